@@ -5,6 +5,8 @@ This module displays a user's activity page. It includes:
   - All workouts (using get_user_workouts)
   - An activity summary (aggregating statistics from the workouts)
   - A detailed activity summary with maps
+  - Training load: heart-rate zones, TRIMP, cadence and the acute:chronic
+    workload ratio (from the stored per-workout metrics)
   - A "Share" button that lets the user share a statistic (e.g., step count)
     with the community by inserting a row into the Posts table.
 """
@@ -23,7 +25,13 @@ Implement a "Share" button to post workout statistics to a community feed by ins
 '''
 
 import streamlit as st
-from data_fetcher import get_user_workouts, get_user_profile
+import pandas as pd
+from data_fetcher import get_user_workouts, get_user_profile, get_workout_training_load, get_workout_sensor_summaries
+from modules import get_workout_page, get_expanded_workout, display_location_preview
+from workout_records import as_workout_record
+from reference_data import DEFAULT_SENSOR_TYPES, sensor_info
+from cache_events import POSTS, publish
+from training_load import ZONE_COLUMNS, max_heart_rate, workload_ratio, workload_status
 from google.cloud import bigquery
 from datetime import datetime, timezone
 import uuid
@@ -58,6 +66,7 @@ def create_post(user_id, content, image_url=None):
     
     errors = client.insert_rows_json(table_id, row_to_insert)
     if not errors:
+        publish(user_id, POSTS)
         st.success("Post inserted successfully!")
     else:
         st.error(f"Errors occurred while inserting the post: {errors}")
@@ -66,6 +75,9 @@ def display_activity_summary(user_id):
     '''
     Displays a detailed activity summary with workout metrics, timestamps, 
     and maps for each workout.
+
+    Workouts are paginated and only one workout per page renders interactive
+    maps; the rest show a static location preview.
     
     Parameters:
         user_id (str): The ID of the user to display activities for.
@@ -85,29 +97,30 @@ def display_activity_summary(user_id):
     if 'map_rendered' not in st.session_state:
         st.session_state.map_rendered = False
 
-    # Process each workout in the list
-    for i, workout in enumerate(workouts_list):
+    page_workouts, offset = get_workout_page(workouts_list, 'activity_detail_page')
+    expanded = get_expanded_workout('activity_detail_expanded', offset, len(page_workouts))
+
+    # One summary row per workout and sensor, for the workouts on this page only
+    sensor_summaries = get_workout_sensor_summaries(
+        user_id, [workout.get('workout_id') for workout in page_workouts if workout.get('workout_id')]
+    )
+
+    # Process each workout on the current page
+    for i, workout in enumerate(page_workouts, start=offset):
         try:
+            # Records from get_user_workouts already carry parsed timestamps
+            record = as_workout_record(workout)
+
             # Extract workout ID and number
-            workout_id = workout.get('workout_id', f'workout{i+1}')
+            workout_id = record.workout_id if record.workout_id is not None else f'workout{i+1}'
             workout_num = workout_id.replace('workout', '') if 'workout' in workout_id else i+1
 
-            # Process timestamps and calculate duration
-            start_time_str = workout.get('start_timestamp')
-            end_time_str = workout.get('end_timestamp')
-
-            if start_time_str and end_time_str:
-                # Parse timestamps
-                start_time = datetime.strptime(start_time_str, '%Y-%m-%d %H:%M:%S')
-                end_time = datetime.strptime(end_time_str, '%Y-%m-%d %H:%M:%S')
-
+            if record.start_time and record.end_time:
                 # Format for display
-                start_display = start_time.strftime('%-I:%M%p').lower()
-                end_display = end_time.strftime('%-I:%M%p').lower()
+                start_display = record.start_time.strftime('%-I:%M%p').lower()
+                end_display = record.end_time.strftime('%-I:%M%p').lower()
 
-                # Calculate duration
-                duration = end_time - start_time
-                hours, remainder = divmod(duration.seconds, 3600)
+                hours, remainder = divmod(record.duration.seconds, 3600)
                 minutes, seconds = divmod(remainder, 60)
                 duration_str = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
             else:
@@ -116,11 +129,11 @@ def display_activity_summary(user_id):
                 duration_str = "00:00:00"
 
             # Extract workout metrics with defaults for missing data
-            distance = workout.get('distance', 0)
-            steps = workout.get('steps', 0)
-            calories = workout.get('calories_burned', 0)
-            start_coords = workout.get('start_lat_lng', (0, 0))
-            end_coords = workout.get('end_lat_lng', (0, 0))
+            distance = record.distance
+            steps = record.steps
+            calories = record.calories_burned
+            start_coords = record.start_lat_lng
+            end_coords = record.end_lat_lng
 
             # Display workout header with icon
             col1, col2 = st.columns([1, 3])
@@ -172,48 +185,68 @@ def display_activity_summary(user_id):
                        unsafe_allow_html=True)
             st.markdown("<hr>", unsafe_allow_html=True)
 
-            # Start and end locations with Folium maps
-            col1, col2 = st.columns(2)
+            # Sensor averages and ranges from the workout's summary rows
+            summary = sensor_summaries.get(record.workout_id, {})
+            if summary:
+                cols = st.columns(len(summary))
+                for col, (sensor_id, stats) in zip(cols, sorted(summary.items())):
+                    sensor = sensor_info(DEFAULT_SENSOR_TYPES, sensor_id)
+                    col.metric(
+                        f"Avg {sensor['name']}",
+                        f"{stats['avg_value']:.0f} {sensor['units']}",
+                        help=f"{stats['min_value']:.0f}-{stats['max_value']:.0f} {sensor['units']} over {stats['samples']} readings",
+                    )
+                st.markdown("<hr>", unsafe_allow_html=True)
+
+            if i != expanded:
+                # Static preview; interactive maps are only built for the expanded workout
+                display_location_preview(start_coords, end_coords)
+                if st.button("Show maps", key=f"show_maps_{workout_id}_{i}"):
+                    st.session_state['activity_detail_expanded'] = i
+                    st.rerun()
+            else:
+                # Start and end locations with Folium maps
+                col1, col2 = st.columns(2)
 
-            with col1:
-                st.markdown("<p><strong>Start Location</strong></p>", unsafe_allow_html=True)
+                with col1:
+                    st.markdown("<p><strong>Start Location</strong></p>", unsafe_allow_html=True)
 
-                # Create a Folium map for start location
-                start_lat, start_lng = start_coords
-                start_map = folium.Map(location=[start_lat, start_lng], zoom_start=14)
+                    # Create a Folium map for start location
+                    start_lat, start_lng = start_coords
+                    start_map = folium.Map(location=[start_lat, start_lng], zoom_start=14)
 
-                # Add a marker for the start position
-                folium.Marker(
-                    [start_lat, start_lng],
-                    popup="Start",
-                    icon=folium.Icon(color="green", icon="play"),
-                ).add_to(start_map)
+                    # Add a marker for the start position
+                    folium.Marker(
+                        [start_lat, start_lng],
+                        popup="Start",
+                        icon=folium.Icon(color="green", icon="play"),
+                    ).add_to(start_map)
 
-                # Display the map with a unique key
-                st_folium(start_map, width=300, height=150, key=f"start_map_{workout_id}_{i}", returned_objects=[])
+                    # Display the map with a unique key
+                    st_folium(start_map, width=300, height=150, key=f"start_map_{workout_id}_{i}", returned_objects=[])
 
-            with col2:
-                st.markdown("<p><strong>End Location</strong></p>", unsafe_allow_html=True)
+                with col2:
+                    st.markdown("<p><strong>End Location</strong></p>", unsafe_allow_html=True)
 
-                # Create a Folium map for end location
-                end_lat, end_lng = end_coords
-                end_map = folium.Map(location=[end_lat, end_lng], zoom_start=14)
+                    # Create a Folium map for end location
+                    end_lat, end_lng = end_coords
+                    end_map = folium.Map(location=[end_lat, end_lng], zoom_start=14)
 
-                # Add a marker for the end position
-                folium.Marker(
-                    [end_lat, end_lng],
-                    popup="End",
-                    icon=folium.Icon(color="red", icon="stop"),
-                ).add_to(end_map)
+                    # Add a marker for the end position
+                    folium.Marker(
+                        [end_lat, end_lng],
+                        popup="End",
+                        icon=folium.Icon(color="red", icon="stop"),
+                    ).add_to(end_map)
 
-                # Display the map with a unique key
-                st_folium(end_map, width=300, height=150, key=f"end_map_{workout_id}_{i}", returned_objects=[])
+                    # Display the map with a unique key
+                    st_folium(end_map, width=300, height=150, key=f"end_map_{workout_id}_{i}", returned_objects=[])
 
             # Close the details container
             st.markdown("</div>", unsafe_allow_html=True)
 
             # Add spacing between workouts
-            if i < len(workouts_list) - 1:
+            if i < offset + len(page_workouts) - 1:
                 st.markdown("<br>", unsafe_allow_html=True)
 
         except Exception as e:
@@ -224,6 +257,55 @@ def display_activity_summary(user_id):
     # Update session state to indicate maps have been rendered
     st.session_state.map_rendered = True
 
+def display_training_load(user_id, user_profile=None):
+    """
+    Displays heart-rate zones, training load and cadence per workout, and the
+    acute:chronic workload ratio.
+    
+    Parameters:
+        user_id (str): The ID of the user
+        user_profile (dict, optional): The user's profile, used to estimate
+            maximum heart rate from the date of birth
+    """
+    max_hr = max_heart_rate((user_profile or {}).get('date_of_birth'))
+    loads = get_workout_training_load(user_id)
+    
+    if not loads:
+        st.info("No heart rate data available for your workouts yet.")
+        return
+    
+    df = pd.DataFrame(loads)
+    df['workout_date'] = pd.to_datetime(df['workout_date'])
+    ratio = workload_ratio(df)
+    latest = ratio.iloc[-1]
+    
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Acute load (7 days)", f"{latest['acute_load']:.0f}")
+    col2.metric("Chronic load (28 days)", f"{latest['chronic_load']:.0f}")
+    acwr = latest['acwr']
+    col3.metric(
+        "Acute:Chronic Ratio",
+        "—" if pd.isna(acwr) else f"{acwr:.2f}",
+        help="0.8-1.3 is the usual safe range; above 1.5 the injury risk rises",
+    )
+    st.caption(f"Workload: {workload_status(acwr)} (max heart rate {max_hr} bpm)")
+    
+    st.markdown("**Daily training load**")
+    st.line_chart(ratio.set_index('date')[['acute_load', 'chronic_load']])
+    
+    st.markdown("**Time in heart-rate zones (minutes)**")
+    zones = df.set_index('workout_id')[ZONE_COLUMNS]
+    zones.columns = [f"Zone {i}" for i in range(len(ZONE_COLUMNS))]
+    st.bar_chart(zones)
+    
+    st.dataframe(
+        df[['workout_date', 'workout_id', 'avg_hr', 'peak_hr', 'trimp', 'steps', 'cadence']].rename(columns={
+            'workout_date': 'Date', 'workout_id': 'Workout', 'avg_hr': 'Avg HR',
+            'peak_hr': 'Peak HR', 'trimp': 'TRIMP', 'steps': 'Steps', 'cadence': 'Cadence (spm)',
+        }),
+        hide_index=True,
+    )
+
 def display_activity_page(user_id):
     """
     Displays the activity page for a given user.
@@ -232,6 +314,7 @@ def display_activity_page(user_id):
       - All workouts for the user.
       - An overall activity summary.
       - A detailed workout summary with maps
+      - Training load and heart-rate zones
       - A share button to post one of the statistics to the community.
     """
     st.title("Your Activity")
@@ -245,12 +328,13 @@ def display_activity_page(user_id):
         return
 
     # Create tabs for different views
-    tab1, tab2 = st.tabs(["Basic Summary", "Detailed Summary with Maps"])
+    tab1, tab2, tab3 = st.tabs(["Basic Summary", "Detailed Summary with Maps", "Training Load"])
     
     with tab1:
         # Display all workouts.
         st.subheader("All Workouts")
-        for workout in workouts:
+        page_workouts, _ = get_workout_page(workouts, 'activity_list_page')
+        for workout in page_workouts:
             #st.markdown(f"**Workout ID:** {workout.get('workout_id', 'N/A')}")
             st.markdown(f"**Start Time:** {workout.get('start_timestamp', 'N/A')}")
             st.markdown(f"**End Time:** {workout.get('end_timestamp', 'N/A')}")
@@ -284,6 +368,10 @@ def display_activity_page(user_id):
         # Display detailed activity summary with maps
         st.subheader("Detailed Workout Analysis")
         display_activity_summary(user_id)
+    
+    with tab3:
+        st.subheader("Training Load")
+        display_training_load(user_id, user_profile)
 
 # Example usage:
 if __name__ == "__main__":
@@ -48,7 +48,8 @@ class TestActivityPage(unittest.TestCase):
     @patch('activity_page.st.title')
     @patch('activity_page.st.tabs')
     @patch('activity_page.display_activity_summary')
-    def test_with_workouts(self, mock_display_summary, mock_tabs, mock_title, 
+    @patch('activity_page.display_training_load')
+    def test_with_workouts(self, mock_training_load, mock_display_summary, mock_tabs, mock_title, 
                           mock_get_profile, mock_get_workouts):
         """Test that the page displays correctly with workouts."""
         # Setup mock data
@@ -76,7 +77,8 @@ class TestActivityPage(unittest.TestCase):
         # Mock tabs
         mock_tab1 = MagicMock()
         mock_tab2 = MagicMock()
-        mock_tabs.return_value = [mock_tab1, mock_tab2]
+        mock_tab3 = MagicMock()
+        mock_tabs.return_value = [mock_tab1, mock_tab2, mock_tab3]
         
         # Mock subheader, markdown, and button functions
         with patch('activity_page.st.subheader') as mock_subheader:
@@ -102,6 +104,10 @@ class TestActivityPage(unittest.TestCase):
                     # Verify activity summary was called in the second tab
                     mock_tab2.__enter__.assert_called()
                     mock_display_summary.assert_called_once_with('user1')
+                    
+                    # Verify training load was shown in the third tab
+                    mock_tab3.__enter__.assert_called()
+                    mock_training_load.assert_called_once_with('user1', {'username': 'testuser'})
     
     @patch('activity_page.get_user_workouts')
     @patch('activity_page.get_user_profile')
@@ -109,7 +115,8 @@ class TestActivityPage(unittest.TestCase):
     @patch('activity_page.st.tabs')
     @patch('activity_page.display_activity_summary')
     @patch('activity_page.create_post')
-    def test_sharing_workout(self, mock_create_post, mock_display_summary, mock_tabs, 
+    @patch('activity_page.display_training_load')
+    def test_sharing_workout(self, mock_training_load, mock_create_post, mock_display_summary, mock_tabs, 
                             mock_title, mock_get_profile, mock_get_workouts):
         """Test the share workout functionality."""
         # Setup mock data
@@ -129,7 +136,8 @@ class TestActivityPage(unittest.TestCase):
         # Mock tabs
         mock_tab1 = MagicMock()
         mock_tab2 = MagicMock()
-        mock_tabs.return_value = [mock_tab1, mock_tab2]
+        mock_tab3 = MagicMock()
+        mock_tabs.return_value = [mock_tab1, mock_tab2, mock_tab3]
         
         # Mock button to return True (simulate button click)
         with patch('activity_page.st.subheader'):
@@ -171,10 +179,11 @@ class TestDisplayActivitySummary(unittest.TestCase):
         mock_info.assert_called_once_with("No workout data available.")
     
     @patch('activity_page.get_user_workouts')
+    @patch('activity_page.get_workout_sensor_summaries')
     @patch('activity_page.folium.Map')
     @patch('activity_page.folium.Marker')
     @patch('activity_page.st_folium')
-    def test_with_workouts(self, mock_st_folium, mock_marker, mock_map, mock_get_workouts):
+    def test_with_workouts(self, mock_st_folium, mock_marker, mock_map, mock_get_summaries, mock_get_workouts):
         """Test summary display with workout data."""
         # Setup mock data with complete workout info
         mock_workouts = [
@@ -190,6 +199,12 @@ class TestDisplayActivitySummary(unittest.TestCase):
             }
         ]
         mock_get_workouts.return_value = mock_workouts
+        mock_get_summaries.return_value = {
+            'workout1': {
+                'sensor1': {'samples': 60, 'avg_value': 142.4, 'min_value': 95.0, 'max_value': 171.0},
+                'sensor3': {'samples': 60, 'avg_value': 36.9, 'min_value': 36.5, 'max_value': 37.4},
+            }
+        }
         
         # Mock Map and Marker
         mock_map_instance = MagicMock()
@@ -220,6 +235,11 @@ class TestDisplayActivitySummary(unittest.TestCase):
                 
                 # Verify session state was updated
                 self.assertTrue(st.session_state.map_rendered)
+                
+                # Verify sensor summaries were read once and shown per sensor
+                mock_get_summaries.assert_called_once_with('user1', ['workout1'])
+                mock_col1.metric.assert_any_call("Avg Heart Rate", "142 bpm", help="95-171 bpm over 60 readings")
+                mock_col2.metric.assert_any_call("Avg Temperature", "37 °C", help="36-37 °C over 60 readings")
 
 class TestCreatePost(unittest.TestCase):
     
@@ -1,14 +1,18 @@
 import streamlit as st
 import datetime
-from modules import display_genai_advice, display_recent_workouts
+from modules import display_genai_advice, display_recent_workouts, display_coach_chat
 from activity_page import display_activity_page
 from community_page import display_posts_page
-from dateutil import parser
+from workout_records import as_workout_record
 from modules import display_genai_advice, display_recent_workouts
+from cache_events import MEALS, POSTS, SENSORS, WATER, WORKOUTS
+from fetch_cache import cache_diagnostics, cached_fetch, diagnostics_enabled, last_days
 from data_fetcher import get_user_posts, get_genai_advice, get_user_profile, get_user_workouts, get_users, get_workout_stats, get_user_water_intake, get_nutrition_data, get_meal_details
-from water_page import display_water_intake_page  # Import the water intake page module
-from nutrition_analytics import display_nutrition_analytics_page
-from meal_logger import display_meal_logger_page
+from water_page import display_water_intake_page, prefetch_water_page  # Import the water intake page module
+from water_ledger import get_water_intake
+from nutrition_analytics import display_nutrition_analytics_page, prefetch_nutrition_analytics_page
+from meal_logger import display_meal_logger_page, prefetch_meal_logger_page
+from prefetch import prefetcher, register_warmer
 from nutrition_goals_tracker import show as display_nutrition_goals_tracker
 from set_goals import show as display_set_goals_page
 
@@ -120,39 +124,60 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Add caching to improve performance
-@st.cache_data(ttl=300, show_spinner=False)  # Cache for 5 minutes, hide spinner
+# Add caching to improve performance; writes evict the entries they change.
+# Entries older than refresh_after are served while they reload in the background.
+@cached_fetch(refresh_after=15 * 60)
 def cached_get_user_profile(user_id):
     return get_user_profile(user_id)
 
-@st.cache_data(ttl=300, show_spinner=False)  # Cache for 5 minutes, hide spinner
+@cached_fetch(POSTS, refresh_after=15 * 60)
 def cached_get_user_posts(user_id):
     return get_user_posts(user_id)
 
-@st.cache_data(ttl=300, show_spinner=False)  # Cache for 5 minutes, hide spinner
+# Full workout histories: the largest values, so the largest budget
+@cached_fetch(WORKOUTS, refresh_after=15 * 60, max_bytes=32 * 1024 * 1024)
 def cached_get_user_workouts(user_id):
     return get_user_workouts(user_id)
 
-@st.cache_data(ttl=300, show_spinner=False)  # Cache for 5 minutes, hide spinner
+@cached_fetch(WORKOUTS, SENSORS, refresh_after=20 * 60)
 def cached_get_genai_advice(user_id):
     return get_genai_advice(user_id)
 
-@st.cache_data(ttl=300, show_spinner=False)  # Cache for 5 minutes, hide spinner
-def cached_get_user_water_intake(user_id, date):
-    return get_user_water_intake(user_id, date)
-
-@st.cache_data(ttl=300, show_spinner=False)  # Cache for 5 minutes, hide spinner
+@cached_fetch(MEALS, WATER, span=last_days('days'))
 def cached_get_nutrition_data(user_id, days=1):
     return get_nutrition_data(user_id, days)
 
-@st.cache_data(ttl=300, show_spinner=False)  # Cache for 5 minutes, hide spinner
+@cached_fetch(MEALS, span=last_days('days'), refresh_after=10 * 60)
 def cached_get_meal_details(user_id, days=1):
     return get_meal_details(user_id, days)
 
-@st.cache_data(ttl=300, show_spinner=False)  # Cache for 5 minutes, hide spinner
+@cached_fetch(user_param=None, refresh_after=10 * 60)
 def cached_get_users():
     return get_users()
 
+def prefetch_home_page(user_id):
+    """Loads the home page's previews into the caches (see prefetch.py)."""
+    cached_get_user_profile(user_id)
+    cached_get_user_workouts(user_id)
+    prefetch_water_page(user_id)
+    cached_get_nutrition_data(user_id, days=1)
+    cached_get_meal_details(user_id, days=1)
+    cached_get_user_posts(user_id)
+    # Not the AI advice: a prefetch must not make speculative Gemini calls
+
+def prefetch_workouts_page(user_id):
+    """Loads the workouts and profile the profile and workouts pages show."""
+    cached_get_user_profile(user_id)
+    cached_get_user_workouts(user_id)
+
+# Caches warmed in the background before the page is likely to be opened
+register_warmer('home', prefetch_home_page)
+register_warmer('profile', prefetch_workouts_page)
+register_warmer('workouts', prefetch_workouts_page)
+register_warmer('water', prefetch_water_page)
+register_warmer('meals', prefetch_meal_logger_page)
+register_warmer('nutrition', prefetch_nutrition_analytics_page)
+
 # Initialize session state for navigation
 if 'page' not in st.session_state:
     st.session_state.page = 'home'
@@ -303,7 +328,8 @@ def display_home_page(user_id=DEFAULT_USER_ID):
                 st.markdown("<div class='feature-title'>", unsafe_allow_html=True)
                 
                 today = datetime.datetime.now().date()
-                today_water_intake = cached_get_user_water_intake(user_id, today)
+                # Cached records plus water logged in this session but not yet saved
+                today_water_intake = get_water_intake(user_id, today)
                 total_water_ml = sum(record['amount_ml'] for record in today_water_intake)
                 water_percentage = min(100, int((total_water_ml / 2000) * 100))  # 2000ml recommended daily intake
                 
@@ -455,7 +481,7 @@ def display_home_page(user_id=DEFAULT_USER_ID):
 
 def display_profile_page(user_id=DEFAULT_USER_ID):
     try:
-        user_profile = get_user_profile(user_id)
+        user_profile = cached_get_user_profile(user_id)
 
         # --- Profile Header ---
         col1, col2 = st.columns([1, 3])
@@ -472,7 +498,7 @@ def display_profile_page(user_id=DEFAULT_USER_ID):
         # --- Activity Stats ---
         st.markdown("---")
         st.subheader("📊 Activity Statistics")
-        workouts = get_user_workouts(user_id)
+        workouts = cached_get_user_workouts(user_id)
 
         if workouts:
             total_distance = sum(w.get('distance', 0) for w in workouts)
@@ -494,8 +520,8 @@ def display_profile_page(user_id=DEFAULT_USER_ID):
             workout_days = set()
             for workout in workouts:
                 try:
-                    dt = parser.parse(workout['start_timestamp'])
-                    workout_days.add(dt.weekday())  # Monday = 0, Sunday = 6
+                    # Workout records carry their parsed date
+                    workout_days.add(as_workout_record(workout).workout_date.weekday())  # Monday = 0, Sunday = 6
                 except Exception as e:
                     st.warning(f"Skipping invalid timestamp: {workout.get('start_timestamp', '')}")
 
@@ -560,7 +586,7 @@ def display_profile_page(user_id=DEFAULT_USER_ID):
             friend_cols = st.columns(min(3, len(friends)))
             for i, friend_id in enumerate(friends):
                 try:
-                    friend = get_user_profile(friend_id)
+                    friend = cached_get_user_profile(friend_id)
                     with friend_cols[i % 3]:
                         st.image(friend.get('profile_image', ''), width=100)
                         st.write(f"**{friend.get('full_name', 'Friend')}**")
@@ -582,8 +608,12 @@ def display_workouts_page(user_id=DEFAULT_USER_ID):
     st.write("Here's a summary of your recent workouts:")
     
     try:
-        # Pass user_id, not get_user_workouts(user_id)
-        display_recent_workouts(user_id)
+        # Cached reads, so prefetched workouts are reused
+        display_recent_workouts(
+            user_id,
+            workouts=cached_get_user_workouts(user_id),
+            user_profile=cached_get_user_profile(user_id),
+        )
     except Exception as e:
         st.error(f"Error displaying workouts: {str(e)}")
 
@@ -625,6 +655,9 @@ def display_advice_page(user_id=DEFAULT_USER_ID):
     except Exception as e:
         st.error(f"Error displaying AI advice: {str(e)}")
 
+    # Follow-up questions for the coach
+    display_coach_chat(user_id)
+
 def display_goals_page(user_id=DEFAULT_USER_ID):
     """Display the nutrition goals tracking page"""
     display_nutrition_goals_tracker(user_id)
@@ -633,6 +666,25 @@ def display_set_goals_page_wrapper(user_id=DEFAULT_USER_ID):
     """Display the set goals page"""
     display_set_goals_page(user_id)
 
+def display_cache_diagnostics():
+    """Displays the entries, memory and evictions of each data cache."""
+    rows = cache_diagnostics()
+    total_bytes = sum(row['bytes'] for row in rows)
+    st.caption(f"{sum(row['entries'] for row in rows)} entries, {total_bytes / (1024 * 1024):.1f} MB cached")
+    st.dataframe([
+        {
+            'Cache': row['name'].rsplit('.', 1)[-1],
+            'Entries': f"{row['entries']}/{row['max_entries']}",
+            'MB': round(row['bytes'] / (1024 * 1024), 2),
+            'Limit MB': round(row['max_bytes'] / (1024 * 1024)),
+            'Hits': row['hits'],
+            'Loads': row['loads'],
+            'Evictions': row['evictions'],
+            'Eviction rate': f"{row['eviction_rate']:.0%}",
+        }
+        for row in rows
+    ], hide_index=True)
+
 def main():
     '''
     Main function for the Streamlit app that:
@@ -662,12 +714,24 @@ def main():
         # Store selected user in session state
         st.session_state.selected_user = selected_user
         
+        # Operators only (SHOW_CACHE_DIAGNOSTICS)
+        if diagnostics_enabled():
+            with st.expander("Cache diagnostics"):
+                display_cache_diagnostics()
+
         st.markdown("---")
         st.caption("© 2025 Social Fitness App")
     
     # Create the navbar
     create_navbar()
 
+    # Count page switches, so prefetching learns where users go next
+    page = st.session_state.page
+    previous_page = st.session_state.get('previous_page')
+    if previous_page is not None and previous_page != page:
+        prefetcher.record_navigation(previous_page, page)
+    st.session_state.previous_page = page
+
     # Display the appropriate page based on session state
     if st.session_state.page == 'home':
         display_home_page(st.session_state.selected_user)
@@ -692,6 +756,9 @@ def main():
     elif st.session_state.page == 'set_goals':
         display_set_goals_page_wrapper(st.session_state.selected_user)
 
+    # Warm the caches of the likely next pages while this one is read
+    prefetcher.after_render(st.session_state.selected_user, page)
+
 
 # This is the starting point for your app
 if __name__ == '__main__':
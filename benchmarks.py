@@ -0,0 +1,185 @@
+"""
+benchmarks.py
+
+Micro-benchmarks for the analytics computations and cached fetch results,
+run with:
+
+    python3 benchmarks.py
+
+Each benchmark times the current implementation against the loop it
+replaced on synthetic data. Nothing here touches BigQuery or Streamlit.
+"""
+
+import pickle
+import timeit
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from cache_events import EventBus
+from compact_records import MealDetail
+from fetch_cache import FetchCache
+from nutrition_stats import match_workout_meals
+from sensor_anomalies import AnomalyDetector, detect_anomalies
+
+
+def make_meals_and_workouts(days=365, seed=0):
+    """Builds synthetic meal rows (three meals a day) and one workout a day."""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2024-01-01', periods=days)
+    meal_times = np.concatenate([
+        dates + pd.to_timedelta(rng.integers(low, high, days), unit='min')
+        for low, high in ((6 * 60, 9 * 60), (11 * 60, 14 * 60), (17 * 60, 20 * 60))
+    ])
+    meals = pd.DataFrame({
+        'meal_time': meal_times,
+        'meal_type': np.repeat(['breakfast', 'lunch', 'dinner'], days),
+        'total_calories': rng.integers(200, 900, 3 * days),
+        'total_carbs_grams': rng.integers(10, 120, 3 * days),
+        'total_protein_grams': rng.integers(5, 60, 3 * days),
+    })
+    meals['date'] = meals['meal_time'].dt.date
+
+    starts = dates + pd.to_timedelta(rng.integers(7 * 60, 19 * 60, days), unit='min')
+    workouts = pd.DataFrame({
+        'start_time': starts,
+        'end_time': starts + pd.Timedelta(minutes=45),
+        'calories_burned': rng.integers(100, 600, days),
+        'distance': rng.uniform(1, 8, days),
+    })
+    workouts['date'] = workouts['start_time'].dt.date
+    workouts['hour'] = workouts['start_time'].dt.hour
+    return meals, workouts
+
+
+def legacy_pre_workout_meals(workouts, meals):
+    """The per-workout loop previously used by display_detailed_analysis."""
+    insights = []
+    for _, workout in workouts.iterrows():
+        pre_workout_meals = meals[
+            (meals['date'] == workout['date']) &
+            (meals['meal_time'].dt.hour < workout['hour'])
+        ]
+        if not pre_workout_meals.empty:
+            hours_before = [(workout['hour'] - hour) for hour in pre_workout_meals['meal_time'].dt.hour]
+            closest_meal = pre_workout_meals.iloc[hours_before.index(min(hours_before))]
+            insights.append({
+                'pre_workout_meal_type': closest_meal['meal_type'],
+                'pre_workout_calories': closest_meal['total_calories'],
+                'hours_before_workout': min(hours_before),
+            })
+    return pd.DataFrame(insights)
+
+
+def make_sensor_readings(workouts=1000, seconds=1800, interval=5, seed=0):
+    """Builds heart rate and step readings every `interval` seconds for each workout."""
+    rng = np.random.default_rng(seed)
+    per_workout = seconds // interval
+    starts = pd.Timestamp('2024-01-01 07:00') + pd.to_timedelta(np.arange(workouts), unit='D')
+    offsets = pd.to_timedelta(np.arange(per_workout) * interval, unit='s')
+    timestamps = (starts.values[:, None] + offsets.values[None, :]).ravel()
+    # One heart rate spike per workout on average
+    heart_rate = rng.normal(140, 8, workouts * per_workout)
+    heart_rate[rng.integers(0, len(heart_rate), workouts)] = 210
+    return pd.DataFrame({
+        'workout_id': np.repeat([f'workout{i}' for i in range(workouts)], 2 * per_workout),
+        'sensor_id': np.tile(np.repeat(['sensor1', 'sensor2'], per_workout), workouts),
+        'timestamp': np.tile(timestamps.reshape(workouts, per_workout), 2).ravel(),
+        'value': np.hstack([
+            heart_rate.reshape(workouts, per_workout),
+            rng.poisson(12, (workouts, per_workout)),
+        ]).ravel(),
+    })
+
+
+def make_meal_detail_rows(meals=270, foods_per_meal=3, seed=0):
+    """Builds get_meal_details() rows as (field, value) pairs. Strings are
+    rebuilt for every row, as the BigQuery client does."""
+    rng = np.random.default_rng(seed)
+    food_names = ['Oatmeal', 'Banana', 'Chicken Breast', 'Brown Rice', 'Broccoli', 'Greek Yogurt']
+    rows = []
+    for meal in range(meals):
+        meal_type = ['breakfast', 'lunch', 'dinner'][meal % 3]
+        for food in rng.integers(0, len(food_names), foods_per_meal):
+            rows.append([
+                ('meal_id', ''.join(['meal-', str(meal)])),
+                ('meal_type', ''.join([meal_type])),
+                ('meal_name', ''.join([meal_type.title(), ' ', str(meal // 3)])),
+                ('meal_time', (datetime(2024, 1, 1) + timedelta(hours=8 * meal)).isoformat()),
+                ('food_name', ''.join([food_names[food]])),
+                ('brand_name', ''.join(['Generic'])),
+                ('quantity', float(rng.uniform(0.5, 2))),
+                ('total_calories', float(rng.uniform(50, 400))),
+                ('total_protein_grams', float(rng.uniform(0, 40))),
+                ('total_carbs_grams', float(rng.uniform(0, 60))),
+                ('total_fat_grams', float(rng.uniform(0, 20))),
+            ])
+    return rows
+
+
+def allocated_bytes(build):
+    """Returns what build() returns and the bytes it still holds."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    value = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return value, after - before
+
+
+def benchmark_cached_rows():
+    """Compares the memory and cache hit time of meal rows as dicts and
+    as compact records."""
+    dicts, dict_bytes = allocated_bytes(lambda: [dict(row) for row in make_meal_detail_rows()])
+    records, record_bytes = allocated_bytes(lambda: [MealDetail(**dict(row)) for row in make_meal_detail_rows()])
+    rows = records
+    print(f"Cached meal detail rows ({len(rows)} rows)")
+    print(f"  {'dicts':<12} {dict_bytes / len(rows):8.0f} B/row")
+    print(f"  {'records':<12} {record_bytes / len(rows):8.0f} B/row")
+
+    # st.cache_data pickles on store and unpickles on every hit; FetchCache
+    # hands out the stored list
+    cache = FetchCache(lambda user_id: records, bus=EventBus(), shared=False)
+    cache('user1')
+    benchmark("Cache hit (meal detail rows)", {
+        'pickled dicts': lambda: pickle.loads(pickle.dumps(dicts)),
+        'pickled records': lambda: pickle.loads(pickle.dumps(records)),
+        'FetchCache': lambda: cache('user1'),
+    }, number=20)
+
+
+def benchmark(name, functions, number=5, items=None):
+    """Prints the best time per call for each named function, and the
+    throughput when the number of items processed per call is given."""
+    print(name)
+    for label, function in functions.items():
+        best = min(timeit.repeat(function, number=number, repeat=3)) / number
+        rate = f" {items / best / 1e6:8.2f} M/s" if items else ""
+        print(f"  {label:<12} {best * 1000:8.2f} ms{rate}")
+
+
+def main():
+    for days in (90, 365, 730):
+        meals, workouts = make_meals_and_workouts(days)
+        benchmark(f"Pre/post-workout meal matching ({days} days)", {
+            'iterrows': lambda: legacy_pre_workout_meals(workouts, meals),
+            'merge_asof': lambda: match_workout_meals(workouts, meals),
+        })
+
+    readings = make_sensor_readings(workouts=3000)
+    sample = readings.head(100_000).to_dict('records')
+    benchmark("Sensor anomaly detection (100k readings)", {
+        'online': lambda: AnomalyDetector().feed(sample),
+        'vectorized': lambda: detect_anomalies(sample),
+    }, number=1, items=len(sample))
+    benchmark(f"Sensor anomaly detection ({len(readings) // 1000}k readings)", {
+        'vectorized': lambda: detect_anomalies(readings),
+    }, number=1, items=len(readings))
+
+    benchmark_cached_rows()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+cache_events.py
+
+This module lets writes tell read caches what they changed. It includes:
+  - CacheEvent: one change, as (user_id, entity, start, end). A missing start
+    or end leaves that side of the date range open.
+  - EventBus: delivers published events to the subscribers whose entity
+    pattern matches (fnmatch style, e.g. 'meals' or '*')
+  - bus / publish() / subscribe(): the process-wide bus used by data_fetcher
+    writes and by the caches in fetch_cache.py and range_cache.py
+
+Events are delivered synchronously, before publish() returns, so a cache has
+dropped the affected entries by the time the write returns to its caller.
+"""
+
+import fnmatch
+import threading
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional
+
+from range_cache import as_date
+
+# Entities published by data_fetcher writes
+MEALS = 'meals'
+WATER = 'water'
+GOALS = 'goals'
+POSTS = 'posts'
+WORKOUTS = 'workouts'
+SENSORS = 'sensors'
+FOODS = 'foods'
+
+
+@dataclass(frozen=True)
+class CacheEvent:
+    """
+    A change to one user's data of one entity.
+
+    Args:
+        user_id (str): The user whose data changed; None for shared data
+        entity (str): What changed (MEALS, WATER, ...)
+        start (date, optional): First day that changed
+        end (date, optional): Last day that changed
+    """
+    user_id: Optional[str]
+    entity: str
+    start: Optional[date] = None
+    end: Optional[date] = None
+
+    def overlaps(self, start=None, end=None):
+        """
+        Whether the change touches the days start..end (inclusive).
+
+        Args:
+            start (date, optional): First day of the range; None is unbounded
+            end (date, optional): Last day of the range; None is unbounded
+
+        Returns:
+            bool
+        """
+        if self.start is not None and end is not None and end < self.start:
+            return False
+        if self.end is not None and start is not None and start > self.end:
+            return False
+        return True
+
+
+class EventBus:
+    """Delivers cache events to subscribers by entity pattern."""
+
+    def __init__(self):
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, pattern, callback):
+        """
+        Calls callback(event) for every event whose entity matches pattern.
+
+        Args:
+            pattern (str): Entity name or fnmatch pattern
+            callback (callable): Receives the CacheEvent
+
+        Returns:
+            callable: Removes the subscription
+        """
+        subscription = (pattern, callback)
+        with self._lock:
+            self._subscribers.append(subscription)
+
+        def unsubscribe():
+            with self._lock:
+                if subscription in self._subscribers:
+                    self._subscribers.remove(subscription)
+        return unsubscribe
+
+    def publish(self, event):
+        """
+        Delivers an event to the matching subscribers.
+
+        A failing subscriber is logged and does not stop the others.
+
+        Args:
+            event (CacheEvent): The change
+        """
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for pattern, callback in subscribers:
+            if fnmatch.fnmatchcase(event.entity, pattern):
+                try:
+                    callback(event)
+                except Exception as e:
+                    print(f"Error handling cache event {event.entity}: {str(e)}")
+
+
+bus = EventBus()
+
+
+def publish(user_id, entity, start=None, end=None):
+    """
+    Publishes a change on the process-wide bus.
+
+    Args:
+        user_id (str): The user whose data changed
+        entity (str): What changed (MEALS, WATER, ...)
+        start (date or datetime, optional): First day that changed
+        end (date or datetime, optional): Last day that changed; defaults to
+            start when start is given
+
+    Returns:
+        CacheEvent: The published event
+    """
+    start = as_date(start) if start is not None else None
+    end = as_date(end) if end is not None else start
+    event = CacheEvent(user_id, entity, start, end)
+    bus.publish(event)
+    return event
+
+
+def subscribe(pattern, callback):
+    """Subscribes to the process-wide bus (see EventBus.subscribe)."""
+    return bus.subscribe(pattern, callback)
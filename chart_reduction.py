@@ -0,0 +1,201 @@
+"""
+chart_reduction.py
+
+This module keeps chart payloads bounded as time series grow. It includes:
+  - Largest-Triangle-Three-Buckets (LTTB) and min/max bucketing, which pick
+    the rows worth drawing for a target number of points
+  - reduce_frame(): reduces a DataFrame for a chart of a given pixel width
+  - webgl_traces(): swaps large SVG scatter traces for WebGL (Scattergl) ones
+
+A chart never needs more points than it has pixels across, so the target is
+derived from the chart width. Both reductions keep the first and last rows
+and the visible peaks of every series.
+"""
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+# Width (in pixels) assumed for a full-width chart
+DEFAULT_CHART_WIDTH = 800
+
+# Points kept per pixel of chart width
+POINTS_PER_PIXEL = 1
+
+# Never reduce below this many points
+MIN_CHART_POINTS = 50
+
+# Scatter traces with more points than this are drawn with WebGL
+WEBGL_THRESHOLD = 1000
+
+# Scatter properties that Scattergl does not support
+_SVG_ONLY_PROPERTIES = ('stackgroup', 'stackgaps', 'groupnorm', 'orientation', 'hoveron', 'cliponaxis', 'alignmentgroup', 'offsetgroup')
+
+
+def target_points(width=DEFAULT_CHART_WIDTH):
+    """
+    Returns the number of points worth drawing on a chart.
+
+    Args:
+        width (int): Chart width in pixels
+
+    Returns:
+        int
+    """
+    return max(MIN_CHART_POINTS, int(width * POINTS_PER_PIXEL))
+
+
+def _as_float(values):
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.astype('int64').to_numpy(dtype=float)
+    return pd.to_numeric(values, errors='coerce').to_numpy(dtype=float)
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Picks points with the Largest-Triangle-Three-Buckets algorithm.
+
+    The first and last points are kept. The points in between are split into
+    n_out - 2 buckets, and from each bucket the point forming the largest
+    triangle with the previously kept point and the next bucket's average is
+    kept.
+
+    Args:
+        x (array-like): Sorted x values (numbers or datetimes)
+        y (array-like): y values without NaN
+        n_out (int): Number of points to keep
+
+    Returns:
+        numpy.ndarray: Sorted indices of the kept points
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = _as_float(x)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        # Twice the triangle area for every candidate in the bucket
+        area = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (avg_y - y[previous])
+        )
+        previous = start + int(np.argmax(area))
+        selected[i + 1] = previous
+    return selected
+
+
+def minmax_indices(y, n_out):
+    """
+    Keeps the minimum and maximum of each of n_out / 2 equal buckets.
+
+    Args:
+        y (array-like): y values without NaN
+        n_out (int): Approximate number of points to keep
+
+    Returns:
+        numpy.ndarray: Sorted indices of the kept points
+    """
+    n = len(y)
+    if n_out >= n or n_out < 4:
+        return np.arange(n)
+
+    y = np.asarray(y, dtype=float)
+    buckets = n_out // 2
+    edges = np.linspace(0, n, buckets + 1).astype(int)
+    lows = [start + int(np.argmin(y[start:end])) for start, end in zip(edges[:-1], edges[1:])]
+    highs = [start + int(np.argmax(y[start:end])) for start, end in zip(edges[:-1], edges[1:])]
+    return np.unique(np.concatenate([[0, n - 1], lows, highs]))
+
+
+def reduce_frame(df, x, y, width=DEFAULT_CHART_WIDTH, max_points=None, method='lttb'):
+    """
+    Returns the rows of a DataFrame worth drawing on a chart.
+
+    Every y column is reduced separately and the union of the kept rows is
+    returned, so all series share the same x values. Frames that are already
+    small enough are returned unchanged.
+
+    Args:
+        df (DataFrame): Chart data
+        x (str or None): The x column, or None to use the index (sorted
+            ascending if it is not already)
+        y (list or str): The y column(s)
+        width (int): Chart width in pixels, used when max_points is not given
+        max_points (int, optional): Points to keep per series
+        method (str): 'lttb' or 'minmax'
+
+    Returns:
+        DataFrame
+    """
+    n_out = max_points or target_points(width)
+    if len(df) <= n_out:
+        return df
+    if method not in ('lttb', 'minmax'):
+        raise ValueError(f"Unknown reduction method: {method}")
+
+    if x is None:
+        if not df.index.is_monotonic_increasing:
+            df = df.sort_index(kind='stable')
+        x_values = df.index.to_series()
+    else:
+        if not df[x].is_monotonic_increasing:
+            df = df.sort_values(x, kind='stable')
+        x_values = df[x]
+
+    columns = [y] if isinstance(y, str) else list(y)
+    keep = []
+    for column in columns:
+        values = _as_float(df[column])
+        positions = np.flatnonzero(~np.isnan(values))
+        if method == 'lttb':
+            picked = lttb_indices(x_values.iloc[positions], values[positions], n_out)
+        else:
+            picked = minmax_indices(values[positions], n_out)
+        keep.append(positions[picked])
+
+    return df.iloc[np.unique(np.concatenate(keep))] if keep else df
+
+
+def webgl_traces(fig, threshold=WEBGL_THRESHOLD):
+    """
+    Replaces SVG scatter traces having more than `threshold` points with
+    WebGL (Scattergl) traces, in place.
+
+    Stacked or filled-to-next traces stay SVG, since WebGL cannot draw them.
+
+    Args:
+        fig (plotly.graph_objects.Figure): The figure
+        threshold (int): Minimum number of points for WebGL
+
+    Returns:
+        plotly.graph_objects.Figure: The same figure
+    """
+    traces = []
+    changed = False
+    for trace in fig.data:
+        points = len(trace.x) if trace.type == 'scatter' and trace.x is not None else 0
+        if points > threshold and trace.stackgroup is None and trace.fill in (None, 'none', 'tozeroy', 'tozerox'):
+            spec = trace.to_plotly_json()
+            spec.pop('type', None)
+            for key in _SVG_ONLY_PROPERTIES:
+                spec.pop(key, None)
+            traces.append(go.Scattergl(spec))
+            changed = True
+        else:
+            traces.append(trace)
+    if changed:
+        fig.data = ()
+        fig.add_traces(traces)
+    return fig
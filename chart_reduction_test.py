@@ -0,0 +1,98 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+from chart_reduction import MIN_CHART_POINTS, lttb_indices, reduce_frame, target_points, webgl_traces
+
+# python3 -m unittest chart_reduction_test.py
+
+
+def make_series(days=5000, peak_at=1234):
+    rng = np.random.default_rng(0)
+    calories = 2000 + rng.normal(0, 50, days)
+    calories[peak_at] = 6000
+    return pd.DataFrame({
+        'date': pd.date_range('2010-01-01', periods=days),
+        'calories': calories,
+        'water': 2000 + rng.normal(0, 100, days),
+    })
+
+
+class TestTargetPoints(unittest.TestCase):
+
+    def test_scales_with_width(self):
+        self.assertEqual(target_points(800), 800)
+        self.assertEqual(target_points(400), 400)
+        self.assertEqual(target_points(10), MIN_CHART_POINTS)
+
+
+class TestReduceFrame(unittest.TestCase):
+
+    def test_lttb_keeps_endpoints_and_peak(self):
+        df = make_series()
+        reduced = reduce_frame(df, 'date', 'calories', max_points=200)
+
+        self.assertEqual(len(reduced), 200)
+        self.assertEqual(reduced.index[0], 0)
+        self.assertEqual(reduced.index[-1], len(df) - 1)
+        self.assertIn(1234, reduced.index)
+        self.assertTrue(reduced['date'].is_monotonic_increasing)
+
+    def test_several_columns_share_rows(self):
+        df = make_series()
+        reduced = reduce_frame(df, 'date', ['calories', 'water'], max_points=200)
+        self.assertGreaterEqual(len(reduced), 200)
+        self.assertLessEqual(len(reduced), 400)
+        self.assertEqual(list(reduced.columns), ['date', 'calories', 'water'])
+
+    def test_minmax_keeps_extremes(self):
+        df = make_series()
+        reduced = reduce_frame(df, 'date', 'calories', max_points=100, method='minmax')
+        self.assertLessEqual(len(reduced), 102)
+        self.assertIn(1234, reduced.index)
+        self.assertIn(df['calories'].idxmin(), reduced.index)
+
+    def test_small_frame_unchanged(self):
+        df = make_series(days=30, peak_at=3)
+        self.assertIs(reduce_frame(df, 'date', 'calories'), df)
+
+    def test_index_as_x_and_missing_values(self):
+        df = make_series().set_index('date')[['calories']]
+        df.iloc[::7] = np.nan
+        reduced = reduce_frame(df.iloc[::-1], None, 'calories', max_points=100)
+
+        self.assertEqual(len(reduced), 100)
+        self.assertTrue(reduced.index.is_monotonic_increasing)
+        self.assertFalse(reduced['calories'].isna().any())
+
+    def test_unknown_method(self):
+        with self.assertRaises(ValueError):
+            reduce_frame(make_series(), 'date', 'calories', max_points=10, method='mean')
+
+    def test_lttb_short_input(self):
+        np.testing.assert_array_equal(lttb_indices([0, 1, 2], [1, 2, 3], 10), [0, 1, 2])
+
+
+class TestWebglTraces(unittest.TestCase):
+
+    def test_large_scatter_becomes_webgl(self):
+        df = make_series(days=2000)
+        fig = px.line(df, x='date', y='calories')
+        fig.add_trace(go.Scatter(x=df['date'][:10], y=df['water'][:10], name='small'))
+        webgl_traces(fig)
+
+        self.assertEqual([trace.type for trace in fig.data], ['scattergl', 'scatter'])
+        self.assertEqual(len(fig.data[0].x), 2000)
+
+    def test_stacked_traces_stay_svg(self):
+        df = make_series(days=2000)
+        fig = px.area(df, x='date', y=['calories', 'water'])
+        webgl_traces(fig)
+        self.assertEqual({trace.type for trace in fig.data}, {'scatter'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,310 @@
+"""
+coach_chat.py
+
+This module powers the AI coach Q&A chat on the advice page. It includes:
+  - A compact set of precomputed fitness features for a user
+  - A rolling conversation memory that folds old turns into a short summary
+  - Relevance-selected history from the user's history index
+  - A response cache for repeated (normalized) questions, keyed on the
+    features and the history retrieved for them
+  - A stub model so the chat can be exercised locally without Vertex AI
+
+Every prompt is built from the features, the rolling summary, the last few
+turns and the new question, each with a hard size cap, so the prompt size
+stays bounded no matter how long the conversation gets.
+"""
+
+import functools
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from data_fetcher import calculate_streak
+from workout_records import as_workout_record
+
+try:
+    import vertexai
+    from vertexai.generative_models import GenerativeModel
+except ImportError:
+    vertexai = None
+    GenerativeModel = None
+
+# Number of most recent turns that are sent to the model word for word
+RECENT_TURNS = 3
+
+# Hard caps (in characters) for each part of the prompt
+MAX_SUMMARY_CHARS = 600
+MAX_QUESTION_CHARS = 300
+MAX_ANSWER_CHARS = 400
+MAX_CONTEXT_CHARS = 220
+
+# Number of history entries retrieved for each question
+CONTEXT_DOCUMENTS = 3
+
+# Maximum number of cached answers kept in memory
+RESPONSE_CACHE_SIZE = 256
+
+
+def build_fitness_features(workouts):
+    """
+    Builds a compact dictionary of fitness features from a user's workouts.
+
+    The features are computed once and reused for every turn of the chat
+    instead of sending the raw workout history to the model.
+
+    Args:
+        workouts (list): Workouts as returned by get_user_workouts
+
+    Returns:
+        dict: Aggregated fitness features
+    """
+    if not workouts:
+        return {
+            'total_workouts': 0,
+            'workouts_last_7_days': 0,
+            'current_streak': 0,
+            'longest_streak': 0,
+        }
+
+    current_streak, longest_streak = calculate_streak(workouts)
+
+    start_times = []
+    durations = []
+    for workout in workouts:
+        try:
+            record = as_workout_record(workout)
+        except (TypeError, ValueError):
+            continue
+        if record.duration is None:
+            continue
+        start_times.append(record.start_time)
+        durations.append(record.duration_minutes)
+
+    total = len(workouts)
+    week_ago = datetime.now() - timedelta(days=7)
+
+    features = {
+        'total_workouts': total,
+        'workouts_last_7_days': sum(
+            1 for start in start_times if start.replace(tzinfo=None) >= week_ago
+        ),
+        'avg_distance': round(sum(w.get('distance') or 0 for w in workouts) / total, 2),
+        'avg_steps': int(sum(w.get('steps') or 0 for w in workouts) / total),
+        'avg_calories_burned': round(sum(w.get('calories_burned') or 0 for w in workouts) / total, 1),
+        'current_streak': current_streak,
+        'longest_streak': longest_streak,
+    }
+    if durations:
+        features['avg_duration_minutes'] = round(sum(durations) / len(durations), 1)
+    if start_times:
+        features['last_workout_date'] = max(start_times).date().isoformat()
+
+    return features
+
+
+def features_digest(features):
+    """Returns a short, stable hash of a features dictionary."""
+    encoded = json.dumps(features, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha1(encoded).hexdigest()[:16]
+
+
+def normalize_question(question):
+    """
+    Normalizes a question so that trivially different phrasings share a
+    cache entry (case, punctuation and extra whitespace are ignored).
+    """
+    text = re.sub(r"[^\w\s]", " ", (question or "").lower())
+    return " ".join(text.split())
+
+
+def _clip(text, limit):
+    # Trim a string to a maximum length, marking the cut with an ellipsis
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+class ConversationMemory:
+    """
+    Keeps the last few turns of a conversation verbatim and folds older turns
+    into a rolling summary with a fixed maximum length.
+    """
+
+    def __init__(self, recent_turns=RECENT_TURNS, max_summary_chars=MAX_SUMMARY_CHARS):
+        self.summary = ""
+        self.max_summary_chars = max_summary_chars
+        self.recent = deque(maxlen=recent_turns)
+        self.turn_count = 0
+
+    def add_turn(self, question, answer):
+        """Records a question/answer pair, compacting the oldest turn if needed."""
+        if len(self.recent) == self.recent.maxlen:
+            self._fold(*self.recent[0])
+        self.recent.append((_clip(question, MAX_QUESTION_CHARS), _clip(answer, MAX_ANSWER_CHARS)))
+        self.turn_count += 1
+
+    def _fold(self, question, answer):
+        # Keep only the gist of the turn and drop the oldest summary text first
+        entry = f"Asked: {_clip(question, 80)} Coach: {_clip(answer, 120)}"
+        summary = f"{self.summary} | {entry}" if self.summary else entry
+        if len(summary) > self.max_summary_chars:
+            summary = "..." + summary[-(self.max_summary_chars - 3):]
+        self.summary = summary
+
+
+class ResponseCache:
+    """A small thread-safe LRU cache of coach answers."""
+
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, answer):
+        with self._lock:
+            self._entries[key] = answer
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Shared across sessions so that common questions are answered once per process
+response_cache = ResponseCache()
+
+
+def build_chat_prompt(features, memory, question, context=None):
+    """
+    Builds the prompt for one chat turn.
+
+    Args:
+        features (dict): Precomputed fitness features
+        memory (ConversationMemory): Conversation so far
+        question (str): The new question
+        context (list, optional): Relevant history summaries for the question
+
+    Returns:
+        str: The prompt text
+    """
+    recent = "\n".join(f"User: {q}\nCoach: {a}" for q, a in memory.recent) or "(none)"
+    history = "\n".join(
+        f"- {_clip(text, MAX_CONTEXT_CHARS)}" for text in (context or [])[:CONTEXT_DOCUMENTS]
+    ) or "(none)"
+
+    return f"""
+    You are a friendly fitness coach answering a user's questions.
+
+    USER FITNESS PROFILE:
+    {json.dumps(features, sort_keys=True, separators=(',', ':'), default=str)}
+
+    RELEVANT HISTORY:
+    {history}
+
+    EARLIER IN THIS CONVERSATION:
+    {memory.summary or '(nothing yet)'}
+
+    RECENT MESSAGES:
+    {recent}
+
+    QUESTION:
+    {_clip(question, MAX_QUESTION_CHARS)}
+
+    INSTRUCTIONS:
+    1. Answer in 2-4 sentences using the profile when it is relevant
+    2. DO NOT mention that you're an AI or that you're analyzing data
+    3. Return ONLY the answer text
+    """
+
+
+class StubCoachModel:
+    """
+    Offline stand-in for the Gemini model. It has the same generate_content
+    interface and returns a deterministic canned answer.
+    """
+
+    def __init__(self):
+        self.calls = 0
+
+    def generate_content(self, prompt):
+        self.calls += 1
+        question = prompt.rsplit("QUESTION:", 1)[-1].split("INSTRUCTIONS:", 1)[0].strip()
+        return SimpleNamespace(
+            text=f"Coach tip: keep your training consistent and listen to your body. (re: {_clip(question, 60)})"
+        )
+
+
+@functools.lru_cache(maxsize=1)
+def get_coach_model():
+    """
+    Returns the model used by the coach chat.
+
+    Set the COACH_MODEL environment variable to "stub" to use the offline
+    StubCoachModel. The stub is also used if Vertex AI is not installed.
+    """
+    if os.environ.get("COACH_MODEL", "").lower() == "stub" or GenerativeModel is None:
+        return StubCoachModel()
+
+    vertexai.init(project="bamboo-creek-450920-h2", location="us-central1")
+    return GenerativeModel("gemini-1.5-flash-002")
+
+
+def ask_coach(user_id, question, memory, features, model=None, cache=None, index=None):
+    """
+    Answers one chat question and records the turn in the memory.
+
+    Args:
+        user_id (str): The current user
+        question (str): The user's question
+        memory (ConversationMemory): The conversation so far (updated in place)
+        features (dict): Precomputed fitness features for the user
+        model (optional): Model with a generate_content(prompt) method
+        cache (ResponseCache, optional): Answer cache. Defaults to the shared cache.
+        index (HistoryIndex, optional): History index used to pick relevant context
+
+    Returns:
+        tuple: (answer text, True if the answer came from the cache)
+    """
+    if cache is None:
+        cache = response_cache
+
+    documents = index.query(question, k=CONTEXT_DOCUMENTS) if index is not None else []
+    context = [doc['text'] for doc in documents]
+
+    # The conversation memory changes every turn, so it is left out of the
+    # key (a repeat later in the chat is still a hit); the history retrieved
+    # for the question is not, as it changes what the answer is based on
+    key = (
+        user_id,
+        features_digest(features),
+        tuple(doc['id'] for doc in documents),
+        normalize_question(question),
+    )
+    answer = cache.get(key)
+    from_cache = answer is not None
+
+    if not from_cache:
+        if model is None:
+            model = get_coach_model()
+        response = model.generate_content(build_chat_prompt(features, memory, question, context))
+        answer = response.text.strip()
+        cache.put(key, answer)
+
+    memory.add_turn(question, answer)
+    return answer, from_cache
@@ -0,0 +1,174 @@
+import unittest
+from unittest.mock import MagicMock
+from datetime import datetime, timedelta
+from coach_chat import (
+    ConversationMemory, ResponseCache, StubCoachModel, ask_coach,
+    build_chat_prompt, build_fitness_features, normalize_question,
+)
+from history_index import HistoryIndex
+
+# python3 -m unittest coach_chat_test.py
+
+
+class TestBuildFitnessFeatures(unittest.TestCase):
+
+    def test_empty_workouts(self):
+        """No workouts gives zeroed features."""
+        features = build_fitness_features([])
+        self.assertEqual(features['total_workouts'], 0)
+        self.assertEqual(features['current_streak'], 0)
+
+    def test_aggregates_workouts(self):
+        """Features summarize the workout history."""
+        today = datetime.now().replace(microsecond=0)
+        workouts = [
+            {
+                'start_timestamp': str(today - timedelta(days=d)),
+                'end_timestamp': str(today - timedelta(days=d) + timedelta(minutes=30)),
+                'distance': 2.0,
+                'steps': 4000,
+                'calories_burned': 200,
+            }
+            for d in range(3)
+        ]
+        features = build_fitness_features(workouts)
+        self.assertEqual(features['total_workouts'], 3)
+        self.assertEqual(features['workouts_last_7_days'], 3)
+        self.assertEqual(features['avg_steps'], 4000)
+        self.assertEqual(features['avg_duration_minutes'], 30.0)
+        self.assertEqual(features['current_streak'], 3)
+        self.assertEqual(features['last_workout_date'], today.date().isoformat())
+
+
+class TestNormalizeQuestion(unittest.TestCase):
+
+    def test_ignores_case_punctuation_and_spacing(self):
+        self.assertEqual(
+            normalize_question("  How should I   warm up?? "),
+            normalize_question("how should i warm up"),
+        )
+
+
+class TestConversationMemory(unittest.TestCase):
+
+    def test_old_turns_are_folded_into_summary(self):
+        """Only the last few turns are kept verbatim."""
+        memory = ConversationMemory(recent_turns=2)
+        for i in range(5):
+            memory.add_turn(f"question {i}", f"answer {i}")
+        self.assertEqual(len(memory.recent), 2)
+        self.assertEqual(memory.recent[-1], ("question 4", "answer 4"))
+        self.assertIn("question 2", memory.summary)
+        self.assertEqual(memory.turn_count, 5)
+
+    def test_summary_is_bounded(self):
+        memory = ConversationMemory(recent_turns=1, max_summary_chars=200)
+        for i in range(100):
+            memory.add_turn("q" * 500, "a" * 500)
+        self.assertLessEqual(len(memory.summary), 200)
+
+
+class TestAskCoach(unittest.TestCase):
+
+    def setUp(self):
+        self.features = {'total_workouts': 5, 'current_streak': 2}
+        self.cache = ResponseCache()
+
+    def test_repeated_question_uses_cache(self):
+        """A normalized repeat of a question does not call the model again."""
+        model = StubCoachModel()
+        memory = ConversationMemory()
+
+        first, first_cached = ask_coach("user1", "How do I run faster?", memory,
+                                        self.features, model=model, cache=self.cache)
+        second, second_cached = ask_coach("user1", "how do i run faster", memory,
+                                          self.features, model=model, cache=self.cache)
+
+        self.assertFalse(first_cached)
+        self.assertTrue(second_cached)
+        self.assertEqual(first, second)
+        self.assertEqual(model.calls, 1)
+        self.assertEqual(memory.turn_count, 2)
+
+    def test_repeat_later_in_a_live_chat_uses_cache(self):
+        """Other turns in between do not stop a repeated question from hitting."""
+        model = StubCoachModel()
+        memory = ConversationMemory()
+        ask_coach("user1", "How many rest days do I need?", memory, self.features, model=model, cache=self.cache)
+        for question in ("What should I eat before a run?", "Is stretching useful?"):
+            ask_coach("user1", question, memory, self.features, model=model, cache=self.cache)
+
+        _, cached = ask_coach("user1", "how many rest days do I need", memory,
+                              self.features, model=model, cache=self.cache)
+        self.assertTrue(cached)
+        self.assertEqual(model.calls, 3)
+
+    def test_cache_depends_on_the_retrieved_history(self):
+        model = StubCoachModel()
+        index = HistoryIndex()
+        index.upsert("nutrition:2024-07-15", "nutrition 500ml water low water")
+        ask_coach("user1", "Am I drinking enough water?", ConversationMemory(),
+                  self.features, model=model, cache=self.cache, index=index)
+
+        index.upsert("nutrition:2024-07-16", "nutrition 3000ml water plenty of water")
+        _, cached = ask_coach("user1", "Am I drinking enough water?", ConversationMemory(),
+                              self.features, model=model, cache=self.cache, index=index)
+        self.assertFalse(cached)
+        self.assertEqual(model.calls, 2)
+
+    def test_cache_is_per_user(self):
+        model = StubCoachModel()
+        ask_coach("user1", "Any tips?", ConversationMemory(), self.features, model=model, cache=self.cache)
+        ask_coach("user2", "Any tips?", ConversationMemory(), self.features, model=model, cache=self.cache)
+        self.assertEqual(model.calls, 2)
+
+    def test_prompt_size_stays_bounded(self):
+        """Prompt length does not grow with the number of turns."""
+        model = MagicMock()
+        model.generate_content.return_value = MagicMock(text="x" * 2000)
+        memory = ConversationMemory()
+
+        sizes = []
+        for i in range(40):
+            ask_coach("user1", f"question number {i} " + "y" * 1000, memory,
+                      self.features, model=model, cache=self.cache)
+            sizes.append(len(model.generate_content.call_args[0][0]))
+
+        self.assertEqual(max(sizes[10:]), max(sizes[5:10]))
+
+    def test_prompt_contains_features_and_question(self):
+        prompt = build_chat_prompt(self.features, ConversationMemory(), "What about rest days?")
+        self.assertIn('"current_streak":2', prompt)
+        self.assertIn("What about rest days?", prompt)
+
+    def test_relevant_history_is_added_to_prompt(self):
+        """Entries retrieved from the history index are sent with the question."""
+        index = HistoryIndex()
+        index.upsert("workout:1", "workout 70 minutes long duration high intensity")
+        index.upsert("nutrition:2024-07-15", "nutrition 500ml water low water dehydrated")
+        model = MagicMock()
+        model.generate_content.return_value = MagicMock(text="Drink more water.")
+
+        ask_coach("user1", "Am I drinking enough water?", ConversationMemory(),
+                  self.features, model=model, cache=self.cache, index=index)
+
+        prompt = model.generate_content.call_args[0][0]
+        self.assertIn("RELEVANT HISTORY", prompt)
+        self.assertIn("low water dehydrated", prompt)
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = ResponseCache(max_entries=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(len(cache), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
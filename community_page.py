@@ -17,6 +17,25 @@ Show personalized AI generated fitness advice using the display_genai_advice fun
 '''
 
 
+def post_sort_time(post):
+    """
+    Parses a post's timestamp for sorting.
+
+    Args:
+        post (Mapping): A post from get_user_posts
+
+    Returns:
+        datetime: The post time, or 1970-01-01 when missing or unparseable
+    """
+    # Handle any missing timestamps by using a default old date
+    if post.get('timestamp'):
+        try:
+            return datetime.strptime(post['timestamp'], '%Y-%m-%d %H:%M:%S')
+        except (ValueError, TypeError):
+            pass
+    return datetime(1970, 1, 1)
+
+
 def display_posts_page(user_id):
     '''
     Displays a social media feed showing posts from a user and their friends.
@@ -70,19 +89,9 @@ def display_posts_page(user_id):
         
         # Display posts if any exist
         if all_posts:
-            # Convert string timestamps to datetime objects for proper sorting
-            for post in all_posts:
-                # Handle any missing timestamps by setting a default old date
-                if post.get('timestamp'):
-                    try:
-                        post['datetime'] = datetime.strptime(post['timestamp'], '%Y-%m-%d %H:%M:%S')
-                    except (ValueError, TypeError):
-                        post['datetime'] = datetime(1970, 1, 1)  # Default old date if parsing fails
-                else:
-                    post['datetime'] = datetime(1970, 1, 1)  # Default old date if timestamp is missing
-            
-            # Sort posts by datetime, most recent first
-            all_posts.sort(key=lambda x: x['datetime'], reverse=True)
+            # Sort posts by datetime, most recent first. Posts are shared
+            # cached records, so the parsed time is only used as the sort key.
+            all_posts.sort(key=post_sort_time, reverse=True)
             
             st.subheader("Recent Posts")
             
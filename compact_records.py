@@ -0,0 +1,168 @@
+"""
+compact_records.py
+
+This module defines the compact row types returned by the high-volume
+fetchers (meal details, meal history and foods, water intake, posts, food
+items). It includes:
+  - CompactRecord: the base class. Records keep their values in __slots__
+    instead of a per-row dict, and read-only dictionary-style access
+    (record['meal_id'], record.get(...), keys(), items(), dict(record),
+    pd.DataFrame(records)) so pages written against the old dicts keep
+    working. Records compare equal to dicts with the same items.
+  - record_type(): creates a record class for a list of fields. String
+    values of the `shared` fields are interned, so e.g. the meal_id,
+    meal_type and meal_time repeated on every food row of a meal, or the
+    food and brand names repeated across meals, are stored once.
+  - to_dicts(): plain dicts, for code that needs to add keys
+
+Cached results are shared between reruns and sessions, so records do not
+support item assignment.
+"""
+
+import sys
+from collections.abc import Mapping
+
+# Record classes by name, e.g. to rebuild records from the shared cache
+RECORD_TYPES = {}
+
+
+class CompactRecord(Mapping):
+    """A slotted row with read-only dictionary-style access."""
+
+    __slots__ = ()
+    _fields = ()
+    _field_set = frozenset()
+    _shared = frozenset()
+
+    def __init__(self, *args, **kwargs):
+        values = dict(zip(self._fields, args))
+        values.update(kwargs)
+        unknown = set(values) - self._field_set
+        if unknown:
+            raise TypeError(f"{type(self).__name__} has no fields {sorted(unknown)}")
+        for field in self._fields:
+            self._set(field, values.get(field))
+
+    @classmethod
+    def from_values(cls, values):
+        """Builds a record from values in field order."""
+        record = cls.__new__(cls)
+        for field, value in zip(cls._fields, values):
+            record._set(field, value)
+        return record
+
+    def _set(self, field, value):
+        if field in self._shared and type(value) is str:
+            value = sys.intern(value)
+        object.__setattr__(self, field, value)
+
+    def __getitem__(self, key):
+        if key in self._field_set:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key in self._field_set:
+            return getattr(self, key)
+        return default
+
+    def __contains__(self, key):
+        return key in self._field_set
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def keys(self):
+        return list(self._fields)
+
+    def values(self):
+        return [getattr(self, field) for field in self._fields]
+
+    def items(self):
+        return [(field, getattr(self, field)) for field in self._fields]
+
+    def to_dict(self):
+        """Returns the record as a plain dict."""
+        return {field: getattr(self, field) for field in self._fields}
+
+    def replace(self, **changes):
+        """Returns a copy with some fields changed."""
+        values = self.to_dict()
+        values.update(changes)
+        return type(self)(**values)
+
+    def __eq__(self, other):
+        if isinstance(other, CompactRecord) and type(other) is type(self):
+            return self.values() == other.values()
+        return Mapping.__eq__(self, other)
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return _rebuild, (type(self).__name__, tuple(self.values()))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+def _rebuild(name, values):
+    return RECORD_TYPES[name].from_values(values)
+
+
+def record_type(name, fields, shared=()):
+    """
+    Creates a record class.
+
+    Args:
+        name (str): Class name (unique; used to rebuild cached records)
+        fields (tuple): Field names, in order
+        shared (tuple): Fields whose string values are interned
+
+    Returns:
+        type: A CompactRecord subclass
+    """
+    fields = tuple(fields)
+    cls = type(name, (CompactRecord,), {
+        '__slots__': fields,
+        '_fields': fields,
+        '_field_set': frozenset(fields),
+        '_shared': frozenset(shared),
+        '__module__': __name__,
+    })
+    RECORD_TYPES[name] = cls
+    # Module-level name so pickle can find the class
+    globals()[name] = cls
+    return cls
+
+
+def to_dicts(records):
+    """Returns plain dict copies of records (dicts are copied too)."""
+    return [record.to_dict() if isinstance(record, CompactRecord) else dict(record) for record in records]
+
+
+MealDetail = record_type('MealDetail', (
+    'meal_id', 'meal_type', 'meal_name', 'meal_time', 'food_name', 'brand_name', 'quantity',
+    'total_calories', 'total_protein_grams', 'total_carbs_grams', 'total_fat_grams',
+), shared=('meal_id', 'meal_type', 'meal_name', 'meal_time', 'food_name', 'brand_name'))
+
+MealTotals = record_type('MealTotals', (
+    'meal_id', 'meal_type', 'meal_name', 'meal_time', 'food_count',
+    'total_calories', 'total_protein', 'total_carbs', 'total_fat',
+), shared=('meal_type', 'meal_name'))
+
+MealFood = record_type('MealFood', (
+    'food_name', 'brand_name', 'quantity',
+    'total_calories', 'total_protein_grams', 'total_carbs_grams', 'total_fat_grams',
+), shared=('food_name', 'brand_name'))
+
+WaterRecord = record_type('WaterRecord', ('water_id', 'amount_ml', 'intake_time'))
+
+Post = record_type('Post', ('user_id', 'post_id', 'timestamp', 'content', 'image'), shared=('user_id',))
+
+FoodItem = record_type('FoodItem', (
+    'food_id', 'food_name', 'brand_name', 'serving_size_grams',
+    'calories', 'protein_grams', 'carbs_grams', 'fat_grams',
+), shared=('brand_name',))
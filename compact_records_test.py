@@ -0,0 +1,86 @@
+import pickle
+import sys
+import unittest
+
+import pandas as pd
+
+from compact_records import MealDetail, Post, WaterRecord, record_type, to_dicts
+from shared_cache import decode, encode
+
+# python3 -m unittest compact_records_test.py
+
+
+ROW = {
+    'meal_id': 'meal1', 'meal_type': 'breakfast', 'meal_name': 'Breakfast', 'meal_time': '2025-04-05T08:00:00',
+    'food_name': 'Oatmeal', 'brand_name': 'Quaker', 'quantity': 1.5, 'total_calories': 225.0,
+    'total_protein_grams': 7.5, 'total_carbs_grams': 40.5, 'total_fat_grams': 4.5,
+}
+
+
+class TestCompactRecord(unittest.TestCase):
+
+    def test_dictionary_access(self):
+        record = MealDetail(**ROW)
+        self.assertEqual(record['food_name'], 'Oatmeal')
+        self.assertEqual(record.get('missing', 'default'), 'default')
+        self.assertIn('quantity', record)
+        self.assertNotIn('missing', record)
+        self.assertEqual(list(record), list(ROW))
+        self.assertEqual(dict(record), ROW)
+        self.assertEqual(record, ROW)
+        with self.assertRaises(KeyError):
+            record['missing']
+
+    def test_read_only(self):
+        record = WaterRecord(water_id='water1', amount_ml=250, intake_time='2025-04-05T09:00:00')
+        with self.assertRaises(TypeError):
+            record['amount_ml'] = 500
+        with self.assertRaises(AttributeError):
+            record.extra = 1
+        changed = record.replace(amount_ml=500)
+        self.assertEqual((record['amount_ml'], changed['amount_ml']), (250, 500))
+
+    def test_missing_fields_are_none_and_unknown_fields_fail(self):
+        self.assertIsNone(Post(post_id='post1')['image'])
+        with self.assertRaises(TypeError):
+            Post(post_id='post1', likes=3)
+
+    def test_shared_strings_are_interned(self):
+        # Built at runtime, as the BigQuery client does
+        first = MealDetail(**dict(ROW, meal_type=''.join(['break', 'fast'])))
+        second = MealDetail(**dict(ROW, meal_type=''.join(['breakf', 'ast'])))
+        self.assertIs(first['meal_type'], second['meal_type'])
+        self.assertIs(first['meal_type'], sys.intern('breakfast'))
+
+    def test_smaller_than_dicts(self):
+        record = MealDetail(**ROW)
+        self.assertFalse(hasattr(record, '__dict__'))
+        self.assertLess(sys.getsizeof(record), sys.getsizeof(dict(ROW)) / 3)
+
+    def test_dataframe_and_to_dicts(self):
+        records = [MealDetail(**ROW), MealDetail(**dict(ROW, meal_id='meal2'))]
+        frame = pd.DataFrame(records)
+        self.assertEqual(list(frame.columns), list(ROW))
+        self.assertEqual(list(frame['meal_id']), ['meal1', 'meal2'])
+
+        rows = to_dicts(records)
+        rows[0]['extra'] = 1
+        self.assertEqual(type(rows[1]), dict)
+        self.assertNotIn('extra', records[0])
+
+    def test_pickle_and_shared_cache_round_trip(self):
+        records = [MealDetail(**ROW), Post(user_id='user1', post_id='post1')]
+        for restored in (pickle.loads(pickle.dumps(records)), decode(encode(records))):
+            self.assertEqual(restored, records)
+            self.assertIs(type(restored[0]), MealDetail)
+
+    def test_record_type(self):
+        Point = record_type('TestPoint', ('x', 'y'))
+        point = Point(1, y=2)
+        self.assertEqual(point.items(), [('x', 1), ('y', 2)])
+        self.assertEqual(repr(point), "TestPoint({'x': 1, 'y': 2})")
+        self.assertEqual(pickle.loads(pickle.dumps(point)), point)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,10 +10,22 @@
 
 import sys
 import json
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import functools
 import os
-import random  # Reintroduce the random import
+
+from compact_records import FoodItem, MealDetail, MealFood, MealTotals, Post, WaterRecord
+from cache_events import FOODS, GOALS, MEALS, SENSORS, WATER, publish, subscribe
+from history_index import get_user_index, index_workouts, summarize_workout
+from range_cache import RangeCache, as_date
+from rollups import (
+    ROLLUP_TABLE, RollupQueue, choose_grain, period_start, rollup_from_daily, trend_points,
+)
+from reference_data import get_advice_images, get_sensor_types, sensor_info, choose_image
+from sensor_anomalies import detect_anomalies
+from sensor_summary import SUMMARY_TABLE, read_sensor_summaries, refresh_sensor_summaries
+from training_load import materialize_training_load, read_training_load
+from workout_records import WorkoutRecord, as_workout_record
 
 # Import BigQuery if it's not already imported
 try:
@@ -96,13 +108,7 @@ def get_user_sensor_data(user_id, workout_id):
         SELECT 
             sd.SensorId AS sensor_type,
             sd.Timestamp AS timestamp,
-            sd.SensorValue AS data,
-            CASE 
-                WHEN sd.SensorId = 'sensor1' THEN 'bpm'
-                WHEN sd.SensorId = 'sensor2' THEN 'steps'
-                WHEN sd.SensorId = 'sensor3' THEN '°C'
-                ELSE 'unknown'
-            END AS units
+            sd.SensorValue AS data
         FROM `bamboo-creek-450920-h2.ISE.SensorData` sd
         JOIN `bamboo-creek-450920-h2.ISE.Workouts` wd
         ON sd.WorkoutID = wd.WorkoutId
@@ -120,19 +126,169 @@ def get_user_sensor_data(user_id, workout_id):
     query_job = client.query(query, job_config=job_config)
     results = query_job.result()
 
+    # Units come from the cached SensorTypes table instead of a per-query mapping
+    sensor_types = get_sensor_types(client)
+
     sensor_data = []
     for row in results:
         sensor_data.append({
             "sensor_type": row.sensor_type,
             "timestamp": row.timestamp.isoformat(),
             "data": row.data,
-            "units": row.units
+            "units": sensor_info(sensor_types, row.sensor_type)['units']
         })
 
     return sensor_data
 
 
-def get_user_workouts(user_id):
+def add_sensor_readings(user_id, workout_id, readings):
+    """
+    Adds sensor readings to one of a user's workouts and refreshes the
+    workout's sensor summary.
+    
+    Args:
+        user_id (str): The user ID owning the workout
+        workout_id (str): The workout the readings belong to
+        readings (list): Dictionaries with 'sensor_id', 'timestamp'
+            (datetime) and 'value'
+    
+    Returns:
+        bool: True once the readings are stored, False if the insert failed.
+            A failed summary or training load refresh is logged and left to
+            the backfills, so retrying never stores the readings twice.
+    """
+    if not readings:
+        return True
+    
+    client = get_bigquery_client()
+    
+    # One row per array position; nothing is inserted for another user's workout
+    query = """
+        INSERT INTO `bamboo-creek-450920-h2.ISE.SensorData` (WorkoutID, SensorId, Timestamp, SensorValue)
+        SELECT @workout_id, sensor_id, @timestamps[OFFSET(i)], @sensor_values[OFFSET(i)]
+        FROM UNNEST(@sensor_ids) AS sensor_id WITH OFFSET i
+        WHERE EXISTS (
+            SELECT 1 FROM `bamboo-creek-450920-h2.ISE.Workouts`
+            WHERE WorkoutId = @workout_id AND UserId = @user_id
+        )
+    """
+    
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("user_id", "STRING", user_id),
+            bigquery.ScalarQueryParameter("workout_id", "STRING", workout_id),
+            bigquery.ArrayQueryParameter("sensor_ids", "STRING", [reading['sensor_id'] for reading in readings]),
+            bigquery.ArrayQueryParameter("timestamps", "TIMESTAMP", [reading['timestamp'] for reading in readings]),
+            bigquery.ArrayQueryParameter("sensor_values", "FLOAT64", [float(reading['value']) for reading in readings]),
+        ]
+    )
+    
+    try:
+        client.query(query, job_config=job_config).result()
+    except Exception as e:
+        print(f"Error adding sensor readings: {str(e)}")
+        return False
+    publish(user_id, SENSORS)
+    
+    # Derived tables; the readings are stored whether or not these succeed
+    try:
+        refresh_sensor_summaries(client, [workout_id])
+    except Exception as e:
+        print(f"Error refreshing sensor summaries of workout {workout_id}: {str(e)}")
+    try:
+        materialize_training_load(client, user_id, workout_ids=[workout_id])
+    except Exception as e:
+        print(f"Error refreshing training load of workout {workout_id}: {str(e)}")
+    return True
+
+
+def get_workout_anomalies(user_id, workout_ids=None):
+    """
+    Finds heart rate spikes, sensor dropouts and implausible step bursts in
+    a user's workouts, reading their sensor data with one query.
+    
+    Args:
+        user_id (str): The user ID
+        workout_ids (list, optional): Only these workouts
+    
+    Returns:
+        DataFrame: Anomaly events (see sensor_anomalies.EVENT_COLUMNS),
+        ordered by workout and time; empty if the data cannot be read
+    """
+    query = """
+        SELECT
+            sd.WorkoutID AS workout_id,
+            sd.SensorId AS sensor_id,
+            sd.Timestamp AS timestamp,
+            sd.SensorValue AS value
+        FROM `bamboo-creek-450920-h2.ISE.SensorData` sd
+        JOIN `bamboo-creek-450920-h2.ISE.Workouts` w ON sd.WorkoutID = w.WorkoutId
+        WHERE w.UserId = @user_id
+    """
+    parameters = [bigquery.ScalarQueryParameter("user_id", "STRING", user_id)]
+    if workout_ids is not None:
+        query += " AND w.WorkoutId IN UNNEST(@workout_ids)"
+        parameters.append(bigquery.ArrayQueryParameter("workout_ids", "STRING", list(workout_ids)))
+    
+    client = get_bigquery_client()
+    
+    try:
+        job_config = bigquery.QueryJobConfig(query_parameters=parameters)
+        rows = [dict(row.items()) for row in client.query(query, job_config=job_config).result()]
+    except Exception as e:
+        print(f"Error fetching sensor data: {str(e)}")
+        rows = []
+    
+    return detect_anomalies(rows)
+
+
+def get_workout_sensor_summaries(user_id, workout_ids=None):
+    """
+    Fetches the per-sensor summaries (sample count, average, minimum,
+    maximum, standard deviation, first and last timestamp) of a user's
+    workouts from the WorkoutSensorSummary table.
+    
+    Args:
+        user_id (str): The user ID
+        workout_ids (list, optional): Only these workouts
+    
+    Returns:
+        dict: workout_id -> sensor_id -> summary dict (see
+        sensor_summary.SUMMARY_COLUMNS); empty if the table cannot be read
+    """
+    try:
+        return read_sensor_summaries(get_bigquery_client(), user_id, workout_ids)
+    except Exception as e:
+        print(f"Error fetching sensor summaries: {str(e)}")
+        return {}
+
+
+def get_workout_training_load(user_id):
+    """
+    Fetches the training metrics (heart-rate zones, TRIMP, cadence) of a
+    user's workouts from the WorkoutTrainingLoad table.
+    
+    The table is written when sensor readings are added
+    (add_sensor_readings) and by the backfill (python3 training_load.py),
+    never by this read.
+    
+    Args:
+        user_id (str): The user ID
+    
+    Returns:
+        List of dictionaries with 'workout_id', 'workout_date' and the
+        training_load.METRIC_COLUMNS, oldest first
+    """
+    client = get_bigquery_client()
+    
+    try:
+        return read_training_load(client, user_id)
+    except Exception as e:
+        print(f"Error fetching training load: {str(e)}")
+        return []
+
+
+def get_user_workouts(user_id, start_time=None, end_time=None, limit=None):
     """Fetches a list of workouts for a given user from BigQuery.
     AI Prompt:
     
@@ -141,6 +297,15 @@ def get_user_workouts(user_id):
     StartTimestamp, EndTimestamp, StartLocationLat, StartLocationLong, 
     EndLocationLat, EndLocationLong, TotalDistance, TotalSteps, CaloriesBurned) 
     for a specific user_id from the BigQuery table
+
+    Returns a list of WorkoutRecord objects. Records also support the old
+    dictionary keys (record['start_timestamp'], record.get('steps'), ...).
+
+    Args:
+        user_id (str): The user ID
+        start_time (datetime, optional): Only workouts starting at or after it
+        end_time (datetime, optional): Only workouts starting at or before it
+        limit (int, optional): Only the latest limit workouts, newest first
     """
     
     # Initialize the BigQuery client
@@ -164,11 +329,20 @@ def get_user_workouts(user_id):
     """
     
     # Create query parameters correctly
-    job_config = bigquery.QueryJobConfig(
-        query_parameters=[
-            bigquery.ScalarQueryParameter("user_id", "STRING", user_id)  # Ensure user_id is a string
-        ]
-    )
+    query_parameters = [
+        bigquery.ScalarQueryParameter("user_id", "STRING", user_id)  # Ensure user_id is a string
+    ]
+    # Date bounds are applied in SQL, so a range reads only its own workouts
+    if start_time is not None:
+        query += "    AND StartTimestamp >= @start_time\n"
+        query_parameters.append(bigquery.ScalarQueryParameter("start_time", "TIMESTAMP", start_time))
+    if end_time is not None:
+        query += "    AND StartTimestamp <= @end_time\n"
+        query_parameters.append(bigquery.ScalarQueryParameter("end_time", "TIMESTAMP", end_time))
+    if limit is not None:
+        query += "    ORDER BY StartTimestamp DESC\n    LIMIT @limit\n"
+        query_parameters.append(bigquery.ScalarQueryParameter("limit", "INT64", limit))
+    job_config = bigquery.QueryJobConfig(query_parameters=query_parameters)
     
     try:
         # Run the query with the specified configuration
@@ -177,29 +351,8 @@ def get_user_workouts(user_id):
         # Wait for the query to complete
         results = query_job.result()
         
-        # Prepare the results as a list of dictionaries
-        workouts = []
-        for row in results:
-            # Handle missing data by setting defaults (e.g., 0 for latitude/longitude or None)
-            start_lat_lng = (
-                row.StartLocationLat if row.StartLocationLat is not None else 0, 
-                row.StartLocationLong if row.StartLocationLong is not None else 0
-            )
-            end_lat_lng = (
-                row.EndLocationLat if row.EndLocationLat is not None else 0,
-                row.EndLocationLong if row.EndLocationLong is not None else 0
-            )
-            
-            workouts.append({
-                'workout_id': row.WorkoutId,
-                'start_timestamp': str(row.StartTimestamp),  # Ensure timestamps are strings
-                'end_timestamp': str(row.EndTimestamp),
-                'start_lat_lng': start_lat_lng,
-                'end_lat_lng': end_lat_lng,
-                'distance': row.TotalDistance,
-                'steps': row.TotalSteps,
-                'calories_burned': row.CaloriesBurned,
-            })
+        # Timestamps are parsed once here; pages read the datetimes from the records
+        workouts = [WorkoutRecord.from_row(row) for row in results]
 
         return workouts
 
@@ -290,8 +443,11 @@ def calculate_streak(workouts):
     if not workouts:
         return 0, 0
 
-    # Convert timestamps to dates
-    workout_dates = sorted(set([datetime.fromisoformat(w['start_timestamp']).date() for w in workouts]))
+    # Collect the distinct workout dates
+    records = [as_workout_record(w) for w in workouts]
+    workout_dates = sorted({r.workout_date for r in records if r.workout_date is not None})
+    if not workout_dates:
+        return 0, 0
 
     current_streak = 1
     longest_streak = 1
@@ -401,18 +557,62 @@ def get_user_posts(user_id):
 
     posts = []
     for row in results:
-        posts.append({
-            'user_id': user_id,
-            'post_id': row.PostId,
-            'timestamp': row.Timestamp.strftime('%Y-%m-%d %H:%M:%S') if row.Timestamp else None,
-            'content': row.Content,
-            'image': row.ImageUrl,
-        })
+        posts.append(Post(
+            user_id=user_id,
+            post_id=row.PostId,
+            timestamp=row.Timestamp.strftime('%Y-%m-%d %H:%M:%S') if row.Timestamp else None,
+            content=row.Content,
+            image=row.ImageUrl,
+        ))
 
     return posts
 
 
 
+# Maximum number of workouts sent to the model when generating advice
+ADVICE_CONTEXT_WORKOUTS = 5
+
+# Number of latest workouts that describe what the user is doing now
+ADVICE_RECENT_WORKOUTS = 3
+
+
+def select_advice_workouts(user_id, recent_workouts, k=ADVICE_CONTEXT_WORKOUTS):
+    """
+    Picks the workouts to describe in an advice prompt.
+
+    The recent workouts are always kept, and their summaries are the query
+    used to find the most similar past workouts in the user's history index.
+    The full history is only read when the index holds no workouts yet.
+
+    Args:
+        user_id (str): The user the workouts belong to
+        recent_workouts (list): The user's latest workouts, newest first, as
+            returned by get_user_workouts(user_id, limit=...)
+        k (int): Maximum number of workouts to pick
+
+    Returns:
+        list: The picked workout IDs, recent workouts first
+    """
+    selected = [workout['workout_id'] for workout in recent_workouts[:k]]
+    if not selected:
+        return []
+
+    index = get_user_index(user_id)
+    if index.count(kind="workout") == 0:
+        index_workouts(index, get_user_workouts(user_id))
+    index_workouts(index, recent_workouts)
+
+    context = " ".join(summarize_workout(workout) for workout in recent_workouts)
+    for doc in index.query(context, k=k + len(selected), kind="workout"):
+        if len(selected) >= k:
+            break
+        workout_id = doc['payload']['workout_id']
+        if workout_id not in selected:
+            selected.append(workout_id)
+
+    return selected
+
+
 def get_genai_advice(user_id):
     """
     AI Prompt:
@@ -425,6 +625,10 @@ def get_genai_advice(user_id):
     
     Returns the most recent advice from the genai model.
 
+    Sensor data is read from the per-workout WorkoutSensorSummary rows
+    rather than the raw readings, and only for the workouts picked by
+    select_advice_workouts().
+
     This function currently returns random data. You will re-write it in Unit 3.
     """
     
@@ -432,6 +636,9 @@ def get_genai_advice(user_id):
     # Initialize Vertex AI
     vertexai.init(project="bamboo-creek-450920-h2", location="us-central1")
     model = GenerativeModel("gemini-1.5-flash-002")
+
+    recent_workouts = get_user_workouts(user_id, limit=ADVICE_RECENT_WORKOUTS)
+    workout_ids = select_advice_workouts(user_id, recent_workouts)
     
     advice_query = f"""
         SELECT
@@ -446,20 +653,30 @@ def get_genai_advice(user_id):
             Workouts.TotalDistance,
             Workouts.TotalSteps,
             Workouts.CaloriesBurned,
-            SensorData.SensorId,
-            SensorData.Timestamp,
-            SensorData.SensorValue,
-            SensorTypes.Name,
-            SensorTypes.Units
+            Summary.sensor_id AS SensorId,
+            Summary.samples AS Samples,
+            Summary.avg_value AS AvgValue,
+            Summary.min_value AS MinValue,
+            Summary.max_value AS MaxValue,
+            Summary.stddev_value AS StddevValue,
+            Summary.first_timestamp AS FirstTimestamp,
+            Summary.last_timestamp AS LastTimestamp
         FROM
             `bamboo-creek-450920-h2`.`ISE`.`Workouts` AS Workouts
-            INNER JOIN `bamboo-creek-450920-h2`.`ISE`.`SensorData` AS SensorData ON Workouts.WorkoutId = SensorData.WorkoutID
-            INNER JOIN `bamboo-creek-450920-h2`.`ISE`.`SensorTypes` AS SensorTypes ON SensorData.SensorId = SensorTypes.SensorId
-        WHERE Workouts.UserId = '{user_id}';
+            LEFT JOIN {SUMMARY_TABLE} AS Summary ON Workouts.WorkoutId = Summary.workout_id
+        WHERE Workouts.UserId = @user_id
+            AND Workouts.WorkoutId IN UNNEST(@workout_ids);
         """
     
-    query_job = client.query(advice_query)
-    results = query_job.result()
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("user_id", "STRING", user_id),
+            bigquery.ArrayQueryParameter("workout_ids", "STRING", workout_ids),
+        ]
+    )
+    # A user without workouts has nothing to look up
+    results = client.query(advice_query, job_config=job_config).result() if workout_ids else []
+    sensor_types = get_sensor_types(client)
     
     # Process and structure the data
     user_data = {
@@ -480,19 +697,33 @@ def get_genai_advice(user_id):
                 "total_distance": row.TotalDistance,
                 "total_steps": row.TotalSteps,
                 "calories_burned": row.CaloriesBurned,
-                "sensor_readings": []
+                "sensor_summary": []
             }
         
-        sensor_reading = {
-            "sensor_id": row.SensorId,
-            "name": row.Name,
-            "timestamp": str(row.Timestamp),
-            "value": row.SensorValue,
-            "units": row.Units
-        }
+        # Workouts without sensor data have no summary rows
+        if row.SensorId is None:
+            continue
         
-        user_data["workouts"][workout_id]["sensor_readings"].append(sensor_reading)
+        sensor = sensor_info(sensor_types, row.SensorId)
+        user_data["workouts"][workout_id]["sensor_summary"].append({
+            "sensor_id": row.SensorId,
+            "name": sensor['name'],
+            "units": sensor['units'],
+            "samples": row.Samples,
+            "average": row.AvgValue,
+            "min": row.MinValue,
+            "max": row.MaxValue,
+            "stddev": row.StddevValue,
+            "first_timestamp": str(row.FirstTimestamp),
+            "last_timestamp": str(row.LastTimestamp),
+        })
 
+    # Keep the picked order: recent workouts first, then the similar ones
+    user_data["workouts"] = {
+        workout_id: user_data["workouts"][workout_id]
+        for workout_id in workout_ids
+        if workout_id in user_data["workouts"]
+    }
 
     # Create prompt for the LLM with clear instructions
     prompt = f"""
@@ -504,7 +735,7 @@ def get_genai_advice(user_id):
 
     INSTRUCTIONS:
     1. Analyze the workout duration, distance, steps, and calories burned
-    2. Look at the heart rate, step count, and temperature sensor readings
+    2. Look at the heart rate, step count, and temperature sensor summaries (average, min, max, spread)
     3. Provide specific advice based on this data
     4. Focus on improving performance, recovery, and overall fitness
     5. The advice should be 2-3 sentences maximum
@@ -520,22 +751,8 @@ def get_genai_advice(user_id):
     response = model.generate_content(prompt)
     advice = response.text.strip()
     
-    image_query = f"""
-        SELECT
-        Images.ImageURL
-        FROM
-        `bamboo-creek-450920-h2`.`ISE`.`Images` AS Images;
-        """
-    
-    query_job = client.query(image_query)
-    results = query_job.result()
-    
-    images = []
-    for row in results:
-        images.append(row.ImageURL)
-    images.append(None)
-    
-    image = random.choice(images)
+    # The image pool is cached per process and the pick is derived from the advice text
+    image = choose_image(get_advice_images(client), advice)
     
     current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
@@ -637,11 +854,11 @@ def get_user_water_intake(user_id, date=None):
         # Prepare the results
         water_records = []
         for row in results:
-            water_records.append({
-                'water_id': row.water_id,
-                'amount_ml': row.amount_ml,
-                'intake_time': row.intake_time.isoformat(),
-            })
+            water_records.append(WaterRecord(
+                water_id=row.water_id,
+                amount_ml=row.amount_ml,
+                intake_time=row.intake_time.isoformat(),
+            ))
         
         return water_records
     
@@ -649,7 +866,7 @@ def get_user_water_intake(user_id, date=None):
         print(f"Error fetching water intake data: {str(e)}")
         return []
 
-def add_water_intake(user_id, amount_ml, intake_time=None):
+def add_water_intake(user_id, amount_ml, intake_time=None, water_id=None):
     """
     AI Prompt:
     Write a Python function add_water_intake(user_id, amount_ml, intake_time=None) that creates a new water intake record in the BigQuery table ISE.WaterIntake for a user with a specified amount in milliliters. The function should generate a unique ID for the record and return a boolean indicating success or failure.
@@ -660,6 +877,8 @@ def add_water_intake(user_id, amount_ml, intake_time=None):
         user_id (str): The user ID to add water intake for
         amount_ml (int): The amount of water in milliliters
         intake_time (datetime, optional): The time of intake. Defaults to now.
+        water_id (str, optional): ID of the record, e.g. one already shown
+            to the user before the write. Generated if not given.
     
     Returns:
         bool: True if successful, False otherwise
@@ -668,10 +887,11 @@ def add_water_intake(user_id, amount_ml, intake_time=None):
         intake_time = datetime.now()
     
     # Generate a unique water_id
-    water_id = f"water_{user_id}_{int(datetime.now().timestamp())}"
+    if water_id is None:
+        water_id = f"water_{user_id}_{int(datetime.now().timestamp())}"
     
-    # Initialize the BigQuery client
-    client = bigquery.Client(project="bamboo-creek-450920-h2")
+    # Use the cached client
+    client = get_bigquery_client()
     
     # Define the SQL query for insertion
     query = """
@@ -694,6 +914,10 @@ def add_water_intake(user_id, amount_ml, intake_time=None):
         # Execute the query
         query_job = client.query(query, job_config=job_config)
         query_job.result()  # Wait for the query to complete
+        
+        # Daily nutrition totals include water
+        publish(user_id, WATER, intake_time)
+        update_rollups(user_id, intake_time)
         return True
     
     except Exception as e:
@@ -779,7 +1003,13 @@ def get_daily_water_summary(user_id, days=7):
         print(f"Error fetching water intake summary: {str(e)}")
         return []
 
-def get_nutrition_data(user_id, days=30):
+def _start_of_day(day):
+    return datetime.combine(as_date(day), datetime.min.time())
+
+def _end_of_day(day):
+    return datetime.combine(as_date(day), datetime.max.time())
+
+def get_nutrition_data(user_id, days=30, start_date=None, end_date=None, raise_errors=False):
     """
     AI Prompt:
     Write a Python function get_nutrition_data(user_id, days=30) that fetches nutrition summary data for a specified time period from the BigQuery table ISE.DailyNutritionSummary. The function should query daily nutrition totals including calories, macronutrients, and water intake for the given user.
@@ -789,13 +1019,18 @@ def get_nutrition_data(user_id, days=30):
     Args:
         user_id (str): The user ID to fetch nutrition data for
         days (int): Number of days to include in the query
+        start_date (date, optional): First day to include; overrides days
+        end_date (date, optional): Last day to include. Defaults to today
+        raise_errors (bool): Raise query errors instead of returning an empty list
     
     Returns:
         List of dictionaries with daily nutrition data
     """
-    # Calculate the start date
-    end_date = datetime.now().date()
-    start_date = end_date - timedelta(days=days)
+    # Calculate the date range
+    if end_date is None:
+        end_date = datetime.now().date()
+    if start_date is None:
+        start_date = end_date - timedelta(days=days)
     
     # Use the cached client
     client = get_bigquery_client()
@@ -844,10 +1079,12 @@ def get_nutrition_data(user_id, days=30):
         return nutrition_data
     
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"Error fetching nutrition data: {str(e)}")
         return []
 
-def get_meal_details(user_id, days=30):
+def get_meal_details(user_id, days=30, start_date=None, end_date=None, raise_errors=False):
     """
     AI Prompt:
     Write a Python function get_meal_details(user_id, days=30) that retrieves detailed meal and food information for a user from BigQuery tables ISE.Meals, ISE.MealFoods, and ISE.FoodItems. The function should join these tables to return comprehensive meal data including nutritional content for each food consumed.
@@ -857,13 +1094,19 @@ def get_meal_details(user_id, days=30):
     Args:
         user_id (str): The user ID to fetch meal data for
         days (int): Number of days to include in the query
+        start_date (date, optional): First day to include; overrides days
+        end_date (date, optional): Last day to include. Defaults to now
+        raise_errors (bool): Raise query errors instead of returning an empty list
     
     Returns:
         List of dictionaries with meal details
     """
-    # Calculate the start date
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=days)
+    # Calculate the time range; explicit dates cover whole days
+    end_date = _end_of_day(end_date) if end_date is not None else datetime.now()
+    if start_date is None:
+        start_date = end_date - timedelta(days=days)
+    else:
+        start_date = _start_of_day(start_date)
     
     # Use the cached client instead of creating a new one
     client = get_bigquery_client()
@@ -907,27 +1150,261 @@ def get_meal_details(user_id, days=30):
         # Prepare the results
         meal_data = []
         for row in results:
-            meal_data.append({
-                'meal_id': row.meal_id,
-                'meal_type': row.meal_type,
-                'meal_name': row.meal_name,
-                'meal_time': row.meal_time.isoformat(),
-                'food_name': row.food_name,
-                'brand_name': row.brand_name,
-                'quantity': row.quantity,
-                'total_calories': row.total_calories,
-                'total_protein_grams': row.total_protein_grams,
-                'total_carbs_grams': row.total_carbs_grams,
-                'total_fat_grams': row.total_fat_grams,
-            })
+            meal_data.append(MealDetail(
+                meal_id=row.meal_id,
+                meal_type=row.meal_type,
+                meal_name=row.meal_name,
+                meal_time=row.meal_time.isoformat(),
+                food_name=row.food_name,
+                brand_name=row.brand_name,
+                quantity=row.quantity,
+                total_calories=row.total_calories,
+                total_protein_grams=row.total_protein_grams,
+                total_carbs_grams=row.total_carbs_grams,
+                total_fat_grams=row.total_fat_grams,
+            ))
         
         return meal_data
     
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"Error fetching meal details: {str(e)}")
         return []
-        
-def get_performance_metrics(user_id, days=30):
+
+# One page of meals, newest first, totals summed per meal in SQL. Pages are
+# keyset paginated on (meal_time, meal_id) so a page costs the same however
+# far back it is.
+MEAL_HISTORY_QUERY = """
+    WITH page AS (
+        SELECT m.meal_id, m.meal_type, m.meal_name, m.meal_time
+        FROM `bamboo-creek-450920-h2.ISE.Meals` m
+        WHERE m.user_id = @user_id
+        AND m.meal_time >= @start_date
+        {cursor_filter}
+        AND EXISTS (
+            SELECT 1 FROM `bamboo-creek-450920-h2.ISE.MealFoods` mf WHERE mf.meal_id = m.meal_id
+        )
+        ORDER BY m.meal_time DESC, m.meal_id DESC
+        LIMIT @limit
+    )
+    SELECT
+        p.meal_id,
+        p.meal_type,
+        p.meal_name,
+        p.meal_time,
+        COUNT(*) AS food_count,
+        SUM(mf.total_calories) AS total_calories,
+        SUM(mf.total_protein_grams) AS total_protein,
+        SUM(mf.total_carbs_grams) AS total_carbs,
+        SUM(mf.total_fat_grams) AS total_fat
+    FROM page p
+    JOIN `bamboo-creek-450920-h2.ISE.MealFoods` mf ON mf.meal_id = p.meal_id
+    GROUP BY p.meal_id, p.meal_type, p.meal_name, p.meal_time
+    ORDER BY p.meal_time DESC, p.meal_id DESC
+"""
+
+MEAL_HISTORY_CURSOR_FILTER = """
+        AND (m.meal_time < @before_time OR (m.meal_time = @before_time AND m.meal_id < @before_id))
+"""
+
+def get_meal_history(user_id, before_cursor=None, limit=5, days=30):
+    """
+    Fetches one page of a user's meals with their nutrition totals, newest
+    first. Food lines are not included (see get_meal_foods).
+
+    Args:
+        user_id (str): The user ID to fetch meals for
+        before_cursor (tuple, optional): The 'next_cursor' of the previous
+            page; None for the first page
+        limit (int): Meals per page
+        days (int): Only meals of the last `days` days
+
+    Returns:
+        dict: 'meals' (list of dictionaries with meal_id, meal_type,
+        meal_name, meal_time, food_count and total_calories/protein/carbs/fat)
+        and 'next_cursor' (None on the last page)
+    """
+    client = get_bigquery_client()
+
+    start_date = datetime.now() - timedelta(days=days)
+    query_parameters = [
+        bigquery.ScalarQueryParameter("user_id", "STRING", user_id),
+        bigquery.ScalarQueryParameter("start_date", "TIMESTAMP", start_date),
+        # One extra row tells whether another page follows
+        bigquery.ScalarQueryParameter("limit", "INT64", limit + 1),
+    ]
+    cursor_filter = ""
+    if before_cursor is not None:
+        before_time, before_id = before_cursor
+        cursor_filter = MEAL_HISTORY_CURSOR_FILTER
+        query_parameters += [
+            bigquery.ScalarQueryParameter("before_time", "TIMESTAMP", datetime.fromisoformat(before_time)),
+            bigquery.ScalarQueryParameter("before_id", "STRING", before_id),
+        ]
+
+    query = MEAL_HISTORY_QUERY.format(cursor_filter=cursor_filter)
+    job_config = bigquery.QueryJobConfig(query_parameters=query_parameters)
+
+    try:
+        results = client.query(query, job_config=job_config).result()
+
+        meals = []
+        for row in results:
+            meals.append(MealTotals(
+                meal_id=row.meal_id,
+                meal_type=row.meal_type,
+                meal_name=row.meal_name,
+                meal_time=row.meal_time.isoformat(),
+                food_count=row.food_count,
+                total_calories=row.total_calories or 0,
+                total_protein=row.total_protein or 0,
+                total_carbs=row.total_carbs or 0,
+                total_fat=row.total_fat or 0,
+            ))
+
+        next_cursor = None
+        if len(meals) > limit:
+            meals = meals[:limit]
+            next_cursor = (meals[-1]['meal_time'], meals[-1]['meal_id'])
+        return {'meals': meals, 'next_cursor': next_cursor}
+
+    except Exception as e:
+        print(f"Error fetching meal history: {str(e)}")
+        return {'meals': [], 'next_cursor': None}
+
+def get_meal_foods(meal_ids):
+    """
+    Fetches the food lines of the given meals.
+
+    Args:
+        meal_ids (list): The meal IDs to fetch foods for
+
+    Returns:
+        dict: meal_id -> list of dictionaries with food_name, brand_name,
+        quantity and total_calories/protein/carbs/fat_grams, in the order
+        they were added
+    """
+    meal_ids = list(meal_ids)
+    if not meal_ids:
+        return {}
+
+    client = get_bigquery_client()
+
+    query = """
+        SELECT
+            mf.meal_id,
+            f.food_name,
+            f.brand_name,
+            mf.quantity,
+            mf.total_calories,
+            mf.total_protein_grams,
+            mf.total_carbs_grams,
+            mf.total_fat_grams
+        FROM `bamboo-creek-450920-h2.ISE.MealFoods` mf
+        JOIN `bamboo-creek-450920-h2.ISE.FoodItems` f ON mf.food_id = f.food_id
+        WHERE mf.meal_id IN UNNEST(@meal_ids)
+        ORDER BY mf.meal_id, mf.added_at
+    """
+
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ArrayQueryParameter("meal_ids", "STRING", meal_ids),
+        ]
+    )
+
+    try:
+        results = client.query(query, job_config=job_config).result()
+
+        foods = {meal_id: [] for meal_id in meal_ids}
+        for row in results:
+            foods.setdefault(row.meal_id, []).append(MealFood(
+                food_name=row.food_name,
+                brand_name=row.brand_name,
+                quantity=row.quantity,
+                total_calories=row.total_calories,
+                total_protein_grams=row.total_protein_grams,
+                total_carbs_grams=row.total_carbs_grams,
+                total_fat_grams=row.total_fat_grams,
+            ))
+        return foods
+
+    except Exception as e:
+        print(f"Error fetching meal foods: {str(e)}")
+        return {}
+
+def get_meal_summary(meal_id):
+    """
+    Fetches one meal with its food lines.
+
+    Args:
+        meal_id (str): The meal ID
+
+    Returns:
+        dict: meal_id, user_id, meal_type, meal_name, meal_time and 'foods'
+        (as in get_meal_foods), or None if the meal does not exist
+    """
+    client = get_bigquery_client()
+
+    query = """
+        SELECT
+            m.meal_id,
+            m.user_id,
+            m.meal_type,
+            m.meal_name,
+            m.meal_time,
+            f.food_name,
+            f.brand_name,
+            mf.quantity,
+            mf.total_calories,
+            mf.total_protein_grams,
+            mf.total_carbs_grams,
+            mf.total_fat_grams
+        FROM `bamboo-creek-450920-h2.ISE.Meals` m
+        LEFT JOIN `bamboo-creek-450920-h2.ISE.MealFoods` mf ON mf.meal_id = m.meal_id
+        LEFT JOIN `bamboo-creek-450920-h2.ISE.FoodItems` f ON mf.food_id = f.food_id
+        WHERE m.meal_id = @meal_id
+        ORDER BY mf.added_at
+    """
+
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("meal_id", "STRING", meal_id),
+        ]
+    )
+
+    try:
+        results = client.query(query, job_config=job_config).result()
+
+        meal = None
+        for row in results:
+            if meal is None:
+                meal = {
+                    'meal_id': row.meal_id,
+                    'user_id': row.user_id,
+                    'meal_type': row.meal_type,
+                    'meal_name': row.meal_name,
+                    'meal_time': row.meal_time.isoformat(),
+                    'foods': [],
+                }
+            # A meal without foods comes back as one row without a food
+            if row.quantity is not None:
+                meal['foods'].append(MealFood(
+                    food_name=row.food_name,
+                    brand_name=row.brand_name,
+                    quantity=row.quantity,
+                    total_calories=row.total_calories,
+                    total_protein_grams=row.total_protein_grams,
+                    total_carbs_grams=row.total_carbs_grams,
+                    total_fat_grams=row.total_fat_grams,
+                ))
+        return meal
+
+    except Exception as e:
+        print(f"Error fetching meal summary: {str(e)}")
+        return None
+
+def get_performance_metrics(user_id, days=30, start_date=None, end_date=None):
     """
     AI Prompt:
     Write a Python function get_performance_metrics(user_id, days=30) that retrieves workout performance data for a user within a specified time period. The function should filter workout data by date range and add a formatted date field to each workout record for easier correlation with other data.
@@ -937,29 +1414,34 @@ def get_performance_metrics(user_id, days=30):
     Args:
         user_id (str): The user ID to fetch performance data for
         days (int): Number of days to include in the query
+        start_date (date, optional): First day to include; overrides days
+        end_date (date, optional): Last day to include. Defaults to now
     
     Returns:
-        List of dictionaries with workout performance metrics
+        List of WorkoutRecord objects with workout performance metrics
     """
-    # Get workouts for the user
-    workouts = get_user_workouts(user_id)
+    # Filter workouts by date; explicit dates cover whole days
+    end_date = _end_of_day(end_date) if end_date is not None else datetime.now()
+    if start_date is None:
+        start_date = end_date - timedelta(days=days)
+    else:
+        start_date = _start_of_day(start_date)
     
-    # Filter workouts by date
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=days)
+    # Get only the user's workouts in the range
+    workouts = get_user_workouts(user_id, start_date, end_date)
     
     filtered_workouts = []
     for workout in workouts:
-        workout_date = datetime.fromisoformat(workout['start_timestamp'])
-        if start_date <= workout_date <= end_date:
-            # Add date for easier correlation
-            workout_date_str = workout_date.date().strftime('%Y-%m-%d')
-            workout['date'] = workout_date_str
-            filtered_workouts.append(workout)
+        # Records carry their parsed start time and date (workout['date'])
+        record = as_workout_record(workout)
+        if record.start_time is None:
+            continue
+        if start_date <= record.start_time.replace(tzinfo=None) <= end_date:
+            filtered_workouts.append(record)
     
     return filtered_workouts
 
-def get_nutrition_performance_correlation(user_id, days=30):
+def get_nutrition_performance_correlation(user_id, days=30, cached=False):
     """
     AI Prompt:
     Write a Python function get_nutrition_performance_correlation(user_id, days=30) that combines nutrition and workout performance data for correlation analysis. The function should create a date-indexed dictionary containing both nutrition and workout data to enable analysis of relationships between diet and exercise performance.
@@ -969,15 +1451,21 @@ def get_nutrition_performance_correlation(user_id, days=30):
     Args:
         user_id (str): The user ID to fetch data for
         days (int): Number of days to include in the analysis
+        cached (bool): Slice the data from the per-user range caches instead
+            of querying BigQuery for exactly this range
     
     Returns:
         Dictionary with nutrition and performance data by date
     """
-    # Get nutrition data
-    nutrition_data = get_nutrition_data(user_id, days)
-    
-    # Get performance data
-    performance_data = get_performance_metrics(user_id, days)
+    if cached:
+        nutrition_data = get_cached_nutrition_data(user_id, days)
+        performance_data = get_cached_performance_metrics(user_id, days)
+    else:
+        # Get nutrition data
+        nutrition_data = get_nutrition_data(user_id, days)
+        
+        # Get performance data
+        performance_data = get_performance_metrics(user_id, days)
     
     # Create a date index for both datasets
     correlated_data = {}
@@ -993,16 +1481,193 @@ def get_nutrition_performance_correlation(user_id, days=30):
     # Match performance data to dates
     for workout in performance_data:
         date = workout['date']
-        if date in correlated_data:
-            correlated_data[date]['performance'] = workout
-        else:
+        if date not in correlated_data:
             correlated_data[date] = {
                 'nutrition': None,
-                'performance': workout
+                'performance': None
+            }
+        current = correlated_data[date]['performance']
+        if current is None:
+            correlated_data[date]['performance'] = workout
+        else:
+            # Several workouts on one day are added up instead of keeping only the last one
+            correlated_data[date]['performance'] = {
+                'date': date,
+                'distance': (current.get('distance') or 0) + (workout.get('distance') or 0),
+                'steps': (current.get('steps') or 0) + (workout.get('steps') or 0),
+                'calories_burned': (current.get('calories_burned') or 0) + (workout.get('calories_burned') or 0),
+                'workout_count': current.get('workout_count', 1) + 1,
             }
     
     return correlated_data
 
+# Per-user range caches: the widest range is fetched once and sliders slice it.
+# The loaders raise on query errors, so a failed fetch is never cached.
+nutrition_ranges = RangeCache(
+    lambda user_id, start, end: get_nutrition_data(user_id, start_date=start, end_date=end, raise_errors=True),
+    day_of=lambda row: as_date(row['date']),
+)
+meal_ranges = RangeCache(
+    lambda user_id, start, end: get_meal_details(user_id, start_date=start, end_date=end, raise_errors=True),
+    day_of=lambda row: as_date(row['meal_time']),
+    sort_key=lambda row: row['meal_time'],
+    newest_first=True,
+)
+performance_ranges = RangeCache(
+    lambda user_id, start, end: get_performance_metrics(user_id, start_date=start, end_date=end),
+    day_of=lambda record: record.workout_date,
+    sort_key=lambda record: record.start_time.replace(tzinfo=None),
+)
+goal_progress_ranges = RangeCache(
+    lambda user_id, start, end: get_goal_progress_range(user_id, start, end),
+    day_of=lambda day: as_date(day['date']),
+    fetch_days=30,
+)
+
+def _invalidate_ranges(*caches):
+    # Cache event handler: the user's ranges are stale from the event's first day
+    def on_event(event):
+        if event.user_id is None:
+            return
+        for cache in caches:
+            cache.invalidate(event.user_id, event.start)
+    return on_event
+
+subscribe(MEALS, _invalidate_ranges(nutrition_ranges, meal_ranges, goal_progress_ranges))
+subscribe(WATER, _invalidate_ranges(nutrition_ranges))
+subscribe(GOALS, _invalidate_ranges(goal_progress_ranges))
+
+def get_cached_nutrition_data(user_id, days=30):
+    """
+    Returns get_nutrition_data(user_id, days) from the per-user range cache.
+
+    Args:
+        user_id (str): The user ID to fetch nutrition data for
+        days (int): Number of days to include
+
+    Returns:
+        List of dictionaries with daily nutrition data
+    """
+    try:
+        return nutrition_ranges.get(user_id, days)
+    except Exception as e:
+        print(f"Error fetching nutrition data: {str(e)}")
+        return []
+
+def get_cached_meal_details(user_id, days=30):
+    """
+    AI Prompt:
+    Write a Python function get_cached_meal_details(user_id, days=30) that implements a cached version of the get_meal_details function. Instead of caching each (user, days) pair for five minutes with Streamlit's cache_data, it should read from a per-user range cache that fetches a wide window of meals once and slices it for any number of days, refetching only the days a write changed. Query errors should be printed and return an empty list without being cached.
+    
+    Returns the meal rows of the last `days` days from the per-user range cache.
+
+    Args:
+        user_id (str): The user ID to fetch meal data for
+        days (int): Number of days to include
+
+    Returns:
+        List of dictionaries with meal details, most recent first
+    """
+    try:
+        return meal_ranges.get(user_id, days)
+    except Exception as e:
+        print(f"Error fetching meal details: {str(e)}")
+        return []
+
+def get_cached_performance_metrics(user_id, days=30):
+    """
+    Returns the workouts of the last `days` days from the per-user range cache.
+
+    Args:
+        user_id (str): The user ID to fetch performance data for
+        days (int): Number of days to include
+
+    Returns:
+        List of WorkoutRecord objects
+    """
+    return performance_ranges.get(user_id, days)
+
+def invalidate_user_ranges(user_id, since=None):
+    """
+    Marks a user's cached ranges as outdated after a write.
+
+    Args:
+        user_id (str): The user whose data changed
+        since (date, optional): First day that changed. Defaults to all days.
+    """
+    for cache in (nutrition_ranges, meal_ranges, performance_ranges, goal_progress_ranges):
+        cache.invalidate(user_id, since)
+
+def get_nutrition_trend(user_id, days=30):
+    """
+    Fetches nutrition and activity trend points from the rollup table, at the
+    coarsest grain (day, week or month) that still gives enough points.
+    
+    Args:
+        user_id (str): The user ID to fetch the trend for
+        days (int): Number of days the trend covers
+    
+    Returns:
+        List of dictionaries with 'date' (start of the bucket), 'grain',
+        per-day nutrition averages and activity totals, oldest first
+        (see rollups.trend_points)
+    """
+    grain = choose_grain(days)
+    end_date = datetime.now().date()
+    start_date = period_start(end_date - timedelta(days=days), grain)
+    
+    client = get_bigquery_client()
+    
+    query = f"""
+        SELECT *
+        FROM {ROLLUP_TABLE}
+        WHERE user_id = @user_id
+        AND grain = @grain
+        AND period_start BETWEEN @start_date AND @end_date
+        ORDER BY period_start ASC
+    """
+    
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("user_id", "STRING", user_id),
+            bigquery.ScalarQueryParameter("grain", "STRING", grain),
+            bigquery.ScalarQueryParameter("start_date", "DATE", start_date),
+            bigquery.ScalarQueryParameter("end_date", "DATE", end_date),
+        ]
+    )
+    
+    try:
+        rows = [dict(row.items()) for row in client.query(query, job_config=job_config).result()]
+    except Exception as e:
+        print(f"Error fetching nutrition rollups: {str(e)}")
+        rows = []
+    
+    if not rows:
+        # No rollups yet for this user: aggregate the daily data locally
+        span = (end_date - start_date).days
+        rows = rollup_from_daily(
+            get_cached_nutrition_data(user_id, span),
+            get_cached_performance_metrics(user_id, span),
+            grain,
+        )
+    
+    return trend_points(rows, grain)
+
+# Rollup refreshes run in the background, so writes do not wait for the MERGE
+rollup_queue = RollupQueue(lambda: get_bigquery_client())
+
+def update_rollups(user_id, day=None):
+    """
+    Queues a refresh of the rollups of the day, ISO week and month containing
+    a day (see rollups.RollupQueue).
+    
+    Args:
+        user_id (str): The user whose data changed
+        day (date, optional): The changed day. Without it all of the user's
+            rollups are rebuilt.
+    """
+    rollup_queue.schedule(user_id, as_date(day) if day is not None else None)
+
 def add_meal(user_id, meal_type, meal_name=None, meal_time=None):
     """
     AI Prompt:
@@ -1050,12 +1715,34 @@ def add_meal(user_id, meal_type, meal_name=None, meal_time=None):
         # Execute the query
         query_job = client.query(query, job_config=job_config)
         query_job.result()  # Wait for the query to complete
+        publish(user_id, MEALS, meal_time)
         return meal_id
     
     except Exception as e:
         print(f"Error adding meal: {str(e)}")
         return None
 
+def scale_nutrients(food_item, quantity):
+    """
+    Scales a food's per-serving nutrients to the servings eaten, the way they
+    are stored in MealFoods.
+
+    Args:
+        food_item (dict): Food with 'calories', 'protein_grams', 'carbs_grams'
+            and 'fat_grams' per serving
+        quantity (float): Number of servings
+
+    Returns:
+        dict: total_calories, total_protein_grams, total_carbs_grams and
+        total_fat_grams
+    """
+    return {
+        'total_calories': food_item['calories'] * quantity,
+        'total_protein_grams': food_item['protein_grams'] * quantity,
+        'total_carbs_grams': food_item['carbs_grams'] * quantity,
+        'total_fat_grams': food_item['fat_grams'] * quantity,
+    }
+
 def add_food_to_meal(meal_id, food_id, quantity):
     """
     AI Prompt:
@@ -1079,10 +1766,11 @@ def add_food_to_meal(meal_id, food_id, quantity):
         return False
     
     # Calculate the total nutrients based on quantity
-    total_calories = food_item['calories'] * quantity
-    total_protein = food_item['protein_grams'] * quantity
-    total_carbs = food_item['carbs_grams'] * quantity
-    total_fat = food_item['fat_grams'] * quantity
+    totals = scale_nutrients(food_item, quantity)
+    total_calories = totals['total_calories']
+    total_protein = totals['total_protein_grams']
+    total_carbs = totals['total_carbs_grams']
+    total_fat = totals['total_fat_grams']
     
     # Generate a unique meal_food_id
     meal_food_id = f"mf_{meal_id}_{food_id}_{int(datetime.now().timestamp())}"
@@ -1348,16 +2036,16 @@ def search_food_items(query=None, limit=50):
         # Prepare the results
         food_items = []
         for row in results:
-            food_items.append({
-                'food_id': row.food_id,
-                'food_name': row.food_name,
-                'brand_name': row.brand_name,
-                'serving_size_grams': row.serving_size_grams,
-                'calories': row.calories,
-                'protein_grams': row.protein_grams,
-                'carbs_grams': row.carbs_grams,
-                'fat_grams': row.fat_grams,
-            })
+            food_items.append(FoodItem(
+                food_id=row.food_id,
+                food_name=row.food_name,
+                brand_name=row.brand_name,
+                serving_size_grams=row.serving_size_grams,
+                calories=row.calories,
+                protein_grams=row.protein_grams,
+                carbs_grams=row.carbs_grams,
+                fat_grams=row.fat_grams,
+            ))
         
         return food_items
     
@@ -1493,6 +2181,7 @@ def add_custom_food_item(food_name, brand_name, serving_size_grams, calories,
         # Execute the query
         query_job = client.query(query, job_config=job_config)
         query_job.result()  # Wait for the query to complete
+        publish(None, FOODS)
         return food_id
     
     except Exception as e:
@@ -1544,6 +2233,10 @@ def update_daily_nutrition_summary(meal_id):
             print("Could not find meal details")
             return False
         
+        # Cached meals, nutrition and progress are stale from this day on
+        publish(user_id, MEALS, meal_date)
+        update_rollups(user_id, meal_date)
+        
         # Use our new update_goal_progress function to update the progress data
         return update_goal_progress(user_id, meal_date)
         
@@ -1599,6 +2292,9 @@ def set_user_nutrition_goals(user_id, calorie_goal, goal_type='daily', start_dat
         query_job = client.query(query, job_config=job_config)
         query_job.result()  # Wait for query to complete
         
+        # An open-ended goal applies to every later day
+        publish(user_id, GOALS, start_date, end_date or date.max)
+        
         return True
         
     except Exception as e:
@@ -1844,21 +2540,32 @@ def get_daily_nutrition_progress(user_id, date=None):
         return None
 
 
-def get_weekly_nutrition_progress(user_id, days=7):
+def _average_progress(daily_progress_list):
+    total_days = len(daily_progress_list)
+    return {
+        "calories": sum(day["consumption"]["calories"] for day in daily_progress_list) / total_days,
+        "calories_remaining": sum(day["remaining"]["calories"] for day in daily_progress_list) / total_days,
+    }
+
+def get_weekly_nutrition_progress(user_id, days=7, start_date=None, end_date=None):
     """
     Get weekly nutrition progress compared to goals
     
     Args:
         user_id (str): User ID
         days (int, optional): Number of days to include. Defaults to 7.
+        start_date (date, optional): First day to include; overrides days
+        end_date (date, optional): Last day to include. Defaults to today
         
     Returns:
         dict: Weekly nutrition progress data
     """
     try:
-        # Calculate start date
-        end_date = datetime.now().date()
-        start_date = end_date - timedelta(days=days-1)
+        # Calculate the date range
+        if end_date is None:
+            end_date = datetime.now().date()
+        if start_date is None:
+            start_date = end_date - timedelta(days=days-1)
         
         # Get progress data directly from GoalProgress table
         client = get_bigquery_client()
@@ -1935,19 +2642,15 @@ def get_weekly_nutrition_progress(user_id, days=7):
             return None
             
         # Calculate averages
-        total_days = len(daily_progress_list)
-        avg_calories = sum(day["consumption"]["calories"] for day in daily_progress_list) / total_days
-        avg_calories_remaining = sum(day["remaining"]["calories"] for day in daily_progress_list) / total_days
+        averages = _average_progress(daily_progress_list)
+        avg_calories = averages["calories"]
         
         # Get current goal
         current_goal = get_user_nutrition_goals(user_id)
         if not current_goal:
             return {
                 "daily_progress": daily_progress_list,
-                "averages": {
-                    "calories": avg_calories,
-                    "calories_remaining": avg_calories_remaining
-                }
+                "averages": averages
             }
         
         # Calculate weekly progress percentage
@@ -1957,10 +2660,7 @@ def get_weekly_nutrition_progress(user_id, days=7):
         
         return {
             "daily_progress": daily_progress_list,
-            "averages": {
-                "calories": avg_calories,
-                "calories_remaining": avg_calories_remaining
-            },
+            "averages": averages,
             "current_goal": current_goal,
             "progress": {
                 "calories_percent": calories_percent
@@ -1971,6 +2671,118 @@ def get_weekly_nutrition_progress(user_id, days=7):
         print(f"Error getting weekly nutrition progress: {e}")
         return None
 
+def get_goal_progress_range(user_id, start_date, end_date):
+    """
+    Reads the daily calorie progress of a range of days with one query,
+    without writing to GoalProgress.
+    
+    Days with a GoalProgress row use its latest values. Other days with an
+    active calorie goal are computed from the meals logged that day, as
+    get_daily_nutrition_progress does; days without either are left out.
+    
+    Args:
+        user_id (str): User ID
+        start_date (date): First day to include
+        end_date (date): Last day to include
+        
+    Returns:
+        list: Daily progress dictionaries (date, goal_id, consumption,
+            remaining, updated_at) as in get_weekly_nutrition_progress,
+            oldest first
+    """
+    client = get_bigquery_client()
+    
+    query = """
+    WITH days AS (
+        SELECT day FROM UNNEST(GENERATE_DATE_ARRAY(@start_date, @end_date)) AS day
+    ),
+    goals AS (
+        SELECT days.day, g.goal_id, g.calorie_target
+        FROM days
+        JOIN `bamboo-creek-450920-h2.ISE.CalorieGoals` g
+            ON g.start_date <= days.day AND (g.end_date IS NULL OR g.end_date >= days.day)
+        WHERE g.user_id = @user_id
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY days.day ORDER BY g.created_at DESC) = 1
+    ),
+    progress AS (
+        SELECT date AS day, goal_id, total_calories_consumed, calories_remaining, updated_at
+        FROM `bamboo-creek-450920-h2.ISE.GoalProgress`
+        WHERE user_id = @user_id AND date BETWEEN @start_date AND @end_date
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY date ORDER BY updated_at DESC) = 1
+    ),
+    consumed AS (
+        SELECT DATE(meals.meal_time) AS day, SUM(total_calories) AS calories
+        FROM `bamboo-creek-450920-h2.ISE.meal_foods`
+        JOIN `bamboo-creek-450920-h2.ISE.meals` ON meal_foods.meal_id = meals.meal_id
+        WHERE meals.user_id = @user_id
+        AND DATE(meals.meal_time) BETWEEN @start_date AND @end_date
+        GROUP BY day
+    )
+    SELECT
+        COALESCE(progress.day, goals.day) AS date,
+        COALESCE(progress.goal_id, goals.goal_id) AS goal_id,
+        COALESCE(progress.total_calories_consumed, consumed.calories, 0) AS calories_consumed,
+        COALESCE(
+            progress.calories_remaining,
+            GREATEST(0, goals.calorie_target - COALESCE(consumed.calories, 0))
+        ) AS calories_remaining,
+        progress.updated_at
+    FROM goals
+    FULL OUTER JOIN progress ON progress.day = goals.day
+    LEFT JOIN consumed ON consumed.day = goals.day
+    ORDER BY date ASC
+    """
+    
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("user_id", "STRING", user_id),
+            bigquery.ScalarQueryParameter("start_date", "DATE", as_date(start_date)),
+            bigquery.ScalarQueryParameter("end_date", "DATE", as_date(end_date)),
+        ]
+    )
+    
+    return [
+        {
+            "date": row.date.strftime('%Y-%m-%d'),
+            "goal_id": row.goal_id,
+            "consumption": {
+                "calories": row.calories_consumed
+            },
+            "remaining": {
+                "calories": row.calories_remaining
+            },
+            "updated_at": row.updated_at
+        }
+        for row in client.query(query, job_config=job_config).result()
+    ]
+
+def get_cached_weekly_nutrition_progress(user_id, days=7):
+    """
+    Get daily progress and averages for the last `days` days, sliced from the
+    per-user range cache instead of querying GoalProgress for every range.
+    
+    Args:
+        user_id (str): User ID
+        days (int, optional): Number of days to include. Defaults to 7.
+        
+    Returns:
+        dict: 'daily_progress' and 'averages' as in get_weekly_nutrition_progress,
+            or None if there is no progress data
+    """
+    # get_weekly_nutrition_progress counts today as one of the days
+    try:
+        daily_progress_list = goal_progress_ranges.get(user_id, days - 1)
+    except Exception as e:
+        print(f"Error getting weekly nutrition progress: {e}")
+        return None
+    if not daily_progress_list:
+        return None
+    return {
+        "daily_progress": daily_progress_list,
+        "averages": _average_progress(daily_progress_list)
+    }
+
+
 def update_goal_progress(user_id, date=None, calories_consumed=None):
     """
     AI Prompt:
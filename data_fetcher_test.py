@@ -10,6 +10,8 @@ from unittest.mock import patch, MagicMock , ANY
 from datetime import datetime
 from google.cloud import bigquery
 import data_fetcher
+import reference_data
+from history_index import HistoryIndex
 from data_fetcher import get_user_workouts, get_user_profile, get_genai_advice, get_user_sensor_data, get_user_posts, calculate_streak, get_badges
 from datetime import datetime, timedelta
 
@@ -33,6 +35,13 @@ class TestGetUserSensorData(unittest.TestCase):
     Include a DummyRow helper class to simulate BigQuery results
     Mock all external dependencies using unittest.mock.patch
     '''
+    def setUp(self):
+        # Sensor units come from the cached SensorTypes table
+        reference_data.sensor_types.prime(dict(reference_data.DEFAULT_SENSOR_TYPES))
+
+    def tearDown(self):
+        reference_data.refresh_reference_data()
+
     @patch("data_fetcher.bigquery.Client")
     def test_successful_fetch(self, mock_client_class):
         """Test that a valid query returns the expected sensor data list."""
@@ -89,7 +98,7 @@ class TestGetUserSensorData(unittest.TestCase):
 
     @patch("data_fetcher.bigquery.Client")
     def test_unknown_sensor_type(self, mock_client_class):
-        """Test that a sensor type not covered by the CASE statement returns 'unknown'."""
+        """Test that a sensor type missing from SensorTypes returns 'unknown'."""
         dummy_timestamp = datetime(2024, 7, 29, 8, 0, 0)
         dummy_rows = [
             DummyRow("sensorX", dummy_timestamp, 50.0, "unknown"),
@@ -296,6 +305,21 @@ class TestGetUserWorkouts(unittest.TestCase):
         param_names = [param.name for param in job_config.query_parameters]
         self.assertIn("user_id", param_names)
 
+
+    @patch('google.cloud.bigquery.Client')
+    def test_date_bounds_are_applied_in_sql(self, mock_client_class):
+        mock_client_instance = MagicMock()
+        mock_client_class.return_value = mock_client_instance
+        mock_client_instance.query.return_value.result.return_value = []
+
+        get_user_workouts("user1", datetime(2025, 4, 1), datetime(2025, 4, 5, 23, 59))
+
+        query, kwargs = mock_client_instance.query.call_args
+        params = {param.name: param.value for param in kwargs["job_config"].query_parameters}
+        self.assertIn("StartTimestamp >= @start_time", query[0])
+        self.assertIn("StartTimestamp <= @end_time", query[0])
+        self.assertEqual(params["start_time"].replace(tzinfo=None), datetime(2025, 4, 1))
+        self.assertEqual(params["end_time"].replace(tzinfo=None), datetime(2025, 4, 5, 23, 59))
         
     @patch('google.cloud.bigquery.Client')
     def test_query_exception(self, MockBigQueryClient):
@@ -354,23 +378,29 @@ class TestGetGenAIAdvice(unittest.TestCase):
     Vertex AI initialization
     GenerativeModel
     datetime
-    random.choice
     '''
+
+    def setUp(self):
+        # Start every test with empty Images/SensorTypes caches
+        reference_data.refresh_reference_data()
+        # ...and an empty history index, so the first call fills it
+        index_patcher = patch('data_fetcher.get_user_index', return_value=HistoryIndex())
+        index_patcher.start()
+        self.addCleanup(index_patcher.stop)
+
+    def tearDown(self):
+        reference_data.refresh_reference_data()
     
     @patch('google.cloud.bigquery.Client')
     @patch('data_fetcher.vertexai')
     @patch('data_fetcher.GenerativeModel')
     @patch('data_fetcher.datetime')
-    @patch('data_fetcher.random.choice')
-    def test_successful_advice_generation(self, mock_random_choice, mock_datetime, 
+    def test_successful_advice_generation(self, mock_datetime, 
                                         mock_generative_model, mock_vertexai, mock_client):
         """Test that advice is generated successfully with valid data."""
         # Set up mock for datetime
         mock_datetime.now.return_value.strftime.return_value = '2025-04-06 10:00:00'
         
-        # Set up mock for random.choice
-        mock_random_choice.return_value = "http://example.com/test_image.jpg"
-        
         # Set up mock for BigQuery client
         mock_client_instance = MagicMock()
         mock_client.return_value = mock_client_instance
@@ -392,10 +422,17 @@ class TestGetGenAIAdvice(unittest.TestCase):
         ]
         mock_image_result.result.return_value = mock_image_rows
         
+        mock_sensor_types_result = MagicMock()
+        mock_sensor_types_result.result.return_value = [
+            MagicMock(SensorId="sensor1", Name="Heart Rate", Units="bpm")
+        ]
+        
         # Configure query method to return different results based on query content
         def side_effect_query(query, job_config=None):
             if "Images.ImageURL" in query:
                 return mock_image_result
+            elif "SensorTypes" in query:
+                return mock_sensor_types_result
             else:
                 return mock_workout_result
                 
@@ -420,12 +457,26 @@ class TestGetGenAIAdvice(unittest.TestCase):
         # Verify GenerativeModel was called with the correct model name
         mock_generative_model.assert_called_once_with("gemini-1.5-flash-002")
         
-        # Verify BigQuery queries were executed
-        self.assertEqual(mock_client_instance.query.call_count, 2)
+        # Verify BigQuery queries were executed (recent workouts, full history
+        # for the empty index, picked workouts, sensor types, images)
+        self.assertEqual(mock_client_instance.query.call_count, 5)
         
         # Check that the generate_content method was called
         mock_model.generate_content.assert_called_once()
         
+        # Sensor data comes from the summary table, not the raw readings
+        recent_query = mock_client_instance.query.call_args_list[0][0][0]
+        self.assertIn("LIMIT @limit", recent_query)
+        advice_query = mock_client_instance.query.call_args_list[2][0][0]
+        self.assertIn("WorkoutSensorSummary", advice_query)
+        self.assertNotIn("SensorData", advice_query)
+        # Only the picked workouts are read
+        self.assertIn("UNNEST(@workout_ids)", advice_query)
+        advice_params = mock_client_instance.query.call_args_list[2][1]['job_config'].query_parameters
+        self.assertEqual(advice_params[1].values, ["workout1"])
+        prompt = mock_model.generate_content.call_args[0][0]
+        self.assertIn('"average": 120.0', prompt)
+        
         # Check result structure
         self.assertIsInstance(result, dict)
         self.assertIn("advice_id", result)
@@ -436,7 +487,13 @@ class TestGetGenAIAdvice(unittest.TestCase):
         # Check result values
         self.assertEqual(result["timestamp"], '2025-04-06 10:00:00')
         self.assertEqual(result["content"], "Increase your running pace by 10% to improve cardiovascular efficiency.")
-        self.assertEqual(result["image"], "http://example.com/test_image.jpg")
+        self.assertIn(result["image"], ["http://example.com/image1.jpg", "http://example.com/image2.jpg", None])
+        
+        # A second call reuses the cached reference tables and the filled
+        # index, and picks the same image
+        second = get_genai_advice("user1")
+        self.assertEqual(mock_client_instance.query.call_count, 7)
+        self.assertEqual(second["image"], result["image"])
     
     @patch('google.cloud.bigquery.Client')
     @patch('data_fetcher.vertexai')
@@ -457,10 +514,17 @@ class TestGetGenAIAdvice(unittest.TestCase):
             MagicMock(ImageURL="http://example.com/image1.jpg")
         ]
         
+        mock_sensor_types_result = MagicMock()
+        mock_sensor_types_result.result.return_value = [
+            MagicMock(SensorId="sensor1", Name="Heart Rate", Units="bpm")
+        ]
+        
         # Configure query method to return different results based on query content
         def side_effect_query(query, job_config=None):
             if "Images.ImageURL" in query:
                 return mock_image_result
+            elif "SensorTypes" in query:
+                return mock_sensor_types_result
             else:
                 return mock_workout_result
                 
@@ -504,10 +568,17 @@ class TestGetGenAIAdvice(unittest.TestCase):
         mock_image_result = MagicMock()
         mock_image_result.result.return_value = []  # Empty image results
         
+        mock_sensor_types_result = MagicMock()
+        mock_sensor_types_result.result.return_value = [
+            MagicMock(SensorId="sensor1", Name="Heart Rate", Units="bpm")
+        ]
+        
         # Configure query method to return different results based on query content
         def side_effect_query(query, job_config=None):
             if "Images.ImageURL" in query:
                 return mock_image_result
+            elif "SensorTypes" in query:
+                return mock_sensor_types_result
             else:
                 return mock_workout_result
                     
@@ -550,10 +621,17 @@ class TestGetGenAIAdvice(unittest.TestCase):
             MagicMock(ImageURL="http://example.com/image1.jpg")
         ]
         
+        mock_sensor_types_result = MagicMock()
+        mock_sensor_types_result.result.return_value = [
+            MagicMock(SensorId="sensor1", Name="Heart Rate", Units="bpm")
+        ]
+        
         # Configure query method to return different results based on query content
         def side_effect_query(query, job_config=None):
             if "Images.ImageURL" in query:
                 return mock_image_result
+            elif "SensorTypes" in query:
+                return mock_sensor_types_result
             else:
                 return mock_workout_result
                     
@@ -586,8 +664,11 @@ class TestGetGenAIAdvice(unittest.TestCase):
         mock_row.TotalSteps = steps
         mock_row.CaloriesBurned = calories
         mock_row.SensorId = sensor_id
-        mock_row.Timestamp = sensor_time
-        mock_row.SensorValue = sensor_value
+        # A single reading summarized by the WorkoutSensorSummary table
+        mock_row.Samples = 1
+        mock_row.AvgValue = mock_row.MinValue = mock_row.MaxValue = sensor_value
+        mock_row.StddevValue = 0.0
+        mock_row.FirstTimestamp = mock_row.LastTimestamp = sensor_time
         mock_row.Name = sensor_name
         mock_row.Units = units
         return mock_row
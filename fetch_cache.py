@@ -0,0 +1,622 @@
+"""
+fetch_cache.py
+
+This module caches the results of BigQuery fetchers and drops them when a
+write changes the data they were built from. It replaces st.cache_data for
+page-level reads:
+  - FetchCache: a per-argument cache around one fetcher. It subscribes to
+    the entities the fetcher reads on the cache event bus (cache_events.py)
+    and evicts only the entries of the user, and the days, an event names.
+  - cached_fetch(): the decorator form, e.g.
+
+        @cached_fetch(MEALS, WATER, span=last_days('days'))
+        def cached_get_nutrition_data(user_id, days=1):
+            return get_nutrition_data(user_id, days)
+
+Because writes publish their events before returning, the next read after a
+write fetches fresh data (read-your-writes), and a load that was already
+running when the event arrived is returned but not stored. That is what
+allows TTLs far longer than the five minutes st.cache_data used.
+
+Concurrent misses for the same arguments are coalesced (single flight): the
+first caller loads, and callers arriving while it runs wait for its result,
+or its exception, instead of sending the same BigQuery job again. This keeps
+the sessions that rerun together when a popular entry (the user list in the
+sidebar, the food catalog) expires or is evicted from sending one query each.
+
+Fetchers given a refresh_after shorter than their TTL are served stale while
+revalidated: once an entry is older than refresh_after, callers still get it
+immediately, and a small background pool (RefreshPool) reloads it. Only
+callers after the TTL (the hard expiry) wait for BigQuery. Events still evict
+entries right away, so this never serves data older than a write.
+
+Each cache is bounded by a number of entries and an estimate of the bytes
+they hold (estimate_size()); past either, the least recently used entries
+are evicted. cache_diagnostics() reports every cache's entries, bytes and
+eviction counts; diagnostics_enabled() tells pages whether to show them
+(SHOW_CACHE_DIAGNOSTICS is set), as they are meant for operators only.
+
+When a shared cache is configured (shared_cache.py), local misses are looked
+up there before calling the fetcher, so instances and cold starts reuse each
+other's results. Local copies are then rechecked against the shared tier
+every SHARED_LOCAL_TTL_SECONDS: by a background refresh for fetchers with a
+refresh_after, and by expiring otherwise.
+"""
+
+import functools
+import inspect
+import os
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from cache_events import bus as default_bus
+from compact_records import CompactRecord
+from range_cache import as_date
+from shared_cache import get_shared_cache
+
+# How long an entry is kept when no write touches it
+DEFAULT_TTL_SECONDS = 60 * 60
+
+# Local TTL when a shared tier is configured: events of other instances only
+# reach the shared tier, so local copies are rechecked against it this often
+SHARED_LOCAL_TTL_SECONDS = 60
+
+# How long a caller waits for an identical load already in flight
+DEFAULT_WAIT_SECONDS = 60
+
+# Bounds of each cache. Together the ten caches in app.py, meal_logger and
+# water_ledger (workouts raised to 32 MB) hold at most about 104 MB. This does
+# not cover the other in-process stores (range caches, history indexes), which
+# are bounded by a number of users (MAX_CACHED_USERS) rather than by bytes.
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_BYTES = 8 * 1024 * 1024
+
+# Every FetchCache, for cache_diagnostics()
+_caches = weakref.WeakSet()
+
+# Background refreshes of stale entries: worker threads, and refreshes that
+# may be queued or running before further stale entries are served without one
+REFRESH_WORKERS = 4
+MAX_PENDING_REFRESHES = 32
+
+
+def last_days(param='days', default=None):
+    """
+    Returns a span function for fetchers that cover the last N days.
+
+    Args:
+        param (str): Name of the fetcher argument holding N
+        default (int, optional): N when the argument is None
+
+    Returns:
+        callable: arguments -> (start, end)
+    """
+    def span(arguments):
+        days = arguments.get(param)
+        if days is None:
+            days = default
+        if days is None:
+            return None, None
+        today = date.today()
+        return today - timedelta(days=days), today
+    return span
+
+
+def on_day(param):
+    """
+    Returns a span function for fetchers that cover one day.
+
+    Args:
+        param (str): Name of the fetcher argument holding the day
+
+    Returns:
+        callable: arguments -> (day, day)
+    """
+    def span(arguments):
+        day = arguments.get(param)
+        if day is None:
+            return None, None
+        day = as_date(day)
+        return day, day
+    return span
+
+
+def estimate_size(value):
+    """
+    Estimates the memory held by a cached value.
+
+    Containers, compact records, dataclasses and objects with __slots__ are
+    walked; DataFrames and arrays report their own usage. Objects reachable
+    more than once (interned strings, shared rows) are counted once.
+
+    Args:
+        value: The value
+
+    Returns:
+        int: Approximate size in bytes
+    """
+    seen = set()
+    total = 0
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        if isinstance(item, (pd.DataFrame, pd.Series, pd.Index)):
+            usage = item.memory_usage(deep=True)
+            total += int(usage.sum()) if hasattr(usage, 'sum') else int(usage)
+            continue
+        if isinstance(item, np.ndarray):
+            total += sys.getsizeof(item) + (0 if item.base is None else item.nbytes)
+            continue
+        total += sys.getsizeof(item)
+        if isinstance(item, (str, bytes, int, float, bool, type(None))):
+            continue
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif isinstance(item, CompactRecord):
+            stack.extend(item.values())
+        elif hasattr(item, '__dict__'):
+            stack.append(item.__dict__)
+        elif hasattr(item, '__slots__'):
+            stack.extend(getattr(item, slot) for slot in item.__slots__ if hasattr(item, slot))
+    return total
+
+
+class RefreshPool:
+    """
+    A bounded pool of background threads refreshing stale entries (and
+    warming caches, see prefetch.py).
+
+    Args:
+        workers (int): Worker threads
+        max_pending (int): Jobs queued or running before submit() declines
+            new ones
+        name (str): Prefix of the worker thread names
+    """
+
+    def __init__(self, workers=REFRESH_WORKERS, max_pending=MAX_PENDING_REFRESHES, name='cache-refresh'):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.name = name
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, function):
+        """
+        Runs function() in the background unless the pool is full.
+
+        Args:
+            function (callable): The refresh
+
+        Returns:
+            bool: Whether the refresh was accepted
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                return False
+            self._pending += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name)
+        try:
+            self._executor.submit(self._run, function)
+        except RuntimeError:
+            # Interpreter shutdown
+            self._done()
+            return False
+        return True
+
+    def _run(self, function):
+        try:
+            function()
+        finally:
+            self._done()
+
+    def _done(self):
+        with self._lock:
+            self._pending -= 1
+
+
+# Refreshes of every FetchCache
+default_refresh_pool = RefreshPool()
+
+
+class _Entry:
+    __slots__ = ('value', 'size', 'user_id', 'start', 'end', 'refresh_at', 'expires_at')
+
+    def __init__(self, value, size, user_id, start, end, refresh_at, expires_at):
+        self.value = value
+        self.size = size
+        self.user_id = user_id
+        self.start = start
+        self.end = end
+        self.refresh_at = refresh_at
+        self.expires_at = expires_at
+
+
+# Leader of flights run by the refresh pool
+_REFRESH = 'refresh'
+
+
+class _RefreshDeclined(Exception):
+    # Error of a refresh flight the pool declined: nobody loaded the value,
+    # so callers that joined the flight load it themselves
+    pass
+
+
+class _Flight:
+    # A load in progress, shared by the callers that missed while it ran
+    __slots__ = ('generation', 'leader', 'done', 'value', 'error')
+
+    def __init__(self, generation, leader):
+        self.generation = generation
+        # Thread ident of the caller loading it, or _REFRESH
+        self.leader = leader
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class FetchCache:
+    """
+    Caches a fetcher's results per argument and evicts them on cache events.
+
+    Results are shared, not copied: callers must not modify them.
+
+    Args:
+        loader (callable): The fetcher
+        entities (tuple): Entity patterns the fetcher reads (cache_events)
+        ttl (float): Seconds an entry is kept without a matching event
+        user_param (str, optional): Argument holding the user ID; defaults to
+            the fetcher's first parameter. None caches shared data that any
+            user's event evicts.
+        span (callable, optional): arguments -> (start, end), the days an
+            entry covers. Entries without a span are evicted by every event
+            for their user.
+        bus (EventBus): Bus to subscribe to
+        clock (callable): Monotonic time in seconds (injectable for tests)
+        shared (SharedCache, optional): Cross-instance tier; defaults to
+            get_shared_cache(). False disables it.
+        wait_timeout (float): Seconds a caller waits for an identical load
+            already in flight before raising TimeoutError
+        refresh_after (float, optional): Seconds after which an entry is
+            served stale and refreshed in the background, until ttl. None
+            (or a value not below ttl) disables background refreshes. With
+            a shared tier, entries are refreshed at least every
+            SHARED_LOCAL_TTL_SECONDS.
+        refresh_pool (RefreshPool): Pool running the refreshes
+        max_entries (int): Entries kept before the least recently used is
+            evicted
+        max_bytes (int): Estimated bytes kept before the least recently used
+            entries are evicted; larger values are returned but not kept
+    """
+
+    def __init__(self, loader, entities=(), ttl=DEFAULT_TTL_SECONDS, user_param=inspect.Parameter.empty,
+                 span=None, bus=default_bus, clock=time.monotonic, shared=None, wait_timeout=DEFAULT_WAIT_SECONDS,
+                 refresh_after=None, refresh_pool=default_refresh_pool, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_bytes=DEFAULT_MAX_BYTES):
+        self.loader = loader
+        self.name = f"{loader.__module__}.{loader.__qualname__}"
+        self.shared = get_shared_cache() if shared is None else (shared or None)
+        self.entities = tuple(entities)
+        self.ttl = ttl
+        # Only the local copy's lifetime is capped; refresh_after stays relative to ttl
+        self.local_ttl = ttl if self.shared is None else min(ttl, SHARED_LOCAL_TTL_SECONDS)
+        if refresh_after is not None and refresh_after >= ttl:
+            refresh_after = None
+        self.refresh_after = refresh_after
+        # With refreshes on, a local copy past local_ttl is rechecked in the background
+        self._refresh_interval = None if refresh_after is None else min(refresh_after, self.local_ttl)
+        self.refresh_pool = refresh_pool
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.span = span
+        self.clock = clock
+        self.wait_timeout = wait_timeout
+        self._signature = inspect.signature(loader)
+        if user_param is inspect.Parameter.empty:
+            user_param = next(iter(self._signature.parameters), None)
+        self.user_param = user_param
+        # Least recently used first
+        self._entries = OrderedDict()
+        self._bytes = 0
+        # Bumped for a user (None: everyone) whenever an event evicts, so a
+        # load that started before the event does not store its result
+        self._generations = {}
+        # Loads in progress, by key
+        self._flights = {}
+        self._counts = {
+            'hits': 0, 'loads': 0, 'coalesced': 0, 'wait_timeouts': 0,
+            'stale_serves': 0, 'refreshes': 0, 'refresh_failures': 0, 'refreshes_declined': 0,
+            'stores': 0, 'evictions': 0, 'invalidations': 0, 'oversized': 0,
+        }
+        self._refresh_seconds = []
+        self._lock = threading.Lock()
+        self._unsubscribe = [bus.subscribe(entity, self._on_event) for entity in self.entities]
+        functools.update_wrapper(self, loader)
+        _caches.add(self)
+
+    def _bind(self, args, kwargs):
+        bound = self._signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = dict(bound.arguments)
+        return tuple(arguments.items()), arguments
+
+    def _generation(self, user_id):
+        return self._generations.get(None, 0), self._generations.get(user_id, 0)
+
+    def __call__(self, *args, **kwargs):
+        key, arguments = self._bind(args, kwargs)
+        user_id = arguments.get(self.user_param) if self.user_param else None
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > now:
+                self._entries.move_to_end(key)
+                if entry.refresh_at is None or entry.refresh_at > now:
+                    self._counts['hits'] += 1
+                    return entry.value
+                # Stale: served as is, and refreshed unless that already runs
+                self._counts['stale_serves'] += 1
+                flight = self._start_flight(key, user_id, leader=_REFRESH)
+                if flight is None:
+                    return entry.value
+                refresh = True
+            else:
+                refresh = False
+                flight = self._start_flight(key, user_id, leader=threading.get_ident())
+                if flight is None:
+                    flight = self._flights[key]
+                    self._counts['coalesced'] += 1
+                else:
+                    self._counts['loads'] += 1
+
+        if refresh:
+            self._submit_refresh(flight, key, arguments, user_id, args, kwargs)
+            return entry.value
+        if flight.leader != threading.get_ident():
+            # Another caller's load, or a background refresh
+            try:
+                return self._wait(flight)
+            except _RefreshDeclined:
+                # The declined flight is gone, so this starts (or joins) a new one
+                return self(*args, **kwargs)
+        return self._run(flight, key, arguments, user_id, args, kwargs)
+
+    def _start_flight(self, key, user_id, leader):
+        # Registers a new load of key, or returns None when one started since
+        # the last event is already running. Called with the lock held.
+        generation = self._generation(user_id)
+        flight = self._flights.get(key)
+        # A load started before the last event may return stale data
+        if flight is not None and flight.generation == generation:
+            return None
+        flight = self._flights[key] = _Flight(generation, leader)
+        return flight
+
+    def _submit_refresh(self, flight, key, arguments, user_id, args, kwargs):
+        refresh = functools.partial(self._refresh, flight, key, arguments, user_id, args, kwargs)
+        if not self.refresh_pool.submit(refresh):
+            with self._lock:
+                self._counts['refreshes_declined'] += 1
+            flight.error = _RefreshDeclined()
+            self._finish(key, flight)
+
+    def _run(self, flight, key, arguments, user_id, args, kwargs):
+        try:
+            flight.value = self._load(key, arguments, user_id, flight.generation, args, kwargs)
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            self._finish(key, flight)
+
+    def _finish(self, key, flight):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.done.set()
+
+    def _refresh(self, flight, key, arguments, user_id, args, kwargs):
+        started = time.perf_counter()
+        try:
+            self._run(flight, key, arguments, user_id, args, kwargs)
+        except Exception as e:
+            print(f"Error refreshing {self.name}: {str(e)}")
+            with self._lock:
+                self._counts['refresh_failures'] += 1
+                # Keep serving the stale entry; retry after another interval
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.refresh_at = self.clock() + self._refresh_interval
+            return
+        with self._lock:
+            self._counts['refreshes'] += 1
+            self._refresh_seconds.append(time.perf_counter() - started)
+            del self._refresh_seconds[:-100]
+
+    def _wait(self, flight):
+        if not flight.done.wait(self.wait_timeout):
+            with self._lock:
+                self._counts['wait_timeouts'] += 1
+            raise TimeoutError(f"{self.name}: identical load still running after {self.wait_timeout}s")
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def _load(self, key, arguments, user_id, generation, args, kwargs):
+        data_key = None
+        if self.shared is not None:
+            hit, value, data_key = self.shared.lookup(
+                self.name, key, self.entities, user_id, per_user=self.user_param is not None
+            )
+            if hit:
+                self._store(key, arguments, user_id, value, generation)
+                return value
+
+        value = self.loader(*args, **kwargs)
+
+        if self._store(key, arguments, user_id, value, generation) and data_key is not None:
+            self.shared.store(data_key, value, self.entities)
+        return value
+
+    def _store(self, key, arguments, user_id, value, generation):
+        # Keeps a loaded value unless an event arrived while it was loading
+        start, end = self.span(arguments) if self.span else (None, None)
+        size = estimate_size(value)
+        with self._lock:
+            if self._generation(user_id) != generation:
+                return False
+            self._drop(key)
+            if size > self.max_bytes:
+                self._counts['oversized'] += 1
+                return True
+            now = self.clock()
+            if self._refresh_interval is not None:
+                refresh_at, expires_at = now + self._refresh_interval, now + self.ttl
+            else:
+                refresh_at, expires_at = None, now + self.local_ttl
+            self._entries[key] = _Entry(value, size, user_id, start, end, refresh_at, expires_at)
+            self._bytes += size
+            self._counts['stores'] += 1
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self._counts['evictions'] += 1
+            return True
+
+    def _drop(self, key):
+        # Removes an entry. Called with the lock held.
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+        return entry
+
+    def _on_event(self, event):
+        with self._lock:
+            stale = [
+                key for key, entry in self._entries.items()
+                if (event.user_id is None or entry.user_id is None or entry.user_id == event.user_id)
+                and event.overlaps(entry.start, entry.end)
+            ]
+            for key in stale:
+                self._drop(key)
+            self._counts['invalidations'] += len(stale)
+            scope = event.user_id if self.user_param else None
+            self._generations[scope] = self._generations.get(scope, 0) + 1
+
+    def clear(self, *args, **kwargs):
+        """
+        Drops the entry for the given arguments, or every entry when called
+        without arguments.
+        """
+        with self._lock:
+            if not args and not kwargs:
+                self._entries.clear()
+                self._bytes = 0
+                self._generations[None] = self._generations.get(None, 0) + 1
+                return
+            key, arguments = self._bind(args, kwargs)
+            self._drop(key)
+            user_id = arguments.get(self.user_param) if self.user_param else None
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+    def stats(self):
+        """
+        Returns the cache's counters.
+
+        Returns:
+            dict: entries, bytes (estimated), max_entries, max_bytes, hits,
+            loads (calls that ran the fetcher or the shared lookup),
+            coalesced (calls that waited for an identical load instead),
+            wait_timeouts, stale_serves, refreshes, refresh_failures,
+            refreshes_declined (pool full), stores, evictions (to stay
+            within the bounds), eviction_rate (evictions per store),
+            invalidations (by events), oversized (values above max_bytes,
+            not kept), and the average and maximum refresh time in
+            milliseconds over the last 100 refreshes
+        """
+        with self._lock:
+            seconds = self._refresh_seconds
+            stores = self._counts['stores']
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                **self._counts,
+                'eviction_rate': self._counts['evictions'] / stores if stores else 0.0,
+                'refresh_avg_ms': sum(seconds) / len(seconds) * 1000 if seconds else 0.0,
+                'refresh_max_ms': max(seconds) * 1000 if seconds else 0.0,
+            }
+
+    def close(self):
+        """Unsubscribes from the bus."""
+        for unsubscribe in self._unsubscribe:
+            unsubscribe()
+        self._unsubscribe = []
+
+
+def cached_fetch(*entities, ttl=DEFAULT_TTL_SECONDS, span=None, user_param=inspect.Parameter.empty, shared=None,
+                 wait_timeout=DEFAULT_WAIT_SECONDS, refresh_after=None, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Decorator wrapping a fetcher in a FetchCache.
+
+    Args:
+        *entities (str): Entity patterns the fetcher reads
+        ttl (float): Seconds an entry is kept without a matching event
+        span (callable, optional): arguments -> (start, end), see last_days()
+            and on_day()
+        user_param (str, optional): Argument holding the user ID, see FetchCache
+        shared (SharedCache, optional): Cross-instance tier, see FetchCache
+        wait_timeout (float): Seconds to wait for an identical load in flight
+        refresh_after (float, optional): Seconds after which entries are
+            served stale and refreshed in the background, see FetchCache
+        max_entries (int): Entries kept, least recently used evicted first
+        max_bytes (int): Estimated bytes kept, see FetchCache
+
+    Returns:
+        callable: Decorator returning the FetchCache
+    """
+    def decorator(loader):
+        return FetchCache(loader, entities, ttl=ttl, user_param=user_param, span=span, shared=shared,
+                          wait_timeout=wait_timeout, refresh_after=refresh_after, max_entries=max_entries,
+                          max_bytes=max_bytes)
+    return decorator
+
+
+def cache_diagnostics():
+    """
+    Returns the statistics of every FetchCache, largest first.
+
+    Returns:
+        list: One stats() dictionary per cache, with its 'name'
+    """
+    rows = [{'name': cache.name, **cache.stats()} for cache in list(_caches)]
+    return sorted(rows, key=lambda row: row['bytes'], reverse=True)
+
+
+def diagnostics_enabled():
+    """
+    Returns whether pages show cache diagnostics, which are for operators
+    only: set SHOW_CACHE_DIAGNOSTICS=1 in the environment to enable them.
+
+    Returns:
+        bool
+    """
+    return os.environ.get('SHOW_CACHE_DIAGNOSTICS', '').lower() in ('1', 'true', 'yes')
@@ -0,0 +1,548 @@
+import sys
+import threading
+import time
+import unittest
+from datetime import date, datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pandas as pd
+
+import data_fetcher
+from cache_events import MEALS, WATER, CacheEvent, EventBus, publish
+from compact_records import MealTotals
+from fetch_cache import (
+    SHARED_LOCAL_TTL_SECONDS, FetchCache, RefreshPool, cache_diagnostics, diagnostics_enabled, estimate_size,
+    last_days, on_day,
+)
+from shared_cache import SharedCache, SQLiteBackend
+from workout_records import WorkoutRecord
+
+# python3 -m unittest fetch_cache_test.py
+
+
+TODAY = date.today()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestEventBus(unittest.TestCase):
+
+    def test_patterns_and_unsubscribe(self):
+        bus = EventBus()
+        meals, everything = [], []
+        unsubscribe = bus.subscribe(MEALS, meals.append)
+        bus.subscribe('*', everything.append)
+
+        bus.publish(CacheEvent('user1', MEALS))
+        bus.publish(CacheEvent('user1', WATER))
+        unsubscribe()
+        bus.publish(CacheEvent('user1', MEALS))
+
+        self.assertEqual(len(meals), 1)
+        self.assertEqual(len(everything), 3)
+
+    def test_failing_subscriber_does_not_stop_others(self):
+        bus = EventBus()
+        received = []
+        bus.subscribe(MEALS, MagicMock(side_effect=Exception("boom")))
+        bus.subscribe(MEALS, received.append)
+        bus.publish(CacheEvent('user1', MEALS))
+        self.assertEqual(len(received), 1)
+
+    def test_overlaps(self):
+        event = CacheEvent('user1', MEALS, TODAY, TODAY)
+        self.assertTrue(event.overlaps(TODAY - timedelta(days=7), TODAY))
+        self.assertFalse(event.overlaps(TODAY - timedelta(days=7), TODAY - timedelta(days=1)))
+        self.assertTrue(event.overlaps(None, None))
+        self.assertTrue(CacheEvent('user1', MEALS).overlaps(TODAY, TODAY))
+
+
+class TestFetchCache(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = EventBus()
+        self.clock = FakeClock()
+        self.loader = MagicMock(side_effect=lambda user_id, days=1: f"{user_id}:{days}:{self.loader.call_count}")
+
+        def fetch(user_id, days=1):
+            return self.loader(user_id, days)
+        self.cache = FetchCache(fetch, (MEALS,), ttl=60, span=last_days('days'), bus=self.bus, clock=self.clock)
+
+    def test_hit_until_ttl(self):
+        first = self.cache('user1', 7)
+        # Keyword and positional calls share an entry
+        self.assertEqual(self.cache('user1', days=7), first)
+        self.assertEqual(self.loader.call_count, 1)
+
+        self.clock.now = 61
+        self.assertNotEqual(self.cache('user1', 7), first)
+
+    def test_event_evicts_only_matching_entries(self):
+        self.cache('user1', 7)
+        self.cache('user1', 1)
+        self.cache('user2', 7)
+
+        # A meal three days ago: only user1's 7-day entry covers it
+        self.bus.publish(CacheEvent('user1', MEALS, TODAY - timedelta(days=3), TODAY - timedelta(days=3)))
+        self.cache('user1', 7)
+        self.cache('user1', 1)
+        self.cache('user2', 7)
+        self.assertEqual(self.loader.call_count, 4)
+
+        # Entities the fetcher does not read are ignored
+        self.bus.publish(CacheEvent('user1', WATER))
+        self.cache('user1', 7)
+        self.assertEqual(self.loader.call_count, 4)
+
+    def test_load_racing_a_write_is_not_stored(self):
+        started, release = threading.Event(), threading.Event()
+
+        def slow_fetch(user_id):
+            started.set()
+            release.wait(5)
+            return 'before write'
+        cache = FetchCache(slow_fetch, (MEALS,), bus=self.bus)
+
+        results = []
+        reader = threading.Thread(target=lambda: results.append(cache('user1')))
+        reader.start()
+        started.wait(5)
+        self.bus.publish(CacheEvent('user1', MEALS))
+        release.set()
+        reader.join()
+
+        self.assertEqual(results, ['before write'])
+        self.assertEqual(cache._entries, {})
+
+    def test_clear(self):
+        self.cache('user1', 7)
+        self.cache('user2', 7)
+        self.cache.clear('user1', 7)
+        self.cache('user1', 7)
+        self.cache('user2', 7)
+        self.assertEqual(self.loader.call_count, 3)
+
+        self.cache.clear()
+        self.cache('user2', 7)
+        self.assertEqual(self.loader.call_count, 4)
+
+    def test_shared_data_evicted_by_any_user(self):
+        loader = MagicMock(return_value=['food'])
+
+        def fetch():
+            return loader()
+        cache = FetchCache(fetch, ('foods',), user_param=None, bus=self.bus)
+        cache()
+        self.bus.publish(CacheEvent('user1', 'foods'))
+        cache()
+        self.assertEqual(loader.call_count, 2)
+
+    def test_on_day_span(self):
+        span = on_day('date')
+        self.assertEqual(span({'date': '2025-04-05'}), (date(2025, 4, 5), date(2025, 4, 5)))
+        self.assertEqual(span({'date': None}), (None, None))
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = EventBus()
+        self.started, self.release = threading.Event(), threading.Event()
+        self.calls = 0
+
+    def make_cache(self, result='users', **kwargs):
+        def fetch(user_id):
+            self.calls += 1
+            call = self.calls
+            self.started.set()
+            self.release.wait(5)
+            if isinstance(result, Exception):
+                raise result
+            return f"{result}:{call}"
+        return FetchCache(fetch, (MEALS,), bus=self.bus, shared=False, **kwargs)
+
+    def call_concurrently(self, cache, count, user_id='user1'):
+        # Starts `count` callers and returns their results (or exceptions)
+        results = [None] * count
+
+        def call(i):
+            try:
+                results[i] = cache(user_id)
+            except Exception as e:
+                results[i] = e
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        return threads, results
+
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.001)
+
+    def test_concurrent_misses_share_one_load(self):
+        cache = self.make_cache()
+        threads, results = self.call_concurrently(cache, 8)
+        self.wait_for(lambda: cache.stats()['coalesced'] == 7)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ['users:1'] * 8)
+        self.assertEqual(self.calls, 1)
+        stats = cache.stats()
+        self.assertEqual((stats['loads'], stats['coalesced'], stats['entries']), (1, 7, 1))
+        self.assertEqual(cache._flights, {})
+
+    def test_errors_reach_every_waiter(self):
+        cache = self.make_cache(result=ConnectionError("BigQuery unavailable"))
+        threads, results = self.call_concurrently(cache, 4)
+        self.wait_for(lambda: cache.stats()['coalesced'] == 3)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertTrue(all(isinstance(result, ConnectionError) for result in results))
+        self.assertEqual(self.calls, 1)
+        # Failures are not cached: the next call loads again
+        with self.assertRaises(ConnectionError):
+            cache('user1')
+        self.assertEqual(self.calls, 2)
+
+    def test_waiters_time_out(self):
+        cache = self.make_cache(wait_timeout=0.01)
+        leader, _ = self.call_concurrently(cache, 1)
+        self.started.wait(5)
+        with self.assertRaises(TimeoutError):
+            cache('user1')
+        self.release.set()
+        leader[0].join()
+        self.assertEqual(cache.stats()['wait_timeouts'], 1)
+
+    def test_calls_after_a_write_do_not_join_an_older_load(self):
+        cache = self.make_cache()
+        leader, leader_results = self.call_concurrently(cache, 1)
+        self.started.wait(5)
+        self.bus.publish(CacheEvent('user1', MEALS))
+        reader, reader_results = self.call_concurrently(cache, 1)
+        self.wait_for(lambda: self.calls == 2)
+        self.release.set()
+        leader[0].join()
+        reader[0].join()
+        self.assertEqual((leader_results, reader_results), (['users:1'], ['users:2']))
+        self.assertEqual(cache.stats()['coalesced'], 0)
+
+    def test_other_keys_load_independently(self):
+        cache = self.make_cache()
+        self.release.set()
+        cache('user1')
+        cache('user2')
+        cache('user1')
+        stats = cache.stats()
+        self.assertEqual((stats['loads'], stats['hits'], stats['coalesced']), (2, 1, 0))
+
+
+class ManualPool:
+    """RefreshPool stand-in that runs refreshes when the test says so."""
+
+    def __init__(self, accept=True):
+        self.accept = accept
+        self.queued = []
+
+    def submit(self, function):
+        if self.accept:
+            self.queued.append(function)
+        return self.accept
+
+    def run(self):
+        queued, self.queued = self.queued, []
+        for function in queued:
+            function()
+
+
+class TestStaleWhileRevalidate(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = EventBus()
+        self.clock = FakeClock()
+        self.pool = ManualPool()
+        self.fail = False
+        self.calls = 0
+
+        def fetch(user_id):
+            self.calls += 1
+            if self.fail:
+                raise ConnectionError("BigQuery unavailable")
+            return f"{user_id}:{self.calls}"
+        self.cache = FetchCache(fetch, (MEALS,), ttl=60, refresh_after=10, bus=self.bus, clock=self.clock,
+                                shared=False, refresh_pool=self.pool)
+
+    def test_stale_entries_are_served_and_refreshed(self):
+        self.cache('user1')
+        self.clock.now = 11
+        # Served immediately, one refresh queued however often it is read
+        self.assertEqual(self.cache('user1'), 'user1:1')
+        self.assertEqual(self.cache('user1'), 'user1:1')
+        self.assertEqual((len(self.pool.queued), self.calls), (1, 1))
+
+        self.pool.run()
+        self.assertEqual(self.cache('user1'), 'user1:2')
+        stats = self.cache.stats()
+        self.assertEqual((stats['stale_serves'], stats['refreshes'], stats['hits']), (2, 1, 1))
+        self.assertGreaterEqual(stats['refresh_max_ms'], 0)
+
+    def test_callers_block_after_hard_expiry(self):
+        self.cache('user1')
+        self.clock.now = 61
+        self.assertEqual(self.cache('user1'), 'user1:2')
+        self.assertEqual(self.pool.queued, [])
+
+    def test_failed_refresh_keeps_the_stale_entry(self):
+        self.cache('user1')
+        self.clock.now = 11
+        self.fail = True
+        self.cache('user1')
+        self.pool.run()
+        self.assertEqual(self.cache.stats()['refresh_failures'], 1)
+
+        # Retried after another refresh_after, not on every read
+        self.assertEqual(self.cache('user1'), 'user1:1')
+        self.assertEqual(self.pool.queued, [])
+        self.clock.now = 22
+        self.cache('user1')
+        self.assertEqual(len(self.pool.queued), 1)
+
+    def test_refresh_racing_a_write_is_not_stored(self):
+        self.cache('user1')
+        self.clock.now = 11
+        self.cache('user1')
+        self.bus.publish(CacheEvent('user1', MEALS))
+        self.pool.run()
+        # The event evicted the entry and the refresh result is dropped
+        self.assertEqual(self.cache('user1'), 'user1:3')
+
+    def test_full_pool_serves_stale_without_refresh(self):
+        self.pool.accept = False
+        self.cache('user1')
+        self.clock.now = 11
+        self.assertEqual(self.cache('user1'), 'user1:1')
+        self.assertEqual(self.cache.stats()['refreshes_declined'], 1)
+        self.assertEqual(self.cache._flights, {})
+
+    def test_callers_after_hard_expiry_wait_for_a_running_refresh(self):
+        self.cache('user1')
+        self.clock.now = 11
+        self.cache('user1')
+        self.clock.now = 61
+        results = []
+        joiner = threading.Thread(target=lambda: results.append(self.cache('user1')))
+        joiner.start()
+        deadline = time.monotonic() + 5
+        while self.cache.stats()['coalesced'] == 0:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.001)
+        self.pool.run()
+        joiner.join(5)
+
+        self.assertEqual(results, ['user1:2'])
+        self.assertEqual((self.calls, self.pool.queued), (2, []))
+
+    def test_callers_joining_a_declined_refresh_load_themselves(self):
+        class BlockingPool:
+            # Declines the refresh once the test has let a caller join it
+            def __init__(self):
+                self.submitting, self.decline = threading.Event(), threading.Event()
+
+            def submit(self, function):
+                self.submitting.set()
+                self.decline.wait(5)
+                return False
+
+        pool = BlockingPool()
+        self.cache.refresh_pool = pool
+        self.cache('user1')
+        self.clock.now = 11
+        stale = []
+        refresher = threading.Thread(target=lambda: stale.append(self.cache('user1')))
+        refresher.start()
+        self.assertTrue(pool.submitting.wait(5))
+
+        # Expired for this caller, which joins the refresh flight
+        self.clock.now = 61
+        results = []
+        joiner = threading.Thread(target=lambda: results.append(self.cache('user1')))
+        joiner.start()
+        deadline = time.monotonic() + 5
+        while self.cache.stats()['coalesced'] == 0:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.001)
+        pool.decline.set()
+        refresher.join(5)
+        joiner.join(5)
+
+        self.assertEqual((stale, results), (['user1:1'], ['user1:2']))
+        self.assertEqual(self.cache._flights, {})
+
+    def test_refresh_after_must_be_below_ttl(self):
+        cache = FetchCache(lambda user_id: user_id, ttl=60, refresh_after=60, bus=self.bus, shared=False)
+        self.assertIsNone(cache.refresh_after)
+
+    def test_shared_tier_keeps_refreshes_on(self):
+        def fetch(user_id):
+            self.calls += 1
+            return f"{user_id}:{self.calls}"
+        shared = SharedCache(SQLiteBackend(':memory:'))
+        cache = FetchCache(fetch, (MEALS,), ttl=3600, refresh_after=600, bus=self.bus, clock=self.clock,
+                           shared=shared, refresh_pool=self.pool)
+        self.assertEqual((cache.refresh_after, cache.local_ttl), (600, SHARED_LOCAL_TTL_SECONDS))
+
+        cache('user1')
+        # Past the local lifetime the copy is served and rechecked in the background
+        self.clock.now = SHARED_LOCAL_TTL_SECONDS + 1
+        self.assertEqual(cache('user1'), 'user1:1')
+        self.assertEqual(len(self.pool.queued), 1)
+        self.pool.run()
+        # The refresh found the value in the shared tier
+        self.assertEqual((self.calls, cache.stats()['refreshes']), (1, 1))
+
+        # Only callers after the real ttl wait for a load
+        self.clock.now = 3700
+        cache('user1')
+        self.assertEqual(self.pool.queued, [])
+
+    def test_shared_tier_without_refresh_after_expires_locally(self):
+        cache = FetchCache(lambda user_id: user_id, ttl=3600, bus=self.bus, clock=self.clock,
+                           shared=SharedCache(SQLiteBackend(':memory:')))
+        cache('user1')
+        self.clock.now = SHARED_LOCAL_TTL_SECONDS + 1
+        cache('user1')
+        self.assertEqual(cache.stats()['loads'], 2)
+
+
+class TestRefreshPool(unittest.TestCase):
+
+    def test_declines_beyond_max_pending(self):
+        pool = RefreshPool(workers=1, max_pending=2)
+        release, finished = threading.Event(), []
+
+        def refresh():
+            release.wait(5)
+            finished.append(1)
+        self.assertTrue(pool.submit(refresh))
+        self.assertTrue(pool.submit(refresh))
+        self.assertFalse(pool.submit(refresh))
+        release.set()
+        pool._executor.shutdown(wait=True)
+        self.assertEqual((len(finished), pool._pending), (2, 0))
+
+
+class TestBounds(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = EventBus()
+        self.loader = MagicMock(side_effect=lambda user_id, size=10: 'x' * size)
+
+        def fetch(user_id, size=10):
+            return self.loader(user_id, size)
+        self.fetch = fetch
+
+    def make_cache(self, **kwargs):
+        return FetchCache(self.fetch, (MEALS,), bus=self.bus, shared=False, **kwargs)
+
+    def test_least_recently_used_is_evicted(self):
+        cache = self.make_cache(max_entries=2)
+        cache('user1')
+        cache('user2')
+        cache('user1')
+        cache('user3')
+        # user2 was used least recently
+        self.assertEqual(list(key[0][1] for key in cache._entries), ['user1', 'user3'])
+        stats = cache.stats()
+        self.assertEqual((stats['entries'], stats['evictions'], stats['stores']), (2, 1, 3))
+        self.assertAlmostEqual(stats['eviction_rate'], 1 / 3)
+
+    def test_bytes_limit(self):
+        cache = self.make_cache(max_bytes=3000)
+        cache('user1', 1000)
+        cache('user2', 1000)
+        cache('user3', 1000)
+        stats = cache.stats()
+        self.assertEqual((stats['entries'], stats['evictions']), (2, 1))
+        self.assertLessEqual(stats['bytes'], 3000)
+
+        # Values above the limit are returned but not kept
+        self.assertEqual(len(cache('user4', 5000)), 5000)
+        self.assertEqual(cache.stats()['oversized'], 1)
+        cache('user4', 5000)
+        self.assertEqual(self.loader.call_count, 5)
+
+    def test_bytes_follow_invalidations_and_clear(self):
+        cache = self.make_cache()
+        cache('user1', 1000)
+        cache('user2', 1000)
+        one_entry = cache.stats()['bytes'] // 2
+        self.bus.publish(CacheEvent('user1', MEALS))
+        self.assertEqual((cache.stats()['bytes'], cache.stats()['invalidations']), (one_entry, 1))
+        cache.clear()
+        self.assertEqual(cache.stats()['bytes'], 0)
+
+    def test_estimate_size(self):
+        rows = [{'meal_id': f'meal{i}', 'meal_type': 'lunch', 'calories': 500.0} for i in range(100)]
+        records = [MealTotals(meal_id=f'meal{i}', meal_type='lunch', total_calories=500.0) for i in range(100)]
+        self.assertGreater(estimate_size(rows), 100 * sys.getsizeof({}))
+        self.assertLess(estimate_size(records), estimate_size(rows))
+        # Shared objects are counted once
+        self.assertLess(estimate_size([rows[0]] * 100), estimate_size(rows) / 10)
+
+        frame = pd.DataFrame({'value': np.arange(10_000, dtype=float)})
+        self.assertGreaterEqual(estimate_size({'frame': frame}), 80_000)
+        record = WorkoutRecord('w1', datetime(2025, 4, 5, 9), datetime(2025, 4, 5, 10))
+        self.assertGreater(estimate_size(record), sys.getsizeof(record))
+
+    def test_diagnostics_list_every_cache(self):
+        cache = self.make_cache()
+        cache('user1')
+        rows = [row for row in cache_diagnostics() if row['name'] == cache.name]
+        self.assertTrue(any(row['entries'] == 1 and row['bytes'] > 0 for row in rows))
+
+    def test_diagnostics_are_off_unless_enabled(self):
+        with patch.dict('os.environ', {}, clear=True):
+            self.assertFalse(diagnostics_enabled())
+        with patch.dict('os.environ', {'SHOW_CACHE_DIAGNOSTICS': '1'}):
+            self.assertTrue(diagnostics_enabled())
+
+
+class TestWritesPublish(unittest.TestCase):
+
+    @patch('data_fetcher.update_rollups')
+    @patch('data_fetcher.get_bigquery_client')
+    def test_water_write_publishes_its_day(self, mock_get_client, mock_update_rollups):
+        events = []
+        unsubscribe = data_fetcher.subscribe(WATER, events.append)
+        try:
+            self.assertTrue(data_fetcher.add_water_intake('user1', 250, datetime(2025, 4, 5, 9)))
+        finally:
+            unsubscribe()
+        self.assertEqual(events, [CacheEvent('user1', WATER, date(2025, 4, 5), date(2025, 4, 5))])
+
+    def test_publish_defaults_end_to_start(self):
+        bus_events = []
+        unsubscribe = data_fetcher.subscribe(MEALS, bus_events.append)
+        try:
+            event = publish('user1', MEALS, datetime(2025, 4, 5, 9))
+        finally:
+            unsubscribe()
+        self.assertEqual((event.start, event.end), (date(2025, 4, 5), date(2025, 4, 5)))
+        self.assertEqual(bus_events, [event])
+
+
+if __name__ == '__main__':
+    unittest.main()
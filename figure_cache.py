@@ -0,0 +1,183 @@
+"""
+figure_cache.py
+
+This module caches Plotly figures so that Streamlit reruns which do not
+change a chart's data skip building the figure. It includes:
+  - content_hash(): a stable hash of DataFrames, arrays and plain values
+  - FigureCache: a size-bounded LRU of serialized figure JSON, keyed by the
+    builder function, a hash of its input data and its parameters
+  - Hit/miss counts and the build time saved, for the analytics pages
+
+A builder is any function builder(data, **params) returning a Figure. On a
+hit the figure is restored from its JSON without re-running the builder.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+# Total size of the cached figure JSON
+FIGURE_CACHE_BYTES = 32 * 1024 * 1024
+
+
+def _update_hash(digest, value):
+    if isinstance(value, pd.DataFrame):
+        digest.update(b'frame')
+        digest.update(repr((list(value.columns), [str(dtype) for dtype in value.dtypes])).encode('utf-8'))
+        try:
+            digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+        except TypeError:
+            # Unhashable cells (lists, dicts): fall back to the JSON representation
+            digest.update(value.to_json(date_format='iso', default_handler=str).encode('utf-8'))
+    elif isinstance(value, (pd.Series, pd.Index)):
+        _update_hash(digest, value.to_frame())
+    elif isinstance(value, np.ndarray):
+        digest.update(repr((value.dtype.str, value.shape)).encode('utf-8'))
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        digest.update(b'dict')
+        for key in sorted(value, key=str):
+            _update_hash(digest, key)
+            _update_hash(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(f'seq{len(value)}'.encode('utf-8'))
+        for item in value:
+            _update_hash(digest, item)
+    else:
+        digest.update(json.dumps(value, default=str).encode('utf-8'))
+
+
+def content_hash(*values):
+    """
+    Returns a hash of the content of the given values.
+
+    Equal DataFrames (same columns, dtypes, index and values) hash the same,
+    regardless of object identity.
+
+    Args:
+        *values: DataFrames, Series, arrays, dicts, lists or JSON-like values
+
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha1()
+    for value in values:
+        _update_hash(digest, value)
+    return digest.hexdigest()
+
+
+class _Entry:
+    __slots__ = ('spec', 'build_seconds')
+
+    def __init__(self, spec, build_seconds):
+        self.spec = spec
+        self.build_seconds = build_seconds
+
+
+class FigureCache:
+    """
+    A size-bounded LRU cache of serialized Plotly figures.
+
+    Args:
+        max_bytes (int): Maximum total size of the cached figure JSON
+    """
+
+    def __init__(self, max_bytes=FIGURE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.build_seconds = 0.0
+        self.saved_seconds = 0.0
+
+    def figure(self, builder, data, **params):
+        """
+        Returns builder(data, **params), from the cache if the same builder
+        was already called with equal data and parameters.
+
+        Args:
+            builder (callable): Function (data, **params) returning a Figure
+            data: The chart's input data (e.g. a DataFrame)
+            **params: Other chart parameters (titles, targets, ...)
+
+        Returns:
+            plotly.graph_objects.Figure
+        """
+        key = content_hash(f"{builder.__module__}.{builder.__qualname__}", data, params)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.saved_seconds += entry.build_seconds
+
+        if entry is not None:
+            # The spec came from a validated figure, so validation can be skipped
+            return go.Figure(json.loads(entry.spec), _validate=False)
+
+        start = time.perf_counter()
+        fig = builder(data, **params)
+        spec = fig.to_json()
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.misses += 1
+            self.build_seconds += elapsed
+            if key not in self._entries and len(spec) <= self.max_bytes:
+                self._entries[key] = _Entry(spec, elapsed)
+                self._bytes += len(spec)
+                while self._bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= len(evicted.spec)
+        return fig
+
+    def stats(self):
+        """
+        Returns cache statistics.
+
+        Returns:
+            dict: 'hits', 'misses', 'entries', 'bytes', 'build_seconds'
+                (time spent building figures) and 'saved_seconds' (build
+                time skipped by hits)
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'build_seconds': self.build_seconds,
+                'saved_seconds': self.saved_seconds,
+            }
+
+    def clear(self):
+        """Drops all cached figures and resets the statistics."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = self.misses = 0
+            self.build_seconds = self.saved_seconds = 0.0
+
+
+figure_cache = FigureCache()
+
+
+def cached_figure(builder, data, **params):
+    """Returns builder(data, **params) from the shared figure cache."""
+    return figure_cache.figure(builder, data, **params)
+
+
+def figure_cache_summary():
+    """Returns a one-line summary of the shared figure cache statistics."""
+    stats = figure_cache.stats()
+    return (f"Charts: {stats['hits']} reused, {stats['misses']} built, "
+            f"{stats['saved_seconds'] * 1000:.0f} ms build time saved")
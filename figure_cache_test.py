@@ -0,0 +1,90 @@
+import json
+import unittest
+from unittest.mock import MagicMock
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+from figure_cache import FigureCache, content_hash
+
+# python3 -m unittest figure_cache_test.py
+
+
+def build_line(df, title):
+    return px.line(df, x='date', y='calories', title=title)
+
+
+def make_frame(days=30, offset=0):
+    return pd.DataFrame({
+        'date': pd.date_range('2024-01-01', periods=days),
+        'calories': np.arange(days) + 2000 + offset,
+    })
+
+
+class TestContentHash(unittest.TestCase):
+
+    def test_equal_frames_hash_equal(self):
+        self.assertEqual(content_hash(make_frame()), content_hash(make_frame()))
+
+    def test_changed_values_columns_or_params_hash_differently(self):
+        base = content_hash(make_frame(), {'title': 'a'})
+        self.assertNotEqual(base, content_hash(make_frame(offset=1), {'title': 'a'}))
+        self.assertNotEqual(base, content_hash(make_frame().rename(columns={'calories': 'kcal'}), {'title': 'a'}))
+        self.assertNotEqual(base, content_hash(make_frame(), {'title': 'b'}))
+
+    def test_unhashable_cells(self):
+        df = pd.DataFrame({'foods': [['apple'], ['rice', 'beans']]})
+        self.assertEqual(content_hash(df), content_hash(df.copy()))
+
+
+class TestFigureCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = FigureCache()
+        self.builder = MagicMock(side_effect=build_line)
+        self.builder.__module__ = __name__
+        self.builder.__qualname__ = 'build_line'
+
+    def test_rerun_with_same_data_skips_builder(self):
+        first = self.cache.figure(self.builder, make_frame(), title='Calories')
+        second = self.cache.figure(self.builder, make_frame(), title='Calories')
+
+        self.assertEqual(self.builder.call_count, 1)
+        self.assertEqual(json.loads(first.to_json()), json.loads(second.to_json()))
+        self.assertEqual(second.layout.title.text, 'Calories')
+
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (1, 1, 1))
+        self.assertGreater(stats['saved_seconds'], 0)
+
+    def test_changed_data_rebuilds(self):
+        self.cache.figure(self.builder, make_frame(), title='Calories')
+        self.cache.figure(self.builder, make_frame(offset=5), title='Calories')
+        self.cache.figure(self.builder, make_frame(), title='Intake')
+        self.assertEqual(self.builder.call_count, 3)
+
+    def test_memory_is_bounded(self):
+        size = len(build_line(make_frame(), 'Calories').to_json())
+        cache = FigureCache(max_bytes=int(size * 2.5))
+        for offset in range(5):
+            cache.figure(self.builder, make_frame(offset=offset), title='Calories')
+
+        stats = cache.stats()
+        self.assertEqual(stats['entries'], 2)
+        self.assertLessEqual(stats['bytes'], cache.max_bytes)
+
+        # The most recent figures are kept
+        cache.figure(self.builder, make_frame(offset=4), title='Calories')
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_clear(self):
+        self.cache.figure(self.builder, make_frame(), title='Calories')
+        self.cache.clear()
+        self.assertEqual(self.cache.stats()['entries'], 0)
+        self.cache.figure(self.builder, make_frame(), title='Calories')
+        self.assertEqual(self.builder.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,343 @@
+"""
+history_index.py
+
+This module keeps a small local retrieval index over a user's history so that
+advice prompts only carry the most relevant workouts and nutrition days.
+
+  - Each workout and each day of nutrition is turned into a short text summary
+  - Summaries are hashed into fixed-size vectors (a hashing vectorizer) and
+    stored as rows of a NumPy matrix
+  - Queries are answered with cosine similarity and a top-k selection
+
+Documents are added incrementally: only new or changed summaries are
+vectorized, so refreshing the index never rescans the full history.
+
+get_user_index() keeps one index per user for the most recently used
+MAX_CACHED_USERS users. When a user's workouts, meals or water change, only
+the documents for the changed days are removed; callers notice the new
+revision and index those days again from current data.
+"""
+
+import re
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+from cache_events import MEALS, WATER, WORKOUTS, subscribe
+from range_cache import MAX_CACHED_USERS, as_date
+from workout_records import as_workout_record
+
+# Size of the hashed feature space
+N_FEATURES = 1024
+
+# Initial number of rows allocated for a new index
+INITIAL_CAPACITY = 64
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9_]+")
+
+
+def _tokens(text):
+    words = _TOKEN_PATTERN.findall(text.lower())
+    # Unigrams plus bigrams so "heart rate" and "long run" stay together
+    return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+
+def vectorize(text, n_features=N_FEATURES):
+    """
+    Hashes a text into an L2-normalized vector.
+
+    Args:
+        text (str): Text to vectorize
+        n_features (int): Number of hash buckets
+
+    Returns:
+        numpy.ndarray: Float32 vector of length n_features
+    """
+    vector = np.zeros(n_features, dtype=np.float32)
+    for token in _tokens(text):
+        h = zlib.crc32(token.encode("utf-8"))
+        # The sign bit keeps colliding tokens from always adding up
+        vector[h % n_features] += 1.0 if (h >> 31) & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector
+
+
+class HistoryIndex:
+    """
+    An incrementally built cosine-similarity index over text summaries.
+    """
+
+    def __init__(self, n_features=N_FEATURES, capacity=INITIAL_CAPACITY):
+        self.n_features = n_features
+        self._matrix = np.zeros((capacity, n_features), dtype=np.float32)
+        self._ids = []
+        self._texts = []
+        self._payloads = []
+        self._positions = {}
+        self._lock = threading.Lock()
+        # Bumped whenever documents are removed, so callers know to refill
+        self.revision = 0
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._positions
+
+    def count(self, kind=None):
+        """Returns the number of documents, or of those whose id starts with kind."""
+        with self._lock:
+            if kind is None:
+                return len(self._ids)
+            return sum(1 for doc_id in self._ids if doc_id.startswith(kind))
+
+    def upsert(self, doc_id, text, payload=None):
+        """
+        Adds a document, or replaces it if the text has changed.
+
+        Returns:
+            bool: True if the index was modified
+        """
+        with self._lock:
+            position = self._positions.get(doc_id)
+            if position is not None and self._texts[position] == text:
+                return False
+
+            vector = vectorize(text, self.n_features)
+            if position is None:
+                position = len(self._ids)
+                if position == self._matrix.shape[0]:
+                    # Grow geometrically so appends stay amortized O(1)
+                    grown = np.zeros((position * 2, self.n_features), dtype=np.float32)
+                    grown[:position] = self._matrix
+                    self._matrix = grown
+                self._positions[doc_id] = position
+                self._ids.append(doc_id)
+                self._texts.append(text)
+                self._payloads.append(payload)
+            else:
+                self._texts[position] = text
+                self._payloads[position] = payload
+
+            self._matrix[position] = vector
+            return True
+
+    def remove_where(self, predicate):
+        """
+        Removes the documents a predicate selects.
+
+        Args:
+            predicate (callable): Called as predicate(doc_id, payload)
+
+        Returns:
+            int: The number of documents removed
+        """
+        with self._lock:
+            doomed = [
+                doc_id for doc_id, payload in zip(self._ids, self._payloads)
+                if predicate(doc_id, payload)
+            ]
+            for doc_id in doomed:
+                position = self._positions.pop(doc_id)
+                last = len(self._ids) - 1
+                if position != last:
+                    # Move the last row into the gap so rows stay contiguous
+                    moved = self._ids[last]
+                    self._matrix[position] = self._matrix[last]
+                    self._ids[position] = moved
+                    self._texts[position] = self._texts[last]
+                    self._payloads[position] = self._payloads[last]
+                    self._positions[moved] = position
+                self._matrix[last] = 0.0
+                del self._ids[last], self._texts[last], self._payloads[last]
+            if doomed:
+                self.revision += 1
+            return len(doomed)
+
+    def query(self, text, k=3, kind=None):
+        """
+        Returns the k most similar documents to a query text.
+
+        Args:
+            text (str): The question or advice request
+            k (int): Maximum number of results
+            kind (str, optional): Only return documents whose id starts with
+                this prefix (e.g. "workout" or "nutrition")
+
+        Returns:
+            list: Dictionaries with id, text, payload and score, best first
+        """
+        with self._lock:
+            count = len(self._ids)
+            if count == 0 or k <= 0:
+                return []
+
+            scores = self._matrix[:count] @ vectorize(text, self.n_features)
+            if kind is not None:
+                mask = np.array([doc_id.startswith(kind) for doc_id in self._ids])
+                scores = np.where(mask, scores, -np.inf)
+
+            k = min(k, count)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+
+            return [
+                {
+                    'id': self._ids[i],
+                    'text': self._texts[i],
+                    'payload': self._payloads[i],
+                    'score': float(scores[i]),
+                }
+                for i in top
+                if np.isfinite(scores[i])
+            ]
+
+
+def _time_of_day(hour):
+    if hour < 12:
+        return "morning"
+    if hour < 17:
+        return "afternoon"
+    return "evening"
+
+
+def summarize_workout(workout):
+    """
+    Builds a short text summary of one workout.
+
+    Args:
+        workout (WorkoutRecord or dict): A workout as returned by get_user_workouts
+
+    Returns:
+        str: The summary
+    """
+    parts = ["workout"]
+    try:
+        record = as_workout_record(workout)
+    except (TypeError, ValueError):
+        record = None
+    start = record.start_time if record else None
+
+    if start:
+        parts.append(f"on {start.date().isoformat()} {start.strftime('%A').lower()} {_time_of_day(start.hour)}")
+    if record and record.duration is not None:
+        minutes = record.duration_minutes
+        length = "long" if minutes >= 60 else "short" if minutes < 25 else "moderate"
+        parts.append(f"{minutes:.0f} minutes {length} duration")
+
+    distance = workout.get('distance') or 0
+    steps = workout.get('steps') or 0
+    calories = workout.get('calories_burned') or 0
+    parts.append(f"{distance:.1f} miles {'long distance' if distance >= 4 else 'short distance'}")
+    parts.append(f"{steps} steps {'high steps' if steps >= 8000 else 'low steps'}")
+    parts.append(f"{calories:.0f} calories burned {'high intensity' if calories >= 400 else 'light intensity'}")
+    return " ".join(parts)
+
+
+def summarize_nutrition_day(entry):
+    """
+    Builds a short text summary of one day of nutrition.
+
+    Args:
+        entry (dict): A day as returned by get_nutrition_data
+
+    Returns:
+        str: The summary
+    """
+    calories = entry.get('total_calories') or 0
+    protein = entry.get('total_protein') or 0
+    carbs = entry.get('total_carbs') or 0
+    fat = entry.get('total_fat') or 0
+    water = entry.get('total_water_ml') or 0
+    return (
+        f"nutrition diet meals on {entry.get('date')} "
+        f"{calories:.0f} calories {'high calorie' if calories >= 2500 else 'low calorie' if calories < 1500 else 'moderate calorie'} "
+        f"{protein:.0f}g protein {'high protein' if protein >= 100 else 'low protein'} "
+        f"{carbs:.0f}g carbs {'high carb' if carbs >= 250 else 'low carb'} "
+        f"{fat:.0f}g fat "
+        f"{water:.0f}ml water hydration {'well hydrated' if water >= 2000 else 'low water dehydrated'}"
+    )
+
+
+def index_workouts(index, workouts):
+    """Adds new workouts to an index. Returns the number indexed."""
+    added = 0
+    for i, workout in enumerate(workouts or []):
+        doc_id = f"workout:{workout.get('workout_id', i)}"
+        # Logged workouts don't change, so known ids are skipped without re-summarizing
+        if doc_id in index:
+            continue
+        if index.upsert(doc_id, summarize_workout(workout), workout):
+            added += 1
+    return added
+
+
+def index_nutrition_days(index, nutrition_data):
+    """Adds new or changed nutrition days to an index. Returns the number indexed."""
+    added = 0
+    for entry in nutrition_data or []:
+        doc_id = f"nutrition:{entry.get('date')}"
+        if index.upsert(doc_id, summarize_nutrition_day(entry), entry):
+            added += 1
+    return added
+
+
+# user_id -> HistoryIndex, least recently used first
+_user_indexes = OrderedDict()
+_registry_lock = threading.Lock()
+
+
+def get_user_index(user_id):
+    """
+    Returns the process-wide history index for a user, creating it if needed.
+
+    A new (empty) index is returned after the user's index was evicted, and
+    a change removes documents from the current one, so callers fill it again
+    when the (index, revision) pair differs from the one they indexed last.
+    """
+    with _registry_lock:
+        index = _user_indexes.get(user_id)
+        if index is None:
+            index = _user_indexes[user_id] = HistoryIndex()
+            while len(_user_indexes) > MAX_CACHED_USERS:
+                _user_indexes.popitem(last=False)
+        _user_indexes.move_to_end(user_id)
+        return index
+
+
+def _document_day(doc_id, payload):
+    # The day a document describes, or None if it can't be told
+    try:
+        if doc_id.startswith("workout:"):
+            return as_workout_record(payload).workout_date
+        return as_date(doc_id.split(":", 1)[1])
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+def _on_history_changed(event):
+    # Only the changed days are removed; the rest of the index stays valid
+    if event.user_id is None:
+        return
+    with _registry_lock:
+        index = _user_indexes.get(event.user_id)
+    if index is None:
+        return
+
+    kind = "workout:" if event.entity == WORKOUTS else "nutrition:"
+
+    def touched(doc_id, payload):
+        if not doc_id.startswith(kind):
+            return False
+        day = _document_day(doc_id, payload)
+        return day is None or event.overlaps(day, day)
+
+    index.remove_where(touched)
+
+
+for _entity in (WORKOUTS, MEALS, WATER):
+    subscribe(_entity, _on_history_changed)
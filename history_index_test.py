@@ -0,0 +1,206 @@
+import unittest
+from datetime import date
+from unittest.mock import patch
+import numpy as np
+from cache_events import MEALS, WATER, WORKOUTS, publish
+from history_index import (
+    HistoryIndex, vectorize, summarize_workout, summarize_nutrition_day,
+    index_workouts, index_nutrition_days, get_user_index,
+)
+from data_fetcher import select_advice_workouts
+
+# python3 -m unittest history_index_test.py
+
+
+class TestVectorize(unittest.TestCase):
+
+    def test_vector_is_normalized(self):
+        vector = vectorize("long run high intensity")
+        self.assertAlmostEqual(float(np.linalg.norm(vector)), 1.0, places=5)
+
+    def test_empty_text(self):
+        self.assertEqual(float(np.linalg.norm(vectorize(""))), 0.0)
+
+
+class TestHistoryIndex(unittest.TestCase):
+
+    def test_query_ranks_most_similar_first(self):
+        index = HistoryIndex()
+        index.upsert("a", "long distance run high intensity")
+        index.upsert("b", "protein heavy breakfast")
+        index.upsert("c", "short walk light intensity")
+
+        results = index.query("high intensity long distance", k=2)
+
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0]['id'], "a")
+        self.assertGreaterEqual(results[0]['score'], results[1]['score'])
+
+    def test_unchanged_text_is_not_reindexed(self):
+        index = HistoryIndex()
+        self.assertTrue(index.upsert("a", "some text"))
+        self.assertFalse(index.upsert("a", "some text"))
+        self.assertTrue(index.upsert("a", "other text"))
+        self.assertEqual(len(index), 1)
+        self.assertEqual(index.query("other text", k=1)[0]['text'], "other text")
+
+    def test_kind_filter(self):
+        index = HistoryIndex()
+        index.upsert("workout:1", "high protein")
+        index.upsert("nutrition:2024-01-01", "high protein")
+        results = index.query("high protein", k=5, kind="nutrition")
+        self.assertEqual([r['id'] for r in results], ["nutrition:2024-01-01"])
+        self.assertEqual(index.count(kind="workout"), 1)
+        self.assertEqual(index.count(), 2)
+
+    def test_grows_past_initial_capacity(self):
+        index = HistoryIndex(capacity=2)
+        for i in range(10):
+            index.upsert(f"doc{i}", f"entry number {i} word{i}")
+        self.assertEqual(len(index), 10)
+        self.assertEqual(index.query("word7", k=1)[0]['id'], "doc7")
+
+    def test_empty_index(self):
+        self.assertEqual(HistoryIndex().query("anything"), [])
+
+    def test_remove_where_keeps_the_rest(self):
+        index = HistoryIndex()
+        for i in range(5):
+            index.upsert(f"doc{i}", f"entry number {i} word{i}")
+
+        removed = index.remove_where(lambda doc_id, payload: doc_id in ("doc1", "doc2"))
+
+        self.assertEqual(removed, 2)
+        self.assertEqual(index.revision, 1)
+        self.assertEqual(len(index), 3)
+        self.assertNotIn("doc1", index)
+        # Rows moved into the gaps still answer for their own ids
+        self.assertEqual(index.query("word4", k=1)[0]['id'], "doc4")
+        self.assertEqual(index.remove_where(lambda doc_id, payload: False), 0)
+        self.assertEqual(index.revision, 1)
+
+
+class TestSummaries(unittest.TestCase):
+
+    def test_workout_summary(self):
+        summary = summarize_workout({
+            'start_timestamp': '2024-07-15 07:00:00',
+            'end_timestamp': '2024-07-15 08:10:00',
+            'distance': 6.2,
+            'steps': 9000,
+            'calories_burned': 600,
+        })
+        self.assertIn("long duration", summary)
+        self.assertIn("morning", summary)
+        self.assertIn("high intensity", summary)
+
+    def test_nutrition_summary(self):
+        summary = summarize_nutrition_day({'date': '2024-07-15', 'total_protein': 120, 'total_water_ml': 500})
+        self.assertIn("high protein", summary)
+        self.assertIn("dehydrated", summary)
+
+    def test_index_helpers_are_incremental(self):
+        index = HistoryIndex()
+        workouts = [{'workout_id': 'w1', 'distance': 1}, {'workout_id': 'w2', 'distance': 5}]
+        self.assertEqual(index_workouts(index, workouts), 2)
+        self.assertEqual(index_workouts(index, workouts), 0)
+
+        days = [{'date': '2024-07-15', 'total_calories': 2000}]
+        self.assertEqual(index_nutrition_days(index, days), 1)
+        self.assertEqual(index_nutrition_days(index, days), 0)
+        days[0]['total_calories'] = 3000
+        self.assertEqual(index_nutrition_days(index, days), 1)
+
+
+class TestUserIndexes(unittest.TestCase):
+
+    def test_index_is_reused(self):
+        self.assertIs(get_user_index("registry_user"), get_user_index("registry_user"))
+
+    def test_least_recently_used_users_are_evicted(self):
+        with patch('history_index.MAX_CACHED_USERS', 2):
+            first = get_user_index("lru_user1")
+            second = get_user_index("lru_user2")
+            get_user_index("lru_user1")
+            get_user_index("lru_user3")
+
+            self.assertIs(get_user_index("lru_user1"), first)
+            self.assertIsNot(get_user_index("lru_user2"), second)
+
+    def test_changes_remove_only_the_touched_days(self):
+        index = get_user_index("changed_user")
+        other = get_user_index("unchanged_user")
+        workouts = [
+            {'workout_id': 'w1', 'start_timestamp': '2024-07-15 07:00:00'},
+            {'workout_id': 'w2', 'start_timestamp': '2024-07-16 07:00:00'},
+        ]
+        days = [{'date': '2024-07-15'}, {'date': '2024-07-16'}]
+        for target in (index, other):
+            index_workouts(target, workouts)
+            index_nutrition_days(target, days)
+
+        publish("changed_user", WORKOUTS, date(2024, 7, 15))
+        publish("changed_user", MEALS, date(2024, 7, 16))
+
+        self.assertIs(get_user_index("changed_user"), index)
+        self.assertNotIn("workout:w1", index)
+        self.assertIn("workout:w2", index)
+        self.assertIn("nutrition:2024-07-15", index)
+        self.assertNotIn("nutrition:2024-07-16", index)
+        self.assertEqual(len(other), 4)
+
+        # Refilling only re-vectorizes what was removed
+        self.assertEqual(index_workouts(index, workouts), 1)
+        self.assertEqual(index_nutrition_days(index, days), 1)
+
+    def test_open_ended_change_removes_that_kind(self):
+        index = get_user_index("water_user")
+        index_workouts(index, [{'workout_id': 'w1', 'start_timestamp': '2024-07-15 07:00:00'}])
+        index_nutrition_days(index, [{'date': '2024-07-15'}, {'date': '2024-07-16'}])
+
+        publish("water_user", WATER)
+
+        self.assertEqual([doc['id'] for doc in index.query("workout", k=5)], ["workout:w1"])
+
+
+class TestSelectAdviceWorkouts(unittest.TestCase):
+
+    def _workout(self, i, calories, distance=1.0):
+        return {
+            'workout_id': f"w{i}",
+            'start_timestamp': f"2024-07-{10 + i:02d} 08:00:00",
+            'end_timestamp': f"2024-07-{10 + i:02d} 08:30:00",
+            'distance': distance,
+            'steps': 2000,
+            'calories_burned': calories,
+        }
+
+    def test_no_recent_workouts(self):
+        with patch('data_fetcher.get_user_workouts') as mock_workouts:
+            self.assertEqual(select_advice_workouts("select_user_empty", []), [])
+        mock_workouts.assert_not_called()
+
+    def test_recent_first_and_history_read_once(self):
+        history = [self._workout(i, 100) for i in range(12)]
+        recent = history[:-4:-1]
+        with patch('data_fetcher.get_user_workouts', return_value=history) as mock_workouts:
+            selected = select_advice_workouts("select_user_large", recent, k=5)
+            select_advice_workouts("select_user_large", recent, k=5)
+
+        self.assertEqual(len(selected), 5)
+        self.assertEqual(selected[:3], ["w11", "w10", "w9"])
+        # Later calls read the index instead of the full history
+        mock_workouts.assert_called_once_with("select_user_large")
+
+    def test_picks_history_like_the_recent_workouts(self):
+        history = [self._workout(i, 100) for i in range(6)]
+        history.append(self._workout(7, 900, distance=10.0))
+        recent = [self._workout(8, 800, distance=9.0)]
+        with patch('data_fetcher.get_user_workouts', return_value=history):
+            selected = select_advice_workouts("select_user_similar", recent, k=2)
+
+        self.assertEqual(selected, ["w8", "w7"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+"""
+meal_builder.py
+
+This module holds the meal a user is logging in their Streamlit session:
+  - MealBuilder: the meal's food lines and totals. Each food added through
+    add_food() is written to BigQuery and appended locally with the same
+    nutrient scaling, so the summary renders without querying.
+  - start_meal() / get_meal_builder() / add_food() / finish_meal(): the
+    session-level helpers used by the meal logger
+
+A builder is only loaded from BigQuery (one get_meal_summary lookup) when the
+session holds no builder for the meal, e.g. after the session restarted.
+"""
+
+import streamlit as st
+
+from data_fetcher import add_food_to_meal, get_meal_summary, scale_nutrients
+
+
+class MealBuilder:
+    """
+    The food lines of a meal being logged.
+
+    Args:
+        meal_id (str): The meal
+        user_id (str): The user the meal belongs to
+        foods (list, optional): Existing food lines (as in get_meal_foods)
+    """
+
+    def __init__(self, meal_id, user_id, foods=None):
+        self.meal_id = meal_id
+        self.user_id = user_id
+        self.foods = list(foods or [])
+
+    @classmethod
+    def from_summary(cls, summary):
+        """Builds a MealBuilder from a get_meal_summary result."""
+        return cls(summary['meal_id'], summary['user_id'], summary['foods'])
+
+    def add(self, food_item, quantity):
+        """
+        Appends a food line without writing it.
+
+        Args:
+            food_item (dict): Food as returned by search_food_items
+            quantity (float): Number of servings
+
+        Returns:
+            dict: The new food line
+        """
+        line = {
+            'food_name': food_item.get('food_name'),
+            'brand_name': food_item.get('brand_name'),
+            'quantity': quantity,
+            **scale_nutrients(food_item, quantity),
+        }
+        self.foods.append(line)
+        return line
+
+    def totals(self):
+        """
+        Returns the meal's nutrition totals.
+
+        Returns:
+            dict: total_calories, total_protein, total_carbs and total_fat
+        """
+        return {
+            'total_calories': sum(food.get('total_calories') or 0 for food in self.foods),
+            'total_protein': sum(food.get('total_protein_grams') or 0 for food in self.foods),
+            'total_carbs': sum(food.get('total_carbs_grams') or 0 for food in self.foods),
+            'total_fat': sum(food.get('total_fat_grams') or 0 for food in self.foods),
+        }
+
+
+def start_meal(meal_id, user_id):
+    """Makes a new, empty meal the session's meal in progress."""
+    st.session_state.meal_builder = MealBuilder(meal_id, user_id)
+    return st.session_state.meal_builder
+
+
+def get_meal_builder(meal_id, user_id):
+    """
+    Returns the session's builder for a meal, loading it if needed.
+
+    Args:
+        meal_id (str): The meal in progress
+        user_id (str): The active user
+
+    Returns:
+        MealBuilder: The builder, or None if the meal cannot be loaded or
+        belongs to another user
+    """
+    builder = st.session_state.get('meal_builder')
+    if builder is None or builder.meal_id != meal_id:
+        summary = get_meal_summary(meal_id)
+        builder = MealBuilder.from_summary(summary) if summary else None
+        st.session_state.meal_builder = builder
+    if builder is None or builder.user_id != user_id:
+        return None
+    return builder
+
+
+def add_food(builder, food_item, quantity):
+    """
+    Writes a food line to the builder's meal and adds it to the builder.
+
+    Args:
+        builder (MealBuilder): The meal in progress
+        food_item (dict): Food as returned by search_food_items
+        quantity (float): Number of servings
+
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    if not add_food_to_meal(meal_id=builder.meal_id, food_id=food_item['food_id'], quantity=quantity):
+        return False
+    builder.add(food_item, quantity)
+    return True
+
+
+def finish_meal():
+    """Drops the session's meal in progress."""
+    st.session_state.pop('meal_builder', None)
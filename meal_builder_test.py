@@ -0,0 +1,125 @@
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import data_fetcher
+from meal_builder import MealBuilder, add_food, get_meal_builder, start_meal
+
+# python3 -m unittest meal_builder_test.py
+
+
+OATMEAL = {
+    'food_id': 'food1', 'food_name': 'Oatmeal', 'brand_name': 'Quaker',
+    'calories': 150.0, 'protein_grams': 5.0, 'carbs_grams': 27.0, 'fat_grams': 3.0,
+}
+
+
+class FakeSessionState(dict):
+    """Dictionary with attribute access, like st.session_state."""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+
+class TestMealBuilder(unittest.TestCase):
+
+    def test_add_scales_like_stored_lines(self):
+        builder = MealBuilder('meal1', 'user1')
+        line = builder.add(OATMEAL, 2)
+
+        self.assertEqual(line['quantity'], 2)
+        for key, value in data_fetcher.scale_nutrients(OATMEAL, 2).items():
+            self.assertEqual(line[key], value)
+        self.assertEqual(builder.totals(), {
+            'total_calories': 300.0, 'total_protein': 10.0, 'total_carbs': 54.0, 'total_fat': 6.0,
+        })
+
+    def test_totals_of_loaded_meal(self):
+        builder = MealBuilder.from_summary({
+            'meal_id': 'meal1', 'user_id': 'user1',
+            'foods': [{'total_calories': 200.0, 'total_protein_grams': 30.0, 'total_carbs_grams': None, 'total_fat_grams': 8.0}],
+        })
+        builder.add(OATMEAL, 1)
+        self.assertEqual(builder.totals()['total_calories'], 350.0)
+        self.assertEqual(builder.totals()['total_carbs'], 27.0)
+
+
+@patch('meal_builder.st')
+class TestSessionMeal(unittest.TestCase):
+
+    @patch('meal_builder.get_meal_summary')
+    @patch('meal_builder.add_food_to_meal', return_value=True)
+    def test_added_food_needs_no_lookup(self, mock_add, mock_summary, mock_st):
+        mock_st.session_state = FakeSessionState()
+        start_meal('meal1', 'user1')
+
+        builder = get_meal_builder('meal1', 'user1')
+        self.assertTrue(add_food(builder, OATMEAL, 1.5))
+
+        mock_add.assert_called_once_with(meal_id='meal1', food_id='food1', quantity=1.5)
+        self.assertEqual([food['food_name'] for food in get_meal_builder('meal1', 'user1').foods], ['Oatmeal'])
+        mock_summary.assert_not_called()
+
+    @patch('meal_builder.add_food_to_meal', return_value=False)
+    def test_failed_add_leaves_builder(self, mock_add, mock_st):
+        mock_st.session_state = FakeSessionState()
+        builder = start_meal('meal1', 'user1')
+        self.assertFalse(add_food(builder, OATMEAL, 1))
+        self.assertEqual(builder.foods, [])
+
+    @patch('meal_builder.get_meal_summary')
+    def test_loads_meal_once(self, mock_summary, mock_st):
+        mock_st.session_state = FakeSessionState()
+        mock_summary.return_value = {'meal_id': 'meal2', 'user_id': 'user2', 'foods': []}
+
+        self.assertIsNotNone(get_meal_builder('meal2', 'user2'))
+        self.assertIsNotNone(get_meal_builder('meal2', 'user2'))
+        mock_summary.assert_called_once_with('meal2')
+
+        # Another user's meal is not shown
+        self.assertIsNone(get_meal_builder('meal2', 'user1'))
+
+
+class TestGetMealSummary(unittest.TestCase):
+
+    def row(self, quantity=None, food_name=None):
+        row = MagicMock()
+        row.meal_id = 'meal1'
+        row.user_id = 'user1'
+        row.meal_type = 'breakfast'
+        row.meal_name = None
+        row.meal_time = datetime(2025, 4, 5, 8)
+        row.food_name = food_name
+        row.quantity = quantity
+        return row
+
+    @patch('data_fetcher.get_bigquery_client')
+    def test_point_lookup(self, mock_get_client):
+        mock_client = mock_get_client.return_value
+        mock_client.query.return_value.result.return_value = [self.row(1.0, 'Oatmeal'), self.row(2.0, 'Milk')]
+
+        summary = data_fetcher.get_meal_summary('meal1')
+
+        self.assertEqual(summary['user_id'], 'user1')
+        self.assertEqual([food['food_name'] for food in summary['foods']], ['Oatmeal', 'Milk'])
+        self.assertIn('WHERE m.meal_id = @meal_id', mock_client.query.call_args[0][0])
+
+    @patch('data_fetcher.get_bigquery_client')
+    def test_meal_without_foods(self, mock_get_client):
+        mock_get_client.return_value.query.return_value.result.return_value = [self.row()]
+        self.assertEqual(data_fetcher.get_meal_summary('meal1')['foods'], [])
+
+    @patch('data_fetcher.get_bigquery_client')
+    def test_missing_meal(self, mock_get_client):
+        mock_get_client.return_value.query.return_value.result.return_value = []
+        self.assertIsNone(data_fetcher.get_meal_summary('meal1'))
+
+
+if __name__ == '__main__':
+    unittest.main()
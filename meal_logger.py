@@ -2,21 +2,35 @@ import streamlit as st
 import pandas as pd
 import datetime
 from data_fetcher import (
-    add_meal, add_food_to_meal, search_food_items, 
-    add_custom_food_item, get_meal_details
+    add_meal, search_food_items, 
+    add_custom_food_item, get_meal_history, get_meal_foods
 )
+from cache_events import MEALS
+from fetch_cache import cached_fetch, last_days
+from meal_builder import add_food, finish_meal, get_meal_builder, start_meal
 
-# Add caching for meal data
-@st.cache_data(ttl=300, show_spinner=False)  # Cache for 5 minutes, hide spinner
-def get_cached_meal_details(user_id, days=30):
-    """Cached version of get_meal_details to improve performance"""
-    
+# Meals shown per page of the meal history
+MEALS_PER_PAGE = 5
+
+# Days of meal history shown until the user moves the slider
+DEFAULT_HISTORY_DAYS = 7
+
+@cached_fetch(MEALS, span=last_days('days'))
+def cached_meal_history(user_id, before_cursor, limit, days):
+    return get_meal_history(user_id, before_cursor, limit, days)
+
+@cached_fetch(MEALS)
+def cached_meal_foods(user_id, meal_ids):
+    return get_meal_foods(meal_ids)
+
+def prefetch_meal_logger_page(user_id):
     """
-    AI Prompt:
-    Write a Python function get_cached_meal_details(user_id, days=30) that implements a cached version of the get_meal_details function using Streamlit's cache_data decorator with a 5-minute time-to-live and hidden spinner. The function should accept a user ID and optional number of days parameter (defaulting to 30), and return cached meal details to improve performance when retrieving the same data multiple times.
+    Loads the first page of the meal history into the cache (see prefetch.py).
+
+    Args:
+        user_id (str): The user
     """
-    
-    return get_meal_details(user_id, days)
+    cached_meal_history(user_id, None, MEALS_PER_PAGE, DEFAULT_HISTORY_DAYS)
 
 def display_meal_logger_page(user_id):
     """
@@ -111,6 +125,7 @@ def display_meal_logger(user_id):
             # Store meal_id in session state for adding foods
             st.session_state.current_meal_id = meal_id
             st.session_state.show_food_search = True
+            start_meal(meal_id, user_id)
             # Force a rerun to show the food search section
             st.rerun()
         else:
@@ -118,11 +133,14 @@ def display_meal_logger(user_id):
     
     # Show food search after meal is created
     if 'show_food_search' in st.session_state and st.session_state.show_food_search:
-        display_food_search()
+        display_food_search(user_id)
 
-def display_food_search():
+def display_food_search(user_id):
     """
     Display interface for searching and adding foods to a meal
+    
+    Args:
+        user_id (str): The ID of the current user
     """
     
     """
@@ -179,14 +197,12 @@ def display_food_search():
                     )
                 
                 with col3:
-                    food_id = food_items[index]['food_id']
                     if st.button("Add", key=f"add_{index}"):
+                        builder = None
                         if 'current_meal_id' in st.session_state:
-                            success = add_food_to_meal(
-                                meal_id=st.session_state.current_meal_id,
-                                food_id=food_id,
-                                quantity=quantity
-                            )
+                            builder = get_meal_builder(st.session_state.current_meal_id, user_id)
+                        if builder is not None:
+                            success = add_food(builder, food_items[index], quantity)
                             
                             if success:
                                 st.success(f"Added {row['Food']} to meal.")
@@ -194,12 +210,14 @@ def display_food_search():
                                 st.rerun()
                             else:
                                 st.error("Failed to add food to meal.")
+                        else:
+                            st.error("Could not load the current meal. Please start a new meal and try again.")
                 
                 st.markdown("---")
     
     # Display current meal summary if a meal is in progress
     if 'current_meal_id' in st.session_state:
-        display_current_meal_summary(st.session_state.current_meal_id)
+        display_current_meal_summary(st.session_state.current_meal_id, user_id)
     
     # Finish meal button
     if st.button("Finish Logging Meal"):
@@ -207,36 +225,33 @@ def display_food_search():
             # Clear the session state to start fresh
             st.session_state.pop('current_meal_id', None)
             st.session_state.pop('show_food_search', None)
+            finish_meal()
             st.success("Meal logged successfully!")
             st.rerun()
 
-def display_current_meal_summary(meal_id):
+def display_current_meal_summary(meal_id, user_id):
     """
     Display summary of the current meal being logged
     
     Args:
         meal_id (str): ID of the current meal
+        user_id (str): The ID of the current user
     """
     try:
-        # Use cached version to get meal details
-        all_meals = get_cached_meal_details('user1', days=1)  # Use a default user_id and small time window
-        foods = [food for food in all_meals if food.get('meal_id') == meal_id]
+        # The session's builder already has every food added in this session
+        builder = get_meal_builder(meal_id, user_id)
+        foods = builder.foods if builder is not None else []
         
         if foods:
             st.subheader("Current Meal Summary")
             
-            # Calculate totals
-            total_calories = sum(food.get('total_calories', 0) for food in foods)
-            total_protein = sum(food.get('total_protein_grams', 0) for food in foods)
-            total_carbs = sum(food.get('total_carbs_grams', 0) for food in foods)
-            total_fat = sum(food.get('total_fat_grams', 0) for food in foods)
-            
             # Display totals
+            totals = builder.totals()
             col1, col2, col3, col4 = st.columns(4)
-            col1.metric("Total Calories", f"{total_calories:.0f}")
-            col2.metric("Protein", f"{total_protein:.1f}g")
-            col3.metric("Carbs", f"{total_carbs:.1f}g")
-            col4.metric("Fat", f"{total_fat:.1f}g")
+            col1.metric("Total Calories", f"{totals['total_calories']:.0f}")
+            col2.metric("Protein", f"{totals['total_protein']:.1f}g")
+            col3.metric("Carbs", f"{totals['total_carbs']:.1f}g")
+            col4.metric("Fat", f"{totals['total_fat']:.1f}g")
             
             # Display foods in the meal
             st.write("Foods in this meal:")
@@ -396,84 +411,50 @@ def display_meal_history(user_id):
     
     """
     AI Prompt:
-    Write a Python function display_meal_history(user_id) that shows a paginated history of user meals with a date range slider, nutritional summaries, and expandable details for each meal. The function should process meal data to group foods by meal ID, calculate total nutritional values for each meal, implement pagination controls with proper state management, and handle exceptions gracefully without exposing technical details to the user.
+    Write a Python function display_meal_history(user_id) that shows a paginated history of user meals with a date range slider, nutritional summaries, and expandable details for each meal. The function should fetch one page of meals at a time with their totals already summed in SQL, page with a keyset cursor (meal time and meal ID) kept in session state per user and date range, load the foods of a meal only when the user asks to see them, and handle exceptions gracefully without exposing technical details to the user.
     """
     
     try:
         st.header("Meal History")
         
         # Date selector for history
-        days = st.slider("Show meals from the last", min_value=1, max_value=30, value=7, step=1, key="history_days")
+        days = st.slider("Show meals from the last", min_value=1, max_value=30, value=DEFAULT_HISTORY_DAYS, step=1, key="history_days")
         
-        # Use cached version of get_meal_details
-        meal_data = get_cached_meal_details(user_id=user_id, days=days)
+        # Cursors of the pages visited so far; the last one is the current page.
+        # A new user or range starts again from the first page.
+        if st.session_state.get('meal_history_range') != (user_id, days) or 'meal_history_cursors' not in st.session_state:
+            st.session_state.meal_history_range = (user_id, days)
+            st.session_state.meal_history_cursors = [None]
+        cursors = st.session_state.meal_history_cursors
         
-        if not meal_data:
+        page = cached_meal_history(user_id, cursors[-1], MEALS_PER_PAGE, days)
+        meals = page['meals']
+        
+        if not meals and len(cursors) == 1:
             st.info("No meal data available for the selected period.")
             return
         
-        # Group by meal_id to consolidate foods in the same meal - do this processing once
-        meals_by_id = {}
-        for food in meal_data:
-            meal_id = food.get('meal_id')
-            meal_time = food.get('meal_time')
-            meal_type = food.get('meal_type')
-            meal_name = food.get('meal_name')
-            
-            if meal_id not in meals_by_id:
-                meals_by_id[meal_id] = {
-                    'meal_id': meal_id,
-                    'meal_time': meal_time,
-                    'meal_type': meal_type,
-                    'meal_name': meal_name,
-                    'foods': [],
-                    'total_calories': 0,
-                    'total_protein': 0,
-                    'total_carbs': 0,
-                    'total_fat': 0
-                }
-            
-            meals_by_id[meal_id]['foods'].append(food)
-            meals_by_id[meal_id]['total_calories'] += food.get('total_calories', 0)
-            meals_by_id[meal_id]['total_protein'] += food.get('total_protein_grams', 0)
-            meals_by_id[meal_id]['total_carbs'] += food.get('total_carbs_grams', 0)
-            meals_by_id[meal_id]['total_fat'] += food.get('total_fat_grams', 0)
-        
-        # Convert to list and sort by meal time (most recent first)
-        meals = list(meals_by_id.values())
-        meals.sort(key=lambda x: x['meal_time'], reverse=True)
-        
-        # Implement pagination
-        items_per_page = 5
-        if 'meal_history_page' not in st.session_state:
-            st.session_state.meal_history_page = 0
-        
-        # Calculate total pages
-        total_pages = len(meals) // items_per_page + (1 if len(meals) % items_per_page > 0 else 0)
-        
         # Navigation
         col1, col2, col3 = st.columns([1, 3, 1])
         
         with col1:
-            if st.button("← Previous", disabled=(st.session_state.meal_history_page <= 0)):
-                st.session_state.meal_history_page -= 1
+            if st.button("← Previous", disabled=(len(cursors) <= 1)):
+                cursors.pop()
                 st.rerun()
         
         with col2:
-            st.write(f"Page {st.session_state.meal_history_page + 1} of {max(1, total_pages)}")
+            st.write(f"Page {len(cursors)}")
         
         with col3:
-            if st.button("Next →", disabled=(st.session_state.meal_history_page >= total_pages - 1)):
-                st.session_state.meal_history_page += 1
+            if st.button("Next →", disabled=(page['next_cursor'] is None)):
+                cursors.append(page['next_cursor'])
                 st.rerun()
         
-        # Get the current page of meals
-        start_idx = st.session_state.meal_history_page * items_per_page
-        end_idx = min(start_idx + items_per_page, len(meals))
-        current_page_meals = meals[start_idx:end_idx]
-        
-        # Display meals for the current page
-        for meal in current_page_meals:
+        # One expander per meal; foods are only loaded for the meals whose
+        # "Show foods" toggle is on (a session-state checkbox, so this also
+        # works on Streamlit versions without expander state)
+        food_slots = {}
+        for meal in meals:
             try:
                 # Format the date and time
                 meal_datetime = datetime.datetime.fromisoformat(meal['meal_time'])
@@ -485,24 +466,31 @@ def display_meal_history(user_id):
                 if meal['meal_name']:
                     meal_title += f" ({meal['meal_name']})"
                 
-                with st.expander(meal_title):
+                toggle_key = f"meal_history_foods_{meal['meal_id']}"
+                with st.expander(meal_title, expanded=st.session_state.get(toggle_key, False)):
                     # Display meal summary
                     col1, col2, col3, col4 = st.columns(4)
                     col1.metric("Total Calories", f"{meal['total_calories']:.0f}")
                     col2.metric("Protein", f"{meal['total_protein']:.1f}g")
                     col3.metric("Carbs", f"{meal['total_carbs']:.1f}g")
                     col4.metric("Fat", f"{meal['total_fat']:.1f}g")
-                    
+                    if st.checkbox("Show foods", key=toggle_key):
+                        food_slots[meal['meal_id']] = st.container()
+            except Exception as e:
+                # Log error but don't show technical details to user
+                print(f"Error displaying meal: {str(e)}")
+                st.info("Unable to display this meal.")
+        
+        if food_slots:
+            foods_by_meal = cached_meal_foods(user_id, tuple(food_slots))
+            for meal_id, slot in food_slots.items():
+                with slot:
                     # Display foods in the meal
                     st.write("Foods in this meal:")
                     
-                    for food in meal['foods']:
+                    for food in foods_by_meal.get(meal_id, []):
                         st.write(f"**{food.get('food_name', 'Unknown')}** ({food.get('quantity', 0)} servings)")
                         st.caption(f"{food.get('total_calories', 0):.0f} cal, P: {food.get('total_protein_grams', 0):.1f}g, C: {food.get('total_carbs_grams', 0):.1f}g, F: {food.get('total_fat_grams', 0):.1f}g")
-            except Exception as e:
-                # Log error but don't show technical details to user
-                print(f"Error displaying meal: {str(e)}")
-                st.info("Unable to display this meal.")
     
     except Exception as e:
         # Log the error but don't show technical details to the user
@@ -10,7 +10,12 @@
 from internals import create_component
 import streamlit as st
 import pydeck as pdk
-from data_fetcher import get_user_workouts, get_user_profile, get_genai_advice, get_user_posts
+import pandas as pd
+import math
+from data_fetcher import get_user_workouts, get_user_profile, get_genai_advice, get_user_posts, get_nutrition_data
+from coach_chat import ConversationMemory, build_fitness_features, ask_coach
+from history_index import get_user_index, index_workouts, index_nutrition_days
+from workout_records import as_workout_record
 from datetime import datetime
 import folium
 from streamlit_folium import st_folium
@@ -113,6 +118,68 @@ def display_post(post_data):
 
 
 
+# Number of workouts rendered per page in workout lists
+WORKOUT_PAGE_SIZE = 10
+
+
+def get_workout_page(items, state_key, page_size=WORKOUT_PAGE_SIZE):
+    """
+    Returns the workouts on the current page and renders the paging controls.
+
+    The page cursor is kept in st.session_state[state_key], so each rerun only
+    renders one page no matter how long the workout history is.
+
+    Args:
+        items (list): All workouts
+        state_key (str): Session state key holding the page cursor
+        page_size (int): Number of workouts per page
+
+    Returns:
+        tuple: (workouts on the current page, index of the first one in items)
+    """
+    total = len(items)
+    page_count = max(1, -(-total // page_size))
+    page = min(max(st.session_state.get(state_key, 0), 0), page_count - 1)
+
+    if page_count > 1:
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col1:
+            if st.button("◀ Previous", key=f"{state_key}_prev", disabled=page == 0):
+                page -= 1
+        with col3:
+            if st.button("Next ▶", key=f"{state_key}_next", disabled=page == page_count - 1):
+                page += 1
+        with col2:
+            st.caption(f"Page {page + 1} of {page_count} ({total} workouts)")
+
+    st.session_state[state_key] = page
+    start = page * page_size
+    return items[start:start + page_size], start
+
+
+def get_expanded_workout(state_key, offset, count):
+    """
+    Returns the index of the workout whose maps are shown on the current page.
+
+    Defaults to the first workout on the page when the stored one is not on it.
+    """
+    expanded = st.session_state.get(state_key)
+    if not isinstance(expanded, int) or not offset <= expanded < offset + count:
+        expanded = offset
+    return expanded
+
+
+def display_location_preview(start_coords, end_coords):
+    """Shows start and end coordinates as text instead of interactive maps."""
+    start_lat, start_lng = start_coords
+    end_lat, end_lng = end_coords
+    st.markdown(
+        f"<p>📍 <strong>Start</strong> {start_lat:.4f}, {start_lng:.4f} &nbsp;→&nbsp; "
+        f"🏁 <strong>End</strong> {end_lat:.4f}, {end_lng:.4f}</p>",
+        unsafe_allow_html=True,
+    )
+
+
 def display_activity_summary(workouts_list):
     '''
     Prompt:
@@ -120,6 +187,9 @@ def display_activity_summary(workouts_list):
         app that shows workout details? I need a function that displays workout metrics, 
         timestamps, and uses folium to render start and end location maps for each workout. 
         The function should handle edge cases like missing data and maintain session state.
+
+    Workouts are shown one page at a time and only one workout per page gets
+    interactive maps; the others show a static preview with a "Show maps" button.
     '''
 
     if workouts_list is None or len(workouts_list) == 0:
@@ -130,29 +200,25 @@ def display_activity_summary(workouts_list):
     if 'map_rendered' not in st.session_state:
         st.session_state.map_rendered = False
 
-    # Process each workout in the list
-    for i, workout in enumerate(workouts_list):
+    page_workouts, offset = get_workout_page(workouts_list, 'activity_summary_page')
+    expanded = get_expanded_workout('activity_summary_expanded', offset, len(page_workouts))
+
+    # Process each workout on the current page
+    for i, workout in enumerate(page_workouts, start=offset):
         try:
+            # Records from get_user_workouts already carry parsed timestamps
+            record = as_workout_record(workout)
+
             # Extract workout ID and number
-            workout_id = workout.get('workout_id', f'workout{i+1}')
+            workout_id = record.workout_id if record.workout_id is not None else f'workout{i+1}'
             workout_num = workout_id.replace('workout', '') if 'workout' in workout_id else i+1
 
-            # Process timestamps and calculate duration
-            start_time_str = workout.get('start_timestamp')
-            end_time_str = workout.get('end_timestamp')
-
-            if start_time_str and end_time_str:
-                # Parse timestamps
-                start_time = datetime.strptime(start_time_str, '%Y-%m-%d %H:%M:%S')
-                end_time = datetime.strptime(end_time_str, '%Y-%m-%d %H:%M:%S')
-
+            if record.start_time and record.end_time:
                 # Format for display
-                start_display = start_time.strftime('%-I:%M%p').lower()
-                end_display = end_time.strftime('%-I:%M%p').lower()
+                start_display = record.start_time.strftime('%-I:%M%p').lower()
+                end_display = record.end_time.strftime('%-I:%M%p').lower()
 
-                # Calculate duration
-                duration = end_time - start_time
-                hours, remainder = divmod(duration.seconds, 3600)
+                hours, remainder = divmod(record.duration.seconds, 3600)
                 minutes, seconds = divmod(remainder, 60)
                 duration_str = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
             else:
@@ -161,11 +227,11 @@ def display_activity_summary(workouts_list):
                 duration_str = "00:00:00"
 
             # Extract workout metrics with defaults for missing data
-            distance = workout.get('distance', 0)
-            steps = workout.get('steps', 0)
-            calories = workout.get('calories_burned', 0)
-            start_coords = workout.get('start_lat_lng', (0, 0))
-            end_coords = workout.get('end_lat_lng', (0, 0))
+            distance = record.distance
+            steps = record.steps
+            calories = record.calories_burned
+            start_coords = record.start_lat_lng
+            end_coords = record.end_lat_lng
 
             # Display workout header with icon
             col1, col2 = st.columns([1, 3])
@@ -217,48 +283,55 @@ def display_activity_summary(workouts_list):
                        unsafe_allow_html=True)
             st.markdown("<hr>", unsafe_allow_html=True)
 
-            # Start and end locations with Folium maps
-            col1, col2 = st.columns(2)
+            if i != expanded:
+                # Static preview; interactive maps are only built for the expanded workout
+                display_location_preview(start_coords, end_coords)
+                if st.button("Show maps", key=f"show_maps_{workout_id}_{i}"):
+                    st.session_state['activity_summary_expanded'] = i
+                    st.rerun()
+            else:
+                # Start and end locations with Folium maps
+                col1, col2 = st.columns(2)
 
-            with col1:
-                st.markdown("<p><strong>Start Location</strong></p>", unsafe_allow_html=True)
+                with col1:
+                    st.markdown("<p><strong>Start Location</strong></p>", unsafe_allow_html=True)
 
-                # Create a Folium map for start location
-                start_lat, start_lng = start_coords
-                start_map = folium.Map(location=[start_lat, start_lng], zoom_start=14)
+                    # Create a Folium map for start location
+                    start_lat, start_lng = start_coords
+                    start_map = folium.Map(location=[start_lat, start_lng], zoom_start=14)
 
-                # Add a marker for the start position
-                folium.Marker(
-                    [start_lat, start_lng],
-                    popup="Start",
-                    icon=folium.Icon(color="green", icon="play"),
-                ).add_to(start_map)
+                    # Add a marker for the start position
+                    folium.Marker(
+                        [start_lat, start_lng],
+                        popup="Start",
+                        icon=folium.Icon(color="green", icon="play"),
+                    ).add_to(start_map)
 
-                # Display the map with a unique key
-                st_folium(start_map, width=300, height=150, key=f"start_map_{workout_id}_{i}", returned_objects=[])
+                    # Display the map with a unique key
+                    st_folium(start_map, width=300, height=150, key=f"start_map_{workout_id}_{i}", returned_objects=[])
 
-            with col2:
-                st.markdown("<p><strong>End Location</strong></p>", unsafe_allow_html=True)
+                with col2:
+                    st.markdown("<p><strong>End Location</strong></p>", unsafe_allow_html=True)
 
-                # Create a Folium map for end location
-                end_lat, end_lng = end_coords
-                end_map = folium.Map(location=[end_lat, end_lng], zoom_start=14)
+                    # Create a Folium map for end location
+                    end_lat, end_lng = end_coords
+                    end_map = folium.Map(location=[end_lat, end_lng], zoom_start=14)
 
-                # Add a marker for the end position
-                folium.Marker(
-                    [end_lat, end_lng],
-                    popup="End",
-                    icon=folium.Icon(color="red", icon="stop"),
-                ).add_to(end_map)
+                    # Add a marker for the end position
+                    folium.Marker(
+                        [end_lat, end_lng],
+                        popup="End",
+                        icon=folium.Icon(color="red", icon="stop"),
+                    ).add_to(end_map)
 
-                # Display the map with a unique key
-                st_folium(end_map, width=300, height=150, key=f"end_map_{workout_id}_{i}", returned_objects=[])
+                    # Display the map with a unique key
+                    st_folium(end_map, width=300, height=150, key=f"end_map_{workout_id}_{i}", returned_objects=[])
 
             # Close the details container
             st.markdown("</div>", unsafe_allow_html=True)
 
             # Add spacing between workouts
-            if i < len(workouts_list) - 1:
+            if i < offset + len(page_workouts) - 1:
                 st.markdown("<br>", unsafe_allow_html=True)
 
         except Exception as e:
@@ -271,13 +344,108 @@ def display_activity_summary(workouts_list):
 
 
 
-def display_recent_workouts(user_id):
-    """Displays a summary of the user's recent workouts."""
+def fit_view_state(lats, lngs, padding=1.2):
+    """
+    Returns a pydeck ViewState that fits all the given points.
+
+    Args:
+        lats (list): Latitudes
+        lngs (list): Longitudes
+        padding (float): Extra margin around the bounding box
+
+    Returns:
+        pdk.ViewState: Centered on the bounding box, zoomed to contain it
+    """
+    min_lat, max_lat = min(lats), max(lats)
+    min_lng, max_lng = min(lngs), max(lngs)
+    # Web mercator: each zoom level halves the visible span (360 degrees at zoom 0)
+    span = max(max_lat - min_lat, max_lng - min_lng, 1e-4) * padding
+    zoom = max(1, min(15, math.log2(360 / span) - 1))
+    return pdk.ViewState(
+        latitude=(min_lat + max_lat) / 2,
+        longitude=(min_lng + max_lng) / 2,
+        zoom=zoom,
+        pitch=0,
+    )
+
+
+def build_workouts_deck(workouts, selected_id=None):
+    """
+    Builds a single pydeck map with the start/end points and paths of all workouts.
+
+    Each layer holds one column-oriented table for every workout, so the page
+    needs one WebGL context no matter how many workouts are shown.
+
+    Args:
+        workouts (list): Workouts as returned by get_user_workouts
+        selected_id (str, optional): Workout to highlight
+
+    Returns:
+        pdk.Deck: The combined map
+    """
+    ids, start_lats, start_lngs, end_lats, end_lngs = [], [], [], [], []
+    for workout in workouts:
+        start_lat, start_lng = tuple(workout["start_lat_lng"])
+        end_lat, end_lng = tuple(workout["end_lat_lng"])
+        ids.append(workout["workout_id"])
+        start_lats.append(start_lat)
+        start_lngs.append(start_lng)
+        end_lats.append(end_lat)
+        end_lngs.append(end_lng)
+
+    selected = [workout_id == selected_id for workout_id in ids]
+
+    points = pd.DataFrame({
+        "workout_id": ids * 2,
+        "lat": start_lats + end_lats,
+        "lon": start_lngs + end_lngs,
+        # Green for start, red for end
+        "color": [(0, 255, 0)] * len(ids) + [(255, 0, 0)] * len(ids),
+        "radius": [90 if s else 40 for s in selected] * 2,
+    })
+    paths = pd.DataFrame({
+        "workout_id": ids,
+        "start": list(zip(start_lngs, start_lats)),
+        "end": list(zip(end_lngs, end_lats)),
+        # Selected workout in orange, the rest in blue
+        "color": [(255, 140, 0) if s else (0, 0, 255) for s in selected],
+        "width": [8 if s else 3 for s in selected],
+    })
+
+    return pdk.Deck(
+        initial_view_state=fit_view_state(start_lats + end_lats, start_lngs + end_lngs),
+        layers=[
+            # Start & End Points
+            pdk.Layer(
+                "ScatterplotLayer",
+                data=points,
+                get_position=["lon", "lat"],
+                get_color="color",
+                get_radius="radius",
+            ),
+            # Path Lines
+            pdk.Layer(
+                "LineLayer",
+                data=paths,
+                get_source_position="start",
+                get_target_position="end",
+                get_color="color",
+                get_width="width",
+            ),
+        ],
+    )
+
+
+def display_recent_workouts(user_id, workouts=None, user_profile=None):
+    """Displays a summary of the user's recent workouts on one combined map.
+    Callers holding cached workouts or profile can pass them in."""
     # Fetch workouts
-    workouts = get_user_workouts(user_id)
+    if workouts is None:
+        workouts = get_user_workouts(user_id)
 
     # Fetch user profile
-    user_profile = get_user_profile(user_id)
+    if user_profile is None:
+        user_profile = get_user_profile(user_id)
 
     # Display user info
     st.sidebar.image(user_profile["profile_image"], width=100)
@@ -290,6 +458,17 @@ def display_recent_workouts(user_id):
         st.write("No workouts available.")
         return
 
+    labels = {workout['workout_id']: f"{workout['start_timestamp']} ({workout['distance']} km)" for workout in workouts}
+    selected_id = st.selectbox(
+        "Highlight workout",
+        options=list(labels),
+        format_func=labels.get,
+        key=f"recent_workout_{user_id}",
+    )
+
+    # One deck for all workouts instead of one per workout
+    st.pydeck_chart(build_workouts_deck(workouts, selected_id))
+
     for workout in workouts:
         #st.subheader(f"Workout ID: {workout['workout_id']}")
         st.write(f"**Start Time:** {workout['start_timestamp']}")
@@ -298,45 +477,6 @@ def display_recent_workouts(user_id):
         st.write(f"**Total Steps:** {workout['steps']}")
         st.write(f"**Calories Burned:** {workout['calories_burned']} kcal")
 
-        # Unpack start and end coordinates, converting lists to tuples
-        start_lat, start_lng = tuple(workout["start_lat_lng"])
-        end_lat, end_lng = tuple(workout["end_lat_lng"])
-
-        # Create a Pydeck map with a line connecting start and end points
-        workout_map = pdk.Deck(
-            initial_view_state=pdk.ViewState(
-                latitude=(start_lat + end_lat) / 2,
-                longitude=(start_lng + end_lng) / 2,
-                zoom=13,
-                pitch=0,
-            ),
-            layers=[
-                # Start & End Points
-                pdk.Layer(
-                    "ScatterplotLayer",
-                    data=[
-                        {"lat": start_lat, "lon": start_lng, "color": (0, 255, 0)},  # Green for start
-                        {"lat": end_lat, "lon": end_lng, "color": (255, 0, 0)},       # Red for end
-                    ],
-                    get_position=["lon", "lat"],
-                    get_color="color",
-                    get_radius=50,
-                ),
-                # Path Line
-                pdk.Layer(
-                    "LineLayer",
-                    data=[{"start": (start_lng, start_lat), "end": (end_lng, end_lat)}],
-                    get_source_position="start",
-                    get_target_position="end",
-                    get_color=(0, 0, 255),  # Blue Line as a tuple
-                    get_width=4,
-                ),
-            ],
-        )
-
-        # Display the map
-        st.pydeck_chart(workout_map)
-
 # Streamlit UI
 
 def display_genai_advice(user_id):
@@ -498,3 +638,74 @@ def display_genai_advice(user_id):
                     st.image(image, width=200)
                 except:
                     st.warning("Image could not be displayed")
+
+
+def display_coach_chat(user_id):
+    """
+    Displays an interactive Q&A chat with the AI coach.
+
+    The user's fitness features are computed once per session and the
+    conversation is kept in a compact rolling memory, so follow-up questions
+    do not resend the raw workout history. Each question is sent with the
+    few history entries most relevant to it.
+
+    Parameters:
+        user_id (str): The ID of the user asking questions
+    """
+    st.markdown("### 💬 Ask Your Coach")
+
+    memory_key = f"coach_memory_{user_id}"
+    features_key = f"coach_features_{user_id}"
+    history_key = f"coach_history_{user_id}"
+
+    if memory_key not in st.session_state:
+        st.session_state[memory_key] = ConversationMemory()
+        st.session_state[history_key] = []
+
+    index_key = f"coach_index_{user_id}"
+    index = get_user_index(user_id)
+
+    # A new index or revision means it was evicted or the user's history changed since
+    indexed = (index, index.revision)
+    if features_key not in st.session_state or st.session_state.get(index_key) != indexed:
+        try:
+            workouts = get_user_workouts(user_id)
+            st.session_state[features_key] = build_fitness_features(workouts)
+            # Only workouts and days not seen before are added to the index
+            index_workouts(index, workouts)
+            index_nutrition_days(index, get_nutrition_data(user_id, 30))
+            st.session_state[index_key] = indexed
+        except Exception as e:
+            print(f"Error building coach features: {str(e)}")
+            st.session_state[features_key] = build_fitness_features([])
+
+    # Replay the conversation so far
+    for role, text in st.session_state[history_key]:
+        with st.chat_message(role):
+            st.write(text)
+
+    question = st.chat_input("Ask a fitness question...")
+    if not question:
+        return
+
+    with st.chat_message("user"):
+        st.write(question)
+
+    try:
+        answer, _ = ask_coach(
+            user_id,
+            question,
+            st.session_state[memory_key],
+            st.session_state[features_key],
+            index=index,
+        )
+    except Exception as e:
+        print(f"Error answering coach question: {str(e)}")
+        st.error("The coach couldn't answer right now. Please try again.")
+        return
+
+    with st.chat_message("assistant"):
+        st.write(answer)
+
+    st.session_state[history_key].append(("user", question))
+    st.session_state[history_key].append(("assistant", answer))
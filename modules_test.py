@@ -11,6 +11,7 @@ import streamlit as st
 from unittest.mock import patch, MagicMock
 from data_fetcher import get_user_workouts
 from modules import display_post, display_activity_summary, display_genai_advice, display_recent_workouts
+from modules import get_workout_page, get_expanded_workout, build_workouts_deck
 
 
 # python3 -m unittest modules_test.py
@@ -938,5 +939,108 @@ class TestDisplayActivitySummary(unittest.TestCase):
 
 
 
+class TestWorkoutPagination(unittest.TestCase):
+    """Tests for the paged, lazily mapped workout list."""
+
+    def setUp(self):
+        for key in ('test_page', 'activity_summary_page', 'activity_summary_expanded'):
+            if key in st.session_state:
+                del st.session_state[key]
+
+    def _workouts(self, count):
+        return [{
+            'workout_id': f'workout{i}',
+            'start_timestamp': '2025-03-20 10:00:00',
+            'end_timestamp': '2025-03-20 11:00:00',
+            'distance': 5.0,
+            'steps': 10000,
+            'calories_burned': 500,
+            'start_lat_lng': (40.7128, -74.0060),
+            'end_lat_lng': (40.7138, -74.0070),
+        } for i in range(count)]
+
+    def test_single_page_has_no_controls(self):
+        with patch("streamlit.button") as mock_button:
+            items, offset = get_workout_page(list(range(5)), 'test_page', page_size=10)
+        self.assertEqual(items, list(range(5)))
+        self.assertEqual(offset, 0)
+        mock_button.assert_not_called()
+
+    def test_cursor_selects_page(self):
+        st.session_state['test_page'] = 2
+        with patch("streamlit.columns", return_value=(MagicMock(), MagicMock(), MagicMock())), \
+                patch("streamlit.button", return_value=False), patch("streamlit.caption"):
+            items, offset = get_workout_page(list(range(25)), 'test_page', page_size=10)
+        self.assertEqual(items, list(range(20, 25)))
+        self.assertEqual(offset, 20)
+
+    def test_cursor_is_clamped(self):
+        st.session_state['test_page'] = 99
+        with patch("streamlit.columns", return_value=(MagicMock(), MagicMock(), MagicMock())), \
+                patch("streamlit.button", return_value=False), patch("streamlit.caption"):
+            items, _ = get_workout_page(list(range(25)), 'test_page', page_size=10)
+        self.assertEqual(items, list(range(20, 25)))
+        self.assertEqual(st.session_state['test_page'], 2)
+
+    def test_expanded_defaults_to_first_on_page(self):
+        self.assertEqual(get_expanded_workout('activity_summary_expanded', 10, 10), 10)
+        st.session_state['activity_summary_expanded'] = 13
+        self.assertEqual(get_expanded_workout('activity_summary_expanded', 10, 10), 13)
+
+    @patch("modules.st_folium")
+    def test_maps_rendered_for_one_workout_only(self, mock_st_folium):
+        """Long histories render a single page and only one pair of maps."""
+        with patch("streamlit.markdown"), patch("streamlit.caption"), \
+                patch("streamlit.button", return_value=False), \
+                patch("streamlit.columns", side_effect=lambda spec: tuple(
+                    MagicMock() for _ in range(spec if isinstance(spec, int) else len(spec)))), \
+                patch("modules.display_location_preview") as mock_preview:
+            display_activity_summary(self._workouts(300))
+
+        self.assertEqual(mock_st_folium.call_count, 2)
+        self.assertEqual(mock_preview.call_count, 9)
+
+
+class TestBuildWorkoutsDeck(unittest.TestCase):
+    """Tests for the combined recent workouts map."""
+
+    def setUp(self):
+        self.workouts = [
+            {'workout_id': 'workout1', 'start_lat_lng': (40.0, -74.0), 'end_lat_lng': (40.01, -74.01)},
+            {'workout_id': 'workout2', 'start_lat_lng': [41.0, -73.0], 'end_lat_lng': [41.02, -73.02]},
+            {'workout_id': 'workout3', 'start_lat_lng': (40.5, -73.5), 'end_lat_lng': (40.5, -73.5)},
+        ]
+
+    def test_one_deck_for_all_workouts(self):
+        deck = build_workouts_deck(self.workouts)
+        points, paths = deck.layers
+        self.assertEqual(len(points.data), 6)
+        self.assertEqual(len(paths.data), 3)
+
+    def test_view_fits_bounding_box(self):
+        view = build_workouts_deck(self.workouts).initial_view_state
+        self.assertAlmostEqual(view.latitude, 40.51)
+        self.assertAlmostEqual(view.longitude, -73.505)
+
+    def test_selected_workout_is_highlighted(self):
+        _, paths = build_workouts_deck(self.workouts, selected_id='workout2').layers
+        widths = {row['workout_id']: row['width'] for row in paths.data}
+        self.assertGreater(widths['workout2'], widths['workout1'])
+
+    @patch('modules.get_user_profile')
+    @patch('modules.get_user_workouts')
+    def test_display_renders_single_chart(self, mock_get_workouts, mock_get_profile):
+        mock_get_workouts.return_value = [
+            dict(w, start_timestamp='2025-03-20 10:00:00', end_timestamp='2025-03-20 11:00:00',
+                 distance=5.0, steps=1000, calories_burned=100)
+            for w in self.workouts
+        ]
+        mock_get_profile.return_value = {'profile_image': 'x.jpg', 'full_name': 'Remi', 'username': 'remi'}
+        with patch('modules.st') as mock_st:
+            mock_st.selectbox.return_value = 'workout1'
+            display_recent_workouts('user1')
+        mock_st.pydeck_chart.assert_called_once()
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -7,7 +7,43 @@ from datetime import datetime, timedelta
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from data_fetcher import get_nutrition_data, get_performance_metrics, get_nutrition_performance_correlation, get_meal_details
+from data_fetcher import get_nutrition_trend, get_cached_nutrition_data, get_cached_performance_metrics, get_nutrition_performance_correlation, get_cached_meal_details
+from workout_records import as_workout_record
+from nutrition_stats import compute_correlation_report, match_workout_meals
+from figure_cache import cached_figure, figure_cache_summary
+from fetch_cache import diagnostics_enabled
+from chart_reduction import DEFAULT_CHART_WIDTH, reduce_frame, webgl_traces
+
+# Display names for the metrics in the correlation heatmaps
+METRIC_LABELS = {
+    'total_calories': 'Calories',
+    'total_protein': 'Protein (g)',
+    'total_carbs': 'Carbs (g)',
+    'total_fat': 'Fat (g)',
+    'total_water_ml': 'Water (ml)',
+    'distance': 'Distance',
+    'steps': 'Steps',
+    'calories_burned': 'Calories Burned',
+}
+
+# Chart title prefixes for each rollup grain of the nutrition trends
+TREND_PERIOD_LABELS = {
+    'day': 'Daily',
+    'week': 'Weekly Average',
+    'month': 'Monthly Average',
+}
+
+def prefetch_nutrition_analytics_page(user_id):
+    """
+    Loads the per-user range caches the analytics tabs slice (see prefetch.py).
+
+    Args:
+        user_id (str): The user
+    """
+    get_cached_nutrition_data(user_id)
+    get_cached_performance_metrics(user_id)
+    get_cached_meal_details(user_id)
+
 
 def display_nutrition_analytics_page(user_id):
     """
@@ -35,6 +71,10 @@ def display_nutrition_analytics_page(user_id):
     
     with tab3:
         display_detailed_analysis(user_id)
+    
+    # Chart reuse across reruns (see figure_cache), for operators only
+    if diagnostics_enabled():
+        st.caption(figure_cache_summary())
 
 
 def display_correlation_analysis(user_id):
@@ -52,14 +92,14 @@ def display_correlation_analysis(user_id):
     # Date range selector
     col1, col2 = st.columns(2)
     with col1:
-        days = st.slider("Data period (days)", min_value=7, max_value=90, value=30, step=1)
+        days = st.slider("Data period (days)", min_value=7, max_value=730, value=30, step=1)
     
     with col2:
         st.info(f"Analyzing data from the last {days} days")
     
     # Get correlated data
     try:
-        correlated_data = get_nutrition_performance_correlation(user_id, days)
+        correlated_data = get_nutrition_performance_correlation(user_id, days, cached=True)
         
         if not correlated_data:
             st.warning("No data available for correlation analysis.")
@@ -112,66 +152,24 @@ def display_correlation_analysis(user_id):
         # Main correlation visualization
         st.subheader("How Nutrition Affects Your Workout Performance")
         
-        # Create Plotly figure with multiple traces
-        fig = make_subplots(rows=2, cols=2, 
-                            subplot_titles=("Calories & Performance", "Protein & Performance", 
-                                            "Carbs & Performance", "Water & Performance"))
-        
-        # 1. Calories vs Workout Performance
-        fig.add_trace(
-            go.Scatter(x=df['total_calories'], y=df['calories_burned'], mode='markers', 
-                       marker=dict(size=10, color='blue'), name='Calories Burned'),
-            row=1, col=1
-        )
-        
-        # 2. Protein vs Workout Performance
-        fig.add_trace(
-            go.Scatter(x=df['total_protein'], y=df['distance'], mode='markers', 
-                       marker=dict(size=10, color='green'), name='Distance'),
-            row=1, col=2
-        )
-        
-        # 3. Carbs vs Workout Performance
-        fig.add_trace(
-            go.Scatter(x=df['total_carbs'], y=df['steps'], mode='markers', 
-                       marker=dict(size=10, color='orange'), name='Steps'),
-            row=2, col=1
-        )
-        
-        # 4. Water vs Performance
-        fig.add_trace(
-            go.Scatter(x=df['total_water_ml'], y=df['calories_burned'], mode='markers', 
-                       marker=dict(size=10, color='cyan'), name='Calories Burned'),
-            row=2, col=2
-        )
-        
-        # Update layout
-        fig.update_layout(height=600, width=800, title_text="Nutrition & Performance Correlations", 
-                          showlegend=False)
-        
-        # Update axes titles
-        fig.update_xaxes(title_text="Calories Consumed", row=1, col=1)
-        fig.update_yaxes(title_text="Calories Burned", row=1, col=1)
-        
-        fig.update_xaxes(title_text="Protein (g)", row=1, col=2)
-        fig.update_yaxes(title_text="Distance (miles)", row=1, col=2)
-        
-        fig.update_xaxes(title_text="Carbs (g)", row=2, col=1)
-        fig.update_yaxes(title_text="Steps", row=2, col=1)
-        
-        fig.update_xaxes(title_text="Water (ml)", row=2, col=2)
-        fig.update_yaxes(title_text="Calories Burned", row=2, col=2)
+        # Scatter grid, rebuilt only when the matched data changes
+        fig = cached_figure(build_correlation_scatter, df)
         
         st.plotly_chart(fig, use_container_width=True)
         
+        # Full, lagged and rolling correlations in one vectorized pass (cached by data hash)
+        report = compute_correlation_report(correlated_data)
+        display_correlation_heatmaps(report)
+        
         # Display correlation insights
         st.subheader("Key Insights")
         
-        # Calculate correlations
-        corr_cal = df['total_calories'].corr(df['calories_burned'])
-        corr_protein = df['total_protein'].corr(df['distance'])
-        corr_carbs = df['total_carbs'].corr(df['steps'])
-        corr_water = df['total_water_ml'].corr(df['calories_burned'])
+        # Look up the highlighted correlations in the matrix
+        matrix = report['correlation']
+        corr_cal = matrix.loc['total_calories', 'calories_burned']
+        corr_protein = matrix.loc['total_protein', 'distance']
+        corr_carbs = matrix.loc['total_carbs', 'steps']
+        corr_water = matrix.loc['total_water_ml', 'calories_burned']
         
         # Function to format correlation values with user-friendly display
         def format_correlation(corr_value):
@@ -300,6 +298,116 @@ def display_correlation_analysis(user_id):
         st.error(f"An error occurred: {e}")
 
 
+def build_correlation_scatter(df):
+    """
+    Builds the 2x2 grid of nutrition vs. performance scatter plots
+
+    Args:
+        df (DataFrame): One row per day with nutrition and performance columns
+
+    Returns:
+        plotly.graph_objects.Figure
+    """
+    fig = make_subplots(rows=2, cols=2, 
+                        subplot_titles=("Calories & Performance", "Protein & Performance", 
+                                        "Carbs & Performance", "Water & Performance"))
+    
+    # 1. Calories vs Workout Performance
+    fig.add_trace(
+        go.Scatter(x=df['total_calories'], y=df['calories_burned'], mode='markers', 
+                   marker=dict(size=10, color='blue'), name='Calories Burned'),
+        row=1, col=1
+    )
+    
+    # 2. Protein vs Workout Performance
+    fig.add_trace(
+        go.Scatter(x=df['total_protein'], y=df['distance'], mode='markers', 
+                   marker=dict(size=10, color='green'), name='Distance'),
+        row=1, col=2
+    )
+    
+    # 3. Carbs vs Workout Performance
+    fig.add_trace(
+        go.Scatter(x=df['total_carbs'], y=df['steps'], mode='markers', 
+                   marker=dict(size=10, color='orange'), name='Steps'),
+        row=2, col=1
+    )
+    
+    # 4. Water vs Performance
+    fig.add_trace(
+        go.Scatter(x=df['total_water_ml'], y=df['calories_burned'], mode='markers', 
+                   marker=dict(size=10, color='cyan'), name='Calories Burned'),
+        row=2, col=2
+    )
+    
+    # Update layout
+    fig.update_layout(height=600, width=800, title_text="Nutrition & Performance Correlations", 
+                      showlegend=False)
+    
+    # Update axes titles
+    fig.update_xaxes(title_text="Calories Consumed", row=1, col=1)
+    fig.update_yaxes(title_text="Calories Burned", row=1, col=1)
+    
+    fig.update_xaxes(title_text="Protein (g)", row=1, col=2)
+    fig.update_yaxes(title_text="Distance (miles)", row=1, col=2)
+    
+    fig.update_xaxes(title_text="Carbs (g)", row=2, col=1)
+    fig.update_yaxes(title_text="Steps", row=2, col=1)
+    
+    fig.update_xaxes(title_text="Water (ml)", row=2, col=2)
+    fig.update_yaxes(title_text="Calories Burned", row=2, col=2)
+    
+    return webgl_traces(fig)
+
+
+def display_correlation_heatmaps(report):
+    """
+    Display heatmaps of a correlation report from nutrition_stats
+
+    Args:
+        report (dict): Output of compute_correlation_report
+    """
+    st.subheader("Correlation Matrix")
+
+    views = [("Same day", report['correlation'])]
+    views += [(f"{lag} day{'s' if lag > 1 else ''} before", frame) for lag, frame in report['lagged'].items()]
+
+    for tab, (label, frame) in zip(st.tabs([label for label, _ in views]), views):
+        with tab:
+            fig = cached_figure(build_correlation_heatmap, frame, label=label)
+            st.plotly_chart(fig, use_container_width=True)
+
+    rolling = report['rolling'].dropna(how='all')
+    if not rolling.empty:
+        with st.expander("How these relationships change over time"):
+            pairs = [('total_calories', 'calories_burned'), ('total_protein', 'distance'),
+                     ('total_carbs', 'steps'), ('total_water_ml', 'calories_burned')]
+            trend = rolling[pairs]
+            trend.columns = [f"{METRIC_LABELS[n]} & {METRIC_LABELS[p]}" for n, p in pairs]
+            trend = reduce_frame(trend, None, list(trend.columns))
+            fig = cached_figure(build_rolling_correlation, trend)
+            st.plotly_chart(fig, use_container_width=True)
+
+
+def build_correlation_heatmap(frame, label):
+    """Builds the heatmap of one correlation matrix (nutrition x performance)."""
+    return px.imshow(
+        frame.rename(index=METRIC_LABELS, columns=METRIC_LABELS),
+        zmin=-1, zmax=1,
+        color_continuous_scale='RdBu',
+        text_auto='.2f',
+        aspect='auto',
+        labels={'x': 'Workout performance', 'y': f'Nutrition ({label.lower()})', 'color': 'Correlation'},
+    )
+
+
+def build_rolling_correlation(trend):
+    """Builds the line chart of rolling correlations (one column per metric pair)."""
+    fig = px.line(trend, labels={'index': 'Date', 'value': 'Rolling correlation', 'variable': 'Metrics'})
+    fig.update_yaxes(range=[-1, 1])
+    return webgl_traces(fig)
+
+
 def display_nutrition_trends(user_id):
     """
     Display trends in nutrition data over time
@@ -313,64 +421,31 @@ def display_nutrition_trends(user_id):
     st.header("Nutrition Trends")
     
     # Date range selector
-    days = st.slider("Trend period (days)", min_value=7, max_value=90, value=30, step=1, key="trend_days")
+    days = st.slider("Trend period (days)", min_value=7, max_value=365, value=30, step=1, key="trend_days")
     
-    # Get nutrition data
-    nutrition_data = get_nutrition_data(user_id, days)
+    # Get nutrition data, pre-aggregated by day, week or month depending on the period
+    nutrition_data = get_nutrition_trend(user_id, days)
     
     if not nutrition_data:
         st.warning("No nutrition data available for the selected period.")
         return
     
-    # Convert to DataFrame
-    df = pd.DataFrame(nutrition_data)
+    # Convert to DataFrame; values are per-day averages within each bucket
+    df = pd.DataFrame(nutrition_data).dropna(subset=['total_calories'])
+    if df.empty:
+        st.warning("No nutrition data available for the selected period.")
+        return
     df['date'] = pd.to_datetime(df['date'])
+    period = TREND_PERIOD_LABELS[nutrition_data[0]['grain']]
+    if nutrition_data[0]['grain'] != 'day':
+        st.caption(f"Long periods are shown by {nutrition_data[0]['grain']}; values are averages per logged day.")
     
     # Create visualization for macronutrient distribution over time
     st.subheader("Macronutrient Distribution Over Time")
     
     # Create stacked area chart
-    fig = go.Figure()
-    
-    fig.add_trace(go.Scatter(
-        x=df['date'], y=df['total_protein'],
-        mode='lines',
-        stackgroup='one',
-        name='Protein',
-        line=dict(width=0.5, color='rgb(0, 128, 0)'),
-        fill='tonexty'
-    ))
-    
-    fig.add_trace(go.Scatter(
-        x=df['date'], y=df['total_carbs'],
-        mode='lines',
-        stackgroup='one',
-        name='Carbs',
-        line=dict(width=0.5, color='rgb(255, 165, 0)'),
-        fill='tonexty'
-    ))
-    
-    fig.add_trace(go.Scatter(
-        x=df['date'], y=df['total_fat'],
-        mode='lines',
-        stackgroup='one',
-        name='Fat',
-        line=dict(width=0.5, color='rgb(255, 0, 0)'),
-        fill='tonexty'
-    ))
-    
-    fig.update_layout(
-        title='Daily Macronutrients',
-        xaxis_title='Date',
-        yaxis_title='Grams',
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=1.02,
-            xanchor="right",
-            x=1
-        )
-    )
+    macros = reduce_frame(df[['date', 'total_protein', 'total_carbs', 'total_fat']], 'date', ['total_protein', 'total_carbs', 'total_fat'])
+    fig = cached_figure(build_macro_area_chart, macros, period=period)
     
     st.plotly_chart(fig, use_container_width=True)
     
@@ -378,27 +453,21 @@ def display_nutrition_trends(user_id):
     col1, col2 = st.columns(2)
     
     with col1:
-        # Calorie intake trend
-        fig_cal = px.line(df, x='date', y='total_calories', title='Daily Calorie Intake')
-        fig_cal.update_traces(line_color='#1E88E5')
-        
-        # Add target line
-        fig_cal.add_hline(y=2000, line_dash="dash", line_color="red",
-                      annotation_text="Target Calories", 
-                      annotation_position="bottom right")
-        
+        # Calorie intake trend with target line
+        fig_cal = cached_figure(
+            build_intake_trend, reduce_frame(df[['date', 'total_calories']], 'date', 'total_calories', width=DEFAULT_CHART_WIDTH // 2),
+            title=f'{period} Calorie Intake', line_color='#1E88E5',
+            target=2000, target_color='red', target_label='Target Calories',
+        )
         st.plotly_chart(fig_cal, use_container_width=True)
         
     with col2:
-        # Water intake trend
-        fig_water = px.line(df, x='date', y='total_water_ml', title='Daily Water Intake')
-        fig_water.update_traces(line_color='#00BCD4')
-        
-        # Add target line
-        fig_water.add_hline(y=2000, line_dash="dash", line_color="blue",
-                        annotation_text="Target Water Intake", 
-                        annotation_position="bottom right")
-        
+        # Water intake trend with target line
+        fig_water = cached_figure(
+            build_intake_trend, reduce_frame(df[['date', 'total_water_ml']], 'date', 'total_water_ml', width=DEFAULT_CHART_WIDTH // 2),
+            title=f'{period} Water Intake', line_color='#00BCD4',
+            target=2000, target_color='blue', target_label='Target Water Intake',
+        )
         st.plotly_chart(fig_water, use_container_width=True)
     
     # Calculate average macronutrient ratios
@@ -416,14 +485,7 @@ def display_nutrition_trends(user_id):
         # Display macronutrient distribution pie chart
         st.subheader("Average Macronutrient Distribution")
         
-        fig_pie = px.pie(
-            values=[protein_pct, carbs_pct, fat_pct],
-            names=['Protein', 'Carbs', 'Fat'],
-            color_discrete_sequence=['green', 'orange', 'red'],
-            title='Macronutrient Ratio'
-        )
-        
-        fig_pie.update_traces(textposition='inside', textinfo='percent+label')
+        fig_pie = cached_figure(build_macro_pie, [protein_pct, carbs_pct, fat_pct])
         
         st.plotly_chart(fig_pie, use_container_width=True)
         
@@ -452,6 +514,97 @@ def display_nutrition_trends(user_id):
             st.success("Your fat intake is in a healthy range.")
 
 
+def build_macro_area_chart(df, period):
+    """
+    Builds the stacked area chart of protein, carbs and fat over time
+
+    Args:
+        df (DataFrame): 'date', 'total_protein', 'total_carbs' and 'total_fat' columns
+        period (str): Title prefix for the trend grain (e.g. 'Daily')
+
+    Returns:
+        plotly.graph_objects.Figure
+    """
+    fig = go.Figure()
+    
+    fig.add_trace(go.Scatter(
+        x=df['date'], y=df['total_protein'],
+        mode='lines',
+        stackgroup='one',
+        name='Protein',
+        line=dict(width=0.5, color='rgb(0, 128, 0)'),
+        fill='tonexty'
+    ))
+    
+    fig.add_trace(go.Scatter(
+        x=df['date'], y=df['total_carbs'],
+        mode='lines',
+        stackgroup='one',
+        name='Carbs',
+        line=dict(width=0.5, color='rgb(255, 165, 0)'),
+        fill='tonexty'
+    ))
+    
+    fig.add_trace(go.Scatter(
+        x=df['date'], y=df['total_fat'],
+        mode='lines',
+        stackgroup='one',
+        name='Fat',
+        line=dict(width=0.5, color='rgb(255, 0, 0)'),
+        fill='tonexty'
+    ))
+    
+    fig.update_layout(
+        title=f'{period} Macronutrients',
+        xaxis_title='Date',
+        yaxis_title='Grams',
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=1.02,
+            xanchor="right",
+            x=1
+        )
+    )
+    
+    return fig
+
+
+def build_macro_pie(percentages):
+    """Builds the pie chart of the protein, carbs and fat percentages."""
+    fig = px.pie(
+        values=percentages,
+        names=['Protein', 'Carbs', 'Fat'],
+        color_discrete_sequence=['green', 'orange', 'red'],
+        title='Macronutrient Ratio'
+    )
+    fig.update_traces(textposition='inside', textinfo='percent+label')
+    return fig
+
+
+def build_intake_trend(df, title, line_color, target, target_color, target_label):
+    """
+    Builds a line chart of one intake metric with a dashed target line
+
+    Args:
+        df (DataFrame): 'date' and the metric column (the second column)
+        title (str): Chart title
+        line_color (str): Color of the metric line
+        target (float): Target value
+        target_color (str): Color of the target line
+        target_label (str): Annotation of the target line
+
+    Returns:
+        plotly.graph_objects.Figure
+    """
+    fig = px.line(df, x='date', y=df.columns[1], title=title)
+    fig.update_traces(line_color=line_color)
+    fig.add_hline(y=target, line_dash="dash", line_color=target_color,
+                  annotation_text=target_label,
+                  annotation_position="bottom right")
+    return webgl_traces(fig)
+
+
 def display_detailed_analysis(user_id):
     """
     Display detailed nutrition and meal analysis
@@ -468,7 +621,7 @@ def display_detailed_analysis(user_id):
     days = st.slider("Analysis period (days)", min_value=7, max_value=90, value=14, step=1, key="detailed_days")
     
     # Get meal details
-    meal_data = get_meal_details(user_id, days)
+    meal_data = get_cached_meal_details(user_id, days)
     
     if not meal_data:
         st.warning("No meal data available for the selected period.")
@@ -484,13 +637,7 @@ def display_detailed_analysis(user_id):
     
     meal_type_calories = df_meals.groupby('meal_type')['total_calories'].sum().reset_index()
     
-    fig_meal_types = px.bar(
-        meal_type_calories, 
-        x='meal_type', 
-        y='total_calories',
-        color='meal_type',
-        title='Calorie Distribution by Meal Type'
-    )
+    fig_meal_types = cached_figure(build_meal_type_chart, meal_type_calories)
     
     st.plotly_chart(fig_meal_types, use_container_width=True)
     
@@ -501,15 +648,7 @@ def display_detailed_analysis(user_id):
     food_counts.columns = ['Food', 'Count']
     food_counts = food_counts.head(10)  # Top 10 foods
     
-    fig_foods = px.bar(
-        food_counts, 
-        x='Count', 
-        y='Food',
-        orientation='h',
-        title='Your Most Frequently Consumed Foods',
-        color='Count',
-        color_continuous_scale='Viridis'
-    )
+    fig_foods = cached_figure(build_common_foods_chart, food_counts)
     
     st.plotly_chart(fig_foods, use_container_width=True)
     
@@ -522,17 +661,7 @@ def display_detailed_analysis(user_id):
     # Group by hour and meal type
     hour_meal_calories = df_meals.groupby(['hour', 'meal_type'])['total_calories'].sum().reset_index()
     
-    fig_timing = px.line(
-        hour_meal_calories,
-        x='hour',
-        y='total_calories',
-        color='meal_type',
-        title='Calorie Intake by Time of Day',
-        labels={'hour': 'Hour of Day', 'total_calories': 'Calories'}
-    )
-    
-    # Format x-axis to show hours
-    fig_timing.update_xaxes(tickvals=list(range(0, 24)), ticktext=[f"{h}:00" for h in range(0, 24)])
+    fig_timing = cached_figure(build_meal_timing_chart, hour_meal_calories)
     
     st.plotly_chart(fig_timing, use_container_width=True)
     
@@ -540,53 +669,26 @@ def display_detailed_analysis(user_id):
     st.subheader("Nutrition & Workout Timing Insights")
     
     # Get performance data
-    performance_data = get_performance_metrics(user_id, days)
+    performance_data = get_cached_performance_metrics(user_id, days)
     
     if performance_data:
         # Create DataFrame for workouts
-        df_workouts = pd.DataFrame(performance_data)
-        df_workouts['start_time'] = pd.to_datetime(df_workouts['start_timestamp'])
-        df_workouts['date'] = df_workouts['start_time'].dt.date
-        df_workouts['hour'] = df_workouts['start_time'].dt.hour
-        
-        # Generate pre-workout and post-workout nutrition insights
-        workout_dates = set(df_workouts['date'])
-        meals_on_workout_days = df_meals[df_meals['date'].isin(workout_dates)]
-        
-        # Analyze pre-workout nutrition
-        workout_meal_insights = []
-        
-        for idx, workout in df_workouts.iterrows():
-            workout_date = workout['date']
-            workout_hour = workout['hour']
-            
-            # Get meals before workout (same day)
-            pre_workout_meals = meals_on_workout_days[
-                (meals_on_workout_days['date'] == workout_date) & 
-                (meals_on_workout_days['meal_time'].dt.hour < workout_hour)
-            ]
-            
-            if not pre_workout_meals.empty:
-                # Calculate pre-workout nutrition
-                hours_before = [(workout_hour - meal_hour) for meal_hour in pre_workout_meals['meal_time'].dt.hour]
-                closest_meal_idx = hours_before.index(min(hours_before))
-                closest_meal = pre_workout_meals.iloc[closest_meal_idx]
-                
-                workout_meal_insights.append({
-                    'workout_date': workout_date,
-                    'workout_time': workout['start_time'],
-                    'calories_burned': workout['calories_burned'],
-                    'distance': workout['distance'],
-                    'pre_workout_meal_type': closest_meal['meal_type'],
-                    'pre_workout_calories': closest_meal['total_calories'],
-                    'pre_workout_carbs': closest_meal['total_carbs_grams'],
-                    'pre_workout_protein': closest_meal['total_protein_grams'],
-                    'hours_before_workout': min(hours_before)
-                })
-        
-        if workout_meal_insights:
-            df_insights = pd.DataFrame(workout_meal_insights)
-            
+        # Workout records already carry parsed start times and dates
+        df_workouts = pd.DataFrame([as_workout_record(w).as_row() for w in performance_data])
+        df_workouts['date'] = df_workouts['workout_date']
+        
+        # Closest meal before and after each workout in one as-of join
+        matches = match_workout_meals(df_workouts, df_meals)
+        df_insights = pd.DataFrame({
+            'workout_date': df_workouts['date'],
+            'workout_time': df_workouts['start_time'],
+            'calories_burned': df_workouts['calories_burned'],
+            'distance': df_workouts['distance'],
+        }).join(matches)
+        df_insights = df_insights[df_insights['minutes_before_workout'].notna()]
+        df_insights['hours_before_workout'] = df_insights['minutes_before_workout'] / 60
+        
+        if not df_insights.empty:
             # Analyze correlation between pre-workout nutrition and performance
             st.markdown("### Pre-Workout Nutrition Impact")
             
@@ -594,11 +696,8 @@ def display_detailed_analysis(user_id):
             
             with col1:
                 # Correlation: Pre-workout carbs vs. Distance
-                fig_carb_dist = px.scatter(
-                    df_insights, 
-                    x='pre_workout_carbs', 
-                    y='distance',
-                    color='hours_before_workout',
+                fig_carb_dist = cached_figure(
+                    build_insight_scatter, df_insights[['pre_workout_carbs', 'distance', 'hours_before_workout']],
                     title='Pre-Workout Carbs vs. Workout Distance',
                     labels={'pre_workout_carbs': 'Carbs before workout (g)', 'distance': 'Distance (miles)'}
                 )
@@ -606,11 +705,8 @@ def display_detailed_analysis(user_id):
             
             with col2:
                 # Correlation: Hours before workout vs. Calories burned
-                fig_timing_perf = px.scatter(
-                    df_insights, 
-                    x='hours_before_workout', 
-                    y='calories_burned',
-                    color='pre_workout_calories',
+                fig_timing_perf = cached_figure(
+                    build_insight_scatter, df_insights[['hours_before_workout', 'calories_burned', 'pre_workout_calories']],
                     title='Meal Timing vs. Calories Burned',
                     labels={'hours_before_workout': 'Hours before workout', 'calories_burned': 'Calories Burned'}
                 )
@@ -631,6 +727,11 @@ def display_detailed_analysis(user_id):
                 st.info("Higher carbohydrate intake before workouts is associated with better performance in your case")
             elif carb_corr < -0.3:
                 st.info("Your data suggests that too many carbs before a workout might be reducing your performance")
+
+            # Recovery meals matched after the end of each workout
+            post_minutes = matches['minutes_after_workout'].dropna()
+            if not post_minutes.empty:
+                st.info(f"**Post-workout meals:** You eat about {post_minutes.median():.0f} minutes after finishing a workout")
         else:
             st.info("Not enough data to analyze pre-workout nutrition patterns. Log more meals and workouts to get insights.")
     else:
@@ -638,4 +739,60 @@ def display_detailed_analysis(user_id):
         
     # Display raw data in expandable section
     with st.expander("View Raw Nutrition Data"):
-        st.dataframe(df_meals) 
\ No newline at end of file
+        st.dataframe(df_meals) 
+
+
+def build_meal_type_chart(meal_type_calories):
+    """Builds the bar chart of calories per meal type."""
+    return px.bar(
+        meal_type_calories, 
+        x='meal_type', 
+        y='total_calories',
+        color='meal_type',
+        title='Calorie Distribution by Meal Type'
+    )
+
+
+def build_common_foods_chart(food_counts):
+    """Builds the horizontal bar chart of the most frequently logged foods."""
+    return px.bar(
+        food_counts, 
+        x='Count', 
+        y='Food',
+        orientation='h',
+        title='Your Most Frequently Consumed Foods',
+        color='Count',
+        color_continuous_scale='Viridis'
+    )
+
+
+def build_meal_timing_chart(hour_meal_calories):
+    """Builds the line chart of calories by hour of day and meal type."""
+    fig = px.line(
+        hour_meal_calories,
+        x='hour',
+        y='total_calories',
+        color='meal_type',
+        title='Calorie Intake by Time of Day',
+        labels={'hour': 'Hour of Day', 'total_calories': 'Calories'}
+    )
+    
+    # Format x-axis to show hours
+    fig.update_xaxes(tickvals=list(range(0, 24)), ticktext=[f"{h}:00" for h in range(0, 24)])
+    return fig
+
+
+def build_insight_scatter(df, title, labels):
+    """
+    Builds a workout insight scatter plot
+
+    Args:
+        df (DataFrame): Three columns: x, y and the color scale
+        title (str): Chart title
+        labels (dict): Axis labels by column name
+
+    Returns:
+        plotly.graph_objects.Figure
+    """
+    x, y, color = df.columns
+    return webgl_traces(px.scatter(df, x=x, y=y, color=color, title=title, labels=labels))
@@ -172,6 +172,20 @@ class TestGetNutritionData(unittest.TestCase):
         # Allow 1 day difference due to potential time zone issues during testing
         self.assertLessEqual(abs(actual_date_diff.days - test_days), 1)
 
+    @patch("data_fetcher.get_bigquery_client")
+    def test_explicit_date_range(self, mock_get_client):
+        """Test that start_date and end_date override the days parameter"""
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        mock_client.query.return_value.result.return_value = []
+
+        data_fetcher.get_nutrition_data("user1", start_date=date(2024, 1, 1), end_date=date(2024, 3, 31))
+
+        job_config = mock_client.query.call_args[1]["job_config"]
+        params = {param.name: param.value for param in job_config.query_parameters}
+        self.assertEqual(params["start_date"], date(2024, 1, 1))
+        self.assertEqual(params["end_date"], date(2024, 3, 31))
+
 
 class TestGetMealDetails(unittest.TestCase):
     """Test cases for the get_meal_details function"""
@@ -323,6 +337,87 @@ class TestGetMealDetails(unittest.TestCase):
         mock_client.query.assert_called_once()
 
 
+class TestGetMealHistory(unittest.TestCase):
+    """Test cases for the get_meal_history and get_meal_foods functions"""
+
+    def meal_row(self, meal_id, hour):
+        row = MagicMock()
+        row.meal_id = meal_id
+        row.meal_type = "lunch"
+        row.meal_name = None
+        row.meal_time = datetime(2024, 7, 15, hour, 0, 0)
+        row.food_count = 2
+        row.total_calories = 500.0
+        row.total_protein = 30.0
+        row.total_carbs = 50.0
+        row.total_fat = None
+        return row
+
+    @patch("data_fetcher.get_bigquery_client")
+    def test_first_page_has_next_cursor(self, mock_get_client):
+        """The query asks for one extra meal to know whether a next page exists"""
+        mock_client = mock_get_client.return_value
+        mock_client.query.return_value.result.return_value = [
+            self.meal_row("meal3", 18), self.meal_row("meal2", 12), self.meal_row("meal1", 8),
+        ]
+
+        page = data_fetcher.get_meal_history("user1", limit=2)
+
+        self.assertEqual([meal['meal_id'] for meal in page['meals']], ["meal3", "meal2"])
+        self.assertEqual(page['meals'][0]['total_calories'], 500.0)
+        self.assertEqual(page['meals'][0]['total_fat'], 0)
+        self.assertEqual(page['next_cursor'], ("2024-07-15T12:00:00", "meal2"))
+
+        query = mock_client.query.call_args[0][0]
+        job_config = mock_client.query.call_args[1]['job_config']
+        params = {param.name: param.value for param in job_config.query_parameters}
+        self.assertIn("GROUP BY", query)
+        self.assertNotIn("@before_time", query)
+        self.assertEqual(params["limit"], 3)
+
+    @patch("data_fetcher.get_bigquery_client")
+    def test_cursor_continues_after_last_meal(self, mock_get_client):
+        mock_client = mock_get_client.return_value
+        mock_client.query.return_value.result.return_value = [self.meal_row("meal1", 8)]
+
+        page = data_fetcher.get_meal_history("user1", ("2024-07-15T12:00:00", "meal2"), limit=2)
+
+        self.assertEqual(len(page['meals']), 1)
+        self.assertIsNone(page['next_cursor'])
+        query = mock_client.query.call_args[0][0]
+        job_config = mock_client.query.call_args[1]['job_config']
+        params = {param.name: param.value for param in job_config.query_parameters}
+        self.assertIn("m.meal_time = @before_time AND m.meal_id < @before_id", query)
+        self.assertEqual(params["before_time"].replace(tzinfo=None), datetime(2024, 7, 15, 12, 0, 0))
+        self.assertEqual(params["before_id"], "meal2")
+
+    @patch("data_fetcher.get_bigquery_client")
+    def test_query_exception(self, mock_get_client):
+        mock_get_client.return_value.query.side_effect = Exception("Query failed")
+        self.assertEqual(data_fetcher.get_meal_history("user1"), {'meals': [], 'next_cursor': None})
+
+    @patch("data_fetcher.get_bigquery_client")
+    def test_meal_foods_grouped_by_meal(self, mock_get_client):
+        mock_client = mock_get_client.return_value
+        row = MagicMock()
+        row.meal_id = "meal1"
+        row.food_name = "Oatmeal"
+        row.quantity = 1.5
+        mock_client.query.return_value.result.return_value = [row]
+
+        foods = data_fetcher.get_meal_foods(["meal1", "meal2"])
+
+        self.assertEqual([food['food_name'] for food in foods["meal1"]], ["Oatmeal"])
+        self.assertEqual(foods["meal2"], [])
+        job_config = mock_client.query.call_args[1]['job_config']
+        self.assertEqual(job_config.query_parameters[0].values, ["meal1", "meal2"])
+
+    @patch("data_fetcher.get_bigquery_client")
+    def test_no_meal_ids_skips_query(self, mock_get_client):
+        self.assertEqual(data_fetcher.get_meal_foods([]), {})
+        mock_get_client.return_value.query.assert_not_called()
+
+
 class TestGetNutritionPerformanceCorrelation(unittest.TestCase):
     """Test cases for the get_nutrition_performance_correlation function"""
 
@@ -506,6 +601,24 @@ class TestGetNutritionPerformanceCorrelation(unittest.TestCase):
         mock_get_nutrition.assert_called_once()
         mock_get_performance.assert_called_once()
 
+    @patch("data_fetcher.get_nutrition_data")
+    @patch("data_fetcher.get_performance_metrics")
+    def test_same_day_workouts_are_combined(self, mock_get_performance, mock_get_nutrition):
+        """Test that several workouts on one day are added up instead of overwritten"""
+        mock_get_nutrition.return_value = []
+        mock_get_performance.return_value = [
+            {'workout_id': 'workout1', 'date': '2024-07-15', 'distance': 2.0, 'steps': 3000, 'calories_burned': 150},
+            {'workout_id': 'workout2', 'date': '2024-07-15', 'distance': 3.0, 'steps': 4000, 'calories_burned': 250},
+        ]
+
+        result = data_fetcher.get_nutrition_performance_correlation("user1", days=7)
+
+        performance = result['2024-07-15']['performance']
+        self.assertEqual(performance['distance'], 5.0)
+        self.assertEqual(performance['steps'], 7000)
+        self.assertEqual(performance['calories_burned'], 400)
+        self.assertEqual(performance['workout_count'], 2)
+
     @patch("data_fetcher.get_nutrition_data")
     @patch("data_fetcher.get_performance_metrics")
     def test_custom_days_parameter(self, mock_get_performance, mock_get_nutrition):
@@ -278,5 +278,38 @@ class TestNutritionGoals(unittest.TestCase):
             # Check the progress percentage
             self.assertEqual(result["progress"]["calories_percent"], 85.0)  # (1700 / 2000) * 100
 
+
+class TestGoalProgressRange(unittest.TestCase):
+
+    @patch("data_fetcher.get_bigquery_client")
+    def test_reads_the_range_with_one_query(self, mock_get_client):
+        row = MagicMock(
+            date=datetime(2023, 1, 1).date(), goal_id="goal123",
+            calories_consumed=1800, calories_remaining=200, updated_at=None,
+        )
+        mock_client = MagicMock()
+        mock_client.query.return_value.result.return_value = [row]
+        mock_get_client.return_value = mock_client
+
+        days = data_fetcher.get_goal_progress_range(
+            "user1", datetime(2022, 12, 3).date(), datetime(2023, 1, 1).date())
+
+        mock_client.query.assert_called_once()
+        query = mock_client.query.call_args[0][0]
+        self.assertNotIn("INSERT", query)
+        self.assertIn("CalorieGoals", query)
+        self.assertEqual(days, [{
+            "date": "2023-01-01", "goal_id": "goal123",
+            "consumption": {"calories": 1800}, "remaining": {"calories": 200}, "updated_at": None,
+        }])
+
+    @patch("data_fetcher.get_goal_progress_range")
+    def test_cached_weekly_progress_uses_the_range_loader(self, mock_range):
+        mock_range.return_value = []
+        data_fetcher.goal_progress_ranges.clear()
+        self.assertIsNone(data_fetcher.get_cached_weekly_nutrition_progress("range_user", days=3))
+        mock_range.assert_called_once()
+
+
 if __name__ == "__main__":
     unittest.main() 
\ No newline at end of file
@@ -4,7 +4,9 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from datetime import datetime, timedelta
-from data_fetcher import get_user_nutrition_goals, get_daily_nutrition_progress, get_weekly_nutrition_progress
+from data_fetcher import get_user_nutrition_goals, get_daily_nutrition_progress, get_cached_weekly_nutrition_progress
+from figure_cache import cached_figure
+from chart_reduction import reduce_frame, webgl_traces
 
 def show(user_id):
     """
@@ -157,7 +159,7 @@ def display_weekly_trends(user_id, goals):
     
     # Get weekly progress data
     days_selector = st.slider("Number of days", min_value=3, max_value=30, value=7, step=1)
-    weekly_progress = get_weekly_nutrition_progress(user_id, days=days_selector)
+    weekly_progress = get_cached_weekly_nutrition_progress(user_id, days=days_selector)
     
     if not weekly_progress or not weekly_progress.get("daily_progress"):
         st.info(f"No nutrition data available for the last {days_selector} days")
@@ -205,6 +207,41 @@ def display_weekly_trends(user_id, goals):
     # Sort by date
     df = df.sort_values('date')
     
+    # Bar chart with target line, rebuilt only when the data or goal changes.
+    # Long ranges keep each bucket's lowest and highest day.
+    fig = cached_figure(
+        build_calorie_target_chart, reduce_frame(df[['date', 'calories']], 'date', 'calories', method='minmax'),
+        target=goals["calorie_target"], goal_type=goals["goal_type"],
+    )
+    
+    # Show chart
+    st.plotly_chart(fig, use_container_width=True)
+    
+    # Progress Percentage Trend
+    st.subheader("Daily Progress Percentage")
+    
+    # Calculate percentage of goal
+    df['percentage'] = (df['calories'] / df['target'] * 100).clip(upper=100)
+    
+    # Create percentage chart
+    fig_pct = cached_figure(build_goal_percentage_chart, reduce_frame(df[['date', 'percentage']], 'date', 'percentage'))
+    
+    # Show chart
+    st.plotly_chart(fig_pct, use_container_width=True) 
+
+
+def build_calorie_target_chart(df, target, goal_type):
+    """
+    Build the daily calories bar chart with the calorie target line
+    
+    Args:
+        df (DataFrame): 'date' and 'calories' columns
+        target (float): Calorie target
+        goal_type (str): Goal type shown in the legend (e.g. 'daily')
+        
+    Returns:
+        plotly.graph_objects.Figure
+    """
     # Create figure with secondary y-axis
     fig = px.bar(
         df, 
@@ -217,9 +254,9 @@ def display_weekly_trends(user_id, goals):
     fig.add_trace(
         go.Scatter(
             x=df['date'], 
-            y=[goals["calorie_target"]] * len(df),
+            y=[target] * len(df),
             mode='lines',
-            name=f'{goals["goal_type"].capitalize()} Target',
+            name=f'{goal_type.capitalize()} Target',
             line=dict(color='red', width=2, dash='dash')
         )
     )
@@ -234,16 +271,19 @@ def display_weekly_trends(user_id, goals):
         height=400
     )
     
-    # Show chart
-    st.plotly_chart(fig, use_container_width=True)
-    
-    # Progress Percentage Trend
-    st.subheader("Daily Progress Percentage")
-    
-    # Calculate percentage of goal
-    df['percentage'] = (df['calories'] / df['target'] * 100).clip(upper=100)
+    return fig
+
+
+def build_goal_percentage_chart(df):
+    """
+    Build the line chart of the daily percentage of the calorie goal
     
-    # Create percentage chart
+    Args:
+        df (DataFrame): 'date' and 'percentage' columns
+        
+    Returns:
+        plotly.graph_objects.Figure
+    """
     fig_pct = px.line(
         df, 
         x='date', 
@@ -274,5 +314,4 @@ def display_weekly_trends(user_id, goals):
     # Update y-axis
     fig_pct.update_yaxes(range=[0, 110])
     
-    # Show chart
-    st.plotly_chart(fig_pct, use_container_width=True) 
\ No newline at end of file
+    return webgl_traces(fig_pct)
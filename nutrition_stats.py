@@ -0,0 +1,343 @@
+"""
+nutrition_stats.py
+
+Pure computations for the nutrition analytics page (no Streamlit). It includes:
+  - Daily nutrition and performance matrices on a continuous calendar index
+  - The full nutrition x performance correlation matrix
+  - Lagged effects (nutrition N days before a workout day)
+  - Rolling-window correlations over time
+  - Pre- and post-workout meal matching with as-of joins
+
+All correlations are computed with masked NumPy sums, so every metric pair
+and every lag is handled in the same vectorized pass and missing days are
+ignored pair by pair. Reports are cached by a hash of the input data.
+"""
+
+import hashlib
+import json
+import threading
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+NUTRITION_METRICS = ['total_calories', 'total_protein', 'total_carbs', 'total_fat', 'total_water_ml']
+PERFORMANCE_METRICS = ['distance', 'steps', 'calories_burned']
+
+# Lags (in days) between nutrition and the performance it is compared with
+DEFAULT_LAGS = (1, 2)
+
+# Window (in days) for rolling correlations
+ROLLING_WINDOW = 14
+
+# Minimum number of paired days before a correlation is reported
+MIN_PAIRED_DAYS = 3
+
+# Maximum number of reports kept in memory
+REPORT_CACHE_SIZE = 32
+
+# Meals further than this from a workout are not matched to it
+MEAL_MATCH_WINDOW_MINUTES = 6 * 60
+
+# Meal columns carried into the matched workout features, and their short names
+MEAL_FEATURES = {
+    'meal_type': 'meal_type',
+    'total_calories': 'calories',
+    'total_carbs_grams': 'carbs',
+    'total_protein_grams': 'protein',
+    'total_fat_grams': 'fat',
+}
+
+
+def _row(values, metrics):
+    if not values:
+        return [np.nan] * len(metrics)
+    return [values.get(metric) if values.get(metric) is not None else np.nan for metric in metrics]
+
+
+def build_daily_matrices(correlated_data):
+    """
+    Builds daily nutrition and performance matrices from correlated data.
+
+    Args:
+        correlated_data (dict): Date-indexed data as returned by
+            get_nutrition_performance_correlation
+
+    Returns:
+        tuple: (DatetimeIndex covering every day in the range,
+                nutrition array of shape (days, len(NUTRITION_METRICS)),
+                performance array of shape (days, len(PERFORMANCE_METRICS)))
+                Days without data are NaN.
+    """
+    if not correlated_data:
+        empty = pd.DatetimeIndex([])
+        return empty, np.empty((0, len(NUTRITION_METRICS))), np.empty((0, len(PERFORMANCE_METRICS)))
+
+    dates = pd.to_datetime(list(correlated_data.keys()))
+    nutrition = pd.DataFrame(
+        [_row(entry.get('nutrition'), NUTRITION_METRICS) for entry in correlated_data.values()],
+        index=dates, columns=NUTRITION_METRICS, dtype=float,
+    )
+    performance = pd.DataFrame(
+        [_row(entry.get('performance'), PERFORMANCE_METRICS) for entry in correlated_data.values()],
+        index=dates, columns=PERFORMANCE_METRICS, dtype=float,
+    )
+
+    # A continuous calendar index makes lags mean "N calendar days earlier"
+    calendar = pd.date_range(dates.min(), dates.max(), freq='D')
+    nutrition = nutrition.groupby(level=0).sum(min_count=1).reindex(calendar)
+    performance = performance.groupby(level=0).sum(min_count=1).reindex(calendar)
+    return calendar, nutrition.to_numpy(), performance.to_numpy()
+
+
+def _center(values, axis):
+    # Subtract the column means; all-NaN columns stay NaN without a warning
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        return values - np.nanmean(values, axis=axis, keepdims=True)
+
+
+def _paired_sums(x, y):
+    # x: (..., days, p), y: (days, q) -> masked sums over days for every (p, q) pair
+    mask = ~np.isnan(x)[..., :, None] & ~np.isnan(y)[:, None, :]
+    xs = np.where(mask, np.nan_to_num(x)[..., :, None], 0.0)
+    ys = np.where(mask, np.nan_to_num(y)[:, None, :], 0.0)
+    return mask.astype(float), xs, ys
+
+
+def _correlation_from_sums(n, sx, sy, sxx, syy, sxy, min_periods):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = sxy - sx * sy / n
+        var_x = sxx - sx * sx / n
+        var_y = syy - sy * sy / n
+        r = cov / np.sqrt(var_x * var_y)
+    # Constant series and too few paired days give no correlation
+    r[(n < min_periods) | (var_x <= 1e-12) | (var_y <= 1e-12)] = np.nan
+    return np.clip(r, -1.0, 1.0)
+
+
+def cross_correlation(x, y, min_periods=MIN_PAIRED_DAYS):
+    """
+    Pearson correlation of every column of x with every column of y.
+
+    Rows where either value is NaN are skipped for that pair only.
+
+    Args:
+        x (numpy.ndarray): Shape (..., days, p). Leading axes (e.g. lags) are kept.
+        y (numpy.ndarray): Shape (days, q)
+        min_periods (int): Minimum number of paired days
+
+    Returns:
+        tuple: (correlations of shape (..., p, q), paired day counts of the same shape)
+    """
+    # Centering first keeps the sums small and the result numerically stable
+    x = _center(x, axis=-2)
+    y = _center(y, axis=0)
+    mask, xs, ys = _paired_sums(x, y)
+    n = mask.sum(axis=-3)
+    r = _correlation_from_sums(
+        n, xs.sum(axis=-3), ys.sum(axis=-3),
+        (xs * xs).sum(axis=-3), (ys * ys).sum(axis=-3), (xs * ys).sum(axis=-3),
+        min_periods,
+    )
+    return r, n
+
+
+def rolling_correlation(x, y, window=ROLLING_WINDOW, min_periods=MIN_PAIRED_DAYS):
+    """
+    Rolling-window correlation of every column of x with every column of y.
+
+    Window sums are taken from cumulative sums, so the cost does not depend
+    on the window size.
+
+    Args:
+        x (numpy.ndarray): Shape (days, p)
+        y (numpy.ndarray): Shape (days, q)
+        window (int): Window length in days
+        min_periods (int): Minimum number of paired days in a window
+
+    Returns:
+        numpy.ndarray: Shape (days, p, q); entry t covers days t-window+1..t
+    """
+    if x.shape[0] == 0:
+        return np.empty((0, x.shape[1], y.shape[1]))
+
+    x = _center(x, axis=0)
+    y = _center(y, axis=0)
+    mask, xs, ys = _paired_sums(x, y)
+
+    def windowed(values):
+        total = np.cumsum(values, axis=0)
+        total[window:] = total[window:] - total[:-window]
+        return total
+
+    return _correlation_from_sums(
+        windowed(mask), windowed(xs), windowed(ys),
+        windowed(xs * xs), windowed(ys * ys), windowed(xs * ys),
+        min_periods,
+    )
+
+
+def _lagged(x, lags):
+    # Stack copies of x shifted down by each lag: shape (len(lags), days, p)
+    shifted = np.full((len(lags),) + x.shape, np.nan)
+    for i, lag in enumerate(lags):
+        if lag < x.shape[0]:
+            shifted[i, lag:] = x[:x.shape[0] - lag]
+    return shifted
+
+
+def data_digest(correlated_data, *params):
+    """Returns a stable hash of correlated data and report parameters."""
+    payload = json.dumps([correlated_data, params], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+_report_cache = OrderedDict()
+_report_cache_lock = threading.Lock()
+
+
+def compute_correlation_report(correlated_data, lags=DEFAULT_LAGS, window=ROLLING_WINDOW):
+    """
+    Computes same-day, lagged and rolling correlations between nutrition and
+    workout performance.
+
+    Args:
+        correlated_data (dict): Date-indexed data as returned by
+            get_nutrition_performance_correlation
+        lags (tuple): Day offsets for the lagged effects
+        window (int): Window length in days for rolling correlations
+
+    Returns:
+        dict: With keys
+            'days' (int): Days with both nutrition and performance data
+            'correlation' (DataFrame): Nutrition metrics x performance metrics
+            'paired_days' (DataFrame): Number of days behind each correlation
+            'lagged' (dict): Lag in days -> DataFrame like 'correlation'
+            'rolling' (DataFrame): Dates x (nutrition, performance) column pairs
+    """
+    key = data_digest(correlated_data, tuple(lags), window)
+    with _report_cache_lock:
+        if key in _report_cache:
+            _report_cache.move_to_end(key)
+            return _report_cache[key]
+
+    dates, nutrition, performance = build_daily_matrices(correlated_data)
+    lags = tuple(lags)
+
+    # Lag 0 and every requested lag in one vectorized call
+    stacked = _lagged(nutrition, (0,) + lags)
+    correlations, counts = cross_correlation(stacked, performance)
+
+    def frame(values):
+        return pd.DataFrame(values, index=NUTRITION_METRICS, columns=PERFORMANCE_METRICS)
+
+    rolling = rolling_correlation(nutrition, performance, window)
+    paired = ~np.isnan(nutrition).all(axis=1) & ~np.isnan(performance).all(axis=1)
+
+    report = {
+        'days': int(paired.sum()),
+        'correlation': frame(correlations[0]),
+        'paired_days': frame(counts[0]),
+        'lagged': {lag: frame(correlations[i + 1]) for i, lag in enumerate(lags)},
+        'rolling': pd.DataFrame(
+            rolling.reshape(len(dates), -1),
+            index=dates,
+            columns=pd.MultiIndex.from_product([NUTRITION_METRICS, PERFORMANCE_METRICS]),
+        ),
+    }
+
+    with _report_cache_lock:
+        _report_cache[key] = report
+        while len(_report_cache) > REPORT_CACHE_SIZE:
+            _report_cache.popitem(last=False)
+    return report
+
+
+def _to_minutes(values):
+    # Naive datetimes (wall-clock time) truncated to the minute
+    times = pd.to_datetime(pd.Series(values), errors='coerce')
+    if times.dt.tz is not None:
+        times = times.dt.tz_localize(None)
+    # A common resolution, since merge_asof needs identical key dtypes
+    return times.dt.floor('min').astype('datetime64[ns]')
+
+
+def aggregate_meals(meal_rows):
+    """
+    Collapses food-level meal rows into one row per meal.
+
+    Args:
+        meal_rows (DataFrame): Rows as returned by get_meal_details (one per
+            food item). Without a 'meal_id' column every row is treated as a meal.
+
+    Returns:
+        DataFrame: One row per meal with 'meal_time' and the MEAL_FEATURES
+            columns that are present, sorted by meal_time
+    """
+    nutrients = [column for column in MEAL_FEATURES if column != 'meal_type' and column in meal_rows]
+    meals = meal_rows
+    if 'meal_id' in meal_rows:
+        aggregations = {'meal_time': 'first', **{column: 'sum' for column in nutrients}}
+        if 'meal_type' in meal_rows:
+            aggregations['meal_type'] = 'first'
+        meals = meal_rows.groupby('meal_id', sort=False).agg(aggregations)
+
+    columns = ['meal_time'] + [column for column in MEAL_FEATURES if column in meals]
+    meals = meals[columns].copy()
+    meals['meal_time'] = _to_minutes(meals['meal_time']).to_numpy()
+    return meals.dropna(subset=['meal_time']).sort_values('meal_time', kind='stable').reset_index(drop=True)
+
+
+def _match(times, meals, direction, prefix, tolerance):
+    # As-of join of workout times against meal times, returned in input order
+    left = pd.DataFrame({'time': times.to_numpy(), 'order': np.arange(len(times))})
+    left = left.dropna(subset=['time']).sort_values('time', kind='stable')
+    right = meals.rename(columns={column: f'{prefix}_{name}' for column, name in MEAL_FEATURES.items()})
+
+    matched = pd.merge_asof(
+        left, right,
+        left_on='time', right_on='meal_time',
+        direction=direction, tolerance=tolerance,
+    )
+    matched['minutes'] = (matched['time'] - matched['meal_time']).abs() / pd.Timedelta(minutes=1)
+    return matched.set_index('order').reindex(np.arange(len(times))).drop(columns=['time', 'meal_time'])
+
+
+def match_workout_meals(workouts, meal_rows, window_minutes=MEAL_MATCH_WINDOW_MINUTES):
+    """
+    Finds the closest meal before and after each workout.
+
+    Meals and workouts are sorted once and joined with pd.merge_asof at
+    minute resolution, so a 7:50 meal before an 8:10 workout is 20 minutes
+    before it. Meals outside the window are not matched.
+
+    Args:
+        workouts (DataFrame): With a 'start_time' column and optionally
+            'end_time' (post-workout meals are matched from the end, or
+            from the start when it is missing)
+        meal_rows (DataFrame): Meal rows as returned by get_meal_details
+        window_minutes (int): Maximum distance between meal and workout
+
+    Returns:
+        DataFrame: Aligned with the workouts index, with columns
+            'pre_workout_<feature>' and 'minutes_before_workout' for the
+            closest earlier meal, 'post_workout_<feature>' and
+            'minutes_after_workout' for the closest later meal
+            (features are the values of MEAL_FEATURES). Unmatched workouts are NaN.
+    """
+    meals = aggregate_meals(meal_rows)
+    tolerance = pd.Timedelta(minutes=window_minutes)
+
+    start = _to_minutes(workouts['start_time'])
+    end = _to_minutes(workouts['end_time']).fillna(start) if 'end_time' in workouts else start
+
+    pre = _match(start, meals, 'backward', 'pre_workout', tolerance)
+    post = _match(end, meals, 'forward', 'post_workout', tolerance)
+    result = pd.concat([
+        pre.rename(columns={'minutes': 'minutes_before_workout'}),
+        post.rename(columns={'minutes': 'minutes_after_workout'}),
+    ], axis=1)
+    result.index = workouts.index
+    return result
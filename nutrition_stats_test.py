@@ -0,0 +1,181 @@
+import unittest
+import numpy as np
+import pandas as pd
+from nutrition_stats import (
+    build_daily_matrices, compute_correlation_report, cross_correlation, rolling_correlation,
+    aggregate_meals, match_workout_meals, NUTRITION_METRICS, PERFORMANCE_METRICS,
+)
+
+# python3 -m unittest nutrition_stats_test.py
+
+
+def make_correlated_data(days=60, seed=0, skip_every=7):
+    """Builds date-indexed data like get_nutrition_performance_correlation returns."""
+    rng = np.random.default_rng(seed)
+    data = {}
+    for i, day in enumerate(pd.date_range('2024-01-01', periods=days)):
+        if skip_every and i % skip_every == 3:
+            continue
+        protein = rng.normal(90, 15)
+        data[day.strftime('%Y-%m-%d')] = {
+            'nutrition': {
+                'total_calories': rng.normal(2000, 250),
+                'total_protein': protein,
+                'total_carbs': rng.normal(250, 30),
+                'total_fat': rng.normal(70, 8),
+                'total_water_ml': rng.normal(2000, 200),
+            },
+            'performance': {
+                'distance': protein / 20 + rng.normal(0, 0.2),
+                'steps': rng.normal(8000, 1000),
+                'calories_burned': rng.normal(400, 60),
+            } if i % 5 else None,
+        }
+    return data
+
+
+class TestBuildDailyMatrices(unittest.TestCase):
+
+    def test_missing_days_are_nan(self):
+        data = {
+            '2024-01-01': {'nutrition': {'total_calories': 2000}, 'performance': {'steps': 100}},
+            '2024-01-03': {'nutrition': None, 'performance': {'steps': 300}},
+        }
+        dates, nutrition, performance = build_daily_matrices(data)
+        self.assertEqual(len(dates), 3)
+        self.assertTrue(np.isnan(nutrition[1]).all())
+        self.assertTrue(np.isnan(nutrition[2]).all())
+        self.assertEqual(performance[2, PERFORMANCE_METRICS.index('steps')], 300)
+
+    def test_empty(self):
+        dates, nutrition, performance = build_daily_matrices({})
+        self.assertEqual(len(dates), 0)
+        self.assertEqual(nutrition.shape, (0, len(NUTRITION_METRICS)))
+
+
+class TestCorrelations(unittest.TestCase):
+
+    def setUp(self):
+        self.data = make_correlated_data()
+        dates, nutrition, performance = build_daily_matrices(self.data)
+        self.nutrition = pd.DataFrame(nutrition, index=dates, columns=NUTRITION_METRICS)
+        self.performance = pd.DataFrame(performance, index=dates, columns=PERFORMANCE_METRICS)
+
+    def test_matrix_matches_pandas(self):
+        report = compute_correlation_report(self.data)
+        for n in NUTRITION_METRICS:
+            for p in PERFORMANCE_METRICS:
+                expected = self.nutrition[n].corr(self.performance[p])
+                self.assertAlmostEqual(report['correlation'].loc[n, p], expected, places=9)
+        self.assertGreater(report['correlation'].loc['total_protein', 'distance'], 0.8)
+
+    def test_lagged_matches_shifted_pandas(self):
+        report = compute_correlation_report(self.data, lags=(1, 2))
+        for lag in (1, 2):
+            expected = self.nutrition['total_carbs'].shift(lag).corr(self.performance['steps'])
+            self.assertAlmostEqual(report['lagged'][lag].loc['total_carbs', 'steps'], expected, places=9)
+
+    def test_rolling_matches_pandas(self):
+        report = compute_correlation_report(self.data, window=10)
+        expected = self.nutrition['total_water_ml'].rolling(10, min_periods=3).corr(self.performance['calories_burned'])
+        actual = report['rolling'][('total_water_ml', 'calories_burned')]
+        np.testing.assert_allclose(actual.to_numpy(), expected.to_numpy(), atol=1e-9)
+
+    def test_constant_series_gives_nan(self):
+        x = np.array([[1.0], [1.0], [1.0], [1.0]])
+        y = np.array([[1.0], [2.0], [3.0], [4.0]])
+        r, n = cross_correlation(x, y)
+        self.assertTrue(np.isnan(r[0, 0]))
+        self.assertEqual(n[0, 0], 4)
+
+    def test_rolling_empty(self):
+        self.assertEqual(rolling_correlation(np.empty((0, 2)), np.empty((0, 3))).shape, (0, 2, 3))
+
+    def test_report_is_cached_by_data(self):
+        first = compute_correlation_report(self.data)
+        self.assertIs(compute_correlation_report(dict(self.data)), first)
+        changed = dict(self.data)
+        changed.pop(next(iter(changed)))
+        self.assertIsNot(compute_correlation_report(changed), first)
+
+    def test_days_counts_matched_days(self):
+        data = {
+            '2024-01-01': {'nutrition': {'total_calories': 1}, 'performance': {'steps': 1}},
+            '2024-01-02': {'nutrition': {'total_calories': 1}, 'performance': None},
+        }
+        self.assertEqual(compute_correlation_report(data)['days'], 1)
+
+
+class TestMatchWorkoutMeals(unittest.TestCase):
+
+    def setUp(self):
+        # Food-level rows: breakfast has two foods, lunch one
+        self.meals = pd.DataFrame({
+            'meal_id': ['m1', 'm1', 'm2', 'm3'],
+            'meal_type': ['breakfast', 'breakfast', 'lunch', 'dinner'],
+            'meal_time': ['2024-01-02 07:50:00', '2024-01-02 07:50:00',
+                          '2024-01-02 10:05:00', '2024-01-01 19:00:00'],
+            'total_calories': [300, 200, 600, 800],
+            'total_carbs_grams': [40, 20, 70, 90],
+            'total_protein_grams': [10, 5, 30, 40],
+        })
+        self.workouts = pd.DataFrame({
+            'start_time': pd.to_datetime(['2024-01-02 08:10:00', '2024-01-02 06:00:00']),
+            'end_time': pd.to_datetime(['2024-01-02 09:00:00', '2024-01-02 06:30:00']),
+        }, index=[5, 7])
+
+    def test_aggregates_foods_into_meals(self):
+        meals = aggregate_meals(self.meals)
+        self.assertEqual(list(meals['meal_type']), ['dinner', 'breakfast', 'lunch'])
+        self.assertEqual(meals.loc[1, 'total_calories'], 500)
+
+    def test_pre_workout_meal_at_minute_resolution(self):
+        matches = match_workout_meals(self.workouts, self.meals)
+        self.assertEqual(list(matches.index), [5, 7])
+        self.assertEqual(matches.loc[5, 'pre_workout_meal_type'], 'breakfast')
+        self.assertEqual(matches.loc[5, 'pre_workout_calories'], 500)
+        self.assertEqual(matches.loc[5, 'minutes_before_workout'], 20)
+
+    def test_post_workout_meal_from_end_time(self):
+        matches = match_workout_meals(self.workouts, self.meals)
+        self.assertEqual(matches.loc[5, 'post_workout_meal_type'], 'lunch')
+        self.assertEqual(matches.loc[5, 'minutes_after_workout'], 65)
+        self.assertEqual(matches.loc[7, 'post_workout_meal_type'], 'breakfast')
+
+    def test_meals_outside_window_are_not_matched(self):
+        # The previous dinner is 11 hours before the early workout
+        matches = match_workout_meals(self.workouts, self.meals)
+        self.assertTrue(pd.isna(matches.loc[7, 'pre_workout_meal_type']))
+        self.assertEqual(match_workout_meals(self.workouts, self.meals, window_minutes=12 * 60)
+                         .loc[7, 'pre_workout_meal_type'], 'dinner')
+
+    def test_matches_naive_loop(self):
+        rng = np.random.default_rng(1)
+        base = pd.Timestamp('2024-01-01')
+        meal_times = base + pd.to_timedelta(np.sort(rng.integers(0, 20000, 300)), unit='min')
+        meals = pd.DataFrame({
+            'meal_time': meal_times,
+            'meal_type': 'snack',
+            'total_calories': rng.integers(100, 900, 300),
+        })
+        workouts = pd.DataFrame({
+            'start_time': base + pd.to_timedelta(rng.integers(0, 20000, 50), unit='min'),
+        })
+        matches = match_workout_meals(workouts, meals, window_minutes=240)
+
+        for i, start in enumerate(workouts['start_time']):
+            earlier = meals[(meals['meal_time'] <= start) & (start - meals['meal_time'] <= pd.Timedelta(minutes=240))]
+            if earlier.empty:
+                self.assertTrue(pd.isna(matches.loc[i, 'minutes_before_workout']))
+            else:
+                expected = (start - earlier['meal_time'].max()) / pd.Timedelta(minutes=1)
+                self.assertEqual(matches.loc[i, 'minutes_before_workout'], expected)
+
+    def test_no_meals(self):
+        matches = match_workout_meals(self.workouts, self.meals.iloc[:0])
+        self.assertTrue(matches['minutes_before_workout'].isna().all())
+        self.assertTrue(matches['minutes_after_workout'].isna().all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,212 @@
+"""
+prefetch.py
+
+This module warms the caches of the pages a user is likely to open next,
+while they read the current one. It includes:
+  - NEXT_PAGES: the likely next pages of each page before any navigation
+    has been seen: the home page's shortcut buttons, then navbar neighbours
+  - Prefetcher: counts page-to-page navigations, and after a page renders
+    hands the warmers of its most likely next pages to a small background
+    pool, within a budget (pages per render, jobs pending, how often a
+    user's page is warmed)
+  - prefetcher / register_warmer(): the process-wide instance used by app.py
+
+A warmer is a function of the user ID that calls the cached fetchers a page
+reads on its first render, with the same arguments (see fetch_cache.py). The
+page then finds them cached; a warmer finding them cached costs nothing.
+"""
+
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+from fetch_cache import RefreshPool
+from range_cache import MAX_CACHED_USERS
+
+# Likely next pages, most likely first, until navigation counts say otherwise
+NEXT_PAGES = {
+    'home': ('workouts', 'water', 'meals', 'posts', 'advice', 'profile'),
+    'profile': ('home', 'posts', 'workouts'),
+    'posts': ('home', 'profile', 'workouts'),
+    'workouts': ('home', 'activity', 'posts'),
+    'activity': ('workouts', 'water', 'home'),
+    'water': ('meals', 'home', 'activity'),
+    'meals': ('water', 'goals', 'nutrition', 'home'),
+    'goals': ('meals', 'nutrition', 'home'),
+    'nutrition': ('meals', 'goals', 'advice'),
+    'advice': ('home', 'nutrition'),
+}
+
+# Pages warmed after each render
+PREFETCH_PAGES = 2
+
+# How long a user's page is not warmed again after being warmed
+PREFETCH_INTERVAL_SECONDS = 60
+
+# Most (user, page) warm times kept; older ones are dropped first
+MAX_WARMED_ENTRIES = MAX_CACHED_USERS * len(NEXT_PAGES)
+
+# One worker, so prefetches never take more than one BigQuery job at a time
+# from a process, and few pending jobs, so a burst of renders is mostly dropped
+PREFETCH_WORKERS = 1
+MAX_PENDING_PREFETCHES = 4
+
+
+class Prefetcher:
+    """
+    Warms the caches of the most likely next pages after a page renders.
+
+    Args:
+        next_pages (dict): page -> likely next pages, most likely first
+        pool (RefreshPool): Background pool running the warmers
+        max_pages (int): Pages warmed after each render
+        interval (float): Seconds before a user's page is warmed again
+        clock (callable): Monotonic time in seconds (injectable for tests)
+        max_warmed (int): Warm times kept, beyond those older than interval
+    """
+
+    def __init__(self, next_pages=NEXT_PAGES, pool=None, max_pages=PREFETCH_PAGES,
+                 interval=PREFETCH_INTERVAL_SECONDS, clock=time.monotonic, max_warmed=MAX_WARMED_ENTRIES):
+        self.next_pages = next_pages
+        self.pool = pool or RefreshPool(PREFETCH_WORKERS, MAX_PENDING_PREFETCHES, name='prefetch')
+        self.max_pages = max_pages
+        self.interval = interval
+        self.clock = clock
+        self.max_warmed = max_warmed
+        self._warmers = {}
+        # from_page -> {to_page: navigations}
+        self._navigations = {}
+        # (user_id, page) -> when it was last warmed, oldest first
+        self._warmed_at = OrderedDict()
+        self._counts = {'scheduled': 0, 'warmed': 0, 'skipped_recent': 0, 'declined': 0, 'failures': 0}
+        self._lock = threading.Lock()
+
+    def register(self, page, warmer):
+        """
+        Adds a warmer for a page.
+
+        Args:
+            page (str): Page key, as in st.session_state.page
+            warmer (callable): warmer(user_id) calls the page's cached fetchers
+        """
+        with self._lock:
+            self._warmers.setdefault(page, []).append(warmer)
+
+    def record_navigation(self, from_page, to_page):
+        """
+        Counts a page switch, so later predictions follow what users do.
+
+        Args:
+            from_page (str): The page left
+            to_page (str): The page opened
+        """
+        if from_page == to_page:
+            return
+        with self._lock:
+            counts = self._navigations.setdefault(from_page, {})
+            counts[to_page] = counts.get(to_page, 0) + 1
+
+    def likely_next(self, page):
+        """
+        Returns the pages most likely opened after a page, among the pages
+        that have warmers.
+
+        Pages seen more often after this one come first; the configured order
+        breaks ties, so it decides until navigations have been counted.
+
+        Args:
+            page (str): The current page
+
+        Returns:
+            list: At most max_pages page keys
+        """
+        configured = list(self.next_pages.get(page, ()))
+        with self._lock:
+            counts = dict(self._navigations.get(page, {}))
+            candidates = [
+                candidate for candidate in dict.fromkeys(configured + list(counts))
+                if candidate != page and candidate in self._warmers
+            ]
+
+        def rank(candidate):
+            order = configured.index(candidate) if candidate in configured else len(configured)
+            return -counts.get(candidate, 0), order
+        return sorted(candidates, key=rank)[:self.max_pages]
+
+    def after_render(self, user_id, page):
+        """
+        Schedules the warmers of the likely next pages in the background.
+
+        Pages warmed for the user within the interval are skipped, and
+        nothing more is scheduled once the pool is full.
+
+        Args:
+            user_id (str): The user viewing the page
+            page (str): The page just rendered
+
+        Returns:
+            list: The pages scheduled
+        """
+        scheduled = []
+        for next_page in self.likely_next(page):
+            now = self.clock()
+            with self._lock:
+                warmed_at = self._warmed_at.get((user_id, next_page))
+                if warmed_at is not None and now - warmed_at < self.interval:
+                    self._counts['skipped_recent'] += 1
+                    continue
+                self._warmed_at[(user_id, next_page)] = now
+                self._warmed_at.move_to_end((user_id, next_page))
+                self._prune_warmed(now)
+            if not self.pool.submit(functools.partial(self._warm, user_id, next_page)):
+                with self._lock:
+                    self._counts['declined'] += 1
+                    self._warmed_at.pop((user_id, next_page), None)
+                break
+            with self._lock:
+                self._counts['scheduled'] += 1
+            scheduled.append(next_page)
+        return scheduled
+
+    def _prune_warmed(self, now):
+        # Drops warm times past the interval, then the oldest beyond the
+        # bound. Called with the lock held.
+        while self._warmed_at:
+            key, warmed_at = next(iter(self._warmed_at.items()))
+            if now - warmed_at < self.interval and len(self._warmed_at) <= self.max_warmed:
+                break
+            del self._warmed_at[key]
+
+    def _warm(self, user_id, page):
+        with self._lock:
+            warmers = list(self._warmers.get(page, ()))
+        for warmer in warmers:
+            try:
+                warmer(user_id)
+            except Exception as e:
+                print(f"Error prefetching {page} page: {str(e)}")
+                with self._lock:
+                    self._counts['failures'] += 1
+                continue
+            with self._lock:
+                self._counts['warmed'] += 1
+
+    def stats(self):
+        """
+        Returns the prefetch counters.
+
+        Returns:
+            dict: scheduled (pages handed to the pool), warmed (warmers that
+            ran), skipped_recent, declined (pool full) and failures
+        """
+        with self._lock:
+            return dict(self._counts)
+
+
+prefetcher = Prefetcher()
+
+
+def register_warmer(page, warmer):
+    """Adds a warmer to the process-wide prefetcher (see Prefetcher.register)."""
+    prefetcher.register(page, warmer)
@@ -0,0 +1,117 @@
+import unittest
+from unittest.mock import MagicMock
+
+from prefetch import Prefetcher
+
+# python3 -m unittest prefetch_test.py
+
+
+NEXT_PAGES = {
+    'home': ('workouts', 'water', 'meals'),
+    'water': ('meals', 'home'),
+}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ManualPool:
+    """RefreshPool stand-in that runs jobs when the test says so."""
+
+    def __init__(self, max_pending=10):
+        self.max_pending = max_pending
+        self.queued = []
+
+    def submit(self, function):
+        if len(self.queued) >= self.max_pending:
+            return False
+        self.queued.append(function)
+        return True
+
+    def run(self):
+        queued, self.queued = self.queued, []
+        for function in queued:
+            function()
+
+
+class TestPrefetcher(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.pool = ManualPool()
+        self.prefetcher = Prefetcher(NEXT_PAGES, pool=self.pool, max_pages=2, interval=60, clock=self.clock)
+        self.warmers = {page: MagicMock() for page in ('home', 'workouts', 'water', 'meals')}
+        for page, warmer in self.warmers.items():
+            self.prefetcher.register(page, warmer)
+
+    def test_configured_pages_until_navigation_is_counted(self):
+        self.assertEqual(self.prefetcher.likely_next('home'), ['workouts', 'water'])
+
+        for _ in range(3):
+            self.prefetcher.record_navigation('home', 'meals')
+        self.prefetcher.record_navigation('home', 'water')
+        self.assertEqual(self.prefetcher.likely_next('home'), ['meals', 'water'])
+
+    def test_pages_without_warmers_are_not_predicted(self):
+        self.prefetcher.record_navigation('water', 'goals')
+        self.assertEqual(self.prefetcher.likely_next('water'), ['meals', 'home'])
+        self.assertEqual(self.prefetcher.likely_next('advice'), [])
+
+    def test_after_render_warms_in_the_background(self):
+        self.assertEqual(self.prefetcher.after_render('user1', 'home'), ['workouts', 'water'])
+        self.warmers['workouts'].assert_not_called()
+
+        self.pool.run()
+        self.warmers['workouts'].assert_called_once_with('user1')
+        self.warmers['water'].assert_called_once_with('user1')
+        self.warmers['meals'].assert_not_called()
+        self.assertEqual(self.prefetcher.stats()['warmed'], 2)
+
+    def test_pages_are_not_warmed_again_within_the_interval(self):
+        self.prefetcher.after_render('user1', 'home')
+        self.assertEqual(self.prefetcher.after_render('user1', 'home'), [])
+        # Other users are warmed separately
+        self.assertEqual(self.prefetcher.after_render('user2', 'home'), ['workouts', 'water'])
+
+        self.clock.now = 61
+        self.assertEqual(self.prefetcher.after_render('user1', 'home'), ['workouts', 'water'])
+        self.assertEqual(self.prefetcher.stats()['skipped_recent'], 2)
+
+    def test_warm_times_are_bounded(self):
+        self.prefetcher.max_warmed = 4
+        for i in range(5):
+            self.pool.run()
+            self.prefetcher.after_render(f"user{i}", 'home')
+        # Two pages per user: only the two latest users are remembered
+        self.assertEqual({user_id for user_id, _ in self.prefetcher._warmed_at}, {'user3', 'user4'})
+
+        # Warm times past the interval are dropped on the next render
+        self.clock.now = 61
+        self.pool.run()
+        self.prefetcher.after_render('user5', 'home')
+        self.assertEqual(list(self.prefetcher._warmed_at), [('user5', 'workouts'), ('user5', 'water')])
+
+    def test_full_pool_stops_scheduling(self):
+        self.pool.max_pending = 1
+        self.assertEqual(self.prefetcher.after_render('user1', 'home'), ['workouts'])
+        self.assertEqual(self.prefetcher.stats()['declined'], 1)
+
+        # The declined page is tried again on the next render
+        self.pool.run()
+        self.assertEqual(self.prefetcher.after_render('user1', 'home'), ['water'])
+
+    def test_failing_warmer_is_counted(self):
+        self.warmers['workouts'].side_effect = ConnectionError("BigQuery unavailable")
+        self.prefetcher.after_render('user1', 'home')
+        self.pool.run()
+        stats = self.prefetcher.stats()
+        self.assertEqual((stats['failures'], stats['warmed']), (1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
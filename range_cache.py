@@ -0,0 +1,201 @@
+"""
+range_cache.py
+
+This module keeps a process-wide, per-user cache of date-keyed rows (daily
+nutrition, meals, workouts, goal progress) so that "last N days" views do not
+query BigQuery again every time N changes. For each user it:
+  - Fetches a wide window (at least DEFAULT_FETCH_DAYS) on first use
+  - Answers any shorter range by slicing the cached rows locally
+  - Fetches only the missing older days when a longer range is requested
+  - Refetches only the most recent days once the cached copy is older than
+    RANGE_TTL_SECONDS, or from a given day after a write (invalidate())
+
+The loaders are the regular fetchers called with explicit start and end dates.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+# Days fetched on the first request, so typical slider values are all covered
+DEFAULT_FETCH_DAYS = 90
+
+# How long the most recent days are trusted before they are fetched again
+RANGE_TTL_SECONDS = 5 * 60
+
+# Maximum number of users kept per cache
+MAX_CACHED_USERS = 64
+
+
+def as_date(value):
+    """
+    Returns the calendar date of a date, datetime or ISO 8601 string.
+
+    Args:
+        value: A date, datetime or ISO 8601 date/timestamp string
+
+    Returns:
+        date
+    """
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.fromisoformat(str(value)).date()
+
+
+class _Range:
+    # Cached rows of one user covering the days start..end (inclusive).
+    # Never changed once built, so rows can be sliced without the lock.
+    __slots__ = ('start', 'end', 'rows', 'loaded_at')
+
+    def __init__(self, start, end, rows, loaded_at=None):
+        self.start = start
+        self.end = end
+        self.rows = rows
+        self.loaded_at = time.monotonic() if loaded_at is None else loaded_at
+
+
+class _User:
+    # A user's cached range, the lock held while fetching their rows, and a
+    # version bumped by invalidate() so a fetch that raced a write is dropped
+    __slots__ = ('lock', 'version', 'range')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = 0
+        self.range = None
+
+
+class RangeCache:
+    """
+    A per-user cache of rows covering one contiguous range of days.
+
+    Loaders run outside the cache-wide lock, so one user's query does not hold
+    up the others; requests for the same user wait for each other instead of
+    fetching the same days twice. A loader error propagates to the caller and
+    nothing is cached for it.
+
+    Args:
+        loader (callable): Function (user_id, start_date, end_date) returning a
+            list of rows for the days start_date..end_date (inclusive). It must
+            raise on errors rather than return an empty list.
+        day_of (callable): Function returning the calendar date of a row
+        sort_key (callable): Key used to order returned rows (defaults to day_of)
+        newest_first (bool): Return rows in descending order
+        fetch_days (int): Minimum number of days fetched on first use
+        ttl (int): Seconds before the most recent days are fetched again
+        today (callable): Returns the current date (injectable for tests)
+    """
+
+    def __init__(self, loader, day_of, sort_key=None, newest_first=False,
+                 fetch_days=DEFAULT_FETCH_DAYS, ttl=RANGE_TTL_SECONDS, today=date.today):
+        self.loader = loader
+        self.day_of = day_of
+        self.sort_key = sort_key or day_of
+        self.newest_first = newest_first
+        self.fetch_days = fetch_days
+        self.ttl = ttl
+        self.today = today
+        # user_id -> _User, least recently used first
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, days):
+        """
+        Returns the rows of the last `days` days (today - days .. today).
+
+        Args:
+            user_id (str): The user ID
+            days (int): Number of days before today to include
+
+        Returns:
+            list: Rows ordered by sort_key
+
+        Raises:
+            Exception: Whatever the loader raised, if rows had to be fetched
+        """
+        today = self.today()
+        start = today - timedelta(days=days)
+
+        with self._lock:
+            user = self._user(user_id)
+        with user.lock:
+            with self._lock:
+                cached, version = user.range, user.version
+            updated = self._update(user_id, cached, start, today)
+            if updated is not cached:
+                with self._lock:
+                    # Not if the user was invalidated or evicted meanwhile
+                    if self._users.get(user_id) is user and user.version == version:
+                        user.range = updated
+
+        return [row for row in updated.rows if start <= self.day_of(row) <= today]
+
+    def invalidate(self, user_id, since=None):
+        """
+        Marks cached rows as outdated after a write.
+
+        Args:
+            user_id (str): The user whose data changed
+            since (date, optional): First day that changed. Without it (or if it
+                is before the cached range) the user's rows are dropped.
+        """
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is None:
+                return
+            user.version += 1
+            cached = user.range
+            if cached is None:
+                return
+            since = as_date(since) if since is not None else None
+            if since is None or since <= cached.start:
+                user.range = None
+            elif since <= cached.end:
+                # The next get() refetches from `since` onwards
+                user.range = _Range(cached.start, since - timedelta(days=1), cached.rows, cached.loaded_at)
+
+    def clear(self):
+        """Drops all cached rows."""
+        with self._lock:
+            self._users.clear()
+
+    def _user(self, user_id):
+        # Called with self._lock held
+        user = self._users.get(user_id)
+        if user is None:
+            user = self._users[user_id] = _User()
+            while len(self._users) > MAX_CACHED_USERS:
+                self._users.popitem(last=False)
+        self._users.move_to_end(user_id)
+        return user
+
+    def _fetch(self, user_id, start, end):
+        return list(self.loader(user_id, start, end) or [])
+
+    def _sorted(self, rows):
+        return sorted(rows, key=self.sort_key, reverse=self.newest_first)
+
+    def _update(self, user_id, cached, start, today):
+        # Returns the user's range covering start..today, fetching what is
+        # missing or expired; `cached` itself if nothing had to be fetched
+        if cached is None or cached.end > today:
+            first = min(start, today - timedelta(days=self.fetch_days))
+            return _Range(first, today, self._sorted(self._fetch(user_id, first, today)))
+
+        rows, first, end, loaded_at = cached.rows, cached.start, cached.end, cached.loaded_at
+        if start < first:
+            # Only the older days that are not cached yet
+            older = self._fetch(user_id, start, first - timedelta(days=1))
+            rows = rows + [row for row in older if self.day_of(row) < first]
+            first = start
+        if end < today or time.monotonic() - loaded_at >= self.ttl:
+            # Recent days may have changed; refetch from the last cached day
+            recent = [row for row in self._fetch(user_id, end, today) if self.day_of(row) >= end]
+            rows = [row for row in rows if self.day_of(row) < end] + recent
+            end, loaded_at = today, time.monotonic()
+        if rows is cached.rows:
+            return cached
+        return _Range(first, end, self._sorted(rows), loaded_at)
@@ -0,0 +1,154 @@
+import threading
+import unittest
+from datetime import date, timedelta
+from unittest.mock import MagicMock, patch
+
+from range_cache import RangeCache, as_date
+
+# python3 -m unittest range_cache_test.py
+
+TODAY = date(2024, 6, 30)
+
+
+def make_rows(start, end):
+    """One row per day from start to end (inclusive)."""
+    days = (end - start).days + 1
+    return [{'date': (start + timedelta(days=i)).isoformat(), 'value': i} for i in range(days)]
+
+
+class TestRangeCache(unittest.TestCase):
+
+    def setUp(self):
+        self.loader = MagicMock(side_effect=lambda user_id, start, end: make_rows(start, end))
+        self.cache = RangeCache(
+            self.loader,
+            day_of=lambda row: as_date(row['date']),
+            fetch_days=30,
+            today=lambda: TODAY,
+        )
+
+    def test_first_request_fetches_the_default_window(self):
+        rows = self.cache.get('user1', 7)
+
+        self.loader.assert_called_once_with('user1', TODAY - timedelta(days=30), TODAY)
+        self.assertEqual(len(rows), 8)
+        self.assertEqual(rows[0]['date'], '2024-06-23')
+        self.assertEqual(rows[-1]['date'], '2024-06-30')
+
+    def test_shorter_ranges_are_sliced_locally(self):
+        self.cache.get('user1', 30)
+        for days in (7, 8, 9, 14):
+            self.assertEqual(len(self.cache.get('user1', days)), days + 1)
+        self.assertEqual(self.loader.call_count, 1)
+
+    def test_longer_range_fetches_only_missing_days(self):
+        self.cache.get('user1', 7)
+        rows = self.cache.get('user1', 60)
+
+        self.loader.assert_called_with(
+            'user1', TODAY - timedelta(days=60), TODAY - timedelta(days=31))
+        self.assertEqual(len(rows), 61)
+        self.assertEqual([row['date'] for row in rows], sorted(row['date'] for row in rows))
+
+    def test_users_are_cached_separately(self):
+        self.cache.get('user1', 7)
+        self.cache.get('user2', 7)
+        self.assertEqual(self.loader.call_count, 2)
+
+    def test_invalidate_refetches_from_changed_day(self):
+        self.cache.get('user1', 7)
+        self.cache.invalidate('user1', since=TODAY - timedelta(days=2))
+        rows = self.cache.get('user1', 7)
+
+        self.loader.assert_called_with('user1', TODAY - timedelta(days=3), TODAY)
+        self.assertEqual(len(rows), 8)
+        self.assertEqual(len({row['date'] for row in rows}), 8)
+
+    def test_invalidate_without_day_drops_user(self):
+        self.cache.get('user1', 7)
+        self.cache.invalidate('user1')
+        self.cache.get('user1', 7)
+        self.assertEqual(self.loader.call_count, 2)
+        self.loader.assert_called_with('user1', TODAY - timedelta(days=30), TODAY)
+
+    def test_expired_cache_refreshes_recent_days_only(self):
+        self.cache.ttl = 60
+        with patch('range_cache.time.monotonic', return_value=1000):
+            self.cache.get('user1', 7)
+        with patch('range_cache.time.monotonic', return_value=1100):
+            rows = self.cache.get('user1', 7)
+
+        self.assertEqual(self.loader.call_count, 2)
+        self.loader.assert_called_with('user1', TODAY, TODAY)
+        self.assertEqual(len(rows), 8)
+
+    def test_failed_fetch_is_not_cached(self):
+        self.loader.side_effect = ConnectionError("BigQuery unavailable")
+        with self.assertRaises(ConnectionError):
+            self.cache.get('user1', 7)
+
+        self.loader.side_effect = lambda user_id, start, end: make_rows(start, end)
+        self.assertEqual(len(self.cache.get('user1', 7)), 8)
+        self.loader.assert_called_with('user1', TODAY - timedelta(days=30), TODAY)
+
+    def test_failed_refresh_keeps_cached_rows(self):
+        self.cache.ttl = 60
+        with patch('range_cache.time.monotonic', return_value=1000):
+            self.cache.get('user1', 7)
+        self.loader.side_effect = ConnectionError("BigQuery unavailable")
+        with patch('range_cache.time.monotonic', return_value=1100):
+            with self.assertRaises(ConnectionError):
+                self.cache.get('user1', 7)
+
+        self.loader.side_effect = lambda user_id, start, end: make_rows(start, end)
+        with patch('range_cache.time.monotonic', return_value=1100):
+            self.assertEqual(len(self.cache.get('user1', 7)), 8)
+        self.loader.assert_called_with('user1', TODAY, TODAY)
+
+    def test_slow_fetch_does_not_block_other_users(self):
+        started, release = threading.Event(), threading.Event()
+
+        def loader(user_id, start, end):
+            if user_id == 'slow':
+                started.set()
+                release.wait(5)
+            return make_rows(start, end)
+
+        cache = RangeCache(loader, day_of=lambda row: as_date(row['date']), today=lambda: TODAY)
+        slow = threading.Thread(target=cache.get, args=('slow', 7))
+        slow.start()
+        self.assertTrue(started.wait(5))
+        try:
+            self.assertEqual(len(cache.get('user1', 7)), 8)
+        finally:
+            release.set()
+            slow.join(5)
+
+    def test_fetch_racing_an_invalidate_is_not_cached(self):
+        def loader(user_id, start, end):
+            # A write lands while the rows are being fetched
+            self.cache.invalidate(user_id, since=TODAY)
+            return make_rows(start, end)
+
+        self.loader.side_effect = loader
+        self.assertEqual(len(self.cache.get('user1', 7)), 8)
+        self.cache.get('user1', 7)
+        self.assertEqual(self.loader.call_count, 2)
+
+    def test_newest_first(self):
+        cache = RangeCache(
+            self.loader, day_of=lambda row: as_date(row['date']),
+            newest_first=True, today=lambda: TODAY,
+        )
+        rows = cache.get('user1', 3)
+        self.assertEqual(rows[0]['date'], '2024-06-30')
+        self.assertEqual(rows[-1]['date'], '2024-06-27')
+
+    def test_as_date(self):
+        self.assertEqual(as_date('2024-06-30T08:15:00+00:00'), TODAY)
+        self.assertEqual(as_date('2024-06-30'), TODAY)
+        self.assertEqual(as_date(TODAY), TODAY)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+"""
+reference_data.py
+
+This module keeps a process-wide cache of small reference tables that rarely
+change, so that they are read from BigQuery once instead of on every request:
+  - Images: the pool of motivational images shown with advice
+  - SensorTypes: sensor names and units, used to label sensor readings
+
+Each table is loaded on first use and kept for REFERENCE_TTL_SECONDS. A
+failed load keeps serving the previous copy (or the default) and is retried
+after FAILED_LOAD_RETRY_SECONDS. Call refresh_reference_data() to drop the
+cached copies after the tables change.
+"""
+
+import hashlib
+import threading
+import time
+
+PROJECT_ID = "bamboo-creek-450920-h2"
+DATASET_ID = "ISE"
+
+# How long a loaded reference table is reused before it is read again
+REFERENCE_TTL_SECONDS = 6 * 60 * 60
+
+# How long the previous copy or the default is served after a failed load
+FAILED_LOAD_RETRY_SECONDS = 60
+
+# Used when the SensorTypes table cannot be read or has no entry for a sensor
+DEFAULT_SENSOR_TYPES = {
+    'sensor1': {'name': 'Heart Rate', 'units': 'bpm'},
+    'sensor2': {'name': 'Step Count', 'units': 'steps'},
+    'sensor3': {'name': 'Temperature', 'units': '°C'},
+}
+
+
+class ReferenceTable:
+    """
+    A lazily loaded, TTL-bound copy of one reference table.
+
+    Args:
+        loader (callable): Function taking a BigQuery client and returning the table
+        ttl (int): Seconds before the cached copy is reloaded
+        default: Value returned when the table cannot be loaded
+        retry_after (int): Seconds before a failed load is tried again
+    """
+
+    def __init__(self, loader, ttl=REFERENCE_TTL_SECONDS, default=None, retry_after=FAILED_LOAD_RETRY_SECONDS):
+        self.loader = loader
+        self.ttl = ttl
+        self.default = default
+        self.retry_after = retry_after
+        self._value = None
+        # None until the first load (or after refresh())
+        self._expires_at = None
+        self._lock = threading.Lock()
+
+    def get(self, client):
+        """Returns the cached table, loading it with the given client if needed."""
+        with self._lock:
+            if self._expires_at is not None and time.monotonic() < self._expires_at:
+                return self._value
+            try:
+                value = self.loader(client)
+            except Exception as e:
+                print(f"Error loading reference data: {str(e)}")
+                # Keep serving the previous copy, or the default, for a short
+                # while instead of rerunning the failing query on every request
+                if self._expires_at is None:
+                    self._value = self.default
+                self._expires_at = time.monotonic() + self.retry_after
+                return self._value
+            self._value = value
+            self._expires_at = time.monotonic() + self.ttl
+            return self._value
+
+    def prime(self, value):
+        """Stores a value as if it had just been loaded (e.g. at startup)."""
+        with self._lock:
+            self._value = value
+            self._expires_at = time.monotonic() + self.ttl
+
+    def refresh(self):
+        """Drops the cached copy so the next get() reloads the table."""
+        with self._lock:
+            self._value = None
+            self._expires_at = None
+
+
+def _load_images(client):
+    query = f"""
+        SELECT
+        Images.ImageURL
+        FROM
+        `{PROJECT_ID}`.`{DATASET_ID}`.`Images` AS Images;
+        """
+    return tuple(row.ImageURL for row in client.query(query).result())
+
+
+def _load_sensor_types(client):
+    query = f"""
+        SELECT SensorId, Name, Units
+        FROM `{PROJECT_ID}`.`{DATASET_ID}`.`SensorTypes`
+        """
+    sensor_types = dict(DEFAULT_SENSOR_TYPES)
+    for row in client.query(query).result():
+        sensor_types[row.SensorId] = {'name': row.Name, 'units': row.Units}
+    return sensor_types
+
+
+images = ReferenceTable(_load_images, default=())
+sensor_types = ReferenceTable(_load_sensor_types, default=DEFAULT_SENSOR_TYPES)
+
+
+def get_advice_images(client):
+    """
+    Returns the cached pool of advice image URLs.
+
+    Args:
+        client: BigQuery client used if the pool has to be loaded
+
+    Returns:
+        tuple: Image URLs
+    """
+    return images.get(client)
+
+
+def get_sensor_types(client):
+    """
+    Returns the cached sensor type mapping.
+
+    Args:
+        client: BigQuery client used if the mapping has to be loaded
+
+    Returns:
+        dict: Sensor ID to {'name', 'units'}
+    """
+    return sensor_types.get(client)
+
+
+def sensor_info(types, sensor_id):
+    """Returns the name and units of a sensor, or 'unknown' if it is not listed."""
+    return types.get(sensor_id, {'name': 'unknown', 'units': 'unknown'})
+
+
+def choose_image(pool, seed):
+    """
+    Picks an image from a pool deterministically.
+
+    The same seed (e.g. the advice text) always gets the same image. As before,
+    one extra slot in the pool means "no image".
+
+    Args:
+        pool (tuple): Image URLs
+        seed (str): Value the choice is derived from
+
+    Returns:
+        str or None: The chosen image URL
+    """
+    candidates = list(pool) + [None]
+    digest = hashlib.sha1(str(seed).encode('utf-8')).digest()
+    return candidates[int.from_bytes(digest[:8], 'big') % len(candidates)]
+
+
+def refresh_reference_data():
+    """Drops all cached reference tables."""
+    images.refresh()
+    sensor_types.refresh()
@@ -0,0 +1,104 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import reference_data
+from reference_data import ReferenceTable, choose_image, sensor_info, DEFAULT_SENSOR_TYPES
+
+# python3 -m unittest reference_data_test.py
+
+
+class TestReferenceTable(unittest.TestCase):
+
+    def test_loads_once_within_ttl(self):
+        loader = MagicMock(return_value=("a.jpg",))
+        table = ReferenceTable(loader, ttl=60)
+        self.assertEqual(table.get("client"), ("a.jpg",))
+        self.assertEqual(table.get("client"), ("a.jpg",))
+        loader.assert_called_once_with("client")
+
+    @patch("reference_data.time.monotonic")
+    def test_reloads_after_ttl(self, mock_monotonic):
+        loader = MagicMock(side_effect=[("a.jpg",), ("b.jpg",)])
+        table = ReferenceTable(loader, ttl=60)
+        mock_monotonic.return_value = 0
+        table.get(None)
+        mock_monotonic.return_value = 61
+        self.assertEqual(table.get(None), ("b.jpg",))
+        self.assertEqual(loader.call_count, 2)
+
+    def test_refresh_forces_reload(self):
+        loader = MagicMock(return_value=())
+        table = ReferenceTable(loader)
+        table.get(None)
+        table.refresh()
+        table.get(None)
+        self.assertEqual(loader.call_count, 2)
+
+    def test_load_error_returns_default(self):
+        table = ReferenceTable(MagicMock(side_effect=Exception("boom")), default=())
+        self.assertEqual(table.get(None), ())
+
+    @patch("reference_data.time.monotonic")
+    def test_failed_load_is_retried_after_a_while(self, mock_monotonic):
+        loader = MagicMock(side_effect=[Exception("boom"), ("a.jpg",)])
+        table = ReferenceTable(loader, default=(), retry_after=30)
+        mock_monotonic.return_value = 0
+        self.assertEqual(table.get(None), ())
+        mock_monotonic.return_value = 10
+        self.assertEqual(table.get(None), ())
+        self.assertEqual(loader.call_count, 1)
+
+        mock_monotonic.return_value = 31
+        self.assertEqual(table.get(None), ("a.jpg",))
+        self.assertEqual(loader.call_count, 2)
+
+    @patch("reference_data.time.monotonic")
+    def test_failed_reload_keeps_previous_copy(self, mock_monotonic):
+        loader = MagicMock(side_effect=[("a.jpg",), Exception("boom")])
+        table = ReferenceTable(loader, ttl=60, retry_after=30)
+        mock_monotonic.return_value = 0
+        table.get(None)
+        mock_monotonic.return_value = 61
+        self.assertEqual(table.get(None), ("a.jpg",))
+        mock_monotonic.return_value = 80
+        self.assertEqual(table.get(None), ("a.jpg",))
+        self.assertEqual(loader.call_count, 2)
+
+    def test_prime_skips_loading(self):
+        loader = MagicMock()
+        table = ReferenceTable(loader)
+        table.prime({'x': 1})
+        self.assertEqual(table.get(None), {'x': 1})
+        loader.assert_not_called()
+
+
+class TestSensorTypes(unittest.TestCase):
+
+    def tearDown(self):
+        reference_data.refresh_reference_data()
+
+    def test_loaded_rows_extend_defaults(self):
+        client = MagicMock()
+        client.query.return_value.result.return_value = [
+            MagicMock(SensorId="sensor4", Name="Cadence", Units="spm"),
+        ]
+        types = reference_data.get_sensor_types(client)
+        self.assertEqual(sensor_info(types, "sensor4")['units'], "spm")
+        self.assertEqual(sensor_info(types, "sensor1")['units'], "bpm")
+        self.assertEqual(sensor_info(types, "sensorX")['units'], "unknown")
+
+    def test_defaults(self):
+        self.assertEqual(DEFAULT_SENSOR_TYPES['sensor3']['units'], "°C")
+
+
+class TestChooseImage(unittest.TestCase):
+
+    def test_same_seed_same_image(self):
+        pool = ("a.jpg", "b.jpg", "c.jpg")
+        self.assertEqual(choose_image(pool, "Drink water"), choose_image(pool, "Drink water"))
+
+    def test_empty_pool(self):
+        self.assertIsNone(choose_image((), "anything"))
+
+
+if __name__ == '__main__':
+    unittest.main()
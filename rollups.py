@@ -0,0 +1,426 @@
+"""
+rollups.py
+
+This module maintains pre-aggregated nutrition and activity totals per user
+in the NutritionActivityRollups table, at three grains:
+  - day:   one row per calendar day
+  - week:  one row per ISO week (starting Monday)
+  - month: one row per calendar month
+
+Each row holds the summed calories, macros and water from
+DailyNutritionSummary, the summed steps and distance and the number of
+workouts from Workouts, and the number of days with a nutrition summary.
+
+refresh_rollups() recomputes only the day, week and month that contain a
+changed date with a single MERGE. Writes do not wait for it: RollupQueue
+runs the refreshes in one background thread, and keeps the periods whose
+refresh failed so they are rebuilt later. Trend
+fetchers read the coarsest grain that still gives enough points
+(choose_grain), so a year-long chart reads about 52 weekly or 12 monthly
+rows instead of 365 daily ones.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import pandas as pd
+
+# Import BigQuery if it's not already imported
+try:
+    from google.cloud import bigquery
+except ImportError:
+    print("BigQuery library not available. Some features will be unavailable.")
+
+PROJECT_ID = "bamboo-creek-450920-h2"
+DATASET_ID = "ISE"
+ROLLUP_TABLE = f"`{PROJECT_ID}.{DATASET_ID}.NutritionActivityRollups`"
+
+# Grains from finest to coarsest, with their approximate length in days
+GRAINS = ('day', 'week', 'month')
+GRAIN_DAYS = {'day': 1, 'week': 7, 'month': 30}
+
+# A trend uses the coarsest grain that still gives at least this many points
+MIN_TREND_POINTS = 12
+
+NUTRITION_TOTALS = ['total_calories', 'total_protein', 'total_carbs', 'total_fat', 'total_water_ml']
+ACTIVITY_TOTALS = ['steps', 'distance', 'workouts']
+
+CREATE_ROLLUP_TABLE = f"""
+    CREATE TABLE IF NOT EXISTS {ROLLUP_TABLE} (
+        user_id STRING NOT NULL,
+        grain STRING NOT NULL,
+        period_start DATE NOT NULL,
+        nutrition_days INT64,
+        total_calories FLOAT64,
+        total_protein FLOAT64,
+        total_carbs FLOAT64,
+        total_fat FLOAT64,
+        total_water_ml FLOAT64,
+        steps INT64,
+        distance FLOAT64,
+        workouts INT64,
+        updated_at TIMESTAMP
+    )
+    PARTITION BY DATE_TRUNC(period_start, MONTH)
+    CLUSTER BY user_id, grain
+"""
+
+# Recomputes the buckets selected by {bucket_filter} from the source tables.
+# Buckets without any source rows left are deleted.
+MERGE_ROLLUPS = f"""
+    MERGE {ROLLUP_TABLE} T
+    USING (
+        WITH daily AS (
+            SELECT
+                day,
+                SUM(nutrition_days) AS nutrition_days,
+                SUM(total_calories) AS total_calories,
+                SUM(total_protein) AS total_protein,
+                SUM(total_carbs) AS total_carbs,
+                SUM(total_fat) AS total_fat,
+                SUM(total_water_ml) AS total_water_ml,
+                SUM(steps) AS steps,
+                SUM(distance) AS distance,
+                SUM(workouts) AS workouts
+            FROM (
+                SELECT
+                    date AS day, 1 AS nutrition_days,
+                    total_calories, total_protein, total_carbs, total_fat, total_water_ml,
+                    0 AS steps, 0.0 AS distance, 0 AS workouts
+                FROM `{PROJECT_ID}.{DATASET_ID}.DailyNutritionSummary`
+                WHERE user_id = @user_id AND date BETWEEN @range_start AND @range_end
+                UNION ALL
+                SELECT
+                    DATE(StartTimestamp) AS day, 0 AS nutrition_days,
+                    0, 0, 0, 0, 0,
+                    TotalSteps, TotalDistance, 1
+                FROM `{PROJECT_ID}.{DATASET_ID}.Workouts`
+                WHERE UserId = @user_id AND DATE(StartTimestamp) BETWEEN @range_start AND @range_end
+            )
+            GROUP BY day
+        ),
+        buckets AS (
+            SELECT
+                grain,
+                CASE grain
+                    WHEN 'day' THEN day
+                    WHEN 'week' THEN DATE_TRUNC(day, ISOWEEK)
+                    ELSE DATE_TRUNC(day, MONTH)
+                END AS period_start,
+                daily.*
+            FROM daily CROSS JOIN UNNEST(['day', 'week', 'month']) AS grain
+        )
+        SELECT
+            @user_id AS user_id, grain, period_start,
+            SUM(nutrition_days) AS nutrition_days,
+            SUM(total_calories) AS total_calories,
+            SUM(total_protein) AS total_protein,
+            SUM(total_carbs) AS total_carbs,
+            SUM(total_fat) AS total_fat,
+            SUM(total_water_ml) AS total_water_ml,
+            SUM(steps) AS steps,
+            SUM(distance) AS distance,
+            SUM(workouts) AS workouts
+        FROM buckets
+        WHERE {{bucket_filter}}
+        GROUP BY grain, period_start
+    ) S
+    ON T.user_id = S.user_id AND T.grain = S.grain AND T.period_start = S.period_start
+    WHEN MATCHED THEN UPDATE SET
+        nutrition_days = S.nutrition_days,
+        total_calories = S.total_calories,
+        total_protein = S.total_protein,
+        total_carbs = S.total_carbs,
+        total_fat = S.total_fat,
+        total_water_ml = S.total_water_ml,
+        steps = S.steps,
+        distance = S.distance,
+        workouts = S.workouts,
+        updated_at = CURRENT_TIMESTAMP()
+    WHEN NOT MATCHED THEN INSERT (
+        user_id, grain, period_start, nutrition_days, total_calories, total_protein,
+        total_carbs, total_fat, total_water_ml, steps, distance, workouts, updated_at
+    ) VALUES (
+        S.user_id, S.grain, S.period_start, S.nutrition_days, S.total_calories, S.total_protein,
+        S.total_carbs, S.total_fat, S.total_water_ml, S.steps, S.distance, S.workouts,
+        CURRENT_TIMESTAMP()
+    )
+    WHEN NOT MATCHED BY SOURCE AND T.user_id = @user_id AND {{target_filter}} THEN DELETE
+"""
+
+# Only the day, ISO week and month containing @day
+_AFFECTED_BUCKETS = """(
+    ({alias}grain = 'day' AND {alias}period_start = @day)
+    OR ({alias}grain = 'week' AND {alias}period_start = DATE_TRUNC(@day, ISOWEEK))
+    OR ({alias}grain = 'month' AND {alias}period_start = DATE_TRUNC(@day, MONTH))
+)"""
+
+
+def period_start(day, grain):
+    """
+    Returns the first day of the bucket that contains a day.
+
+    Args:
+        day (date): The day
+        grain (str): 'day', 'week' (ISO week) or 'month'
+
+    Returns:
+        date
+    """
+    if grain == 'day':
+        return day
+    if grain == 'week':
+        return day - timedelta(days=day.weekday())
+    if grain == 'month':
+        return day.replace(day=1)
+    raise ValueError(f"Unknown grain: {grain}")
+
+
+def affected_range(day):
+    """
+    Returns the source days needed to recompute every bucket containing a day.
+
+    Args:
+        day (date): The changed day
+
+    Returns:
+        tuple: (first day, last day) covering its ISO week and its month
+    """
+    week_start = period_start(day, 'week')
+    month_start = period_start(day, 'month')
+    next_month = (month_start + timedelta(days=32)).replace(day=1)
+    return min(week_start, month_start), max(week_start + timedelta(days=6), next_month - timedelta(days=1))
+
+
+def choose_grain(days, min_points=MIN_TREND_POINTS):
+    """
+    Returns the coarsest grain that still gives at least min_points buckets.
+
+    Args:
+        days (int): Length of the requested range in days
+        min_points (int): Minimum number of points in the trend
+
+    Returns:
+        str: 'day', 'week' or 'month'
+    """
+    for grain in reversed(GRAINS):
+        if days / GRAIN_DAYS[grain] >= min_points:
+            return grain
+    return 'day'
+
+
+def ensure_rollup_table(client):
+    """Creates the rollup table if it does not exist."""
+    client.query(CREATE_ROLLUP_TABLE).result()
+
+
+def refresh_rollups(client, user_id, day=None):
+    """
+    Recomputes a user's rollups with a single MERGE.
+
+    Args:
+        client: BigQuery client
+        user_id (str): The user whose data changed
+        day (date, optional): The changed day. Only the day, ISO week and month
+            containing it are recomputed. Without it, every bucket is rebuilt
+            (backfill).
+    """
+    if day is None:
+        query = MERGE_ROLLUPS.format(bucket_filter='TRUE', target_filter='TRUE')
+        range_start, range_end = date(1970, 1, 1), date.today()
+        parameters = []
+    else:
+        query = MERGE_ROLLUPS.format(
+            bucket_filter=_AFFECTED_BUCKETS.format(alias=''),
+            target_filter=_AFFECTED_BUCKETS.format(alias='T.'),
+        )
+        range_start, range_end = affected_range(day)
+        parameters = [bigquery.ScalarQueryParameter("day", "DATE", day)]
+
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("user_id", "STRING", user_id),
+            bigquery.ScalarQueryParameter("range_start", "DATE", range_start),
+            bigquery.ScalarQueryParameter("range_end", "DATE", range_end),
+        ] + parameters
+    )
+    client.query(query, job_config=job_config).result()
+
+
+class RollupQueue:
+    """
+    Refreshes rollups in a background thread, off the write path.
+
+    Writes queue the day they changed and return; one worker drains the
+    queue in batches, so several writes to a day refresh its buckets once and
+    this process never runs two rollup MERGEs at the same time. Periods whose
+    refresh failed are kept and queued again with the next write.
+
+    Args:
+        get_client (callable): Returns the BigQuery client
+        executor: Runs the worker (defaults to one background thread)
+    """
+
+    def __init__(self, get_client, executor=None):
+        self.get_client = get_client
+        self._executor = executor
+        # (user_id, day) waiting to be refreshed; day None rebuilds everything
+        self._pending = set()
+        self._failed = set()
+        self._running = False
+        self._lock = threading.Lock()
+
+    def schedule(self, user_id, day=None):
+        """
+        Queues a refresh of the buckets containing a day.
+
+        Args:
+            user_id (str): The user whose data changed
+            day (date, optional): The changed day. Without it all of the
+                user's rollups are rebuilt.
+        """
+        with self._lock:
+            self._pending.add((user_id, day))
+            # Failed periods get another chance with every write
+            self._pending |= self._failed
+            self._failed.clear()
+            if self._running:
+                return
+            self._running = True
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rollups')
+        try:
+            self._executor.submit(self._drain)
+        except RuntimeError:
+            # Interpreter shutdown
+            with self._lock:
+                self._running = False
+
+    def failed(self):
+        """
+        Returns the periods whose last refresh failed.
+
+        Returns:
+            list: (user_id, day) tuples; day None means a full rebuild
+        """
+        with self._lock:
+            return sorted(self._failed, key=_period_key)
+
+    def _drain(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._running = False
+                    return
+                batch, self._pending = self._pending, set()
+            for user_id, day in _coalesce(batch):
+                try:
+                    refresh_rollups(self.get_client(), user_id, day)
+                except Exception as e:
+                    print(f"Error updating rollups: {str(e)}")
+                    with self._lock:
+                        self._failed.add((user_id, day))
+
+
+def _period_key(period):
+    user_id, day = period
+    return user_id, day or date.min
+
+
+def _coalesce(periods):
+    # A user's full rebuild covers their single days
+    rebuilt = {user_id for user_id, day in periods if day is None}
+    return sorted(
+        (period for period in periods if period[1] is None or period[0] not in rebuilt),
+        key=_period_key,
+    )
+
+
+def rollup_from_daily(nutrition_data, workouts, grain):
+    """
+    Computes rollup rows locally from daily data, with the same columns as
+    the rollup table. Used when the table has no rows for a user yet.
+
+    Args:
+        nutrition_data (list): Days as returned by get_nutrition_data
+        workouts (list): WorkoutRecord objects or workout dicts with a 'date'
+        grain (str): 'day', 'week' or 'month'
+
+    Returns:
+        list: Dictionaries with period_start (date), nutrition_days and the
+            NUTRITION_TOTALS and ACTIVITY_TOTALS columns, oldest first
+    """
+    frames = []
+    if nutrition_data:
+        nutrition = pd.DataFrame(nutrition_data)
+        nutrition['nutrition_days'] = 1
+        frames.append(nutrition[['date', 'nutrition_days'] + NUTRITION_TOTALS])
+    if workouts:
+        frames.append(pd.DataFrame([{
+            'date': workout['date'],
+            'steps': workout.get('steps') or 0,
+            'distance': workout.get('distance') or 0,
+            'workouts': 1,
+        } for workout in workouts]))
+    if not frames:
+        return []
+
+    daily = pd.concat(frames, ignore_index=True)
+    daily['period_start'] = [period_start(day, grain) for day in pd.to_datetime(daily['date']).dt.date]
+    columns = ['nutrition_days'] + NUTRITION_TOTALS + ACTIVITY_TOTALS
+    daily = daily.reindex(columns=['period_start'] + columns)
+    totals = daily.groupby('period_start', sort=True)[columns].sum(min_count=1).fillna(0)
+    totals[['nutrition_days', 'steps', 'workouts']] = totals[['nutrition_days', 'steps', 'workouts']].astype(int)
+    return totals.reset_index().to_dict('records')
+
+
+def trend_points(rollup_rows, grain):
+    """
+    Turns rollup rows into trend points.
+
+    Nutrition values are averaged over the days with a nutrition summary, so
+    daily, weekly and monthly trends share the same scale (e.g. kcal per day).
+    Activity values stay totals for the bucket.
+
+    Args:
+        rollup_rows (list): Dictionaries with the rollup table columns
+        grain (str): The grain of the rows
+
+    Returns:
+        list: Dictionaries with 'date' (YYYY-MM-DD bucket start), 'grain',
+            'nutrition_days', the NUTRITION_TOTALS averages and ACTIVITY_TOTALS
+    """
+    points = []
+    for row in rollup_rows:
+        days = row.get('nutrition_days') or 0
+        point = {
+            'date': row['period_start'].strftime('%Y-%m-%d'),
+            'grain': grain,
+            'nutrition_days': days,
+        }
+        for metric in NUTRITION_TOTALS:
+            point[metric] = (row.get(metric) or 0) / days if days else None
+        for metric in ACTIVITY_TOTALS:
+            point[metric] = row.get(metric) or 0
+        points.append(point)
+    return points
+
+
+def backfill_rollups(client, user_ids):
+    """
+    Creates the rollup table if needed and rebuilds every user's rollups.
+
+    Args:
+        client: BigQuery client
+        user_ids (list): Users to rebuild
+    """
+    ensure_rollup_table(client)
+    for user_id in user_ids:
+        refresh_rollups(client, user_id)
+
+
+if __name__ == "__main__":
+    # One-off setup: python3 rollups.py
+    from data_fetcher import get_bigquery_client, get_users
+    backfill_rollups(get_bigquery_client(), [user['UserId'] for user in get_users()])
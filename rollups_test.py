@@ -0,0 +1,222 @@
+import unittest
+from datetime import date
+from unittest.mock import MagicMock, patch
+
+import data_fetcher
+from rollups import (
+    RollupQueue, affected_range, choose_grain, period_start, refresh_rollups, rollup_from_daily, trend_points,
+)
+
+# python3 -m unittest rollups_test.py
+
+
+def nutrition_day(day, calories):
+    return {
+        'date': day, 'total_calories': calories, 'total_protein': 100,
+        'total_carbs': 200, 'total_fat': 50, 'total_water_ml': 2000,
+    }
+
+
+class TestBuckets(unittest.TestCase):
+
+    def test_period_start(self):
+        day = date(2024, 5, 16)  # a Thursday
+        self.assertEqual(period_start(day, 'day'), day)
+        self.assertEqual(period_start(day, 'week'), date(2024, 5, 13))
+        self.assertEqual(period_start(day, 'month'), date(2024, 5, 1))
+        with self.assertRaises(ValueError):
+            period_start(day, 'year')
+
+    def test_affected_range_covers_week_and_month(self):
+        # The ISO week of 2024-05-01 starts in April
+        self.assertEqual(affected_range(date(2024, 5, 1)), (date(2024, 4, 29), date(2024, 5, 31)))
+        # The ISO week of 2024-05-31 ends in June
+        self.assertEqual(affected_range(date(2024, 5, 31)), (date(2024, 5, 1), date(2024, 6, 2)))
+        self.assertEqual(affected_range(date(2024, 12, 20)), (date(2024, 12, 1), date(2024, 12, 31)))
+
+    def test_choose_grain(self):
+        self.assertEqual(choose_grain(7), 'day')
+        self.assertEqual(choose_grain(30), 'day')
+        self.assertEqual(choose_grain(90), 'week')
+        self.assertEqual(choose_grain(365), 'month')
+
+
+class TestLocalRollups(unittest.TestCase):
+
+    def test_rollup_from_daily_by_week(self):
+        nutrition = [
+            nutrition_day('2024-05-13', 2000),
+            nutrition_day('2024-05-14', 1800),
+            nutrition_day('2024-05-20', 2200),
+        ]
+        workouts = [
+            {'date': '2024-05-14', 'steps': 5000, 'distance': 2.5},
+            {'date': '2024-05-14', 'steps': 1000, 'distance': 0.5},
+        ]
+        rows = rollup_from_daily(nutrition, workouts, 'week')
+
+        self.assertEqual([row['period_start'] for row in rows], [date(2024, 5, 13), date(2024, 5, 20)])
+        self.assertEqual(rows[0]['nutrition_days'], 2)
+        self.assertEqual(rows[0]['total_calories'], 3800)
+        self.assertEqual(rows[0]['steps'], 6000)
+        self.assertEqual(rows[0]['workouts'], 2)
+        self.assertEqual(rows[1]['workouts'], 0)
+
+    def test_rollup_from_daily_empty(self):
+        self.assertEqual(rollup_from_daily([], [], 'month'), [])
+
+    def test_trend_points_average_per_logged_day(self):
+        rows = [{
+            'period_start': date(2024, 5, 1), 'nutrition_days': 2, 'total_calories': 3800,
+            'total_protein': 200, 'total_carbs': 400, 'total_fat': 100, 'total_water_ml': 4000,
+            'steps': 6000, 'distance': 3.0, 'workouts': 2,
+        }, {
+            'period_start': date(2024, 6, 1), 'nutrition_days': 0, 'total_calories': 0,
+            'steps': 1000, 'distance': 1.0, 'workouts': 1,
+        }]
+        points = trend_points(rows, 'month')
+
+        self.assertEqual(points[0]['date'], '2024-05-01')
+        self.assertEqual(points[0]['total_calories'], 1900)
+        self.assertEqual(points[0]['steps'], 6000)
+        self.assertIsNone(points[1]['total_calories'])
+        self.assertEqual(points[1]['workouts'], 1)
+
+
+class TestRefreshRollups(unittest.TestCase):
+
+    def test_incremental_refresh_limits_buckets(self):
+        client = MagicMock()
+        refresh_rollups(client, 'user1', date(2024, 5, 16))
+
+        query = client.query.call_args[0][0]
+        job_config = client.query.call_args[1]['job_config']
+        params = {param.name: param.value for param in job_config.query_parameters}
+
+        self.assertIn('MERGE', query)
+        self.assertIn("DATE_TRUNC(@day, ISOWEEK)", query)
+        self.assertIn("T.period_start = DATE_TRUNC(@day, MONTH)", query)
+        self.assertEqual(params['day'], date(2024, 5, 16))
+        self.assertEqual(params['range_start'], date(2024, 5, 1))
+        self.assertEqual(params['range_end'], date(2024, 5, 31))
+
+    def test_backfill_rebuilds_everything(self):
+        client = MagicMock()
+        refresh_rollups(client, 'user1')
+
+        query = client.query.call_args[0][0]
+        job_config = client.query.call_args[1]['job_config']
+        self.assertNotIn('@day', query)
+        self.assertNotIn('day', {param.name for param in job_config.query_parameters})
+
+
+class ManualExecutor:
+    """Executor stand-in that runs jobs when the test says so."""
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, function):
+        self.jobs.append(function)
+
+    def run(self):
+        jobs, self.jobs = self.jobs, []
+        for function in jobs:
+            function()
+
+
+class TestRollupQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.client = MagicMock()
+        self.executor = ManualExecutor()
+        self.queue = RollupQueue(lambda: self.client, executor=self.executor)
+
+    def refreshed(self):
+        days = []
+        for call in self.client.query.call_args_list:
+            params = {param.name: param.value for param in call[1]['job_config'].query_parameters}
+            days.append((params['user_id'], params.get('day')))
+        return days
+
+    def test_writes_do_not_wait_for_the_merge(self):
+        self.queue.schedule('user1', date(2024, 5, 16))
+        self.client.query.assert_not_called()
+
+        self.executor.run()
+        self.assertEqual(self.refreshed(), [('user1', date(2024, 5, 16))])
+
+    def test_queued_days_are_refreshed_once_in_one_batch(self):
+        self.queue.schedule('user1', date(2024, 5, 16))
+        self.queue.schedule('user1', date(2024, 5, 16))
+        self.queue.schedule('user2', date(2024, 5, 17))
+        self.assertEqual(len(self.executor.jobs), 1)
+
+        self.executor.run()
+        self.assertEqual(self.refreshed(), [('user1', date(2024, 5, 16)), ('user2', date(2024, 5, 17))])
+
+    def test_full_rebuild_covers_single_days(self):
+        self.queue.schedule('user1', date(2024, 5, 16))
+        self.queue.schedule('user1')
+        self.executor.run()
+        self.assertEqual(self.refreshed(), [('user1', None)])
+
+    def test_failed_periods_are_retried_with_the_next_write(self):
+        self.client.query.side_effect = Exception("Could not serialize access")
+        self.queue.schedule('user1', date(2024, 5, 16))
+        self.executor.run()
+        self.assertEqual(self.queue.failed(), [('user1', date(2024, 5, 16))])
+
+        self.client.query.side_effect = None
+        self.client.query.reset_mock()
+        self.queue.schedule('user1', date(2024, 6, 2))
+        self.executor.run()
+        self.assertEqual(self.refreshed(), [('user1', date(2024, 5, 16)), ('user1', date(2024, 6, 2))])
+        self.assertEqual(self.queue.failed(), [])
+
+    @patch("data_fetcher.get_bigquery_client")
+    def test_update_rollups_queues_the_day(self, mock_get_client):
+        with patch.object(data_fetcher.rollup_queue, 'schedule') as mock_schedule:
+            data_fetcher.update_rollups('user1', '2024-05-16T08:00:00')
+        mock_schedule.assert_called_once_with('user1', date(2024, 5, 16))
+        mock_get_client.assert_not_called()
+
+
+class TestGetNutritionTrend(unittest.TestCase):
+
+    @patch("data_fetcher.get_bigquery_client")
+    def test_reads_coarsest_grain(self, mock_get_client):
+        row = MagicMock()
+        row.items.return_value = {
+            'period_start': date(2024, 5, 1), 'nutrition_days': 1, 'total_calories': 2000,
+            'steps': 0, 'distance': 0, 'workouts': 0,
+        }.items()
+        mock_client = MagicMock()
+        mock_client.query.return_value.result.return_value = [row]
+        mock_get_client.return_value = mock_client
+
+        points = data_fetcher.get_nutrition_trend('user1', days=365)
+
+        job_config = mock_client.query.call_args[1]['job_config']
+        params = {param.name: param.value for param in job_config.query_parameters}
+        self.assertEqual(params['grain'], 'month')
+        self.assertEqual(params['start_date'].day, 1)
+        self.assertEqual(points[0]['total_calories'], 2000)
+
+    @patch("data_fetcher.get_cached_performance_metrics")
+    @patch("data_fetcher.get_cached_nutrition_data")
+    @patch("data_fetcher.get_bigquery_client")
+    def test_falls_back_to_daily_data(self, mock_get_client, mock_nutrition, mock_performance):
+        mock_get_client.return_value.query.side_effect = Exception("Not found: Table")
+        mock_nutrition.return_value = [nutrition_day('2024-05-13', 2000)]
+        mock_performance.return_value = []
+
+        points = data_fetcher.get_nutrition_trend('user1', days=14)
+
+        self.assertEqual(len(points), 1)
+        self.assertEqual(points[0]['grain'], 'day')
+        self.assertEqual(points[0]['total_calories'], 2000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,277 @@
+"""
+sensor_anomalies.py
+
+This module flags abnormal sensor readings during workouts:
+  - heart_rate_spike: a heart rate far above its recent level (EWMA z-score)
+  - heart_rate_out_of_range: a heart rate outside what a body can produce
+  - dropout: no reading from a sensor for longer than DROPOUT_SECONDS
+  - step_burst: more steps per second than a person can take
+
+Every (workout, sensor) stream keeps an exponentially weighted mean and
+variance. A reading is scored against the state before it, then folded in:
+
+    diff = x - mean
+    mean = mean + alpha * diff
+    var  = (1 - alpha) * (var + alpha * diff * diff)
+
+AnomalyDetector applies this online, one reading at a time, with O(1) state
+per stream (for incoming batches). detect_anomalies() computes the same
+events for any number of historical workouts at once with vectorized
+NumPy/pandas operations.
+"""
+
+import numpy as np
+import pandas as pd
+
+from workout_records import parse_timestamp
+
+HEART_RATE_SENSOR = 'sensor1'
+STEPS_SENSOR = 'sensor2'
+
+# Weight of the newest reading in the moving mean and variance
+EWMA_ALPHA = 0.1
+
+# Readings a stream needs before it is scored
+WARMUP_READINGS = 10
+
+# A heart rate this many standard deviations above the moving mean is a spike
+SPIKE_Z = 4.0
+
+# Plausible heart rate in bpm
+HEART_RATE_RANGE = (25, 230)
+
+# Longest expected silence between two readings of the same sensor
+DROPOUT_SECONDS = 30
+
+# Step readings count the steps since the previous reading; sprinting
+# cadence stays below this
+MAX_STEPS_PER_SECOND = 5
+
+EVENT_COLUMNS = ['workout_id', 'sensor_id', 'timestamp', 'kind', 'value', 'score']
+
+
+def readings_from_sensor_data(workout_id, sensor_data):
+    """
+    Converts get_user_sensor_data output to readings for the detectors.
+
+    Args:
+        workout_id (str): The workout the data belongs to
+        sensor_data (list): Dictionaries with 'sensor_type', 'timestamp' and 'data'
+
+    Returns:
+        list: Dictionaries with 'workout_id', 'sensor_id', 'timestamp' and 'value'
+    """
+    return [{
+        'workout_id': workout_id,
+        'sensor_id': reading['sensor_type'],
+        'timestamp': reading['timestamp'],
+        'value': reading['data'],
+    } for reading in sensor_data]
+
+
+class _StreamState:
+    __slots__ = ('count', 'mean', 'var', 'last_time')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.var = 0.0
+        self.last_time = None
+
+
+class AnomalyDetector:
+    """
+    Online anomaly detection over sensor readings.
+
+    Readings of a stream must arrive in time order; streams may interleave.
+
+    Args:
+        alpha (float): EWMA weight of the newest reading
+        z_threshold (float): z-score above which a heart rate is a spike
+        warmup (int): Readings a stream needs before it is scored
+        dropout_seconds (float): Longest expected gap between readings
+        max_steps_per_second (float): Highest plausible step rate
+    """
+
+    def __init__(self, alpha=EWMA_ALPHA, z_threshold=SPIKE_Z, warmup=WARMUP_READINGS,
+                 dropout_seconds=DROPOUT_SECONDS, max_steps_per_second=MAX_STEPS_PER_SECOND):
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.warmup = warmup
+        self.dropout_seconds = dropout_seconds
+        self.max_steps_per_second = max_steps_per_second
+        self._streams = {}
+
+    def update(self, workout_id, sensor_id, timestamp, value):
+        """
+        Scores one reading and adds it to its stream.
+
+        Args:
+            workout_id (str): The workout
+            sensor_id (str): The sensor
+            timestamp (datetime or str): Time of the reading
+            value (float): The reading
+
+        Returns:
+            list: Anomaly events (dicts with EVENT_COLUMNS), usually empty
+        """
+        timestamp = parse_timestamp(timestamp)
+        value = float(value)
+        state = self._streams.get((workout_id, sensor_id))
+        if state is None:
+            state = self._streams[(workout_id, sensor_id)] = _StreamState()
+
+        events = []
+
+        def emit(kind, score):
+            events.append({
+                'workout_id': workout_id, 'sensor_id': sensor_id, 'timestamp': timestamp,
+                'kind': kind, 'value': value, 'score': score,
+            })
+
+        score = np.nan
+        if state.count >= self.warmup and state.var > 0:
+            score = (value - state.mean) / np.sqrt(state.var)
+
+        if sensor_id == HEART_RATE_SENSOR:
+            low, high = HEART_RATE_RANGE
+            if value < low or value > high:
+                emit('heart_rate_out_of_range', score)
+            elif score > self.z_threshold:
+                emit('heart_rate_spike', score)
+
+        if state.last_time is not None:
+            gap = (timestamp - state.last_time).total_seconds()
+            if gap > self.dropout_seconds:
+                emit('dropout', gap)
+            if sensor_id == STEPS_SENSOR and gap > 0 and value / gap > self.max_steps_per_second:
+                emit('step_burst', value / gap)
+
+        # Fold the reading into the stream state
+        if state.count == 0:
+            state.mean = value
+        else:
+            diff = value - state.mean
+            increment = self.alpha * diff
+            state.mean += increment
+            state.var = (1 - self.alpha) * (state.var + diff * increment)
+        state.count += 1
+        state.last_time = timestamp
+        return events
+
+    def feed(self, readings):
+        """
+        Scores a batch of readings in order.
+
+        Args:
+            readings (list): Dictionaries with 'workout_id', 'sensor_id',
+                'timestamp' and 'value'
+
+        Returns:
+            list: Anomaly events in reading order
+        """
+        events = []
+        for reading in readings:
+            events.extend(self.update(
+                reading['workout_id'], reading['sensor_id'], reading['timestamp'], reading['value']
+            ))
+        return events
+
+    def reset(self, workout_id=None):
+        """Drops the state of one workout's streams, or of all streams."""
+        if workout_id is None:
+            self._streams.clear()
+        else:
+            for key in [key for key in self._streams if key[0] == workout_id]:
+                del self._streams[key]
+
+
+def _stream_ewma(x, first, stream_start, position, alpha, initial=None):
+    """
+    Runs y = (1 - alpha) * y + alpha * x separately over each stream of a
+    sorted array, starting each stream at its first value (or `initial`).
+
+    A single EWMA over the whole array carries the previous stream into the
+    next one. That carry-over decays by (1 - alpha) per reading, so it is
+    computed once at each stream start and subtracted.
+    """
+    flat = pd.Series(x).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    start_value = x if initial is None else initial
+    # Difference between the wanted and the flat value at each stream start
+    offset = np.where(first, start_value - flat, 0.0)
+    return flat + offset[stream_start] * (1 - alpha) ** position
+
+
+def detect_anomalies(readings, alpha=EWMA_ALPHA, z_threshold=SPIKE_Z, warmup=WARMUP_READINGS,
+                     dropout_seconds=DROPOUT_SECONDS, max_steps_per_second=MAX_STEPS_PER_SECOND):
+    """
+    Finds the anomalies of many workouts at once.
+
+    Produces the same events as feeding every stream through an
+    AnomalyDetector in time order.
+
+    Args:
+        readings (DataFrame or list): Rows with 'workout_id', 'sensor_id',
+            'timestamp' and 'value', in any order
+        alpha, z_threshold, warmup, dropout_seconds, max_steps_per_second:
+            See AnomalyDetector
+
+    Returns:
+        DataFrame: EVENT_COLUMNS, ordered by workout, time and kind
+    """
+    frame = pd.DataFrame(readings)
+    if frame.empty:
+        return pd.DataFrame(columns=EVENT_COLUMNS)
+
+    frame = frame[['workout_id', 'sensor_id', 'timestamp', 'value']].copy()
+    frame['timestamp'] = pd.to_datetime(frame['timestamp'], utc=True)
+    frame['value'] = pd.to_numeric(frame['value'], errors='coerce')
+    frame = frame.dropna(subset=['timestamp', 'value'])
+
+    # Sort into streams (workout and sensor), each in time order
+    workout_codes, _ = pd.factorize(frame['workout_id'])
+    sensor_codes, sensor_ids = pd.factorize(frame['sensor_id'])
+    streams = workout_codes.astype(np.int64) * len(sensor_ids) + sensor_codes
+    seconds = frame['timestamp'].to_numpy(dtype='datetime64[ns]').astype(np.int64) / 1e9
+    order = np.lexsort((seconds, streams))
+    streams, seconds, sensor_codes = streams[order], seconds[order], sensor_codes[order]
+    values = frame['value'].to_numpy(dtype=float)[order]
+    n = len(values)
+
+    first = np.ones(n, dtype=bool)
+    first[1:] = streams[1:] != streams[:-1]
+    stream_start = np.maximum.accumulate(np.where(first, np.arange(n), 0))
+    position = np.arange(n) - stream_start
+
+    # Stream state after each reading, then shifted to the state before it
+    mean_after = _stream_ewma(values, first, stream_start, position, alpha)
+    mean_before = np.where(first, np.nan, np.roll(mean_after, 1))
+    diff = np.where(first, 0.0, values - mean_before)
+    var_after = _stream_ewma((1 - alpha) * diff * diff, first, stream_start, position, alpha, initial=0.0)
+    var_before = np.where(first, np.nan, np.roll(var_after, 1))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        score = np.where((position >= warmup) & (var_before > 0), (values - mean_before) / np.sqrt(var_before), np.nan)
+        gap = np.where(first, np.nan, seconds - np.roll(seconds, 1))
+        step_rate = np.where(gap > 0, values / gap, np.nan)
+
+    heart_rate = sensor_codes == sensor_ids.get_indexer([HEART_RATE_SENSOR])[0]
+    steps = sensor_codes == sensor_ids.get_indexer([STEPS_SENSOR])[0]
+    low, high = HEART_RATE_RANGE
+    out_of_range = heart_rate & ((values < low) | (values > high))
+    checks = [
+        ('heart_rate_out_of_range', out_of_range, score),
+        ('heart_rate_spike', heart_rate & ~out_of_range & (score > z_threshold), score),
+        ('dropout', gap > dropout_seconds, gap),
+        ('step_burst', steps & (step_rate > max_steps_per_second), step_rate),
+    ]
+
+    events = []
+    for kind, mask, scores in checks:
+        rows = np.flatnonzero(mask)
+        if len(rows):
+            found = frame.iloc[order[rows]][['workout_id', 'sensor_id', 'timestamp']]
+            events.append(found.assign(kind=kind, value=values[rows], score=scores[rows])[EVENT_COLUMNS])
+    if not events:
+        return pd.DataFrame(columns=EVENT_COLUMNS)
+    events = pd.concat(events, ignore_index=True)
+    return events.sort_values(['workout_id', 'timestamp', 'kind'], kind='stable', ignore_index=True)
@@ -0,0 +1,141 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pandas as pd
+
+import data_fetcher
+from sensor_anomalies import AnomalyDetector, detect_anomalies, readings_from_sensor_data
+
+# python3 -m unittest sensor_anomalies_test.py
+
+
+START = datetime(2025, 4, 5, 9)
+
+
+def stream(workout_id, sensor_id, values, interval=5, gaps=None):
+    """Readings every `interval` seconds; gaps maps a reading index to extra seconds."""
+    gaps = gaps or {}
+    rows, offset = [], 0
+    for i, value in enumerate(values):
+        offset += gaps.get(i, 0)
+        rows.append({
+            'workout_id': workout_id, 'sensor_id': sensor_id,
+            'timestamp': START + timedelta(seconds=i * interval + offset), 'value': value,
+        })
+    return rows
+
+
+def steady_heart_rate(count=60, seed=0):
+    return list(140 + np.random.default_rng(seed).normal(0, 2, count))
+
+
+def kinds(events):
+    return [event['kind'] for event in events]
+
+
+class TestAnomalyDetector(unittest.TestCase):
+
+    def test_heart_rate_spike(self):
+        values = steady_heart_rate()
+        values[40] = 175
+        events = AnomalyDetector().feed(stream('w1', 'sensor1', values))
+
+        self.assertEqual(kinds(events), ['heart_rate_spike'])
+        self.assertEqual(events[0]['timestamp'], START + timedelta(seconds=200))
+        self.assertGreater(events[0]['score'], 4)
+
+    def test_no_scores_during_warmup(self):
+        values = steady_heart_rate()
+        values[3] = 190
+        self.assertEqual(AnomalyDetector().feed(stream('w1', 'sensor1', values)), [])
+
+    def test_out_of_range_heart_rate(self):
+        values = steady_heart_rate()
+        values[2] = 0
+        self.assertEqual(kinds(AnomalyDetector().feed(stream('w1', 'sensor1', values))), ['heart_rate_out_of_range'])
+
+    def test_dropout_and_step_burst(self):
+        steps = [10] * 20
+        steps[12] = 60  # 60 steps in 5 seconds
+        events = AnomalyDetector().feed(stream('w1', 'sensor2', steps, gaps={8: 45}))
+        self.assertEqual(kinds(events), ['dropout', 'step_burst'])
+        self.assertEqual(events[0]['score'], 50)
+        self.assertEqual(events[1]['score'], 12)
+
+    def test_streams_keep_separate_state(self):
+        detector = AnomalyDetector()
+        first, second = stream('w1', 'sensor1', steady_heart_rate()), stream('w2', 'sensor1', [60] * 20)
+        # Interleaved batches of two workouts
+        events = detector.feed(first[:30] + second[:10]) + detector.feed(first[30:] + second[10:])
+        self.assertEqual(events, [])
+
+        detector.reset('w1')
+        self.assertEqual(detector.feed(stream('w1', 'sensor1', [90])), [])
+
+    def test_sensor_data_output(self):
+        sensor_data = [{'sensor_type': 'sensor1', 'timestamp': '2025-04-05T09:00:00', 'data': 120, 'units': 'bpm'}]
+        readings = readings_from_sensor_data('w1', sensor_data)
+        self.assertEqual(readings, [{
+            'workout_id': 'w1', 'sensor_id': 'sensor1', 'timestamp': '2025-04-05T09:00:00', 'value': 120,
+        }])
+        self.assertEqual(AnomalyDetector().feed(readings), [])
+
+
+class TestDetectAnomalies(unittest.TestCase):
+
+    def test_matches_online_detector(self):
+        rows = []
+        for i in range(10):
+            heart_rate = steady_heart_rate(seed=i)
+            heart_rate[20 + i] = 180 if i % 2 else 250
+            steps = [12] * 60
+            steps[30 + i] = 80
+            rows += stream(f'w{i}', 'sensor1', heart_rate, gaps={40: 40 * (i % 3)})
+            rows += stream(f'w{i}', 'sensor2', steps)
+        online = pd.DataFrame(AnomalyDetector().feed(rows))
+
+        # Any row order gives the same result
+        bulk = detect_anomalies(pd.DataFrame(rows).sample(frac=1, random_state=0))
+
+        columns = ['workout_id', 'sensor_id', 'kind', 'value']
+        self.assertEqual(
+            sorted(map(tuple, online[columns].to_numpy().tolist())),
+            sorted(map(tuple, bulk[columns].to_numpy().tolist())),
+        )
+        self.assertEqual(set(bulk['kind']), {'heart_rate_spike', 'heart_rate_out_of_range', 'dropout', 'step_burst'})
+        np.testing.assert_allclose(
+            online.sort_values(columns)['score'].to_numpy(float),
+            bulk.sort_values(columns)['score'].to_numpy(float),
+            rtol=1e-9,
+        )
+
+    def test_empty(self):
+        self.assertTrue(detect_anomalies([]).empty)
+        self.assertTrue(detect_anomalies(stream('w1', 'sensor1', steady_heart_rate())).empty)
+
+
+class TestGetWorkoutAnomalies(unittest.TestCase):
+
+    @patch("data_fetcher.get_bigquery_client")
+    def test_reads_sensor_data_once(self, mock_get_client):
+        values = steady_heart_rate()
+        values[40] = 175
+        rows = []
+        for reading in stream('w1', 'sensor1', values):
+            row = MagicMock()
+            row.items.return_value = reading.items()
+            rows.append(row)
+        mock_client = mock_get_client.return_value
+        mock_client.query.return_value.result.return_value = rows
+
+        events = data_fetcher.get_workout_anomalies('user1', ['w1'])
+
+        mock_client.query.assert_called_once()
+        self.assertIn('UNNEST(@workout_ids)', mock_client.query.call_args[0][0])
+        self.assertEqual(events['kind'].tolist(), ['heart_rate_spike'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,209 @@
+"""
+sensor_summary.py
+
+This module maintains one summary row per workout and sensor in the
+WorkoutSensorSummary table, so pages and the advice prompt never scan the
+raw SensorData rows. Each row holds:
+  - the number of readings
+  - the average, minimum, maximum and standard deviation of the values
+  - the first and last reading timestamps
+
+refresh_sensor_summaries() recomputes the rows of the given workouts with a
+single MERGE and runs whenever sensor readings are added
+(data_fetcher.add_sensor_readings). Without workout IDs it rebuilds every
+row, which is the backfill for workouts recorded before the table existed.
+"""
+
+import pandas as pd
+
+# Import BigQuery if it's not already imported
+try:
+    from google.cloud import bigquery
+except ImportError:
+    print("BigQuery library not available. Some features will be unavailable.")
+
+PROJECT_ID = "bamboo-creek-450920-h2"
+DATASET_ID = "ISE"
+SUMMARY_TABLE = f"`{PROJECT_ID}.{DATASET_ID}.WorkoutSensorSummary`"
+
+SUMMARY_COLUMNS = [
+    'samples', 'avg_value', 'min_value', 'max_value', 'stddev_value',
+    'first_timestamp', 'last_timestamp',
+]
+
+CREATE_SUMMARY_TABLE = f"""
+    CREATE TABLE IF NOT EXISTS {SUMMARY_TABLE} (
+        workout_id STRING NOT NULL,
+        user_id STRING NOT NULL,
+        sensor_id STRING NOT NULL,
+        samples INT64,
+        avg_value FLOAT64,
+        min_value FLOAT64,
+        max_value FLOAT64,
+        stddev_value FLOAT64,
+        first_timestamp TIMESTAMP,
+        last_timestamp TIMESTAMP,
+        updated_at TIMESTAMP
+    )
+    CLUSTER BY user_id, workout_id
+"""
+
+# Recomputes the summaries of the workouts selected by {workout_filter}.
+# Summaries of sensors without readings left are deleted.
+MERGE_SUMMARIES = f"""
+    MERGE {SUMMARY_TABLE} T
+    USING (
+        SELECT
+            sd.WorkoutID AS workout_id,
+            w.UserId AS user_id,
+            sd.SensorId AS sensor_id,
+            COUNT(*) AS samples,
+            AVG(sd.SensorValue) AS avg_value,
+            MIN(sd.SensorValue) AS min_value,
+            MAX(sd.SensorValue) AS max_value,
+            STDDEV_POP(sd.SensorValue) AS stddev_value,
+            MIN(sd.Timestamp) AS first_timestamp,
+            MAX(sd.Timestamp) AS last_timestamp
+        FROM `{PROJECT_ID}.{DATASET_ID}.SensorData` sd
+        JOIN `{PROJECT_ID}.{DATASET_ID}.Workouts` w ON sd.WorkoutID = w.WorkoutId
+        WHERE {{workout_filter}}
+        GROUP BY workout_id, user_id, sensor_id
+    ) S
+    ON T.workout_id = S.workout_id AND T.sensor_id = S.sensor_id
+    WHEN MATCHED THEN UPDATE SET
+        user_id = S.user_id,
+        samples = S.samples,
+        avg_value = S.avg_value,
+        min_value = S.min_value,
+        max_value = S.max_value,
+        stddev_value = S.stddev_value,
+        first_timestamp = S.first_timestamp,
+        last_timestamp = S.last_timestamp,
+        updated_at = CURRENT_TIMESTAMP()
+    WHEN NOT MATCHED THEN INSERT (
+        workout_id, user_id, sensor_id, samples, avg_value, min_value, max_value,
+        stddev_value, first_timestamp, last_timestamp, updated_at
+    ) VALUES (
+        S.workout_id, S.user_id, S.sensor_id, S.samples, S.avg_value, S.min_value, S.max_value,
+        S.stddev_value, S.first_timestamp, S.last_timestamp, CURRENT_TIMESTAMP()
+    )
+    WHEN NOT MATCHED BY SOURCE AND {{target_filter}} THEN DELETE
+"""
+
+
+def ensure_summary_table(client):
+    """Creates the summary table if it does not exist."""
+    client.query(CREATE_SUMMARY_TABLE).result()
+
+
+def refresh_sensor_summaries(client, workout_ids=None):
+    """
+    Recomputes sensor summaries with a single MERGE.
+
+    Args:
+        client: BigQuery client
+        workout_ids (list, optional): Workouts whose readings changed. Without
+            them, every summary is rebuilt (backfill).
+    """
+    if workout_ids is None:
+        query = MERGE_SUMMARIES.format(workout_filter='TRUE', target_filter='TRUE')
+        job_config = bigquery.QueryJobConfig()
+    else:
+        query = MERGE_SUMMARIES.format(
+            workout_filter='sd.WorkoutID IN UNNEST(@workout_ids)',
+            target_filter='T.workout_id IN UNNEST(@workout_ids)',
+        )
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ArrayQueryParameter("workout_ids", "STRING", list(workout_ids))]
+        )
+    client.query(query, job_config=job_config).result()
+
+
+def summarize_readings(readings):
+    """
+    Computes summary rows locally, with the same columns as the table.
+
+    Args:
+        readings (DataFrame or list): Rows with 'workout_id', 'sensor_id',
+            'timestamp' and 'value'
+
+    Returns:
+        list: Dictionaries with 'workout_id', 'sensor_id' and SUMMARY_COLUMNS
+    """
+    frame = pd.DataFrame(readings)
+    if frame.empty:
+        return []
+    frame['value'] = pd.to_numeric(frame['value'], errors='coerce')
+    summary = frame.groupby(['workout_id', 'sensor_id'], sort=True).agg(
+        samples=('value', 'size'),
+        avg_value=('value', 'mean'),
+        min_value=('value', 'min'),
+        max_value=('value', 'max'),
+        stddev_value=('value', lambda values: values.std(ddof=0)),
+        first_timestamp=('timestamp', 'min'),
+        last_timestamp=('timestamp', 'max'),
+    )
+    return summary.reset_index().to_dict('records')
+
+
+def group_by_workout(rows):
+    """
+    Groups summary rows by workout and sensor.
+
+    Args:
+        rows (list): Dictionaries with 'workout_id', 'sensor_id' and
+            SUMMARY_COLUMNS
+
+    Returns:
+        dict: workout_id -> sensor_id -> {SUMMARY_COLUMNS}
+    """
+    workouts = {}
+    for row in rows:
+        workouts.setdefault(row['workout_id'], {})[row['sensor_id']] = {
+            column: row.get(column) for column in SUMMARY_COLUMNS
+        }
+    return workouts
+
+
+def read_sensor_summaries(client, user_id, workout_ids=None):
+    """
+    Reads a user's sensor summaries.
+
+    Args:
+        client: BigQuery client
+        user_id (str): The user
+        workout_ids (list, optional): Only these workouts
+
+    Returns:
+        dict: workout_id -> sensor_id -> {SUMMARY_COLUMNS}
+    """
+    query = f"""
+        SELECT workout_id, sensor_id, {', '.join(SUMMARY_COLUMNS)}
+        FROM {SUMMARY_TABLE}
+        WHERE user_id = @user_id
+    """
+    parameters = [bigquery.ScalarQueryParameter("user_id", "STRING", user_id)]
+    if workout_ids is not None:
+        query += " AND workout_id IN UNNEST(@workout_ids)"
+        parameters.append(bigquery.ArrayQueryParameter("workout_ids", "STRING", list(workout_ids)))
+
+    job_config = bigquery.QueryJobConfig(query_parameters=parameters)
+    rows = [dict(row.items()) for row in client.query(query, job_config=job_config).result()]
+    return group_by_workout(rows)
+
+
+def backfill_sensor_summaries(client):
+    """
+    Creates the summary table if needed and summarizes every workout.
+
+    Args:
+        client: BigQuery client
+    """
+    ensure_summary_table(client)
+    refresh_sensor_summaries(client)
+
+
+if __name__ == "__main__":
+    # One-off setup: python3 sensor_summary.py
+    from data_fetcher import get_bigquery_client
+    backfill_sensor_summaries(get_bigquery_client())
@@ -0,0 +1,126 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import data_fetcher
+from sensor_summary import group_by_workout, read_sensor_summaries, refresh_sensor_summaries, summarize_readings
+
+# python3 -m unittest sensor_summary_test.py
+
+
+START = datetime(2025, 4, 5, 9)
+
+
+def reading(workout_id, sensor_id, minute, value):
+    return {'workout_id': workout_id, 'sensor_id': sensor_id, 'timestamp': START + timedelta(minutes=minute), 'value': value}
+
+
+class TestSummarizeReadings(unittest.TestCase):
+
+    def test_per_workout_and_sensor(self):
+        rows = summarize_readings([
+            reading('w1', 'sensor1', 2, 150),
+            reading('w1', 'sensor1', 0, 110),
+            reading('w1', 'sensor3', 1, 36.6),
+            reading('w2', 'sensor1', 0, 100),
+        ])
+        summaries = group_by_workout(rows)
+
+        heart_rate = summaries['w1']['sensor1']
+        self.assertEqual(heart_rate['samples'], 2)
+        self.assertEqual(heart_rate['avg_value'], 130)
+        self.assertEqual((heart_rate['min_value'], heart_rate['max_value']), (110, 150))
+        self.assertEqual(heart_rate['stddev_value'], 20)
+        self.assertEqual(heart_rate['first_timestamp'], START)
+        self.assertEqual(heart_rate['last_timestamp'], START + timedelta(minutes=2))
+        self.assertEqual(set(summaries), {'w1', 'w2'})
+        self.assertEqual(set(summaries['w1']), {'sensor1', 'sensor3'})
+
+    def test_empty(self):
+        self.assertEqual(summarize_readings([]), [])
+
+
+class TestRefreshSensorSummaries(unittest.TestCase):
+
+    def test_refresh_limited_to_workouts(self):
+        client = MagicMock()
+        refresh_sensor_summaries(client, ['w1'])
+
+        query = client.query.call_args[0][0]
+        job_config = client.query.call_args[1]['job_config']
+        self.assertIn('MERGE', query)
+        self.assertIn('sd.WorkoutID IN UNNEST(@workout_ids)', query)
+        self.assertIn('T.workout_id IN UNNEST(@workout_ids)', query)
+        self.assertEqual(job_config.query_parameters[0].values, ['w1'])
+
+    def test_backfill_rebuilds_everything(self):
+        client = MagicMock()
+        refresh_sensor_summaries(client)
+        query = client.query.call_args[0][0]
+        self.assertNotIn('@workout_ids', query)
+
+    def test_read_groups_rows(self):
+        row = MagicMock()
+        row.items.return_value = {
+            'workout_id': 'w1', 'sensor_id': 'sensor1', 'samples': 3, 'avg_value': 120.0,
+            'min_value': 100.0, 'max_value': 140.0, 'stddev_value': 16.3,
+            'first_timestamp': START, 'last_timestamp': START,
+        }.items()
+        client = MagicMock()
+        client.query.return_value.result.return_value = [row]
+
+        summaries = read_sensor_summaries(client, 'user1', ['w1'])
+
+        self.assertEqual(summaries['w1']['sensor1']['avg_value'], 120.0)
+        self.assertIn('workout_id IN UNNEST(@workout_ids)', client.query.call_args[0][0])
+
+
+class TestAddSensorReadings(unittest.TestCase):
+
+    @patch("data_fetcher.materialize_training_load")
+    @patch("data_fetcher.refresh_sensor_summaries")
+    @patch("data_fetcher.get_bigquery_client")
+    def test_insert_refreshes_summary(self, mock_get_client, mock_refresh, mock_materialize):
+        client = mock_get_client.return_value
+        readings = [
+            {'sensor_id': 'sensor1', 'timestamp': START, 'value': 120},
+            {'sensor_id': 'sensor2', 'timestamp': START, 'value': 90},
+        ]
+
+        self.assertTrue(data_fetcher.add_sensor_readings('user1', 'w1', readings))
+
+        query, job_config = client.query.call_args[0][0], client.query.call_args[1]['job_config']
+        # Every array is read from its query parameter
+        self.assertIn('@timestamps[OFFSET(i)]', query)
+        self.assertIn('@sensor_values[OFFSET(i)]', query)
+        self.assertIn('FROM UNNEST(@sensor_ids) AS sensor_id WITH OFFSET i', query)
+        params = {param.name: param for param in job_config.query_parameters}
+        self.assertEqual(set(params), {'user_id', 'workout_id', 'sensor_ids', 'timestamps', 'sensor_values'})
+        self.assertEqual(params['sensor_ids'].values, ['sensor1', 'sensor2'])
+        self.assertEqual(params['sensor_values'].values, [120.0, 90.0])
+        mock_refresh.assert_called_once_with(client, ['w1'])
+        mock_materialize.assert_called_once_with(client, 'user1', workout_ids=['w1'])
+
+    @patch("data_fetcher.refresh_sensor_summaries")
+    @patch("data_fetcher.get_bigquery_client")
+    def test_failure_returns_false(self, mock_get_client, mock_refresh):
+        mock_get_client.return_value.query.side_effect = Exception("boom")
+        self.assertFalse(data_fetcher.add_sensor_readings('user1', 'w1', [{'sensor_id': 'sensor1', 'timestamp': START, 'value': 1}]))
+        mock_refresh.assert_not_called()
+
+    @patch("data_fetcher.materialize_training_load")
+    @patch("data_fetcher.refresh_sensor_summaries")
+    @patch("data_fetcher.get_bigquery_client")
+    def test_stored_readings_succeed_when_maintenance_fails(self, mock_get_client, mock_refresh, mock_materialize):
+        mock_refresh.side_effect = Exception("summary failed")
+        mock_materialize.side_effect = Exception("training load failed")
+        reading = {'sensor_id': 'sensor1', 'timestamp': START, 'value': 1}
+
+        self.assertTrue(data_fetcher.add_sensor_readings('user1', 'w1', [reading]))
+        # Both refreshes are attempted, the insert ran once
+        mock_materialize.assert_called_once()
+        self.assertEqual(mock_get_client.return_value.query.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,559 @@
+"""
+shared_cache.py
+
+This module is the cache tier shared by every app instance, behind the
+per-process FetchCache (fetch_cache.py). It includes:
+  - encode() / decode(): compact values: msgpack (JSON when msgpack is not
+    installed) with dates, datetimes, tuples and WorkoutRecords kept as
+    such (and compact records, compact_records.py), zlib-compressed above COMPRESS_MIN_BYTES
+  - SQLiteBackend: a local file stand-in, shared by the processes of one
+    host (and handy for development)
+  - RedisBackend: any Redis-protocol server (Redis, Memorystore, Valkey)
+  - SharedCache: namespaced keys, per-entity TTLs and hit/miss/latency
+    metrics on top of a backend
+  - get_shared_cache(): the configured instance, from SHARED_CACHE_URL
+    ("redis://host:6379/0" or "sqlite:///path/to/cache.db"); None when unset
+
+msgpack and redis are listed in requirements-optional.txt, not in the default
+requirements.txt.
+
+Writes reach other instances through version keys. Every cache event bumps
+the version of its (entity, user); data keys include the versions of the
+entities they were read from, so after a write every instance looks up new
+keys and the old entries simply expire.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import date, datetime, timedelta
+
+from cache_events import FOODS, GOALS, MEALS, POSTS, SENSORS, WATER, WORKOUTS, subscribe
+from compact_records import RECORD_TYPES, CompactRecord
+from workout_records import WorkoutRecord
+
+# Import msgpack if it's available; values fall back to tagged JSON
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Import redis if it's available
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# Prefix of every key; bump the version when cached value formats change
+DEFAULT_NAMESPACE = 'fitness:v2'
+
+# Values at least this large are compressed
+COMPRESS_MIN_BYTES = 512
+
+# How long shared entries live, by the entity they are read from. A cache
+# reading several entities uses the shortest TTL.
+ENTITY_TTLS = {
+    FOODS: 24 * 60 * 60,
+    WORKOUTS: 6 * 60 * 60,
+    SENSORS: 6 * 60 * 60,
+    POSTS: 60 * 60,
+    GOALS: 60 * 60,
+    MEALS: 30 * 60,
+    WATER: 30 * 60,
+}
+DEFAULT_TTL_SECONDS = 60 * 60
+
+# How long version keys are kept; longer than any entry TTL
+VERSION_TTL_SECONDS = 7 * 24 * 60 * 60
+
+_FORMAT_MSGPACK = 1
+_FORMAT_JSON = 2
+_COMPRESSED = 4
+
+# Tags of the non-native types in encoded values
+_DATETIME, _DATE, _TIMEDELTA, _TUPLE, _WORKOUT, _RECORD = range(1, 7)
+
+
+def _workout_data(record):
+    return [record.workout_id, record.start_time, record.end_time, record.start_lat_lng,
+            record.end_lat_lng, record.distance, record.steps, record.calories_burned]
+
+
+def _tagged(value):
+    # (tag, data) of a value msgpack/JSON cannot store natively, or None
+    if isinstance(value, datetime):
+        return _DATETIME, value.isoformat()
+    if isinstance(value, date):
+        return _DATE, value.isoformat()
+    if isinstance(value, timedelta):
+        return _TIMEDELTA, value.total_seconds()
+    if isinstance(value, tuple):
+        return _TUPLE, list(value)
+    if isinstance(value, WorkoutRecord):
+        return _WORKOUT, _workout_data(value)
+    if isinstance(value, CompactRecord):
+        # Values only: field names come from the record type
+        return _RECORD, [type(value).__name__, value.values()]
+    return None
+
+
+def _untag(tag, data):
+    if tag == _DATETIME:
+        return datetime.fromisoformat(data)
+    if tag == _DATE:
+        return date.fromisoformat(data)
+    if tag == _TIMEDELTA:
+        return timedelta(seconds=data)
+    if tag == _TUPLE:
+        return tuple(data)
+    if tag == _WORKOUT:
+        return WorkoutRecord(*data)
+    if tag == _RECORD:
+        name, values = data
+        return RECORD_TYPES[name].from_values(values)
+    raise ValueError(f"Unknown cached type tag: {tag}")
+
+
+def _native(value):
+    # Plain Python equivalent of NumPy scalars and dict/list subclasses, or None
+    if type(value).__module__ == 'numpy' and hasattr(value, 'item'):
+        return value.item()
+    if isinstance(value, dict):
+        return dict(value)
+    if isinstance(value, list):
+        return list(value)
+    return None
+
+
+def _msgpack_default(value):
+    native = _native(value)
+    if native is not None:
+        return native
+    tagged = _tagged(value)
+    if tagged is None:
+        raise TypeError(f"Cannot cache {type(value).__name__}")
+    tag, data = tagged
+    return msgpack.ExtType(tag, msgpack.packb(data, default=_msgpack_default, use_bin_type=True, strict_types=True))
+
+
+def _msgpack_ext_hook(tag, payload):
+    return _untag(tag, msgpack.unpackb(payload, ext_hook=_msgpack_ext_hook, raw=False, strict_map_key=False))
+
+
+def _json_default(value):
+    native = _native(value)
+    if native is not None:
+        return native
+    tagged = _tagged(value)
+    if tagged is None:
+        raise TypeError(f"Cannot cache {type(value).__name__}")
+    tag, data = tagged
+    return {'__t': tag, 'v': _tag_tuples(data)}
+
+
+def _json_object_hook(obj):
+    if '__t' in obj and len(obj) == 2:
+        return _untag(obj['__t'], obj['v'])
+    return obj
+
+
+def encode(value):
+    """
+    Serializes a cached value.
+
+    Args:
+        value: None, bools, numbers, strings, lists, dicts with string keys,
+            tuples, dates, datetimes, timedeltas, WorkoutRecords and
+            compact records
+
+    Returns:
+        bytes: One format byte followed by the (possibly compressed) payload
+
+    Raises:
+        TypeError: If the value contains an unsupported type
+    """
+    if msgpack is not None:
+        # strict_types sends tuples (and subclasses) through the default hook
+        flags = _FORMAT_MSGPACK
+        payload = msgpack.packb(value, default=_msgpack_default, use_bin_type=True, strict_types=True)
+    else:
+        flags = _FORMAT_JSON
+        payload = json.dumps(_tag_tuples(value), default=_json_default, separators=(',', ':')).encode('utf-8')
+    if len(payload) >= COMPRESS_MIN_BYTES:
+        flags |= _COMPRESSED
+        payload = zlib.compress(payload, 6)
+    return bytes([flags]) + payload
+
+
+def _tag_tuples(value):
+    # json.dumps writes tuples as lists without calling default
+    if isinstance(value, tuple):
+        return {'__t': _TUPLE, 'v': [_tag_tuples(item) for item in value]}
+    if isinstance(value, list):
+        return [_tag_tuples(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _tag_tuples(item) for key, item in value.items()}
+    return value
+
+
+def decode(data):
+    """
+    Restores a value written by encode().
+
+    Args:
+        data (bytes): Encoded value
+
+    Returns:
+        The value
+    """
+    flags, payload = data[0], data[1:]
+    if flags & _COMPRESSED:
+        payload = zlib.decompress(payload)
+    if flags & _FORMAT_MSGPACK:
+        if msgpack is None:
+            raise ValueError("msgpack is not installed")
+        return msgpack.unpackb(payload, ext_hook=_msgpack_ext_hook, raw=False, strict_map_key=False)
+    return json.loads(payload.decode('utf-8'), object_hook=_json_object_hook)
+
+
+class SQLiteBackend:
+    """
+    Shared cache storage in a local SQLite file.
+
+    Args:
+        path (str): Database file; ':memory:' for a private in-memory cache
+        clock (callable): Wall-clock time in seconds (injectable for tests)
+    """
+
+    # Expired rows are deleted every this many writes
+    SWEEP_EVERY = 500
+
+    def __init__(self, path, clock=time.time):
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        if path != ':memory:':
+            self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)'
+        )
+        self._writes = 0
+
+    def get_many(self, keys):
+        """Returns the stored bytes of each key (None when missing or expired)."""
+        if not keys:
+            return []
+        placeholders = ','.join('?' * len(keys))
+        with self._lock:
+            rows = self._connection.execute(
+                f'SELECT key, value FROM cache WHERE key IN ({placeholders}) AND expires_at > ?',
+                (*keys, self.clock()),
+            ).fetchall()
+        found = dict(rows)
+        return [found.get(key) for key in keys]
+
+    def set(self, key, value, ttl):
+        """Stores bytes under key for ttl seconds."""
+        with self._lock:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)',
+                (key, value, self.clock() + ttl),
+            )
+            self._writes += 1
+            if self._writes % self.SWEEP_EVERY == 0:
+                self._connection.execute('DELETE FROM cache WHERE expires_at <= ?', (self.clock(),))
+
+    def incr(self, key, ttl):
+        """Increments the integer stored under key and returns the new value."""
+        with self._lock:
+            self._connection.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._connection.execute(
+                    'SELECT value FROM cache WHERE key = ? AND expires_at > ?', (key, self.clock())
+                ).fetchone()
+                value = int(row[0]) + 1 if row else 1
+                self._connection.execute(
+                    'INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)',
+                    (key, str(value).encode(), self.clock() + ttl),
+                )
+                self._connection.execute('COMMIT')
+            except Exception:
+                self._connection.execute('ROLLBACK')
+                raise
+        return value
+
+
+class RedisBackend:
+    """
+    Shared cache storage on a Redis-protocol server.
+
+    Args:
+        url (str): e.g. "redis://10.0.0.3:6379/0"
+        client (optional): An existing redis client; overrides url
+    """
+
+    def __init__(self, url=None, client=None):
+        if client is None:
+            if redis is None:
+                raise ImportError("The redis package is required for a Redis shared cache")
+            client = redis.Redis.from_url(url, socket_timeout=0.25, socket_connect_timeout=0.5)
+        self.client = client
+
+    def get_many(self, keys):
+        """Returns the stored bytes of each key (None when missing)."""
+        return self.client.mget(keys) if keys else []
+
+    def set(self, key, value, ttl):
+        """Stores bytes under key for ttl seconds."""
+        self.client.set(key, value, ex=max(1, int(ttl)))
+
+    def incr(self, key, ttl):
+        """Increments the integer stored under key and returns the new value."""
+        pipeline = self.client.pipeline()
+        pipeline.incr(key)
+        pipeline.expire(key, int(ttl))
+        return pipeline.execute()[0]
+
+
+class CacheMetrics:
+    """Hit, miss, error and latency counters of a SharedCache."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Sets every counter back to zero."""
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.errors = 0
+            self.skipped = 0
+            self.bytes_read = 0
+            self.bytes_written = 0
+            self._seconds = {'get': 0.0, 'set': 0.0}
+            self._calls = {'get': 0, 'set': 0}
+            self._max_seconds = {'get': 0.0, 'set': 0.0}
+
+    def record(self, operation, seconds, hit=None, error=False, size=0):
+        """Adds one backend call."""
+        with self._lock:
+            self._calls[operation] += 1
+            self._seconds[operation] += seconds
+            self._max_seconds[operation] = max(self._max_seconds[operation], seconds)
+            if error:
+                self.errors += 1
+            elif hit is True:
+                self.hits += 1
+                self.bytes_read += size
+            elif hit is False:
+                self.misses += 1
+            if operation == 'set' and not error:
+                self.bytes_written += size
+
+    def record_skipped(self):
+        """Counts a value that could not be encoded."""
+        with self._lock:
+            self.skipped += 1
+
+    def stats(self):
+        """
+        Returns the counters.
+
+        Returns:
+            dict: hits, misses, errors, skipped (values that could not be
+            encoded), hit_rate, bytes_read, bytes_written, and the average
+            and maximum get/set latency in milliseconds
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                'hits': self.hits,
+                'misses': self.misses,
+                'errors': self.errors,
+                'skipped': self.skipped,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'bytes_read': self.bytes_read,
+                'bytes_written': self.bytes_written,
+            }
+            for operation in ('get', 'set'):
+                calls = self._calls[operation]
+                stats[f'{operation}_ms_avg'] = 1000 * self._seconds[operation] / calls if calls else 0.0
+                stats[f'{operation}_ms_max'] = 1000 * self._max_seconds[operation]
+            return stats
+
+
+def _digest(value):
+    return hashlib.blake2b(repr(value).encode('utf-8'), digest_size=12).hexdigest()
+
+
+class SharedCache:
+    """
+    Cross-instance cache of encoded fetcher results.
+
+    Backend errors are counted and treated as misses, so a cache outage only
+    costs BigQuery queries.
+
+    Args:
+        backend: SQLiteBackend, RedisBackend or anything with get_many/set/incr
+        namespace (str): Prefix of every key
+        ttls (dict): Entry TTL in seconds by entity
+        default_ttl (float): TTL of caches without entities
+    """
+
+    def __init__(self, backend, namespace=DEFAULT_NAMESPACE, ttls=None, default_ttl=DEFAULT_TTL_SECONDS):
+        self.backend = backend
+        self.namespace = namespace
+        self.ttls = dict(ENTITY_TTLS if ttls is None else ttls)
+        self.default_ttl = default_ttl
+        self.metrics = CacheMetrics()
+
+    def ttl_for(self, entities):
+        """Returns the TTL of entries read from the given entities."""
+        ttls = [self.ttls.get(entity, self.default_ttl) for entity in entities]
+        return min(ttls) if ttls else self.default_ttl
+
+    def _version_key(self, entity, scope):
+        return f'{self.namespace}:ver:{entity}:{scope}'
+
+    def _version_keys(self, entities, user_id, per_user):
+        keys = []
+        for entity in entities:
+            if per_user:
+                # The user's own changes, and changes to data every user shares
+                keys.append(self._version_key(entity, f'u:{user_id}'))
+                keys.append(self._version_key(entity, 'all'))
+            else:
+                keys.append(self._version_key(entity, 'any'))
+        return keys
+
+    def _call(self, operation, call):
+        # (ok, result, seconds) of a backend call; failures are counted here
+        started = time.perf_counter()
+        try:
+            result = call()
+        except Exception as e:
+            self.metrics.record(operation, time.perf_counter() - started, error=True)
+            print(f"Error in shared cache {operation}: {str(e)}")
+            return False, None, 0.0
+        return True, result, time.perf_counter() - started
+
+    def lookup(self, name, key, entities, user_id, per_user=True):
+        """
+        Looks up an entry.
+
+        Args:
+            name (str): Name of the cache (the fetcher)
+            key: The fetcher's arguments (hashable, with a stable repr)
+            entities (tuple): Entities the fetcher reads
+            user_id (str): User of the entry
+            per_user (bool): False for data shared by all users
+
+        Returns:
+            tuple: (hit, value, data_key). data_key is where store() should
+            write the value on a miss; None if the backend failed.
+        """
+        data_key = f'{self.namespace}:data:{name}:{_digest(key)}'
+        seconds = 0.0
+        version_keys = self._version_keys(entities, user_id, per_user)
+        if version_keys:
+            ok, versions, seconds = self._call('get', lambda: self.backend.get_many(version_keys))
+            if not ok:
+                return False, None, None
+            data_key += ':' + _digest([int(version) if version else 0 for version in versions])
+
+        ok, found, more_seconds = self._call('get', lambda: self.backend.get_many([data_key]))
+        if not ok:
+            return False, None, None
+        seconds += more_seconds
+        data = found[0]
+        if data is None:
+            self.metrics.record('get', seconds, hit=False)
+            return False, None, data_key
+        try:
+            value = decode(data)
+        except Exception as e:
+            print(f"Error decoding shared cache entry: {str(e)}")
+            self.metrics.record('get', seconds, error=True)
+            return False, None, data_key
+        self.metrics.record('get', seconds, hit=True, size=len(data))
+        return True, value, data_key
+
+    def store(self, data_key, value, entities):
+        """
+        Writes an entry under the data_key returned by lookup().
+
+        Values that cannot be encoded are skipped (counted in 'skipped').
+        """
+        if data_key is None:
+            return
+        try:
+            data = encode(value)
+        except (TypeError, ValueError, OverflowError):
+            self.metrics.record_skipped()
+            return
+        ok, _, seconds = self._call('set', lambda: self.backend.set(data_key, data, self.ttl_for(entities)))
+        if ok:
+            self.metrics.record('set', seconds, size=len(data))
+
+    def bump(self, event):
+        """
+        Makes entries read before a change unreachable on every instance.
+
+        Args:
+            event (CacheEvent): The change
+        """
+        scopes = ['any', f'u:{event.user_id}' if event.user_id is not None else 'all']
+        for scope in scopes:
+            key = self._version_key(event.entity, scope)
+            self._call('set', lambda: self.backend.incr(key, VERSION_TTL_SECONDS))
+
+
+def backend_from_url(url):
+    """
+    Builds a backend from a SHARED_CACHE_URL.
+
+    Args:
+        url (str): "redis://...", "rediss://..." or "sqlite:///path"
+
+    Returns:
+        SQLiteBackend or RedisBackend
+    """
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBackend(url)
+    if url.startswith('sqlite://'):
+        return SQLiteBackend(url[len('sqlite://'):] or ':memory:')
+    raise ValueError(f"Unsupported shared cache URL: {url}")
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_cache():
+    """
+    Returns the process's SharedCache, built from SHARED_CACHE_URL and
+    SHARED_CACHE_NAMESPACE on first use. None when no URL is set or the
+    backend cannot be created.
+    """
+    global _shared_cache
+    url = os.environ.get('SHARED_CACHE_URL')
+    if not url:
+        return None
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            try:
+                _shared_cache = SharedCache(
+                    backend_from_url(url),
+                    namespace=os.environ.get('SHARED_CACHE_NAMESPACE', DEFAULT_NAMESPACE),
+                )
+                # Every local write bumps its versions before returning
+                subscribe('*', _shared_cache.bump)
+            except Exception as e:
+                print(f"Shared cache unavailable: {str(e)}")
+                return None
+        return _shared_cache
@@ -0,0 +1,144 @@
+import unittest
+from datetime import date, datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+
+import shared_cache
+from cache_events import MEALS, CacheEvent, EventBus
+from fetch_cache import FetchCache
+from shared_cache import SharedCache, SQLiteBackend, decode, encode
+from workout_records import WorkoutRecord
+
+# python3 -m unittest shared_cache_test.py
+
+
+VALUE = {
+    'meals': [{'meal_id': 'meal1', 'meal_time': datetime(2025, 4, 5, 8, tzinfo=timezone.utc), 'calories': np.float64(512.5)}],
+    'day': date(2025, 4, 5),
+    'cursor': ('2025-04-05T08:00:00', 'meal1'),
+    'workout': WorkoutRecord('w1', datetime(2025, 4, 5, 9), datetime(2025, 4, 5, 10), (1.5, 2.5)),
+    'count': 3,
+    'missing': None,
+}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCodec(unittest.TestCase):
+
+    def check_round_trip(self):
+        decoded = decode(encode(VALUE))
+        self.assertEqual(decoded['meals'][0]['meal_time'], VALUE['meals'][0]['meal_time'])
+        self.assertEqual(decoded['meals'][0]['calories'], 512.5)
+        self.assertEqual(decoded['day'], VALUE['day'])
+        self.assertEqual(decoded['cursor'], VALUE['cursor'])
+        self.assertEqual(decoded['workout'], VALUE['workout'])
+        self.assertEqual(decoded['workout'].duration, timedelta(hours=1))
+        self.assertEqual(decoded['workout'].start_lat_lng, (1.5, 2.5))
+        self.assertEqual((decoded['count'], decoded['missing']), (3, None))
+
+    def test_round_trip(self):
+        self.check_round_trip()
+
+    def test_round_trip_without_msgpack(self):
+        with patch('shared_cache.msgpack', None):
+            self.check_round_trip()
+
+    def test_large_values_are_compressed(self):
+        rows = [{'meal_id': f'meal{i}', 'meal_type': 'lunch'} for i in range(200)]
+        data = encode(rows)
+        self.assertTrue(data[0] & shared_cache._COMPRESSED)
+        self.assertEqual(decode(data), rows)
+
+    def test_unsupported_type(self):
+        with self.assertRaises(TypeError):
+            encode({'lock': object()})
+
+
+class TestSharedCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = SharedCache(SQLiteBackend(':memory:', clock=self.clock), namespace='test')
+
+    def test_miss_store_hit(self):
+        hit, _, data_key = self.cache.lookup('fetch', ('user1', 7), (MEALS,), 'user1')
+        self.assertFalse(hit)
+        self.cache.store(data_key, VALUE, (MEALS,))
+
+        hit, value, _ = self.cache.lookup('fetch', ('user1', 7), (MEALS,), 'user1')
+        self.assertTrue(hit)
+        self.assertEqual(value['day'], VALUE['day'])
+        self.assertTrue(data_key.startswith('test:data:fetch:'))
+
+        stats = self.cache.metrics.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['errors']), (1, 1, 0))
+        self.assertEqual(stats['hit_rate'], 0.5)
+        self.assertGreater(stats['bytes_written'], 0)
+
+    def test_entity_ttl(self):
+        _, _, data_key = self.cache.lookup('fetch', ('user1',), (MEALS,), 'user1')
+        self.cache.store(data_key, [1], (MEALS,))
+        self.clock.now += shared_cache.ENTITY_TTLS[MEALS] + 1
+        self.assertFalse(self.cache.lookup('fetch', ('user1',), (MEALS,), 'user1')[0])
+
+    def test_event_changes_only_that_users_keys(self):
+        for user_id in ('user1', 'user2'):
+            _, _, data_key = self.cache.lookup('fetch', (user_id,), (MEALS,), user_id)
+            self.cache.store(data_key, [user_id], (MEALS,))
+
+        self.cache.bump(CacheEvent('user1', MEALS))
+
+        self.assertFalse(self.cache.lookup('fetch', ('user1',), (MEALS,), 'user1')[0])
+        self.assertTrue(self.cache.lookup('fetch', ('user2',), (MEALS,), 'user2')[0])
+
+    def test_backend_errors_are_misses(self):
+        backend = MagicMock()
+        backend.get_many.side_effect = ConnectionError("down")
+        cache = SharedCache(backend)
+        self.assertEqual(cache.lookup('fetch', ('user1',), (MEALS,), 'user1'), (False, None, None))
+        self.assertEqual(cache.metrics.stats()['errors'], 1)
+
+    def test_instances_share_results(self):
+        backend = SQLiteBackend(':memory:', clock=self.clock)
+        loader = MagicMock(return_value=[{'meal_id': 'meal1'}])
+
+        def fetch(user_id, days=7):
+            return loader(user_id, days)
+
+        # Two instances: separate local caches and buses, one shared tier
+        first_bus, second_bus = EventBus(), EventBus()
+        first_shared, second_shared = SharedCache(backend), SharedCache(backend)
+        first_bus.subscribe('*', first_shared.bump)
+        first = FetchCache(fetch, (MEALS,), bus=first_bus, shared=first_shared)
+        second = FetchCache(fetch, (MEALS,), bus=second_bus, shared=second_shared)
+
+        first('user1')
+        self.assertEqual(second('user1'), [{'meal_id': 'meal1'}])
+        self.assertEqual(loader.call_count, 1)
+
+        # A write on the first instance reaches the second once its local copy expires
+        first_bus.publish(CacheEvent('user1', MEALS))
+        second.clear()
+        second('user1')
+        self.assertEqual(loader.call_count, 2)
+
+    def test_configured_from_environment(self):
+        with patch.dict('os.environ', {'SHARED_CACHE_URL': 'sqlite://:memory:'}), \
+                patch('shared_cache._shared_cache', None), patch('shared_cache.subscribe') as mock_subscribe:
+            cache = shared_cache.get_shared_cache()
+            self.assertIsInstance(cache.backend, SQLiteBackend)
+            mock_subscribe.assert_called_once_with('*', cache.bump)
+        with patch.dict('os.environ', {}, clear=True):
+            self.assertIsNone(shared_cache.get_shared_cache())
+
+
+if __name__ == '__main__':
+    unittest.main()
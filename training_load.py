@@ -0,0 +1,420 @@
+"""
+training_load.py
+
+This module computes training metrics from the SensorData readings of
+workouts. It includes:
+  - Time spent in each heart-rate zone (percent of maximum heart rate)
+  - TRIMP, the heart-rate based training load (Banister)
+  - Average and peak heart rate, total steps and cadence
+  - The acute:chronic workload ratio (7-day vs 28-day average daily load)
+
+workout_metrics() works on the readings of any number of workouts at once:
+the readings are sorted by workout and time and every metric is a grouped
+NumPy reduction, so thousands of workouts cost a few array passes.
+
+Per-workout metrics are stored in the WorkoutTrainingLoad table when sensor
+readings are written (data_fetcher.add_sensor_readings) and by the backfill
+(python3 training_load.py) for workouts recorded before that, so reading
+them never touches the raw sensor data. Rows are written with a MERGE keyed
+on workout_id: repeated or concurrent materializations update a workout's
+row instead of adding another, and no rows sit in the streaming buffer where
+later DML could not change them.
+"""
+
+from datetime import date, datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+# Import BigQuery if it's not already imported
+try:
+    from google.cloud import bigquery
+except ImportError:
+    print("BigQuery library not available. Some features will be unavailable.")
+
+PROJECT_ID = "bamboo-creek-450920-h2"
+DATASET_ID = "ISE"
+TRAINING_LOAD_TABLE_ID = f"{PROJECT_ID}.{DATASET_ID}.WorkoutTrainingLoad"
+TRAINING_LOAD_TABLE = f"`{TRAINING_LOAD_TABLE_ID}`"
+
+HEART_RATE_SENSOR = 'sensor1'
+STEPS_SENSOR = 'sensor2'
+
+DEFAULT_MAX_HR = 190
+DEFAULT_RESTING_HR = 60
+
+# Lower bound of zones 1-5 as a fraction of maximum heart rate. Readings
+# below zone 1 count as zone 0.
+ZONE_BOUNDS = np.array([0.5, 0.6, 0.7, 0.8, 0.9])
+ZONE_COLUMNS = [f'zone{zone}_minutes' for zone in range(len(ZONE_BOUNDS) + 1)]
+
+# A reading counts until the next one, but never for longer than this
+# (gaps in the recording are not training time)
+MAX_SAMPLE_GAP_SECONDS = 60
+
+# Banister TRIMP weighting: minutes * HRr * 0.64 * e^(1.92 * HRr)
+TRIMP_A = 0.64
+TRIMP_B = 1.92
+
+ACUTE_DAYS = 7
+CHRONIC_DAYS = 28
+
+METRIC_COLUMNS = [
+    'hr_samples', 'hr_minutes', 'avg_hr', 'peak_hr', *ZONE_COLUMNS,
+    'trimp', 'steps', 'cadence',
+]
+
+CREATE_TRAINING_LOAD_TABLE = f"""
+    CREATE TABLE IF NOT EXISTS {TRAINING_LOAD_TABLE} (
+        workout_id STRING NOT NULL,
+        user_id STRING NOT NULL,
+        workout_date DATE,
+        hr_samples INT64,
+        hr_minutes FLOAT64,
+        avg_hr FLOAT64,
+        peak_hr FLOAT64,
+        {', '.join(f'{column} FLOAT64' for column in ZONE_COLUMNS)},
+        trimp FLOAT64,
+        steps FLOAT64,
+        cadence FLOAT64,
+        max_hr INT64,
+        resting_hr INT64,
+        computed_at TIMESTAMP
+    )
+    CLUSTER BY user_id
+"""
+
+# Sensor readings of some of the user's workouts, with the user's date of
+# birth for the maximum heart rate. {workout_filter} selects the workouts.
+WORKOUT_READINGS = f"""
+    SELECT
+        sd.WorkoutID AS workout_id,
+        DATE(w.StartTimestamp) AS workout_date,
+        sd.SensorId AS sensor_id,
+        sd.Timestamp AS timestamp,
+        sd.SensorValue AS value,
+        u.DateOfBirth AS date_of_birth
+    FROM `{PROJECT_ID}.{DATASET_ID}.SensorData` sd
+    JOIN `{PROJECT_ID}.{DATASET_ID}.Workouts` w ON sd.WorkoutID = w.WorkoutId
+    JOIN `{PROJECT_ID}.{DATASET_ID}.Users` u ON u.UserId = w.UserId
+    LEFT JOIN {TRAINING_LOAD_TABLE} t ON t.workout_id = w.WorkoutId
+    WHERE w.UserId = @user_id
+    AND {{workout_filter}}
+    AND sd.SensorId IN UNNEST(@sensors)
+"""
+
+# Workouts without a row (backfill), or the given workouts (new readings)
+NEW_WORKOUTS_FILTER = "t.workout_id IS NULL"
+GIVEN_WORKOUTS_FILTER = "w.WorkoutId IN UNNEST(@workout_ids)"
+
+# Column types of the stored rows, in table order
+STORED_COLUMNS = [
+    ('workout_id', 'STRING'),
+    ('user_id', 'STRING'),
+    ('workout_date', 'DATE'),
+    ('hr_samples', 'INT64'),
+    *[(column, 'FLOAT64') for column in METRIC_COLUMNS if column != 'hr_samples'],
+    ('max_hr', 'INT64'),
+    ('resting_hr', 'INT64'),
+    ('computed_at', 'TIMESTAMP'),
+]
+
+# Upserts computed rows, so a workout never has more than one row
+MERGE_TRAINING_LOAD = f"""
+    MERGE {TRAINING_LOAD_TABLE} T
+    USING (SELECT * FROM UNNEST(@rows)) S
+    ON T.workout_id = S.workout_id
+    WHEN MATCHED THEN UPDATE SET
+        {', '.join(f'{column} = S.{column}' for column, _ in STORED_COLUMNS if column != 'workout_id')}
+    WHEN NOT MATCHED THEN INSERT ({', '.join(column for column, _ in STORED_COLUMNS)})
+        VALUES ({', '.join(f'S.{column}' for column, _ in STORED_COLUMNS)})
+"""
+
+
+def max_heart_rate(date_of_birth, today=None):
+    """
+    Estimates maximum heart rate as 220 - age.
+
+    Args:
+        date_of_birth (str or date): 'YYYY-MM-DD' or a date, may be None
+        today (date, optional): Reference day (defaults to today)
+
+    Returns:
+        int: The estimate, or DEFAULT_MAX_HR if the birth date is unknown
+    """
+    if not date_of_birth:
+        return DEFAULT_MAX_HR
+    try:
+        born = date_of_birth if isinstance(date_of_birth, date) else datetime.strptime(date_of_birth, '%Y-%m-%d').date()
+    except ValueError:
+        return DEFAULT_MAX_HR
+    today = today or date.today()
+    age = today.year - born.year - ((today.month, today.day) < (born.month, born.day))
+    return 220 - age
+
+
+def _empty_metrics():
+    return pd.DataFrame(columns=['workout_id'] + METRIC_COLUMNS)
+
+
+def workout_metrics(readings, max_hr=DEFAULT_MAX_HR, resting_hr=DEFAULT_RESTING_HR):
+    """
+    Computes the training metrics of every workout in a batch of readings.
+
+    Args:
+        readings (DataFrame or list): Rows with 'workout_id', 'sensor_id',
+            'timestamp' and 'value'. Heart rate readings are in bpm, step
+            readings are the steps counted since the previous reading.
+        max_hr (int): Maximum heart rate of the user
+        resting_hr (int): Resting heart rate of the user
+
+    Returns:
+        DataFrame: One row per workout with 'workout_id' and METRIC_COLUMNS.
+            Minutes are time spent at each reading (capped at
+            MAX_SAMPLE_GAP_SECONDS); cadence is steps per minute over the
+            span of the step readings.
+    """
+    frame = pd.DataFrame(readings)
+    if frame.empty:
+        return _empty_metrics()
+
+    frame = frame[['workout_id', 'sensor_id', 'timestamp', 'value']].copy()
+    frame['timestamp'] = pd.to_datetime(frame['timestamp'], utc=True)
+    frame['value'] = pd.to_numeric(frame['value'], errors='coerce')
+    frame = frame.dropna(subset=['timestamp', 'value'])
+
+    # Sort by workout, then time, on integer codes rather than strings
+    codes, workout_ids = pd.factorize(frame['workout_id'], sort=True)
+    n = len(workout_ids)
+    seconds = frame['timestamp'].to_numpy(dtype='datetime64[ns]').astype(np.int64) / 1e9
+    order = np.lexsort((seconds, codes))
+    codes, seconds = codes[order], seconds[order]
+    values = frame['value'].to_numpy(dtype=float)[order]
+    hr = frame['sensor_id'].eq(HEART_RATE_SENSOR).to_numpy(dtype=bool)[order]
+    step = frame['sensor_id'].eq(STEPS_SENSOR).to_numpy(dtype=bool)[order]
+
+    # Heart rate: time at each reading, zones and TRIMP
+    hr_codes, hr_values, hr_seconds = codes[hr], values[hr], seconds[hr]
+    held = np.zeros(len(hr_values))
+    if len(hr_values) > 1:
+        held[:-1] = np.diff(hr_seconds)
+        held[:-1][hr_codes[1:] != hr_codes[:-1]] = 0
+    minutes = np.clip(held, 0, MAX_SAMPLE_GAP_SECONDS) / 60
+
+    zones = np.searchsorted(ZONE_BOUNDS, hr_values / max_hr, side='right')
+    zone_minutes = np.bincount(
+        hr_codes * len(ZONE_COLUMNS) + zones, weights=minutes, minlength=n * len(ZONE_COLUMNS)
+    ).reshape(n, len(ZONE_COLUMNS))
+
+    reserve = np.clip((hr_values - resting_hr) / (max_hr - resting_hr), 0, 1)
+    trimp = np.bincount(hr_codes, weights=minutes * reserve * TRIMP_A * np.exp(TRIMP_B * reserve), minlength=n)
+
+    hr_samples = np.bincount(hr_codes, minlength=n)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        avg_hr = np.bincount(hr_codes, weights=hr_values, minlength=n) / hr_samples
+    peak_hr = np.full(n, np.nan)
+    np.fmax.at(peak_hr, hr_codes, hr_values)
+
+    # Steps: total and cadence over the span of the step readings
+    step_codes, step_seconds = codes[step], seconds[step]
+    steps = np.bincount(step_codes, weights=values[step], minlength=n)
+    first, last = np.full(n, np.inf), np.full(n, -np.inf)
+    np.minimum.at(first, step_codes, step_seconds)
+    np.maximum.at(last, step_codes, step_seconds)
+    span_minutes = (last - first) / 60
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cadence = np.where(span_minutes > 0, steps / span_minutes, np.nan)
+
+    metrics = pd.DataFrame(zone_minutes, columns=ZONE_COLUMNS)
+    metrics.insert(0, 'workout_id', workout_ids)
+    metrics.insert(1, 'hr_samples', hr_samples)
+    metrics.insert(2, 'hr_minutes', zone_minutes.sum(axis=1))
+    metrics.insert(3, 'avg_hr', avg_hr)
+    metrics.insert(4, 'peak_hr', peak_hr)
+    metrics['trimp'] = trimp
+    metrics['steps'] = steps
+    metrics['cadence'] = cadence
+    return metrics
+
+
+def workload_ratio(loads, today=None):
+    """
+    Computes the acute:chronic workload ratio from per-workout loads.
+
+    Daily loads are the summed TRIMP of the day's workouts (0 on rest days).
+    The acute load is their ACUTE_DAYS average and the chronic load their
+    CHRONIC_DAYS average, both up to and including each day.
+
+    Args:
+        loads (DataFrame or list): Rows with 'workout_date' and 'trimp'
+        today (date, optional): Last day of the series (defaults to the
+            latest workout date)
+
+    Returns:
+        DataFrame: 'date', 'load', 'acute_load', 'chronic_load' and 'acwr'
+            (NaN while the chronic load is 0), one row per day
+    """
+    frame = pd.DataFrame(loads)
+    if frame.empty:
+        return pd.DataFrame(columns=['date', 'load', 'acute_load', 'chronic_load', 'acwr'])
+
+    days = pd.to_datetime(frame['workout_date']).dt.normalize()
+    daily = pd.to_numeric(frame['trimp'], errors='coerce').fillna(0).groupby(days).sum()
+    end = pd.Timestamp(today) if today is not None else daily.index.max()
+    daily = daily.reindex(pd.date_range(daily.index.min(), end, freq='D'), fill_value=0)
+
+    acute = daily.rolling(ACUTE_DAYS, min_periods=1).mean()
+    chronic = daily.rolling(CHRONIC_DAYS, min_periods=1).mean()
+    return pd.DataFrame({
+        'date': daily.index,
+        'load': daily.to_numpy(),
+        'acute_load': acute.to_numpy(),
+        'chronic_load': chronic.to_numpy(),
+        'acwr': (acute / chronic.where(chronic > 0)).to_numpy(),
+    })
+
+
+def workload_status(ratio):
+    """
+    Describes an acute:chronic workload ratio.
+
+    Args:
+        ratio (float): The ratio, may be NaN
+
+    Returns:
+        str: 'not enough data', 'low', 'optimal', 'high' or 'very high'
+    """
+    if ratio is None or np.isnan(ratio):
+        return 'not enough data'
+    if ratio < 0.8:
+        return 'low'
+    if ratio <= 1.3:
+        return 'optimal'
+    if ratio <= 1.5:
+        return 'high'
+    return 'very high'
+
+
+def ensure_training_load_table(client):
+    """Creates the training load table if it does not exist."""
+    client.query(CREATE_TRAINING_LOAD_TABLE).result()
+
+
+def materialize_training_load(client, user_id, max_hr=None, resting_hr=DEFAULT_RESTING_HR, workout_ids=None):
+    """
+    Computes and stores the metrics of some of the user's workouts.
+
+    The readings are read with one query, computed in one batch and stored
+    with one MERGE.
+
+    Args:
+        client: BigQuery client
+        user_id (str): The user
+        max_hr (int, optional): Maximum heart rate of the user; estimated
+            from the date of birth when not given
+        resting_hr (int): Resting heart rate of the user
+        workout_ids (list, optional): Workouts whose readings changed; their
+            rows are recomputed. Without them, only workouts that have no
+            row yet are computed (backfill).
+
+    Returns:
+        int: Number of workouts stored
+
+    Raises:
+        Exception: If the query or the MERGE fails
+    """
+    parameters = [
+        bigquery.ScalarQueryParameter("user_id", "STRING", user_id),
+        bigquery.ArrayQueryParameter("sensors", "STRING", [HEART_RATE_SENSOR, STEPS_SENSOR]),
+    ]
+    if workout_ids is None:
+        query = WORKOUT_READINGS.format(workout_filter=NEW_WORKOUTS_FILTER)
+    else:
+        query = WORKOUT_READINGS.format(workout_filter=GIVEN_WORKOUTS_FILTER)
+        parameters.append(bigquery.ArrayQueryParameter("workout_ids", "STRING", list(workout_ids)))
+    job_config = bigquery.QueryJobConfig(query_parameters=parameters)
+    rows = [dict(row.items()) for row in client.query(query, job_config=job_config).result()]
+    if not rows:
+        return 0
+
+    readings = pd.DataFrame(rows)
+    if max_hr is None:
+        max_hr = max_heart_rate(rows[0].get('date_of_birth'))
+    metrics = workout_metrics(readings, max_hr, resting_hr)
+    workout_dates = readings.groupby('workout_id')['workout_date'].first()
+    metrics['workout_date'] = metrics['workout_id'].map(workout_dates)
+
+    computed_at = datetime.now(timezone.utc)
+    records = []
+    for record in metrics.to_dict('records'):
+        record = {key: (None if isinstance(value, float) and np.isnan(value) else value) for key, value in record.items()}
+        record['hr_samples'] = int(record['hr_samples'])
+        record.update(user_id=user_id, max_hr=int(max_hr), resting_hr=int(resting_hr), computed_at=computed_at)
+        records.append(record)
+
+    store_training_load(client, records)
+    return len(records)
+
+
+def store_training_load(client, records):
+    """
+    Upserts computed rows into the training load table with one MERGE.
+
+    Args:
+        client: BigQuery client
+        records (list): Dictionaries with the STORED_COLUMNS
+    """
+    rows = [
+        bigquery.StructQueryParameter(None, *[
+            bigquery.ScalarQueryParameter(column, column_type, _param_value(record.get(column)))
+            for column, column_type in STORED_COLUMNS
+        ])
+        for record in records
+    ]
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ArrayQueryParameter("rows", "STRUCT", rows)]
+    )
+    client.query(MERGE_TRAINING_LOAD, job_config=job_config).result()
+
+
+def _param_value(value):
+    # Plain Python values for query parameters (NumPy scalars, Timestamps)
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if hasattr(value, 'item') and type(value).__module__ == 'numpy':
+        return value.item()
+    return value
+
+
+def read_training_load(client, user_id):
+    """
+    Reads the stored metrics of a user's workouts.
+
+    Args:
+        client: BigQuery client
+        user_id (str): The user
+
+    Returns:
+        list: Dictionaries with 'workout_id', 'workout_date' and
+            METRIC_COLUMNS, oldest first
+    """
+    query = f"""
+        SELECT *
+        FROM {TRAINING_LOAD_TABLE}
+        WHERE user_id = @user_id
+        ORDER BY workout_date ASC, workout_id ASC
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ScalarQueryParameter("user_id", "STRING", user_id)]
+    )
+    return [dict(row.items()) for row in client.query(query, job_config=job_config).result()]
+
+
+if __name__ == "__main__":
+    # One-off setup: python3 training_load.py
+    from data_fetcher import get_bigquery_client, get_users
+    client = get_bigquery_client()
+    ensure_training_load_table(client)
+    for user in get_users():
+        stored = materialize_training_load(client, user['UserId'])
+        print(f"{user['UserId']}: {stored} workouts")
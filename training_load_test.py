@@ -0,0 +1,175 @@
+import unittest
+from datetime import date, datetime, timedelta
+from unittest.mock import MagicMock
+
+import numpy as np
+import pandas as pd
+
+from training_load import (
+    ZONE_COLUMNS, materialize_training_load, max_heart_rate, workload_ratio, workload_status,
+    workout_metrics,
+)
+
+# python3 -m unittest training_load_test.py
+
+
+def readings(workout_id, heart_rates, steps=(), start=datetime(2025, 4, 5, 9), interval=10):
+    rows = [{
+        'workout_id': workout_id, 'sensor_id': 'sensor1',
+        'timestamp': start + timedelta(seconds=i * interval), 'value': value,
+    } for i, value in enumerate(heart_rates)]
+    rows += [{
+        'workout_id': workout_id, 'sensor_id': 'sensor2',
+        'timestamp': start + timedelta(minutes=i), 'value': value,
+    } for i, value in enumerate(steps)]
+    return rows
+
+
+class TestMaxHeartRate(unittest.TestCase):
+
+    def test_age_based(self):
+        self.assertEqual(max_heart_rate('1990-06-01', today=date(2025, 5, 31)), 186)
+        self.assertEqual(max_heart_rate('1990-06-01', today=date(2025, 6, 1)), 185)
+
+    def test_unknown_birth_date(self):
+        self.assertEqual(max_heart_rate(None), 190)
+        self.assertEqual(max_heart_rate('not a date'), 190)
+
+
+class TestWorkoutMetrics(unittest.TestCase):
+
+    def test_zones_trimp_and_cadence(self):
+        # 6 readings 10 s apart: the last one is not held, so 50 s in total
+        rows = readings('w1', [90, 100, 120, 140, 160, 180], steps=[0, 100, 100])
+        metrics = workout_metrics(rows, max_hr=200, resting_hr=60).set_index('workout_id')
+
+        w1 = metrics.loc['w1']
+        self.assertEqual(w1['hr_samples'], 6)
+        self.assertAlmostEqual(w1['hr_minutes'], 50 / 60)
+        self.assertAlmostEqual(w1['avg_hr'], 790 / 6)
+        self.assertEqual(w1['peak_hr'], 180)
+        # 90 bpm (45%) is below zone 1; 100 bpm (50%) starts zone 1
+        self.assertAlmostEqual(w1['zone0_minutes'], 10 / 60)
+        self.assertAlmostEqual(w1['zone1_minutes'], 10 / 60)
+        self.assertAlmostEqual(w1['zone4_minutes'], 10 / 60)
+        self.assertAlmostEqual(w1['zone5_minutes'], 0)
+        self.assertGreater(w1['trimp'], 0)
+        self.assertEqual(w1['steps'], 200)
+        self.assertAlmostEqual(w1['cadence'], 100)
+
+    def test_batch_matches_single_workouts(self):
+        rng = np.random.default_rng(1)
+        workouts = {
+            f'w{i}': readings(f'w{i}', rng.normal(140, 15, 50), steps=rng.integers(80, 120, 5))
+            for i in range(20)
+        }
+        batch = pd.DataFrame([row for rows in workouts.values() for row in rows]).sample(frac=1, random_state=0)
+
+        together = workout_metrics(batch).set_index('workout_id')
+        alone = workout_metrics(workouts['w7']).set_index('workout_id')
+        self.assertEqual(len(together), 20)
+        pd.testing.assert_series_equal(together.loc['w7'], alone.loc['w7'])
+
+    def test_gaps_are_capped(self):
+        rows = readings('w1', [150, 150], interval=600)
+        self.assertAlmostEqual(workout_metrics(rows)['hr_minutes'].iloc[0], 1)
+
+    def test_workout_without_heart_rate(self):
+        metrics = workout_metrics(readings('w1', [], steps=[50, 50]))
+        self.assertEqual(metrics['hr_samples'].iloc[0], 0)
+        self.assertTrue(np.isnan(metrics['avg_hr'].iloc[0]))
+        self.assertEqual(metrics[ZONE_COLUMNS].sum(axis=1).iloc[0], 0)
+
+    def test_empty(self):
+        self.assertTrue(workout_metrics([]).empty)
+
+
+class TestWorkloadRatio(unittest.TestCase):
+
+    def test_acute_and_chronic_loads(self):
+        loads = [{'workout_date': date(2025, 4, 1) + timedelta(days=i), 'trimp': 100} for i in range(28)]
+        loads += [{'workout_date': date(2025, 4, 28), 'trimp': 100}]
+        ratio = workload_ratio(loads).set_index('date')
+
+        self.assertEqual(len(ratio), 28)
+        last = ratio.iloc[-1]
+        self.assertEqual(last['load'], 200)
+        self.assertAlmostEqual(last['acute_load'], 800 / 7)
+        self.assertAlmostEqual(last['chronic_load'], 2900 / 28)
+        self.assertAlmostEqual(last['acwr'], (800 / 7) / (2900 / 28))
+
+    def test_rest_days_count_as_zero(self):
+        loads = [{'workout_date': '2025-04-01', 'trimp': 70}]
+        ratio = workload_ratio(loads, today=date(2025, 4, 7))
+        self.assertEqual(len(ratio), 7)
+        self.assertAlmostEqual(ratio['acute_load'].iloc[-1], 10)
+
+    def test_status(self):
+        self.assertEqual(workload_status(float('nan')), 'not enough data')
+        self.assertEqual(workload_status(0.5), 'low')
+        self.assertEqual(workload_status(1.0), 'optimal')
+        self.assertEqual(workload_status(1.4), 'high')
+        self.assertEqual(workload_status(2.0), 'very high')
+
+
+class TestMaterializeTrainingLoad(unittest.TestCase):
+
+    def make_row(self, values):
+        row = MagicMock()
+        row.items.return_value = values.items()
+        return row
+
+    def make_client(self, heart_rates, date_of_birth=None, merge_result=()):
+        rows = [
+            self.make_row(dict(reading, workout_date=date(2025, 4, 5), date_of_birth=date_of_birth))
+            for reading in readings('w1', heart_rates)
+        ]
+        client = MagicMock()
+        client.query.return_value.result.side_effect = [rows, merge_result]
+        return client
+
+    def stored_rows(self, client):
+        # The rows passed to the MERGE (the second query)
+        (merge,), kwargs = client.query.call_args_list[1]
+        self.assertIn('ON T.workout_id = S.workout_id', merge)
+        [rows] = kwargs['job_config'].query_parameters
+        return [dict(row.struct_values) for row in rows.values]
+
+    def test_stores_new_workouts_with_a_merge(self):
+        client = self.make_client([120, 130, 140])
+
+        self.assertEqual(materialize_training_load(client, 'user1', max_hr=190), 1)
+
+        self.assertIn('t.workout_id IS NULL', client.query.call_args_list[0][0][0])
+        client.insert_rows_json.assert_not_called()
+        stored = self.stored_rows(client)
+        self.assertEqual(stored[0]['workout_id'], 'w1')
+        self.assertEqual(stored[0]['user_id'], 'user1')
+        self.assertEqual(stored[0]['workout_date'], date(2025, 4, 5))
+        self.assertEqual(stored[0]['max_hr'], 190)
+        self.assertIsNone(stored[0]['cadence'])
+
+    def test_given_workouts_are_recomputed(self):
+        client = self.make_client([120, 130], date_of_birth=date(1995, 1, 1))
+
+        materialize_training_load(client, 'user1', workout_ids=['w1'])
+
+        query = client.query.call_args_list[0][0][0]
+        self.assertIn('w.WorkoutId IN UNNEST(@workout_ids)', query)
+        self.assertNotIn('t.workout_id IS NULL', query)
+        # Maximum heart rate from the date of birth
+        self.assertEqual(self.stored_rows(client)[0]['max_hr'], max_heart_rate(date(1995, 1, 1)))
+
+    def test_nothing_new(self):
+        client = MagicMock()
+        client.query.return_value.result.return_value = []
+        self.assertEqual(materialize_training_load(client, 'user1'), 0)
+        self.assertEqual(client.query.call_count, 1)
+
+    def test_merge_errors_raise(self):
+        client = self.make_client([120, 130], merge_result=Exception("merge failed"))
+        with self.assertRaises(Exception):
+            materialize_training_load(client, 'user1')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,227 @@
+"""
+water_ledger.py
+
+This module makes water logging instant. It includes:
+  - cached_get_user_water_intake(): the cached per-day intake records that
+    every page reads
+  - WaterLedger: the entries a session has logged but the server may not
+    show yet. New entries appear in totals immediately, are written to
+    BigQuery in a background thread, and are dropped from the ledger once
+    a fetch returns them (reconciled by water_id). Finished writes of other
+    days are dropped on any read, and at most MAX_LEDGER_ENTRIES are kept.
+  - log_water() / get_water_intake() / get_water_summary(): the page-level
+    helpers, using one ledger per Streamlit session
+
+When a background write succeeds, the cached records of that user and day
+are cleared, so the next fetch (on any page) reads the new total.
+"""
+
+import datetime
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from cache_events import WATER
+from data_fetcher import add_water_intake, get_daily_water_summary, get_user_water_intake
+from fetch_cache import cached_fetch, on_day
+
+# Background writers shared by all sessions
+_writer = ThreadPoolExecutor(max_workers=2, thread_name_prefix='water-ledger')
+
+# Entries a ledger keeps; the oldest finished writes are dropped beyond it
+MAX_LEDGER_ENTRIES = 100
+
+
+@cached_fetch(WATER, span=on_day('date'))
+def cached_get_user_water_intake(user_id, date):
+    return get_user_water_intake(user_id, date)
+
+
+def _sort_key(record):
+    # ISO timestamps sort as text; the offset suffix is ignored
+    return str(record['intake_time'])[:19]
+
+
+class _Entry:
+    __slots__ = ('user_id', 'water_id', 'amount_ml', 'intake_time', 'future', 'refreshed')
+
+    def __init__(self, user_id, water_id, amount_ml, intake_time):
+        self.user_id = user_id
+        self.water_id = water_id
+        self.amount_ml = amount_ml
+        self.intake_time = intake_time
+        self.future = None
+        self.refreshed = False
+
+    @property
+    def day(self):
+        return self.intake_time.date()
+
+    def failed(self):
+        return self.future is not None and self.future.done() and (
+            self.future.exception() is not None or not self.future.result()
+        )
+
+    def persisted(self):
+        return self.future is not None and self.future.done() and not self.failed()
+
+    def as_record(self):
+        return {
+            'water_id': self.water_id,
+            'amount_ml': self.amount_ml,
+            'intake_time': self.intake_time.isoformat(),
+            'pending': True,
+        }
+
+
+def _persist(entry, invalidate):
+    ok = add_water_intake(entry.user_id, entry.amount_ml, entry.intake_time, water_id=entry.water_id)
+    if ok:
+        invalidate(entry.user_id, entry.day)
+    return ok
+
+
+def _invalidate_cached_intake(user_id, day):
+    cached_get_user_water_intake.clear(user_id, day)
+
+
+class WaterLedger:
+    """
+    Water entries logged in this session that the server may not show yet.
+
+    Args:
+        fetch (callable): (user_id, day) -> list of intake records
+        executor: Runs the background writes (an Executor)
+        invalidate (callable): (user_id, day) called after a successful write
+            to drop cached records
+    """
+
+    def __init__(self, fetch=cached_get_user_water_intake, executor=_writer, invalidate=_invalidate_cached_intake):
+        self.fetch = fetch
+        self.executor = executor
+        self.invalidate = invalidate
+        self._entries = []
+        self._failed = []
+
+    def log(self, user_id, amount_ml, intake_time=None):
+        """
+        Records an entry locally and starts writing it to BigQuery.
+
+        Args:
+            user_id (str): The user
+            amount_ml (int): Amount of water in ml
+            intake_time (datetime, optional): Time of intake, defaults to now
+
+        Returns:
+            dict: The new intake record (with 'pending': True)
+        """
+        intake_time = intake_time or datetime.datetime.now()
+        entry = _Entry(user_id, f"water_{user_id}_{uuid.uuid4().hex[:12]}", int(amount_ml), intake_time)
+        self._entries.append(entry)
+        entry.future = self.executor.submit(_persist, entry, self.invalidate)
+        self._trim()
+        return entry.as_record()
+
+    def _settle(self, entry):
+        # Drops a finished entry; failures are kept for pop_failures().
+        # Returns False for entries still being written.
+        if entry.failed():
+            self._entries.remove(entry)
+            self._failed.append(entry)
+            del self._failed[:-MAX_LEDGER_ENTRIES]
+            return True
+        if entry.persisted():
+            self._entries.remove(entry)
+            return True
+        return False
+
+    def _trim(self):
+        # Bounds the ledger when the days logged are never read back
+        excess = len(self._entries) - MAX_LEDGER_ENTRIES
+        for entry in list(self._entries):
+            if excess <= 0:
+                break
+            if self._settle(entry):
+                excess -= 1
+
+    def _reconcile(self, user_id, day, server_ids):
+        overlay = []
+        for entry in list(self._entries):
+            if entry.user_id != user_id or entry.day != day:
+                # A successful write already cleared its day's cached records
+                self._settle(entry)
+                continue
+            if entry.water_id in server_ids:
+                self._entries.remove(entry)
+            elif entry.failed():
+                self._settle(entry)
+            else:
+                if entry.persisted() and not entry.refreshed:
+                    # Written after the cached records were read; refetch next time
+                    entry.refreshed = True
+                    self.invalidate(user_id, day)
+                overlay.append(entry.as_record())
+        return overlay
+
+    def intake(self, user_id, day):
+        """
+        Returns a day's intake records: the server's plus this session's
+        entries the server does not show yet.
+
+        Args:
+            user_id (str): The user
+            day (date): The day
+
+        Returns:
+            list: Intake records, newest first
+        """
+        records = list(self.fetch(user_id, day))
+        overlay = self._reconcile(user_id, day, {record['water_id'] for record in records})
+        return sorted(records + overlay, key=_sort_key, reverse=True)
+
+    def summary(self, user_id, days=7):
+        """
+        Returns daily totals, adding entries whose write has not finished.
+
+        Args:
+            user_id (str): The user
+            days (int): Number of days
+
+        Returns:
+            list: Dictionaries with 'date' (YYYY-MM-DD) and 'total_ml'
+        """
+        totals = get_daily_water_summary(user_id, days)
+        unwritten = {}
+        for entry in self._entries:
+            if entry.user_id == user_id and not entry.future.done():
+                key = entry.day.strftime('%Y-%m-%d')
+                unwritten[key] = unwritten.get(key, 0) + entry.amount_ml
+        return [dict(day, total_ml=day['total_ml'] + unwritten.get(day['date'], 0)) for day in totals]
+
+    def pop_failures(self):
+        """Returns the entries whose write failed since the last call."""
+        failed, self._failed = self._failed, []
+        return [entry.as_record() for entry in failed]
+
+
+def get_ledger():
+    """Returns this session's water ledger."""
+    if 'water_ledger' not in st.session_state:
+        st.session_state.water_ledger = WaterLedger()
+    return st.session_state.water_ledger
+
+
+def log_water(user_id, amount_ml, intake_time=None):
+    """Logs water for the current session (see WaterLedger.log)."""
+    return get_ledger().log(user_id, amount_ml, intake_time)
+
+
+def get_water_intake(user_id, day):
+    """Returns a day's intake records including unsynced entries (see WaterLedger.intake)."""
+    return get_ledger().intake(user_id, day)
+
+
+def get_water_summary(user_id, days=7):
+    """Returns daily totals including unsynced entries (see WaterLedger.summary)."""
+    return get_ledger().summary(user_id, days)
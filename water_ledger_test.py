@@ -0,0 +1,143 @@
+import unittest
+from concurrent.futures import Future
+from datetime import date, datetime
+from unittest.mock import MagicMock, patch
+
+from water_ledger import WaterLedger
+
+# python3 -m unittest water_ledger_test.py
+
+
+TODAY = date(2025, 4, 5)
+
+
+class ManualExecutor:
+    """Holds submitted writes until run() is called."""
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, function, *args):
+        future = Future()
+        self.jobs.append((future, function, args))
+        return future
+
+    def run(self):
+        for future, function, args in self.jobs:
+            try:
+                future.set_result(function(*args))
+            except Exception as e:
+                future.set_exception(e)
+        self.jobs = []
+
+
+def server_record(water_id, amount_ml, hour):
+    return {'water_id': water_id, 'amount_ml': amount_ml, 'intake_time': datetime(2025, 4, 5, hour).isoformat()}
+
+
+class TestWaterLedger(unittest.TestCase):
+
+    def setUp(self):
+        self.server = [server_record('water_1', 300, 8)]
+        self.fetch = MagicMock(side_effect=lambda user_id, day: list(self.server))
+        self.executor = ManualExecutor()
+        self.invalidate = MagicMock()
+        self.ledger = WaterLedger(self.fetch, self.executor, self.invalidate)
+
+    def total(self):
+        return sum(record['amount_ml'] for record in self.ledger.intake('user1', TODAY))
+
+    @patch('water_ledger.add_water_intake', return_value=True)
+    def test_entry_counts_before_it_is_saved(self, mock_add):
+        record = self.ledger.log('user1', 500, datetime(2025, 4, 5, 12))
+
+        self.assertTrue(record['pending'])
+        self.assertEqual(self.total(), 800)
+        mock_add.assert_not_called()
+
+        # Newest first
+        self.assertEqual(self.ledger.intake('user1', TODAY)[0]['water_id'], record['water_id'])
+
+    @patch('water_ledger.add_water_intake', return_value=True)
+    def test_saved_entry_reconciles_with_server(self, mock_add):
+        record = self.ledger.log('user1', 500, datetime(2025, 4, 5, 12))
+        self.executor.run()
+
+        mock_add.assert_called_once_with('user1', 500, datetime(2025, 4, 5, 12), water_id=record['water_id'])
+        self.invalidate.assert_called_once_with('user1', TODAY)
+
+        # The server row replaces the local entry; nothing is counted twice
+        self.server.append(dict(server_record(record['water_id'], 500, 12)))
+        self.assertEqual(self.total(), 800)
+        self.assertEqual(self.ledger._entries, [])
+
+    @patch('water_ledger.add_water_intake', return_value=True)
+    def test_stale_cache_still_shows_saved_entry(self, mock_add):
+        self.ledger.log('user1', 500, datetime(2025, 4, 5, 12))
+        self.executor.run()
+        self.invalidate.reset_mock()
+
+        # The fetch still returns records read before the write
+        self.assertEqual(self.total(), 800)
+        self.invalidate.assert_called_once_with('user1', TODAY)
+        self.assertEqual(self.total(), 800)
+        self.invalidate.assert_called_once()
+
+    @patch('water_ledger.add_water_intake', return_value=False)
+    def test_failed_write_is_reported(self, mock_add):
+        self.ledger.log('user1', 500, datetime(2025, 4, 5, 12))
+        self.executor.run()
+
+        self.assertEqual(self.total(), 300)
+        failures = self.ledger.pop_failures()
+        self.assertEqual([failure['amount_ml'] for failure in failures], [500])
+        self.assertEqual(self.ledger.pop_failures(), [])
+        self.invalidate.assert_not_called()
+
+    @patch('water_ledger.get_daily_water_summary')
+    @patch('water_ledger.add_water_intake', return_value=True)
+    def test_summary_adds_unwritten_entries(self, mock_add, mock_summary):
+        mock_summary.return_value = [{'date': '2025-04-04', 'total_ml': 1000}, {'date': '2025-04-05', 'total_ml': 300}]
+        self.ledger.log('user1', 500, datetime(2025, 4, 5, 12))
+        self.ledger.log('user2', 250, datetime(2025, 4, 5, 12))
+
+        summary = self.ledger.summary('user1', days=2)
+        self.assertEqual([day['total_ml'] for day in summary], [1000, 800])
+
+        # Once written, the server totals include the entry
+        self.executor.run()
+        self.assertEqual([day['total_ml'] for day in self.ledger.summary('user1', days=2)], [1000, 300])
+
+    def test_other_days_and_users_are_separate(self):
+        self.ledger.log('user1', 500, datetime(2025, 4, 4, 12))
+        self.ledger.log('user2', 500, datetime(2025, 4, 5, 12))
+        self.assertEqual(self.total(), 300)
+
+    @patch('water_ledger.add_water_intake', side_effect=[True, False, True])
+    def test_finished_entries_of_other_days_are_dropped(self, mock_add):
+        self.ledger.log('user1', 500, datetime(2025, 4, 3, 12))
+        self.ledger.log('user1', 250, datetime(2025, 4, 4, 12))
+        self.executor.run()
+        self.ledger.log('user2', 100, datetime(2025, 4, 4, 12))
+
+        self.assertEqual(self.total(), 300)
+
+        # Only the write still running is kept; the failure is reported
+        self.assertEqual([entry.amount_ml for entry in self.ledger._entries], [100])
+        self.assertEqual([failure['amount_ml'] for failure in self.ledger.pop_failures()], [250])
+
+    @patch('water_ledger.MAX_LEDGER_ENTRIES', 2)
+    @patch('water_ledger.add_water_intake', return_value=True)
+    def test_ledger_is_bounded(self, mock_add):
+        for hour in range(8, 11):
+            self.ledger.log('user1', 100, datetime(2025, 4, 1, hour))
+            self.executor.run()
+        self.ledger.log('user1', 100, datetime(2025, 4, 1, 11))
+        self.ledger.log('user1', 100, datetime(2025, 4, 1, 12))
+
+        # Finished writes go first; entries still being written are kept
+        self.assertEqual([entry.intake_time.hour for entry in self.ledger._entries], [11, 12])
+
+
+if __name__ == '__main__':
+    unittest.main()
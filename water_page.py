@@ -3,12 +3,23 @@ import pandas as pd
 import datetime
 import matplotlib.pyplot as plt
 import altair as alt
-from data_fetcher import get_user_water_intake, add_water_intake, get_daily_water_summary
+from water_ledger import cached_get_user_water_intake, get_water_intake, get_water_summary, get_ledger, log_water
+from chart_reduction import reduce_frame
 
 # Define the recommended daily water intake in ml (2000ml = 2 liters)
 RECOMMENDED_DAILY_INTAKE = 2000
 
 
+def prefetch_water_page(user_id):
+    """
+    Loads today's intake records into the cache (see prefetch.py).
+
+    Args:
+        user_id (str): The user
+    """
+    cached_get_user_water_intake(user_id, datetime.datetime.now().date())
+
+
 def display_water_intake_page(user_id):
     """
     Display the water intake tracking page
@@ -52,8 +63,11 @@ def display_todays_intake(user_id):
     
     st.header(f"Today's Water Intake ({today_str})")
     
-    # Get today's water intake data
-    today_intake = get_user_water_intake(user_id, today)
+    # Today's records, including entries logged in this session that are
+    # still being saved
+    today_intake = get_water_intake(user_id, today)
+    for failed in get_ledger().pop_failures():
+        st.error(f"Failed to save {failed['amount_ml']} ml of water. Please try again.")
     
     # Calculate total intake for today
     total_ml = sum(record['amount_ml'] for record in today_intake)
@@ -82,12 +96,9 @@ def display_todays_intake(user_id):
         selected_amount = st.selectbox("Amount", list(amounts.keys()))
         
         if st.button("Add Water"):
-            if add_water_intake(user_id, amounts[selected_amount]):
-                st.success(f"Added {amounts[selected_amount]} ml of water!")
-                # Rerun the app to show the updated data
-                st.rerun()
-            else:
-                st.error("Failed to add water intake. Please try again.")
+            # Shown right away; saved in the background
+            log_water(user_id, amounts[selected_amount])
+            st.rerun()
     
     # Custom water intake form
     st.subheader("Custom Water Intake")
@@ -107,12 +118,8 @@ def display_todays_intake(user_id):
         
         submitted = st.form_submit_button("Add Custom Entry")
         if submitted:
-            if add_water_intake(user_id, custom_amount, custom_datetime):
-                st.success(f"Added {custom_amount} ml of water!")
-                # Rerun the app to show the updated data
-                st.rerun()
-            else:
-                st.error("Failed to add water intake. Please try again.")
+            log_water(user_id, custom_amount, custom_datetime)
+            st.rerun()
     
     # Display today's water intake log
     st.subheader("Today's Water Log")
@@ -190,7 +197,7 @@ def display_weekly_summary(user_id):
     st.header("Weekly Water Intake Summary")
     
     # Get summary data for the past 7 days
-    summary_data = get_daily_water_summary(user_id, days=7)
+    summary_data = get_water_summary(user_id, days=7)
     
     if not summary_data:
         st.info("No water intake data available for the past week.")
@@ -201,8 +208,8 @@ def display_weekly_summary(user_id):
     df['date'] = pd.to_datetime(df['date'])
     df['day'] = df['date'].dt.strftime('%a')
     
-    # Create the bar chart using Altair
-    chart = alt.Chart(df).mark_bar().encode(
+    # Create the bar chart using Altair, keeping its data bounded by the chart width
+    chart = alt.Chart(reduce_frame(df, 'date', 'total_ml', width=600, method='minmax')).mark_bar().encode(
         x=alt.X('day:O', title='Day'),
         y=alt.Y('total_ml:Q', title='Water Intake (ml)'),
         color=alt.condition(
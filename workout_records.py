@@ -0,0 +1,157 @@
+"""
+workout_records.py
+
+This module defines WorkoutRecord, the in-memory representation of a workout
+used by every page. It includes:
+  - Real datetimes for the start and end of the workout, parsed once
+  - The derived duration and calendar date
+  - Dictionary-style access (record['start_timestamp'], record.get('steps'))
+    so code written against the old workout dicts keeps working
+
+Records are built once in get_user_workouts. as_workout_record() also accepts
+plain workout dicts (e.g. from tests or older callers) and converts them.
+"""
+
+from dataclasses import dataclass, field, asdict
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+
+def parse_timestamp(value):
+    """
+    Converts a timestamp value to a datetime.
+
+    Args:
+        value: A datetime, an ISO 8601 string, or None/empty
+
+    Returns:
+        datetime or None
+
+    Raises:
+        ValueError: If a string cannot be parsed
+        TypeError: If the value is not a datetime or string
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    raise TypeError(f"Invalid timestamp: {value!r}")
+
+
+@dataclass(slots=True)
+class WorkoutRecord:
+    """A single workout with parsed timestamps."""
+
+    workout_id: Optional[str]
+    start_time: Optional[datetime]
+    end_time: Optional[datetime]
+    start_lat_lng: tuple = (0, 0)
+    end_lat_lng: tuple = (0, 0)
+    distance: float = 0
+    steps: int = 0
+    calories_burned: float = 0
+    duration: Optional[timedelta] = field(init=False, default=None)
+    workout_date: Optional[date] = field(init=False, default=None)
+
+    def __post_init__(self):
+        if self.start_time is not None:
+            self.workout_date = self.start_time.date()
+            if self.end_time is not None:
+                self.duration = self.end_time - self.start_time
+
+    @classmethod
+    def from_row(cls, row):
+        """Builds a record from a BigQuery Workouts row."""
+        return cls(
+            workout_id=row.WorkoutId,
+            start_time=parse_timestamp(row.StartTimestamp),
+            end_time=parse_timestamp(row.EndTimestamp),
+            # Handle missing data by defaulting coordinates to 0
+            start_lat_lng=(
+                row.StartLocationLat if row.StartLocationLat is not None else 0,
+                row.StartLocationLong if row.StartLocationLong is not None else 0,
+            ),
+            end_lat_lng=(
+                row.EndLocationLat if row.EndLocationLat is not None else 0,
+                row.EndLocationLong if row.EndLocationLong is not None else 0,
+            ),
+            distance=row.TotalDistance,
+            steps=row.TotalSteps,
+            calories_burned=row.CaloriesBurned,
+        )
+
+    @property
+    def duration_minutes(self):
+        """Workout length in minutes, or None if a timestamp is missing."""
+        return self.duration.total_seconds() / 60 if self.duration is not None else None
+
+    # Dictionary-style access with the keys of the old workout dicts
+
+    def __getitem__(self, key):
+        if key == 'start_timestamp':
+            return str(self.start_time) if self.start_time is not None else None
+        if key == 'end_timestamp':
+            return str(self.end_time) if self.end_time is not None else None
+        if key == 'date':
+            return self.workout_date.strftime('%Y-%m-%d') if self.workout_date is not None else None
+        if key in _DICT_KEYS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in _DICT_KEYS
+
+    def get(self, key, default=None):
+        try:
+            value = self[key]
+        except KeyError:
+            return default
+        return default if value is None and key in ('start_timestamp', 'end_timestamp', 'date') else value
+
+    def keys(self):
+        return list(_DICT_KEYS)
+
+    def to_dict(self):
+        """Returns the record as a plain dict with the old workout keys."""
+        return {key: self[key] for key in _DICT_KEYS}
+
+    def as_row(self):
+        """Returns all fields (including derived ones) as a dict, e.g. for a DataFrame."""
+        return asdict(self)
+
+
+_DICT_KEYS = (
+    'workout_id', 'start_timestamp', 'end_timestamp', 'start_lat_lng',
+    'end_lat_lng', 'distance', 'steps', 'calories_burned', 'date',
+)
+
+
+def as_workout_record(workout):
+    """
+    Returns a WorkoutRecord for a record or a workout dict.
+
+    Records are returned unchanged, so no timestamp is parsed twice.
+
+    Args:
+        workout (WorkoutRecord or dict): The workout
+
+    Returns:
+        WorkoutRecord
+
+    Raises:
+        ValueError, TypeError: If a timestamp cannot be parsed
+    """
+    if isinstance(workout, WorkoutRecord):
+        return workout
+    return WorkoutRecord(
+        workout_id=workout.get('workout_id'),
+        start_time=parse_timestamp(workout.get('start_timestamp')),
+        end_time=parse_timestamp(workout.get('end_timestamp')),
+        start_lat_lng=workout.get('start_lat_lng', (0, 0)),
+        end_lat_lng=workout.get('end_lat_lng', (0, 0)),
+        distance=workout.get('distance', 0),
+        steps=workout.get('steps', 0),
+        calories_burned=workout.get('calories_burned', 0),
+    )
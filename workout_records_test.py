@@ -0,0 +1,88 @@
+import unittest
+from datetime import datetime, date, timedelta
+from unittest.mock import MagicMock
+from workout_records import WorkoutRecord, as_workout_record, parse_timestamp
+
+# python3 -m unittest workout_records_test.py
+
+
+class TestParseTimestamp(unittest.TestCase):
+
+    def test_values(self):
+        self.assertEqual(parse_timestamp("2025-04-05 09:00:00"), datetime(2025, 4, 5, 9))
+        self.assertEqual(parse_timestamp(datetime(2025, 4, 5, 9)), datetime(2025, 4, 5, 9))
+        self.assertIsNone(parse_timestamp(None))
+        self.assertIsNone(parse_timestamp(""))
+
+    def test_invalid_values(self):
+        with self.assertRaises(ValueError):
+            parse_timestamp("InvalidTimestamp")
+        with self.assertRaises(TypeError):
+            parse_timestamp(1000)
+
+
+class TestWorkoutRecord(unittest.TestCase):
+
+    def setUp(self):
+        self.row = MagicMock(
+            WorkoutId="workout1",
+            StartTimestamp=datetime(2025, 4, 5, 9, 0, 0),
+            EndTimestamp=datetime(2025, 4, 5, 10, 30, 0),
+            StartLocationLat=37.7749,
+            StartLocationLong=None,
+            EndLocationLat=37.7849,
+            EndLocationLong=-122.4294,
+            TotalDistance=5.0,
+            TotalSteps=5000,
+            CaloriesBurned=300,
+        )
+
+    def test_from_row_derives_fields(self):
+        record = WorkoutRecord.from_row(self.row)
+        self.assertEqual(record.duration, timedelta(minutes=90))
+        self.assertEqual(record.duration_minutes, 90)
+        self.assertEqual(record.workout_date, date(2025, 4, 5))
+        self.assertEqual(record.start_lat_lng, (37.7749, 0))
+
+    def test_dict_style_access(self):
+        record = WorkoutRecord.from_row(self.row)
+        self.assertEqual(record['workout_id'], "workout1")
+        self.assertEqual(record['start_timestamp'], "2025-04-05 09:00:00")
+        self.assertEqual(record['date'], "2025-04-05")
+        self.assertEqual(record.get('steps', 0), 5000)
+        self.assertEqual(record.get('missing', 'N/A'), 'N/A')
+        self.assertIn('distance', record)
+        with self.assertRaises(KeyError):
+            record['missing']
+
+    def test_missing_timestamps(self):
+        record = WorkoutRecord("w", None, None)
+        self.assertIsNone(record.duration)
+        self.assertEqual(record.get('start_timestamp', 'N/A'), 'N/A')
+
+    def test_uses_slots(self):
+        record = WorkoutRecord("w", None, None)
+        self.assertFalse(hasattr(record, '__dict__'))
+
+
+class TestAsWorkoutRecord(unittest.TestCase):
+
+    def test_record_is_returned_unchanged(self):
+        record = WorkoutRecord("w", datetime(2025, 1, 1), None)
+        self.assertIs(as_workout_record(record), record)
+
+    def test_dict_is_converted(self):
+        record = as_workout_record({
+            'workout_id': 'workout1',
+            'start_timestamp': '2025-04-05T09:00:00',
+            'end_timestamp': '2025-04-05 09:45:00',
+            'steps': 100,
+        })
+        self.assertEqual(record.duration_minutes, 45)
+        self.assertEqual(record.steps, 100)
+        self.assertEqual(record.distance, 0)
+        self.assertEqual(record.start_lat_lng, (0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()